@@ -0,0 +1,1298 @@
+//-------------------------------------------------------------------------
+// ChecksumXcelRTL_noparam.v
+//-------------------------------------------------------------------------
+// This file is generated by PyMTL yosys-SystemVerilog translation pass.
+
+// PyMTL Component PipeQueue1EntryRTL Definition
+// At /root/package/pymtl3/stdlib/queues/queues.py
+module PipeQueue1EntryRTL__EntryType_Bits128
+(
+  input  logic [0:0]    clk,
+  output logic [0:0]    count,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    deq__en,
+  output logic [0:0]    deq__rdy,
+  output logic [127:0]  deq__ret,
+  input  logic [0:0]    enq__en,
+  input  logic [127:0]  enq__msg,
+  output logic [0:0]    enq__rdy
+);
+  // Wire declarations
+  logic [127:0]  entry;
+  logic [0:0]    full;
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:490
+  // s.deq.rdy //= lambda: s.full & ~s.reset
+  
+  always_comb begin : _lambda__s_checksum_unit_in_q_q_deq_rdy
+    deq__rdy = full & ( ~reset );
+  end
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:489
+  // s.enq.rdy //= lambda: ~s.reset & ( ~s.full | s.deq.en )
+  
+  always_comb begin : _lambda__s_checksum_unit_in_q_q_enq_rdy
+    enq__rdy = ( ~reset ) & ( ( ~full ) | deq__en );
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:492
+  // @update_ff
+  // def ff_pipe1():
+  //   s.full <<= ~s.reset & ( s.enq.en | s.full & ~s.deq.en )
+  // 
+  //   if s.enq.en:
+  //     s.entry <<= s.enq.msg
+  
+  always_ff @(posedge clk) begin : ff_pipe1
+    full <= ( ~reset ) & ( enq__en | ( full & ( ~deq__en ) ) );
+    if ( enq__en ) begin
+      entry <= enq__msg;
+    end
+  end
+
+  // Connections
+  assign count = full;
+  assign deq__ret = entry;
+
+endmodule
+
+
+// PyMTL Component PipeQueueRTL Definition
+// At /root/package/pymtl3/stdlib/queues/queues.py
+module PipeQueueRTL__EntryType_Bits128__num_entries_1
+(
+  input  logic [0:0]    clk,
+  output logic [0:0]    count,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    deq__en,
+  output logic [0:0]    deq__rdy,
+  output logic [127:0]  deq__ret,
+  input  logic [0:0]    enq__en,
+  input  logic [127:0]  enq__msg,
+  output logic [0:0]    enq__rdy
+);
+  // Sub-component declarations
+  logic [0:0]    q__clk;
+  logic [0:0]    q__count;
+  logic [0:0]    q__reset;
+  logic [0:0]    q__deq__en;
+  logic [0:0]    q__deq__rdy;
+  logic [127:0]  q__deq__ret;
+  logic [0:0]    q__enq__en;
+  logic [127:0]  q__enq__msg;
+  logic [0:0]    q__enq__rdy;
+
+  PipeQueue1EntryRTL__EntryType_Bits128 q
+  (
+    .clk            (           q__clk          ),
+    .count          (          q__count         ),
+    .reset          (          q__reset         ),
+    .deq__en        (         q__deq__en        ),
+    .deq__rdy       (        q__deq__rdy        ),
+    .deq__ret       (        q__deq__ret        ),
+    .enq__en        (         q__enq__en        ),
+    .enq__msg       (        q__enq__msg        ),
+    .enq__rdy       (        q__enq__rdy        )
+  );
+
+  // Connections
+  assign q__clk = clk;
+  assign q__reset = reset;
+  assign q__enq__en = enq__en;
+  assign q__enq__msg = enq__msg;
+  assign enq__rdy = q__enq__rdy;
+  assign q__deq__en = deq__en;
+  assign deq__rdy = q__deq__rdy;
+  assign deq__ret = q__deq__ret;
+  assign count = q__count;
+
+endmodule
+
+
+// PyMTL Component StepUnit Definition
+// At /root/package/examples/ex02_cksum/ChecksumRTL.py
+module StepUnit_noparam
+(
+  input  logic [0:0]    clk,
+  input  logic [0:0]    reset,
+  input  logic [31:0]   sum1_in,
+  output logic [31:0]   sum1_out,
+  input  logic [31:0]   sum2_in,
+  output logic [31:0]   sum2_out,
+  input  logic [15:0]   word_in
+);
+  // Temporary wire definitions
+  logic [31:0]   __tmpvar__up_step_temp1;
+  logic [31:0]   __tmpvar__up_step_temp2;
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex02_cksum/ChecksumRTL.py:38
+  // @update
+  // def up_step():
+  //   temp1 = zext(s.word_in, 32) + s.sum1_in
+  //   s.sum1_out @= temp1 & 0xffff
+  // 
+  //   temp2 = s.sum1_out + s.sum2_in
+  //   s.sum2_out @= temp2 & 0xffff
+  
+  always_comb begin : up_step
+    __tmpvar__up_step_temp1 = { { 16 { 1'b0 } }, word_in } + sum1_in;
+    sum1_out = __tmpvar__up_step_temp1 & 32'd65535;
+    __tmpvar__up_step_temp2 = sum1_out + sum2_in;
+    sum2_out = __tmpvar__up_step_temp2 & 32'd65535;
+  end
+
+endmodule
+
+
+// PyMTL Component ChecksumRTL Definition
+// At /root/package/examples/ex02_cksum/ChecksumRTL.py
+module ChecksumRTL_noparam
+(
+  input  logic [0:0]    clk,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    recv__en,
+  input  logic [127:0]  recv__msg,
+  output logic [0:0]    recv__rdy,
+  output logic [0:0]    send__en,
+  output logic [31:0]   send__msg,
+  input  logic [0:0]    send__rdy
+);
+  // Wire declarations
+  logic [31:0]   sum1;
+  logic [31:0]   sum2;
+  logic [15:0]   words [0:7];
+
+  // Struct/Array ports of sub-components in the form of wires
+  logic [0:0]    steps__clk [0:7];
+  logic [0:0]    steps__reset [0:7];
+  logic [31:0]   steps__sum1_in [0:7];
+  logic [31:0]   steps__sum1_out [0:7];
+  logic [31:0]   steps__sum2_in [0:7];
+  logic [31:0]   steps__sum2_out [0:7];
+  logic [15:0]   steps__word_in [0:7];
+
+  // Sub-component declarations
+  logic [0:0]    in_q__clk;
+  logic [0:0]    in_q__count;
+  logic [0:0]    in_q__reset;
+  logic [0:0]    in_q__deq__en;
+  logic [0:0]    in_q__deq__rdy;
+  logic [127:0]  in_q__deq__ret;
+  logic [0:0]    in_q__enq__en;
+  logic [127:0]  in_q__enq__msg;
+  logic [0:0]    in_q__enq__rdy;
+
+  PipeQueueRTL__EntryType_Bits128__num_entries_1 in_q
+  (
+    .clk            (         in_q__clk         ),
+    .count          (        in_q__count        ),
+    .reset          (        in_q__reset        ),
+    .deq__en        (       in_q__deq__en       ),
+    .deq__rdy       (       in_q__deq__rdy      ),
+    .deq__ret       (       in_q__deq__ret      ),
+    .enq__en        (       in_q__enq__en       ),
+    .enq__msg       (       in_q__enq__msg      ),
+    .enq__rdy       (       in_q__enq__rdy      )
+  );
+
+  logic [0:0]    steps__0__clk;
+  logic [0:0]    steps__0__reset;
+  logic [31:0]   steps__0__sum1_in;
+  logic [31:0]   steps__0__sum1_out;
+  logic [31:0]   steps__0__sum2_in;
+  logic [31:0]   steps__0__sum2_out;
+  logic [15:0]   steps__0__word_in;
+
+  StepUnit_noparam steps__0
+  (
+    .clk            (       steps__0__clk       ),
+    .reset          (      steps__0__reset      ),
+    .sum1_in        (     steps__0__sum1_in     ),
+    .sum1_out       (     steps__0__sum1_out    ),
+    .sum2_in        (     steps__0__sum2_in     ),
+    .sum2_out       (     steps__0__sum2_out    ),
+    .word_in        (     steps__0__word_in     )
+  );
+
+  logic [0:0]    steps__1__clk;
+  logic [0:0]    steps__1__reset;
+  logic [31:0]   steps__1__sum1_in;
+  logic [31:0]   steps__1__sum1_out;
+  logic [31:0]   steps__1__sum2_in;
+  logic [31:0]   steps__1__sum2_out;
+  logic [15:0]   steps__1__word_in;
+
+  StepUnit_noparam steps__1
+  (
+    .clk            (       steps__1__clk       ),
+    .reset          (      steps__1__reset      ),
+    .sum1_in        (     steps__1__sum1_in     ),
+    .sum1_out       (     steps__1__sum1_out    ),
+    .sum2_in        (     steps__1__sum2_in     ),
+    .sum2_out       (     steps__1__sum2_out    ),
+    .word_in        (     steps__1__word_in     )
+  );
+
+  logic [0:0]    steps__2__clk;
+  logic [0:0]    steps__2__reset;
+  logic [31:0]   steps__2__sum1_in;
+  logic [31:0]   steps__2__sum1_out;
+  logic [31:0]   steps__2__sum2_in;
+  logic [31:0]   steps__2__sum2_out;
+  logic [15:0]   steps__2__word_in;
+
+  StepUnit_noparam steps__2
+  (
+    .clk            (       steps__2__clk       ),
+    .reset          (      steps__2__reset      ),
+    .sum1_in        (     steps__2__sum1_in     ),
+    .sum1_out       (     steps__2__sum1_out    ),
+    .sum2_in        (     steps__2__sum2_in     ),
+    .sum2_out       (     steps__2__sum2_out    ),
+    .word_in        (     steps__2__word_in     )
+  );
+
+  logic [0:0]    steps__3__clk;
+  logic [0:0]    steps__3__reset;
+  logic [31:0]   steps__3__sum1_in;
+  logic [31:0]   steps__3__sum1_out;
+  logic [31:0]   steps__3__sum2_in;
+  logic [31:0]   steps__3__sum2_out;
+  logic [15:0]   steps__3__word_in;
+
+  StepUnit_noparam steps__3
+  (
+    .clk            (       steps__3__clk       ),
+    .reset          (      steps__3__reset      ),
+    .sum1_in        (     steps__3__sum1_in     ),
+    .sum1_out       (     steps__3__sum1_out    ),
+    .sum2_in        (     steps__3__sum2_in     ),
+    .sum2_out       (     steps__3__sum2_out    ),
+    .word_in        (     steps__3__word_in     )
+  );
+
+  logic [0:0]    steps__4__clk;
+  logic [0:0]    steps__4__reset;
+  logic [31:0]   steps__4__sum1_in;
+  logic [31:0]   steps__4__sum1_out;
+  logic [31:0]   steps__4__sum2_in;
+  logic [31:0]   steps__4__sum2_out;
+  logic [15:0]   steps__4__word_in;
+
+  StepUnit_noparam steps__4
+  (
+    .clk            (       steps__4__clk       ),
+    .reset          (      steps__4__reset      ),
+    .sum1_in        (     steps__4__sum1_in     ),
+    .sum1_out       (     steps__4__sum1_out    ),
+    .sum2_in        (     steps__4__sum2_in     ),
+    .sum2_out       (     steps__4__sum2_out    ),
+    .word_in        (     steps__4__word_in     )
+  );
+
+  logic [0:0]    steps__5__clk;
+  logic [0:0]    steps__5__reset;
+  logic [31:0]   steps__5__sum1_in;
+  logic [31:0]   steps__5__sum1_out;
+  logic [31:0]   steps__5__sum2_in;
+  logic [31:0]   steps__5__sum2_out;
+  logic [15:0]   steps__5__word_in;
+
+  StepUnit_noparam steps__5
+  (
+    .clk            (       steps__5__clk       ),
+    .reset          (      steps__5__reset      ),
+    .sum1_in        (     steps__5__sum1_in     ),
+    .sum1_out       (     steps__5__sum1_out    ),
+    .sum2_in        (     steps__5__sum2_in     ),
+    .sum2_out       (     steps__5__sum2_out    ),
+    .word_in        (     steps__5__word_in     )
+  );
+
+  logic [0:0]    steps__6__clk;
+  logic [0:0]    steps__6__reset;
+  logic [31:0]   steps__6__sum1_in;
+  logic [31:0]   steps__6__sum1_out;
+  logic [31:0]   steps__6__sum2_in;
+  logic [31:0]   steps__6__sum2_out;
+  logic [15:0]   steps__6__word_in;
+
+  StepUnit_noparam steps__6
+  (
+    .clk            (       steps__6__clk       ),
+    .reset          (      steps__6__reset      ),
+    .sum1_in        (     steps__6__sum1_in     ),
+    .sum1_out       (     steps__6__sum1_out    ),
+    .sum2_in        (     steps__6__sum2_in     ),
+    .sum2_out       (     steps__6__sum2_out    ),
+    .word_in        (     steps__6__word_in     )
+  );
+
+  logic [0:0]    steps__7__clk;
+  logic [0:0]    steps__7__reset;
+  logic [31:0]   steps__7__sum1_in;
+  logic [31:0]   steps__7__sum1_out;
+  logic [31:0]   steps__7__sum2_in;
+  logic [31:0]   steps__7__sum2_out;
+  logic [15:0]   steps__7__word_in;
+
+  StepUnit_noparam steps__7
+  (
+    .clk            (       steps__7__clk       ),
+    .reset          (      steps__7__reset      ),
+    .sum1_in        (     steps__7__sum1_in     ),
+    .sum1_out       (     steps__7__sum1_out    ),
+    .sum2_in        (     steps__7__sum2_in     ),
+    .sum2_out       (     steps__7__sum2_out    ),
+    .word_in        (     steps__7__word_in     )
+  );
+
+  // Connect struct/array ports and their wire forms
+  assign steps__0__clk = steps__clk[0];
+  assign steps__1__clk = steps__clk[1];
+  assign steps__2__clk = steps__clk[2];
+  assign steps__3__clk = steps__clk[3];
+  assign steps__4__clk = steps__clk[4];
+  assign steps__5__clk = steps__clk[5];
+  assign steps__6__clk = steps__clk[6];
+  assign steps__7__clk = steps__clk[7];
+  assign steps__0__reset = steps__reset[0];
+  assign steps__1__reset = steps__reset[1];
+  assign steps__2__reset = steps__reset[2];
+  assign steps__3__reset = steps__reset[3];
+  assign steps__4__reset = steps__reset[4];
+  assign steps__5__reset = steps__reset[5];
+  assign steps__6__reset = steps__reset[6];
+  assign steps__7__reset = steps__reset[7];
+  assign steps__0__sum1_in = steps__sum1_in[0];
+  assign steps__1__sum1_in = steps__sum1_in[1];
+  assign steps__2__sum1_in = steps__sum1_in[2];
+  assign steps__3__sum1_in = steps__sum1_in[3];
+  assign steps__4__sum1_in = steps__sum1_in[4];
+  assign steps__5__sum1_in = steps__sum1_in[5];
+  assign steps__6__sum1_in = steps__sum1_in[6];
+  assign steps__7__sum1_in = steps__sum1_in[7];
+  assign steps__sum1_out[0] = steps__0__sum1_out;
+  assign steps__sum1_out[1] = steps__1__sum1_out;
+  assign steps__sum1_out[2] = steps__2__sum1_out;
+  assign steps__sum1_out[3] = steps__3__sum1_out;
+  assign steps__sum1_out[4] = steps__4__sum1_out;
+  assign steps__sum1_out[5] = steps__5__sum1_out;
+  assign steps__sum1_out[6] = steps__6__sum1_out;
+  assign steps__sum1_out[7] = steps__7__sum1_out;
+  assign steps__0__sum2_in = steps__sum2_in[0];
+  assign steps__1__sum2_in = steps__sum2_in[1];
+  assign steps__2__sum2_in = steps__sum2_in[2];
+  assign steps__3__sum2_in = steps__sum2_in[3];
+  assign steps__4__sum2_in = steps__sum2_in[4];
+  assign steps__5__sum2_in = steps__sum2_in[5];
+  assign steps__6__sum2_in = steps__sum2_in[6];
+  assign steps__7__sum2_in = steps__sum2_in[7];
+  assign steps__sum2_out[0] = steps__0__sum2_out;
+  assign steps__sum2_out[1] = steps__1__sum2_out;
+  assign steps__sum2_out[2] = steps__2__sum2_out;
+  assign steps__sum2_out[3] = steps__3__sum2_out;
+  assign steps__sum2_out[4] = steps__4__sum2_out;
+  assign steps__sum2_out[5] = steps__5__sum2_out;
+  assign steps__sum2_out[6] = steps__6__sum2_out;
+  assign steps__sum2_out[7] = steps__7__sum2_out;
+  assign steps__0__word_in = steps__word_in[0];
+  assign steps__1__word_in = steps__word_in[1];
+  assign steps__2__word_in = steps__word_in[2];
+  assign steps__3__word_in = steps__word_in[3];
+  assign steps__4__word_in = steps__word_in[4];
+  assign steps__5__word_in = steps__word_in[5];
+  assign steps__6__word_in = steps__word_in[6];
+  assign steps__7__word_in = steps__word_in[7];
+
+  // Temporary wire definitions
+  logic [0:0]    __tmpvar__up_rtl_send_go;
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex02_cksum/ChecksumRTL.py:93
+  // @update
+  // def up_rtl_send():
+  //   go = s.in_q.deq.rdy & s.send.rdy
+  //   s.send.en     @= go
+  //   s.in_q.deq.en @= go
+  
+  always_comb begin : up_rtl_send
+    __tmpvar__up_rtl_send_go = in_q__deq__rdy & send__rdy;
+    send__en = __tmpvar__up_rtl_send_go;
+    in_q__deq__en = __tmpvar__up_rtl_send_go;
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex02_cksum/ChecksumRTL.py:99
+  // @update
+  // def up_rtl_sum():
+  //   s.send.msg @= ( s.sum2 << 16 ) | s.sum1
+  
+  always_comb begin : up_rtl_sum
+    send__msg = ( sum2 << 5'd16 ) | sum1;
+  end
+
+  // Connections
+  assign in_q__clk = clk;
+  assign in_q__reset = reset;
+  assign steps__clk[0] = clk;
+  assign steps__reset[0] = reset;
+  assign steps__clk[1] = clk;
+  assign steps__reset[1] = reset;
+  assign steps__clk[2] = clk;
+  assign steps__reset[2] = reset;
+  assign steps__clk[3] = clk;
+  assign steps__reset[3] = reset;
+  assign steps__clk[4] = clk;
+  assign steps__reset[4] = reset;
+  assign steps__clk[5] = clk;
+  assign steps__reset[5] = reset;
+  assign steps__clk[6] = clk;
+  assign steps__reset[6] = reset;
+  assign steps__clk[7] = clk;
+  assign steps__reset[7] = reset;
+  assign in_q__enq__en = recv__en;
+  assign in_q__enq__msg = recv__msg;
+  assign recv__rdy = in_q__enq__rdy;
+  assign words[0] = in_q__deq__ret[15:0];
+  assign words[1] = in_q__deq__ret[31:16];
+  assign words[2] = in_q__deq__ret[47:32];
+  assign words[3] = in_q__deq__ret[63:48];
+  assign words[4] = in_q__deq__ret[79:64];
+  assign words[5] = in_q__deq__ret[95:80];
+  assign words[6] = in_q__deq__ret[111:96];
+  assign words[7] = in_q__deq__ret[127:112];
+  assign steps__word_in[0] = words[0];
+  assign steps__sum1_in[0] = 32'd0;
+  assign steps__sum2_in[0] = 32'd0;
+  assign steps__word_in[1] = words[1];
+  assign steps__sum1_in[1] = steps__sum1_out[0];
+  assign steps__sum2_in[1] = steps__sum2_out[0];
+  assign steps__word_in[2] = words[2];
+  assign steps__sum1_in[2] = steps__sum1_out[1];
+  assign steps__sum2_in[2] = steps__sum2_out[1];
+  assign steps__word_in[3] = words[3];
+  assign steps__sum1_in[3] = steps__sum1_out[2];
+  assign steps__sum2_in[3] = steps__sum2_out[2];
+  assign steps__word_in[4] = words[4];
+  assign steps__sum1_in[4] = steps__sum1_out[3];
+  assign steps__sum2_in[4] = steps__sum2_out[3];
+  assign steps__word_in[5] = words[5];
+  assign steps__sum1_in[5] = steps__sum1_out[4];
+  assign steps__sum2_in[5] = steps__sum2_out[4];
+  assign steps__word_in[6] = words[6];
+  assign steps__sum1_in[6] = steps__sum1_out[5];
+  assign steps__sum2_in[6] = steps__sum2_out[5];
+  assign steps__word_in[7] = words[7];
+  assign steps__sum1_in[7] = steps__sum1_out[6];
+  assign steps__sum2_in[7] = steps__sum2_out[6];
+  assign sum1 = steps__sum1_out[7];
+  assign sum2 = steps__sum2_out[7];
+
+endmodule
+
+
+// PyMTL Component NormalQueueCtrlRTL Definition
+// At /root/package/pymtl3/stdlib/queues/queues.py
+module NormalQueueCtrlRTL__num_entries_2
+(
+  input  logic [0:0]    clk,
+  output logic [1:0]    count,
+  input  logic [0:0]    deq_en,
+  output logic [0:0]    deq_rdy,
+  input  logic [0:0]    enq_en,
+  output logic [0:0]    enq_rdy,
+  output logic [0:0]    raddr,
+  input  logic [0:0]    reset,
+  output logic [0:0]    waddr,
+  output logic [0:0]    wen
+);
+  // Wire declarations
+  logic [0:0]    deq_xfer;
+  logic [0:0]    enq_xfer;
+  logic [0:0]    head;
+  logic [0:0]    tail;
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:84
+  // s.deq_rdy //= lambda: ~s.reset & ( s.count > CountType(0) )
+  
+  always_comb begin : _lambda__s_in_q_ctrl_deq_rdy
+    deq_rdy = ( ~reset ) & ( count > 2'd0 );
+  end
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:87
+  // s.deq_xfer //= lambda: s.deq_en & s.deq_rdy
+  
+  always_comb begin : _lambda__s_in_q_ctrl_deq_xfer
+    deq_xfer = deq_en & deq_rdy;
+  end
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:83
+  // s.enq_rdy //= lambda: ~s.reset & ( s.count < s.num_entries )
+  
+  always_comb begin : _lambda__s_in_q_ctrl_enq_rdy
+    enq_rdy = ( ~reset ) & ( count < 2'd2 );
+  end
+
+  // PyMTL Lambda Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:86
+  // s.enq_xfer //= lambda: s.enq_en & s.enq_rdy
+  
+  always_comb begin : _lambda__s_in_q_ctrl_enq_xfer
+    enq_xfer = enq_en & enq_rdy;
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/pymtl3/stdlib/queues/queues.py:89
+  // @update_ff
+  // def up_reg():
+  // 
+  //   if s.reset:
+  //     s.head  <<= PtrType(0)
+  //     s.tail  <<= PtrType(0)
+  //     s.count <<= CountType(0)
+  // 
+  //   else:
+  //     if s.deq_xfer:
+  //       s.head <<= s.head + PtrType(1) if s.head < s.last_idx else PtrType(0)
+  // 
+  //     if s.enq_xfer:
+  //       s.tail <<= s.tail + PtrType(1) if s.tail < s.last_idx else PtrType(0)
+  // 
+  //     if s.enq_xfer & ~s.deq_xfer:
+  //       s.count <<= s.count + CountType(1)
+  //     if ~s.enq_xfer & s.deq_xfer:
+  //       s.count <<= s.count - CountType(1)
+  
+  always_ff @(posedge clk) begin : up_reg
+    if ( reset ) begin
+      head <= 1'd0;
+      tail <= 1'd0;
+      count <= 2'd0;
+    end
+    else begin
+      if ( deq_xfer ) begin
+        head <= ( head < 1'd1 ) ? head + 1'd1 : 1'd0;
+      end
+      if ( enq_xfer ) begin
+        tail <= ( tail < 1'd1 ) ? tail + 1'd1 : 1'd0;
+      end
+      if ( enq_xfer & ( ~deq_xfer ) ) begin
+        count <= count + 2'd1;
+      end
+      if ( ( ~enq_xfer ) & deq_xfer ) begin
+        count <= count - 2'd1;
+      end
+    end
+  end
+
+  // Connections
+  assign wen = enq_xfer;
+  assign waddr = tail;
+  assign raddr = head;
+
+endmodule
+
+
+// PyMTL Component RegisterFile Definition
+// Full name: RegisterFile__Type_XcelReqMsg__type__1__addr_5__data_32__nregs_2__rd_ports_1__wr_ports_1__const_zero_False
+// At /root/package/pymtl3/stdlib/basic_rtl/register_files.py
+module RegisterFile__11f946f1b1099326
+(
+  input  logic [0:0]    clk,
+  input  logic [0:0]    raddr__0,
+  output logic [0:0]    rdata__0__type_,
+  output logic [4:0]    rdata__0__addr,
+  output logic [31:0]   rdata__0__data,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    waddr__0,
+  input  logic [0:0]    wdata__0__type_,
+  input  logic [4:0]    wdata__0__addr,
+  input  logic [31:0]   wdata__0__data,
+  input  logic [0:0]    wen__0
+);
+  // Struct/Array ports in the form of wires
+  logic [0:0]    raddr [0:0];
+  logic [0:0]    rdata__type_ [0:0];
+  logic [4:0]    rdata__addr [0:0];
+  logic [31:0]   rdata__data [0:0];
+  logic [37:0]   rdata [0:0];
+  logic [0:0]    waddr [0:0];
+  logic [0:0]    wdata__type_ [0:0];
+  logic [4:0]    wdata__addr [0:0];
+  logic [31:0]   wdata__data [0:0];
+  logic [37:0]   wdata [0:0];
+  logic [0:0]    wen [0:0];
+
+  // Wire declarations
+  logic [0:0]    regs__type_ [0:1];
+  logic [4:0]    regs__addr [0:1];
+  logic [31:0]   regs__data [0:1];
+  logic [37:0]   regs [0:1];
+
+  // PyMTL Update Block Source
+  // At /root/package/pymtl3/stdlib/basic_rtl/register_files.py:20
+  // @update
+  // def up_rf_read():
+  //   for i in range( rd_ports ):
+  //     s.rdata[i] @= s.regs[ s.raddr[i] ]
+  
+  integer __loopvar__up_rf_read_i;
+  
+  always_comb begin : up_rf_read
+    for ( __loopvar__up_rf_read_i = 1'd0; __loopvar__up_rf_read_i < 1'd1; __loopvar__up_rf_read_i = __loopvar__up_rf_read_i + 1'd1 )
+      rdata[1'(__loopvar__up_rf_read_i)] = regs[raddr[1'(__loopvar__up_rf_read_i)]];
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/pymtl3/stdlib/basic_rtl/register_files.py:32
+  // @update_ff
+  // def up_rf_write():
+  //   for i in range( wr_ports ):
+  //     if s.wen[i]:
+  //       s.regs[ s.waddr[i] ] <<= s.wdata[i]
+  
+  integer __loopvar__up_rf_write_i;
+  
+  always_ff @(posedge clk) begin : up_rf_write
+    for ( __loopvar__up_rf_write_i = 1'd0; __loopvar__up_rf_write_i < 1'd1; __loopvar__up_rf_write_i = __loopvar__up_rf_write_i + 1'd1 )
+      if ( wen[1'(__loopvar__up_rf_write_i)] ) begin
+        regs[waddr[1'(__loopvar__up_rf_write_i)]] <= wdata[1'(__loopvar__up_rf_write_i)];
+      end
+  end
+
+  // Connections
+  assign raddr[0] = raddr__0;
+  assign rdata__0__type_ = rdata__type_[0];
+  assign rdata__0__addr = rdata__addr[0];
+  assign rdata__0__data = rdata__data[0];
+  assign rdata__0__type_ = rdata[0][37:37];
+  assign rdata__0__addr = rdata[0][36:32];
+  assign rdata__0__data = rdata[0][31:0];
+  assign waddr[0] = waddr__0;
+  assign wdata__type_[0] = wdata__0__type_;
+  assign wdata__addr[0] = wdata__0__addr;
+  assign wdata__data[0] = wdata__0__data;
+  assign wdata[0][37:37] = wdata__0__type_;
+  assign wdata[0][36:32] = wdata__0__addr;
+  assign wdata[0][31:0] = wdata__0__data;
+  assign wen[0] = wen__0;
+
+endmodule
+
+
+// PyMTL Component NormalQueueDpathRTL Definition
+// Full name: NormalQueueDpathRTL__EntryType_XcelReqMsg__type__1__addr_5__data_32__num_entries_2
+// At /root/package/pymtl3/stdlib/queues/queues.py
+module NormalQueueDpathRTL__8e342899926022cb
+(
+  input  logic [0:0]    clk,
+  output logic [0:0]    deq_ret__type_,
+  output logic [4:0]    deq_ret__addr,
+  output logic [31:0]   deq_ret__data,
+  input  logic [0:0]    enq_msg__type_,
+  input  logic [4:0]    enq_msg__addr,
+  input  logic [31:0]   enq_msg__data,
+  input  logic [0:0]    raddr,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    waddr,
+  input  logic [0:0]    wen
+);
+  // Struct/Array ports in the form of wires
+  logic [37:0]   deq_ret;
+  logic [37:0]   enq_msg;
+
+  // Struct/Array ports of sub-components in the form of wires
+  logic [0:0]    queue__raddr [0:0];
+  logic [0:0]    queue__rdata__type_ [0:0];
+  logic [4:0]    queue__rdata__addr [0:0];
+  logic [31:0]   queue__rdata__data [0:0];
+  logic [37:0]   queue__rdata [0:0];
+  logic [0:0]    queue__waddr [0:0];
+  logic [0:0]    queue__wdata__type_ [0:0];
+  logic [4:0]    queue__wdata__addr [0:0];
+  logic [31:0]   queue__wdata__data [0:0];
+  logic [37:0]   queue__wdata [0:0];
+  logic [0:0]    queue__wen [0:0];
+
+  // Sub-component declarations
+  logic [0:0]    queue__clk;
+  logic [0:0]    queue__raddr__0;
+  logic [0:0]    queue__rdata__0__type_;
+  logic [4:0]    queue__rdata__0__addr;
+  logic [31:0]   queue__rdata__0__data;
+  logic [0:0]    queue__reset;
+  logic [0:0]    queue__waddr__0;
+  logic [0:0]    queue__wdata__0__type_;
+  logic [4:0]    queue__wdata__0__addr;
+  logic [31:0]   queue__wdata__0__data;
+  logic [0:0]    queue__wen__0;
+
+  RegisterFile__11f946f1b1099326 queue
+  (
+    .clk            (         queue__clk        ),
+    .raddr__0       (      queue__raddr__0      ),
+    .rdata__0__type_(   queue__rdata__0__type_  ),
+    .rdata__0__addr (   queue__rdata__0__addr   ),
+    .rdata__0__data (   queue__rdata__0__data   ),
+    .reset          (        queue__reset       ),
+    .waddr__0       (      queue__waddr__0      ),
+    .wdata__0__type_(   queue__wdata__0__type_  ),
+    .wdata__0__addr (   queue__wdata__0__addr   ),
+    .wdata__0__data (   queue__wdata__0__data   ),
+    .wen__0         (       queue__wen__0       )
+  );
+
+  // Connect struct/array ports and their wire forms
+  assign queue__raddr__0 = queue__raddr[0];
+  assign queue__rdata__type_[0] = queue__rdata__0__type_;
+  assign queue__rdata__addr[0] = queue__rdata__0__addr;
+  assign queue__rdata__data[0] = queue__rdata__0__data;
+  assign queue__rdata[0][37:37] = queue__rdata__0__type_;
+  assign queue__rdata[0][36:32] = queue__rdata__0__addr;
+  assign queue__rdata[0][31:0] = queue__rdata__0__data;
+  assign queue__waddr__0 = queue__waddr[0];
+  assign queue__wdata__0__type_ = queue__wdata__type_[0];
+  assign queue__wdata__0__addr = queue__wdata__addr[0];
+  assign queue__wdata__0__data = queue__wdata__data[0];
+  assign queue__wdata__0__type_ = queue__wdata[0][37:37];
+  assign queue__wdata__0__addr = queue__wdata[0][36:32];
+  assign queue__wdata__0__data = queue__wdata[0][31:0];
+  assign queue__wen__0 = queue__wen[0];
+
+  // Connections
+  assign deq_ret__type_ = deq_ret[37:37];
+  assign deq_ret__addr = deq_ret[36:32];
+  assign deq_ret__data = deq_ret[31:0];
+  assign enq_msg[37:37] = enq_msg__type_;
+  assign enq_msg[36:32] = enq_msg__addr;
+  assign enq_msg[31:0] = enq_msg__data;
+  assign queue__clk = clk;
+  assign queue__reset = reset;
+  assign queue__raddr[0] = raddr;
+  assign deq_ret = queue__rdata[0];
+  assign queue__wen[0] = wen;
+  assign queue__waddr[0] = waddr;
+  assign queue__wdata[0] = enq_msg;
+
+endmodule
+
+
+// PyMTL Component NormalQueueRTL Definition
+// Full name: NormalQueueRTL__EntryType_XcelReqMsg__type__1__addr_5__data_32__num_entries_2
+// At /root/package/pymtl3/stdlib/queues/queues.py
+module NormalQueueRTL__8e342899926022cb
+(
+  input  logic [0:0]    clk,
+  output logic [1:0]    count,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    deq__en,
+  output logic [0:0]    deq__rdy,
+  output logic [0:0]    deq__ret__type_,
+  output logic [4:0]    deq__ret__addr,
+  output logic [31:0]   deq__ret__data,
+  input  logic [0:0]    enq__en,
+  input  logic [0:0]    enq__msg__type_,
+  input  logic [4:0]    enq__msg__addr,
+  input  logic [31:0]   enq__msg__data,
+  output logic [0:0]    enq__rdy
+);
+  // Struct/Array ports in the form of wires
+  logic [37:0]   deq__ret;
+  logic [37:0]   enq__msg;
+
+  // Struct/Array ports of sub-components in the form of wires
+  logic [37:0]   dpath__deq_ret;
+  logic [37:0]   dpath__enq_msg;
+
+  // Sub-component declarations
+  logic [0:0]    ctrl__clk;
+  logic [1:0]    ctrl__count;
+  logic [0:0]    ctrl__deq_en;
+  logic [0:0]    ctrl__deq_rdy;
+  logic [0:0]    ctrl__enq_en;
+  logic [0:0]    ctrl__enq_rdy;
+  logic [0:0]    ctrl__raddr;
+  logic [0:0]    ctrl__reset;
+  logic [0:0]    ctrl__waddr;
+  logic [0:0]    ctrl__wen;
+
+  NormalQueueCtrlRTL__num_entries_2 ctrl
+  (
+    .clk            (         ctrl__clk         ),
+    .count          (        ctrl__count        ),
+    .deq_en         (        ctrl__deq_en       ),
+    .deq_rdy        (       ctrl__deq_rdy       ),
+    .enq_en         (        ctrl__enq_en       ),
+    .enq_rdy        (       ctrl__enq_rdy       ),
+    .raddr          (        ctrl__raddr        ),
+    .reset          (        ctrl__reset        ),
+    .waddr          (        ctrl__waddr        ),
+    .wen            (         ctrl__wen         )
+  );
+
+  logic [0:0]    dpath__clk;
+  logic [0:0]    dpath__deq_ret__type_;
+  logic [4:0]    dpath__deq_ret__addr;
+  logic [31:0]   dpath__deq_ret__data;
+  logic [0:0]    dpath__enq_msg__type_;
+  logic [4:0]    dpath__enq_msg__addr;
+  logic [31:0]   dpath__enq_msg__data;
+  logic [0:0]    dpath__raddr;
+  logic [0:0]    dpath__reset;
+  logic [0:0]    dpath__waddr;
+  logic [0:0]    dpath__wen;
+
+  NormalQueueDpathRTL__8e342899926022cb dpath
+  (
+    .clk            (         dpath__clk        ),
+    .deq_ret__type_ (   dpath__deq_ret__type_   ),
+    .deq_ret__addr  (    dpath__deq_ret__addr   ),
+    .deq_ret__data  (    dpath__deq_ret__data   ),
+    .enq_msg__type_ (   dpath__enq_msg__type_   ),
+    .enq_msg__addr  (    dpath__enq_msg__addr   ),
+    .enq_msg__data  (    dpath__enq_msg__data   ),
+    .raddr          (        dpath__raddr       ),
+    .reset          (        dpath__reset       ),
+    .waddr          (        dpath__waddr       ),
+    .wen            (         dpath__wen        )
+  );
+
+  // Connect struct/array ports and their wire forms
+  assign dpath__deq_ret[37:37] = dpath__deq_ret__type_;
+  assign dpath__deq_ret[36:32] = dpath__deq_ret__addr;
+  assign dpath__deq_ret[31:0] = dpath__deq_ret__data;
+  assign dpath__enq_msg__type_ = dpath__enq_msg[37:37];
+  assign dpath__enq_msg__addr = dpath__enq_msg[36:32];
+  assign dpath__enq_msg__data = dpath__enq_msg[31:0];
+
+  // Connections
+  assign deq__ret__type_ = deq__ret[37:37];
+  assign deq__ret__addr = deq__ret[36:32];
+  assign deq__ret__data = deq__ret[31:0];
+  assign enq__msg[37:37] = enq__msg__type_;
+  assign enq__msg[36:32] = enq__msg__addr;
+  assign enq__msg[31:0] = enq__msg__data;
+  assign ctrl__clk = clk;
+  assign ctrl__reset = reset;
+  assign dpath__clk = clk;
+  assign dpath__reset = reset;
+  assign dpath__wen = ctrl__wen;
+  assign dpath__waddr = ctrl__waddr;
+  assign dpath__raddr = ctrl__raddr;
+  assign ctrl__enq_en = enq__en;
+  assign enq__rdy = ctrl__enq_rdy;
+  assign ctrl__deq_en = deq__en;
+  assign deq__rdy = ctrl__deq_rdy;
+  assign count = ctrl__count;
+  assign dpath__enq_msg = enq__msg;
+  assign deq__ret = dpath__deq_ret;
+
+endmodule
+
+
+// PyMTL Component Reg Definition
+// At /root/package/pymtl3/stdlib/basic_rtl/registers.py
+module Reg__Type_Bits32
+(
+  input  logic [0:0]    clk,
+  input  logic [31:0]   in_,
+  output logic [31:0]   out,
+  input  logic [0:0]    reset
+);
+
+  // PyMTL Update Block Source
+  // At /root/package/pymtl3/stdlib/basic_rtl/registers.py:10
+  // @update_ff
+  // def up_reg():
+  //   s.out <<= s.in_
+  
+  always_ff @(posedge clk) begin : up_reg
+    out <= in_;
+  end
+
+endmodule
+
+
+// PyMTL Component ChecksumXcelRTL Definition
+// At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py
+module ChecksumXcelRTL_noparam
+(
+  input  logic [0:0]    clk,
+  input  logic [0:0]    reset,
+  input  logic [0:0]    xcel__req__en,
+  input  logic [0:0]    xcel__req__msg__type_,
+  input  logic [4:0]    xcel__req__msg__addr,
+  input  logic [31:0]   xcel__req__msg__data,
+  output logic [0:0]    xcel__req__rdy,
+  output logic [0:0]    xcel__resp__en,
+  output logic [0:0]    xcel__resp__msg__type_,
+  output logic [31:0]   xcel__resp__msg__data,
+  input  logic [0:0]    xcel__resp__rdy
+);
+  // Struct/Array ports in the form of wires
+  logic [37:0]   xcel__req__msg;
+  logic [32:0]   xcel__resp__msg;
+
+  // Wire declarations
+  logic [0:0]    start_pulse;
+  logic [1:0]    state;
+  logic [1:0]    state_next;
+
+  // Struct/Array ports of sub-components in the form of wires
+  logic [37:0]   in_q__deq__ret;
+  logic [37:0]   in_q__enq__msg;
+  logic [0:0]    reg_file__clk [0:5];
+  logic [31:0]   reg_file__in_ [0:5];
+  logic [31:0]   reg_file__out [0:5];
+  logic [0:0]    reg_file__reset [0:5];
+
+  // Sub-component declarations
+  logic [0:0]    checksum_unit__clk;
+  logic [0:0]    checksum_unit__reset;
+  logic [0:0]    checksum_unit__recv__en;
+  logic [127:0]  checksum_unit__recv__msg;
+  logic [0:0]    checksum_unit__recv__rdy;
+  logic [0:0]    checksum_unit__send__en;
+  logic [31:0]   checksum_unit__send__msg;
+  logic [0:0]    checksum_unit__send__rdy;
+
+  ChecksumRTL_noparam checksum_unit
+  (
+    .clk            (     checksum_unit__clk    ),
+    .reset          (    checksum_unit__reset   ),
+    .recv__en       (  checksum_unit__recv__en  ),
+    .recv__msg      (  checksum_unit__recv__msg ),
+    .recv__rdy      (  checksum_unit__recv__rdy ),
+    .send__en       (  checksum_unit__send__en  ),
+    .send__msg      (  checksum_unit__send__msg ),
+    .send__rdy      (  checksum_unit__send__rdy )
+  );
+
+  logic [0:0]    in_q__clk;
+  logic [1:0]    in_q__count;
+  logic [0:0]    in_q__reset;
+  logic [0:0]    in_q__deq__en;
+  logic [0:0]    in_q__deq__rdy;
+  logic [0:0]    in_q__deq__ret__type_;
+  logic [4:0]    in_q__deq__ret__addr;
+  logic [31:0]   in_q__deq__ret__data;
+  logic [0:0]    in_q__enq__en;
+  logic [0:0]    in_q__enq__msg__type_;
+  logic [4:0]    in_q__enq__msg__addr;
+  logic [31:0]   in_q__enq__msg__data;
+  logic [0:0]    in_q__enq__rdy;
+
+  NormalQueueRTL__8e342899926022cb in_q
+  (
+    .clk            (         in_q__clk         ),
+    .count          (        in_q__count        ),
+    .reset          (        in_q__reset        ),
+    .deq__en        (       in_q__deq__en       ),
+    .deq__rdy       (       in_q__deq__rdy      ),
+    .deq__ret__type_(   in_q__deq__ret__type_   ),
+    .deq__ret__addr (    in_q__deq__ret__addr   ),
+    .deq__ret__data (    in_q__deq__ret__data   ),
+    .enq__en        (       in_q__enq__en       ),
+    .enq__msg__type_(   in_q__enq__msg__type_   ),
+    .enq__msg__addr (    in_q__enq__msg__addr   ),
+    .enq__msg__data (    in_q__enq__msg__data   ),
+    .enq__rdy       (       in_q__enq__rdy      )
+  );
+
+  logic [0:0]    reg_file__0__clk;
+  logic [31:0]   reg_file__0__in_;
+  logic [31:0]   reg_file__0__out;
+  logic [0:0]    reg_file__0__reset;
+
+  Reg__Type_Bits32 reg_file__0
+  (
+    .clk            (      reg_file__0__clk     ),
+    .in_            (      reg_file__0__in_     ),
+    .out            (      reg_file__0__out     ),
+    .reset          (     reg_file__0__reset    )
+  );
+
+  logic [0:0]    reg_file__1__clk;
+  logic [31:0]   reg_file__1__in_;
+  logic [31:0]   reg_file__1__out;
+  logic [0:0]    reg_file__1__reset;
+
+  Reg__Type_Bits32 reg_file__1
+  (
+    .clk            (      reg_file__1__clk     ),
+    .in_            (      reg_file__1__in_     ),
+    .out            (      reg_file__1__out     ),
+    .reset          (     reg_file__1__reset    )
+  );
+
+  logic [0:0]    reg_file__2__clk;
+  logic [31:0]   reg_file__2__in_;
+  logic [31:0]   reg_file__2__out;
+  logic [0:0]    reg_file__2__reset;
+
+  Reg__Type_Bits32 reg_file__2
+  (
+    .clk            (      reg_file__2__clk     ),
+    .in_            (      reg_file__2__in_     ),
+    .out            (      reg_file__2__out     ),
+    .reset          (     reg_file__2__reset    )
+  );
+
+  logic [0:0]    reg_file__3__clk;
+  logic [31:0]   reg_file__3__in_;
+  logic [31:0]   reg_file__3__out;
+  logic [0:0]    reg_file__3__reset;
+
+  Reg__Type_Bits32 reg_file__3
+  (
+    .clk            (      reg_file__3__clk     ),
+    .in_            (      reg_file__3__in_     ),
+    .out            (      reg_file__3__out     ),
+    .reset          (     reg_file__3__reset    )
+  );
+
+  logic [0:0]    reg_file__4__clk;
+  logic [31:0]   reg_file__4__in_;
+  logic [31:0]   reg_file__4__out;
+  logic [0:0]    reg_file__4__reset;
+
+  Reg__Type_Bits32 reg_file__4
+  (
+    .clk            (      reg_file__4__clk     ),
+    .in_            (      reg_file__4__in_     ),
+    .out            (      reg_file__4__out     ),
+    .reset          (     reg_file__4__reset    )
+  );
+
+  logic [0:0]    reg_file__5__clk;
+  logic [31:0]   reg_file__5__in_;
+  logic [31:0]   reg_file__5__out;
+  logic [0:0]    reg_file__5__reset;
+
+  Reg__Type_Bits32 reg_file__5
+  (
+    .clk            (      reg_file__5__clk     ),
+    .in_            (      reg_file__5__in_     ),
+    .out            (      reg_file__5__out     ),
+    .reset          (     reg_file__5__reset    )
+  );
+
+  // Connect struct/array ports and their wire forms
+  assign in_q__deq__ret[37:37] = in_q__deq__ret__type_;
+  assign in_q__deq__ret[36:32] = in_q__deq__ret__addr;
+  assign in_q__deq__ret[31:0] = in_q__deq__ret__data;
+  assign in_q__enq__msg__type_ = in_q__enq__msg[37:37];
+  assign in_q__enq__msg__addr = in_q__enq__msg[36:32];
+  assign in_q__enq__msg__data = in_q__enq__msg[31:0];
+  assign reg_file__0__clk = reg_file__clk[0];
+  assign reg_file__1__clk = reg_file__clk[1];
+  assign reg_file__2__clk = reg_file__clk[2];
+  assign reg_file__3__clk = reg_file__clk[3];
+  assign reg_file__4__clk = reg_file__clk[4];
+  assign reg_file__5__clk = reg_file__clk[5];
+  assign reg_file__0__in_ = reg_file__in_[0];
+  assign reg_file__1__in_ = reg_file__in_[1];
+  assign reg_file__2__in_ = reg_file__in_[2];
+  assign reg_file__3__in_ = reg_file__in_[3];
+  assign reg_file__4__in_ = reg_file__in_[4];
+  assign reg_file__5__in_ = reg_file__in_[5];
+  assign reg_file__out[0] = reg_file__0__out;
+  assign reg_file__out[1] = reg_file__1__out;
+  assign reg_file__out[2] = reg_file__2__out;
+  assign reg_file__out[3] = reg_file__3__out;
+  assign reg_file__out[4] = reg_file__4__out;
+  assign reg_file__out[5] = reg_file__5__out;
+  assign reg_file__0__reset = reg_file__reset[0];
+  assign reg_file__1__reset = reg_file__reset[1];
+  assign reg_file__2__reset = reg_file__reset[2];
+  assign reg_file__3__reset = reg_file__reset[3];
+  assign reg_file__4__reset = reg_file__reset[4];
+  assign reg_file__5__reset = reg_file__reset[5];
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:80
+  // @update
+  // def up_fsm_output():
+  //   if s.state == s.XCFG:
+  //     s.in_q.deq.en  @= s.in_q.deq.rdy
+  //     s.xcel.resp.en @= s.in_q.deq.rdy
+  //     s.checksum_unit.recv.en  @= s.start_pulse & s.checksum_unit.recv.rdy
+  //     s.checksum_unit.send.rdy @= 1
+  // 
+  //   elif s.state == s.WAIT:
+  //     s.in_q.deq.en  @= 0
+  //     s.xcel.resp.en @= 0
+  //     s.checksum_unit.recv.en  @= s.checksum_unit.recv.rdy
+  //     s.checksum_unit.send.rdy @= 1
+  // 
+  //   else: # s.state == s.BUSY:
+  //     s.in_q.deq.en  @= 0
+  //     s.xcel.resp.en @= 0
+  //     s.checksum_unit.recv.en  @= 0
+  //     s.checksum_unit.send.rdy @= 1
+  
+  always_comb begin : up_fsm_output
+    if ( state == 2'd0 ) begin
+      in_q__deq__en = in_q__deq__rdy;
+      xcel__resp__en = in_q__deq__rdy;
+      checksum_unit__recv__en = start_pulse & checksum_unit__recv__rdy;
+      checksum_unit__send__rdy = 1'd1;
+    end
+    else if ( state == 2'd1 ) begin
+      in_q__deq__en = 1'd0;
+      xcel__resp__en = 1'd0;
+      checksum_unit__recv__en = checksum_unit__recv__rdy;
+      checksum_unit__send__rdy = 1'd1;
+    end
+    else begin
+      in_q__deq__en = 1'd0;
+      xcel__resp__en = 1'd0;
+      checksum_unit__recv__en = 1'd0;
+      checksum_unit__send__rdy = 1'd1;
+    end
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:100
+  // @update
+  // def up_resp_msg():
+  //   s.xcel.resp.msg.type_ @= s.in_q.deq.ret.type_
+  //   s.xcel.resp.msg.data  @= 0
+  //   if s.in_q.deq.ret.type_ == XcelMsgType.READ:
+  //     s.xcel.resp.msg.data @= s.reg_file[ s.in_q.deq.ret.addr[0:3] ].out
+  
+  always_comb begin : up_resp_msg
+    xcel__resp__msg__type_ = in_q__deq__ret__type_;
+    xcel__resp__msg__data = 32'd0;
+    if ( in_q__deq__ret__type_ == 1'd0 ) begin
+      xcel__resp__msg__data = reg_file__out[in_q__deq__ret__addr[3'd2:3'd0]];
+    end
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:52
+  // @update
+  // def up_start_pulse():
+  //   s.start_pulse @=   s.xcel.resp.en & \
+  //                    ( s.in_q.deq.ret.type_ == XcelMsgType.WRITE ) & \
+  //                    ( s.in_q.deq.ret.addr == 4 )
+  
+  always_comb begin : up_start_pulse
+    start_pulse = ( xcel__resp__en & ( in_q__deq__ret__type_ == 1'd1 ) ) & ( in_q__deq__ret__addr == 5'd4 );
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:58
+  // @update
+  // def up_state_next():
+  //   if s.state == s.XCFG:
+  //     s.state_next @= (
+  //       s.WAIT if s.start_pulse & ~s.checksum_unit.recv.rdy else
+  //       s.BUSY if s.start_pulse &  s.checksum_unit.recv.rdy else
+  //       s.XCFG
+  //     )
+  // 
+  //   elif s.state == s.WAIT:
+  //     s.state_next @= s.BUSY if s.checksum_unit.recv.rdy else s.WAIT
+  // 
+  //   else: # s.state == s.BUSY
+  //     s.state_next @= s.XCFG if s.checksum_unit.send.en else s.BUSY
+  
+  always_comb begin : up_state_next
+    if ( state == 2'd0 ) begin
+      state_next = ( start_pulse & ( ~checksum_unit__recv__rdy ) ) ? 2'd1 : ( start_pulse & checksum_unit__recv__rdy ) ? 2'd2 : 2'd0;
+    end
+    else if ( state == 2'd1 ) begin
+      state_next = checksum_unit__recv__rdy ? 2'd2 : 2'd1;
+    end
+    else
+      state_next = checksum_unit__send__en ? 2'd0 : 2'd2;
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:107
+  // @update
+  // def up_wr_regfile():
+  //   for i in range(6):
+  //     s.reg_file[i].in_ @= s.reg_file[i].out
+  // 
+  //   if s.in_q.deq.en & (s.in_q.deq.ret.type_ == XcelMsgType.WRITE):
+  //     for i in range(6):
+  //       s.reg_file[i].in_ @= (
+  //         s.in_q.deq.ret.data if b5(i) == s.in_q.deq.ret.addr else
+  //         s.reg_file[i].out
+  //       )
+  // 
+  //   if s.checksum_unit.send.en:
+  //     s.reg_file[5].in_ @= s.checksum_unit.send.msg
+  
+  integer __loopvar__up_wr_regfile_i;
+  
+  always_comb begin : up_wr_regfile
+    for ( __loopvar__up_wr_regfile_i = 1'd0; __loopvar__up_wr_regfile_i < 3'd6; __loopvar__up_wr_regfile_i = __loopvar__up_wr_regfile_i + 1'd1 )
+      reg_file__in_[3'(__loopvar__up_wr_regfile_i)] = reg_file__out[3'(__loopvar__up_wr_regfile_i)];
+    if ( in_q__deq__en & ( in_q__deq__ret__type_ == 1'd1 ) ) begin
+      for ( __loopvar__up_wr_regfile_i = 1'd0; __loopvar__up_wr_regfile_i < 3'd6; __loopvar__up_wr_regfile_i = __loopvar__up_wr_regfile_i + 1'd1 )
+        reg_file__in_[3'(__loopvar__up_wr_regfile_i)] = ( { { 2 { 1'b0 } }, 3'(__loopvar__up_wr_regfile_i) } == in_q__deq__ret__addr ) ? in_q__deq__ret__data : reg_file__out[3'(__loopvar__up_wr_regfile_i)];
+    end
+    if ( checksum_unit__send__en ) begin
+      reg_file__in_[3'd5] = checksum_unit__send__msg;
+    end
+  end
+
+  // PyMTL Update Block Source
+  // At /root/package/examples/ex04_xcel/ChecksumXcelRTL.py:73
+  // @update_ff
+  // def up_state():
+  //   if s.reset:
+  //     s.state <<= s.XCFG
+  //   else:
+  //     s.state <<= s.state_next
+  
+  always_ff @(posedge clk) begin : up_state
+    if ( reset ) begin
+      state <= 2'd0;
+    end
+    else
+      state <= state_next;
+  end
+
+  // Connections
+  assign xcel__req__msg[37:37] = xcel__req__msg__type_;
+  assign xcel__req__msg[36:32] = xcel__req__msg__addr;
+  assign xcel__req__msg[31:0] = xcel__req__msg__data;
+  assign xcel__resp__msg__type_ = xcel__resp__msg[32:32];
+  assign xcel__resp__msg__data = xcel__resp__msg[31:0];
+  assign in_q__clk = clk;
+  assign in_q__reset = reset;
+  assign reg_file__clk[0] = clk;
+  assign reg_file__reset[0] = reset;
+  assign reg_file__clk[1] = clk;
+  assign reg_file__reset[1] = reset;
+  assign reg_file__clk[2] = clk;
+  assign reg_file__reset[2] = reset;
+  assign reg_file__clk[3] = clk;
+  assign reg_file__reset[3] = reset;
+  assign reg_file__clk[4] = clk;
+  assign reg_file__reset[4] = reset;
+  assign reg_file__clk[5] = clk;
+  assign reg_file__reset[5] = reset;
+  assign checksum_unit__clk = clk;
+  assign checksum_unit__reset = reset;
+  assign in_q__enq__en = xcel__req__en;
+  assign in_q__enq__msg = xcel__req__msg;
+  assign xcel__req__rdy = in_q__enq__rdy;
+  assign checksum_unit__recv__msg[31:0] = reg_file__out[0];
+  assign checksum_unit__recv__msg[63:32] = reg_file__out[1];
+  assign checksum_unit__recv__msg[95:64] = reg_file__out[2];
+  assign checksum_unit__recv__msg[127:96] = reg_file__out[3];
+
+endmodule
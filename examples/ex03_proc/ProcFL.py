@@ -116,7 +116,7 @@ class ProcFL( Component ):
 
           s.PC += 4
 
-      except:
+      except Exception:
         print( "Unexpected error at PC={:0>8s}!".format( str(s.PC) ) )
         raise
 
@@ -254,3 +254,17 @@ class ProcFL_Tests:
     th = TestHarness( s.ProcType, src_delay=3, sink_delay=14,
                       mem_stall_prob=0.5, mem_latency=3 )
     s.run_sim( th, inst_xcel.gen_multiple_test )
+
+#-------------------------------------------------------------------------
+# ProcFLGenerator_Tests
+#-------------------------------------------------------------------------
+# The same test cases with blocking methods running as generators
+# instead of greenlets.
+
+class ProcFLGenerator_Tests( ProcFL_Tests ):
+
+  def run_sim( s, th, gen_test ):
+    th.elaborate()
+    th.load( assemble( gen_test() ) )
+    run_sim( th, dict( s.__class__.cmdline_opts, coroutine='generator' ) )
+    assert th._dag.greenlet_fallback == []
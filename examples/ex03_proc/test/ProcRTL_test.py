@@ -23,10 +23,54 @@ random.seed(0xdeadbeef)
 # It is as simple as inheriting from CL tests and change the ProcType to
 # ProcRTL.
 
+from . import inst_add
 from .ProcCL_test import ProcCL_Tests as BaseTests
+from .harness import TestHarness, assemble
 
 class ProcRTL_Tests( BaseTests ):
 
   @classmethod
   def setup_class( cls ):
     cls.ProcType = ProcRTL
+
+#-------------------------------------------------------------------------
+# checkpoint/restore
+#-------------------------------------------------------------------------
+# Warm up a harness, take a checkpoint, and restore it into a freshly
+# elaborated harness without loading the program.
+
+def test_checkpoint_restore( tmp_path ):
+
+  def mk_harness():
+    th = TestHarness( ProcRTL, src_delay=3, sink_delay=5,
+                      mem_stall_prob=0.5, mem_latency=3 )
+    th.elaborate()
+    return th
+
+  path = str( tmp_path / "proc.ckpt" )
+
+  A = mk_harness()
+  A.load( assemble( inst_add.gen_random_test() ) )
+  A.apply( DefaultPassGroup() )
+  A.sim_reset()
+  for i in range(40):
+    A.sim_tick()
+  A.sim_checkpoint( path )
+
+  trace_a = []
+  while not A.done():
+    A.sim_tick()
+    trace_a.append( A.line_trace() )
+
+  B = mk_harness()
+  B.apply( DefaultPassGroup() )
+  B.sim_reset()
+  B.sim_restore( path )
+
+  trace_b = []
+  while not B.done() and len(trace_b) <= len(trace_a):
+    B.sim_tick()
+    trace_b.append( B.line_trace() )
+
+  assert trace_a == trace_b
+  assert A.sim_cycle_count() == B.sim_cycle_count()
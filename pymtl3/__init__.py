@@ -1,5 +1,36 @@
-from .datatypes import *
-from .datatypes import _bitwidths
+from . import datatypes
+from .datatypes import (
+    Bits,
+    _bitwidths,
+    bitstruct,
+    clog2,
+    concat,
+    mk_bits,
+    mk_bitstruct,
+    reduce_and,
+    reduce_or,
+    reduce_xor,
+    sext,
+    trunc,
+    zext,
+)
+
+# BitsN and bN are created on first use, see datatypes/bits_import.py.
+# This has to come before the imports below, some of which import BitsN
+# from this package. __all__ is not a global so that "from pymtl3 import
+# *" goes through __getattr__ and creates all of them at once.
+
+def __getattr__( name ):
+  if name == "__all__":
+    datatypes.bits_import._mk_all_bits()
+    return _all
+  try:
+    value = getattr( datatypes, name )
+  except AttributeError:
+    raise AttributeError( f"module {__name__!r} has no attribute {name!r}" ) from None
+  globals()[ name ] = value
+  return value
+
 from .dsl.Component import Component
 from .dsl.ComponentLevel1 import update
 from .dsl.ComponentLevel2 import update_ff
@@ -27,7 +58,7 @@ from .dsl.MetadataKey import MetadataKey
 from .dsl.Placeholder import Placeholder
 from .passes.PassGroups import DefaultPassGroup
 
-__all__ = [
+_all = [
   'U','M','RD','WR',
   'Wire', 'InPort', 'OutPort', 'Interface', 'CallerPort', 'CalleePort',
   'update', 'update_ff', 'update_once', 'connect', 'method_port',
@@ -8,6 +8,8 @@ Author : Shunning Jiang
 Date   : Oct 31, 2017
 """
 
+import struct
+
 # lower <= value <= upper
 _upper = [ 0,  1 ]
 _lower = [ 0, -1 ]
@@ -23,6 +25,53 @@ def _new_valid_bits( nbits, uint ):
   ret._uint  = uint
   return ret
 
+def _new_bits_of( cls, nbits, uint ):
+  ret = object_new( cls )
+  ret._nbits = nbits
+  ret._uint  = uint
+  return ret
+
+#-------------------------------------------------------------------------
+# Serialization helpers
+#-------------------------------------------------------------------------
+# A value of nbits bits takes ceil(nbits/8) little-endian bytes. Arrays
+# of 1, 2, 4 and 8-byte values are packed and unpacked by a single
+# struct call.
+
+_struct_fmts = { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }
+
+def _check_buffer( buffer, offset, nbytes ):
+  if offset < 0 or offset + nbytes > len(buffer):
+    raise ValueError( f"{nbytes} bytes at offset {offset} do not fit in a buffer "
+                      f"of {len(buffer)} bytes" )
+
+def _pack_uints( buffer, offset, uints, nbytes ):
+  fmt = _struct_fmts.get( nbytes )
+  if fmt is not None:
+    struct.pack_into( f"<{len(uints)}{fmt}", buffer, offset, *uints )
+  else:
+    data = b''.join([ v.to_bytes( nbytes, 'little' ) for v in uints ])
+    _check_buffer( buffer, offset, len(data) )
+    buffer[offset:offset+len(data)] = data
+  return offset + len(uints) * nbytes
+
+def _unpack_uints( buffer, offset, count, nbytes ):
+  if count is None:
+    count = ( len(buffer) - offset ) // nbytes
+  fmt = _struct_fmts.get( nbytes )
+  if fmt is not None:
+    return list( struct.unpack_from( f"<{count}{fmt}", buffer, offset ) )
+  _check_buffer( buffer, offset, count * nbytes )
+  view = memoryview( buffer )
+  return [ int.from_bytes( view[i:i+nbytes], 'little' )
+           for i in range( offset, offset + count * nbytes, nbytes ) ]
+
+def _get_nbits( cls ):
+  nbits = cls.nbits
+  if not isinstance( nbits, int ):
+    raise TypeError( f"Cannot deserialize a {cls.__name__} without a fixed bitwidth, please use BitsN" )
+  return nbits
+
 class Bits:
   __slots__ = ( "_nbits", "_uint", "_next" )
 
@@ -148,6 +197,23 @@ class Bits:
     # Bypass check
     return _new_valid_bits( 1, (self._uint >> i) & 1 )
 
+  # Same as int( x[lo:hi] ) and int( x[i] ) without creating a Bits. The
+  # translated result is a Bits, so update blocks can only use them as a
+  # comparison operand, an index, an if condition or the right-hand side
+  # of an assignment, where the two agree.
+
+  def uint_slice( self, lo, hi ):
+    lo, hi = int(lo), int(hi)
+    if not 0 <= lo < hi <= self._nbits:
+      raise IndexError( f"Invalid access: [{lo}:{hi}] in a Bits{self._nbits} instance" )
+    return (self._uint >> lo) & _upper[hi - lo]
+
+  def bit( self, i ):
+    i = int(i)
+    if i >= self._nbits or i < 0:
+      raise IndexError( f"Invalid access: [{i}] in a Bits{self._nbits} instance" )
+    return (self._uint >> i) & 1
+
   def __setitem__( self, idx, v ):
     sv = int(self._uint)
 
@@ -529,3 +595,52 @@ class Bits:
   def hex( self ):
     str = "{:x}".format(int(self._uint)).zfill(((self._nbits-1)//4)+1)
     return "0x"+str
+
+  # Serialization
+
+  def to_bytes( self ):
+    return self._uint.to_bytes( (self._nbits + 7) >> 3, 'little' )
+
+  def pack_into( self, buffer, offset=0 ):
+    nbytes = (self._nbits + 7) >> 3
+    _check_buffer( buffer, offset, nbytes )
+    buffer[offset:offset+nbytes] = self._uint.to_bytes( nbytes, 'little' )
+    return offset + nbytes
+
+  @classmethod
+  def from_bytes( cls, data ):
+    nbits = _get_nbits( cls )
+    if len(data) != (nbits + 7) >> 3:
+      raise ValueError( f"Bits{nbits} takes {(nbits + 7) >> 3} bytes, not {len(data)}" )
+    return cls( int.from_bytes( data, 'little' ) )
+
+  @classmethod
+  def unpack_from( cls, buffer, offset=0 ):
+    nbytes = (_get_nbits( cls ) + 7) >> 3
+    _check_buffer( buffer, offset, nbytes )
+    return cls( int.from_bytes( memoryview( buffer )[offset:offset+nbytes], 'little' ) )
+
+  # Bulk variants that pack all values with one struct call or one join
+  # and create the unpacked values without going through __init__
+
+  @classmethod
+  def pack_array_into( cls, buffer, values, offset=0 ):
+    nbits = _get_nbits( cls )
+    uints = [ x._uint for x in values ]
+    if uints and max( uints ) >> nbits:
+      raise ValueError( f"Some values are too wide for Bits{nbits}" )
+    return _pack_uints( buffer, offset, uints, (nbits + 7) >> 3 )
+
+  @classmethod
+  def unpack_array_from( cls, buffer, count=None, offset=0 ):
+    nbits = _get_nbits( cls )
+    uints = _unpack_uints( buffer, offset, count, (nbits + 7) >> 3 )
+    if nbits & 7 and uints and max( uints ) >> nbits:
+      raise ValueError( f"Some values in the buffer are too wide for Bits{nbits}" )
+    ret = []
+    for v in uints:
+      x = object_new( cls )
+      x._nbits = nbits
+      x._uint  = v
+      ret.append( x )
+    return ret
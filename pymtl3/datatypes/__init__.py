@@ -1,4 +1,37 @@
-from .bits_import import *
-from .bits_import import _bitwidths
+from . import bits_import
+from .bits_import import Bits, _bitwidths, mk_bits
 from .bitstructs import bitstruct, is_bitstruct_class, is_bitstruct_inst, mk_bitstruct
 from .helpers import clog2, concat, reduce_and, reduce_or, reduce_xor, sext, trunc, zext
+
+# BitsN and bN are created by bits_import on first use. __all__ is not
+# a global so that "from pymtl3.datatypes import *" goes through
+# __getattr__ and creates all of them at once. The NumPy helpers are
+# imported on first use since NumPy is optional.
+
+_numpy_helpers = { 'bitstruct_dtype', 'from_numpy', 'to_numpy' }
+
+def __getattr__( name ):
+  if name == "__all__":
+    bits_import._mk_all_bits()
+    return _all
+  if name in _numpy_helpers:
+    from . import numpy_helpers
+    value = getattr( numpy_helpers, name )
+    globals()[ name ] = value
+    return value
+  try:
+    value = getattr( bits_import, name )
+  except AttributeError:
+    raise AttributeError( f"module {__name__!r} has no attribute {name!r}" ) from None
+  globals()[ name ] = value
+  return value
+
+def __dir__():
+  return sorted( set( globals() ) | set( dir( bits_import ) ) | _numpy_helpers )
+
+_all = [
+  'Bits', 'mk_bits',
+  'bitstruct', 'is_bitstruct_class', 'is_bitstruct_inst', 'mk_bitstruct',
+  'clog2', 'concat', 'reduce_and', 'reduce_or', 'reduce_xor', 'sext', 'trunc', 'zext',
+] + [ "Bits{}".format(x) for x in _bitwidths ] \
+  + [ "b{}".format(x) for x in _bitwidths ]
@@ -6,7 +6,7 @@ Import RPython Bits from PyPy mamba module if the environment variable
 that forces the use of Python Bits is set, and there is actually an
 importable Bits in mamba module. Otherwise import the Pure-Python
 implementation in Bits.py. Then generate a bunch of fixed-width BitsN
-types for PyMTL use.
+types for PyMTL use on demand.
 
 Author : Shunning Jiang
 Date   : Aug 23, 2018
@@ -61,16 +61,43 @@ class Bits{0}(Bits):
 _bits_types[{0}] = b{0} = Bits{0}
 """
 
+# BitsN types are created on first use. The template adds BitsN and bN
+# to the globals of this module, so later lookups no longer go through
+# __getattr__.
+
 _bitwidths  = list(range(1, 256)) + [ 384, 512 ]
 _bits_types = dict()
 
-custom_exec(compile( "".join([ bits_template.format(nbits) for nbits in _bitwidths ]),
-                     filename="bits_import.py", mode="exec"), globals(), locals() )
-
 def mk_bits( nbits ):
   assert nbits > 0, "We don't allow Bits0"
   # assert nbits < 512, "We don't allow bitwidth to exceed 512."
   if nbits not in _bits_types:
     custom_exec(compile( bits_template.format(nbits), filename=f"Bits{nbits}", mode="exec" ),
-                globals(), locals() )
+                globals(), globals() )
   return _bits_types[nbits]
+
+# Compiling all templates at once is much faster than one by one, so
+# star imports that need all of them call this first
+
+def _mk_all_bits():
+  nbits_list = [ nbits for nbits in _bitwidths if nbits not in _bits_types ]
+  if nbits_list:
+    custom_exec(compile( "".join([ bits_template.format(nbits) for nbits in nbits_list ]),
+                         filename="bits_import.py", mode="exec"), globals(), globals() )
+
+_predefined = { f"{prefix}{nbits}": nbits for nbits in _bitwidths for prefix in ( "Bits", "b" ) }
+
+def __getattr__( name ):
+  # "from bits_import import *" exports every BitsN and bN
+  if name == "__all__":
+    _mk_all_bits()
+    return [ x for x in globals() if not x.startswith('_') ]
+  try:
+    nbits = _predefined[ name ]
+  except KeyError:
+    raise AttributeError( f"module {__name__!r} has no attribute {name!r}" )
+  mk_bits( nbits )
+  return globals()[ name ]
+
+def __dir__():
+  return sorted( set( globals() ) | set( _predefined ) )
@@ -45,6 +45,9 @@ class Pixel:
   def __str__( self ):
     return f'({self.r},{self.g},{self.b})'
 
+Both accept packed=True to create a packed bit struct, which stores the
+whole value in one Bits object (see "Packed bitstructs" below).
+
 Author : Yanghui Ou, Shunning Jiang
   Date : Oct 19, 2019
 """
@@ -58,7 +61,9 @@ import py
 
 from pymtl3.extra.pypy import custom_exec
 
-from .bits_import import *
+from . import PythonBits
+from .bits_import import Bits, mk_bits
+from .PythonBits import _check_buffer, _pack_uints, _unpack_uints
 from .helpers import concat
 
 #-------------------------------------------------------------------------
@@ -93,6 +98,9 @@ def get_bitstruct_inst_all_classes( obj ):
     return ret
   # BitStruct
   assert is_bitstruct_inst( obj ), f"{obj} is not a valid PyMTL Bitstruct!"
+  # The fields of a packed bitstruct are views, report the field types
+  if hasattr( obj.__class__, _PACKED ):
+    return ret | { _get_leaf_type( x ) for x in obj.__bitstruct_fields__.values() }
   return ret | functools.reduce( operator.or_, [ get_bitstruct_inst_all_classes(getattr(obj, v))
                                                 for v in obj.__bitstruct_fields__.keys() ] )
 
@@ -518,6 +526,410 @@ def _mk_from_bits_fns( fields, total_nbits ):
                      [ "assert cls.nbits == other.nbits, f'LHS bitstruct {cls.nbits}-bit <> RHS other {other.nbits}-bit'",
                        "other = other.to_bits()",
                        f"return cls({','.join(from_bits_strs)})" ], _globals )
+
+#-------------------------------------------------------------------------
+# _mk_to_uint_fn
+#-------------------------------------------------------------------------
+# Creates _to_uint function that returns to_bits() as an int without
+# creating Bits objects, for example,
+#
+# def _to_uint( self ):
+#   return (int(self.x) << 32) | (int(self.y[1]) << 16) | (int(self.y[0]) << 0)
+
+def _mk_to_uint_fn( fields ):
+  leaves = []
+
+  def _gen_leaves( type_, expr ):
+    if isinstance( type_, list ):
+      for i in reversed(range(len(type_))):
+        _gen_leaves( type_[0], f"{expr}[{i}]" )
+    elif is_bitstruct_class( type_ ):
+      for name, typ in getattr(type_, _FIELDS).items():
+        _gen_leaves( typ, f"{expr}.{name}" )
+    else:
+      leaves.append( ( expr, type_.nbits ) )
+
+  for name, type_ in fields.items():
+    _gen_leaves( type_, f"self.{name}" )
+
+  terms = []
+  lo = 0
+  for expr, nbits in reversed( leaves ):
+    terms.append( f"(int({expr}) << {lo})" )
+    lo += nbits
+
+  return _create_fn( '_to_uint', [ 'self' ], [ f"return {' | '.join( reversed( terms ) )}" ] )
+
+#-------------------------------------------------------------------------
+# _mk_from_uint_fn
+#-------------------------------------------------------------------------
+# Creates class method _from_uint that creates a bitstruct from the int
+# value of its bits. Like clone of a packed bitstruct, we do not go
+# through __init__ but set the fields directly, for example,
+#
+# def _from_uint( cls, v ):
+#   ret = _object_new( cls )
+#   ret.x = _new_bits_of( _type0, 16, (v >> 32) & 0xffff )
+#   ret.y = [ _type1._from_uint( (v >> 0) & 0xffff ), _type1._from_uint( (v >> 16) & 0xffff ) ]
+#   return ret
+
+def _mk_from_uint_fn( fields ):
+  type_names = {}
+
+  def _gen_from_uint_str( type_, lo ):
+    if isinstance( type_, list ):
+      elem_nbits = _field_nbits( type_[0] )
+      return "[" + ", ".join([ _gen_from_uint_str( type_[0], lo + i * elem_nbits )
+                               for i in range(len(type_)) ]) + "]"
+
+    if type_ not in type_names:
+      type_names[ type_ ] = f"_type{len(type_names)}"
+    value = f"(v >> {lo}) & {(1 << type_.nbits) - 1}"
+    if is_bitstruct_class( type_ ):
+      return f"{type_names[ type_ ]}._from_uint( {value} )"
+    # Pure-Python BitsN objects are filled in directly
+    if issubclass( type_, PythonBits.Bits ):
+      return f"_new_bits_of( {type_names[ type_ ]}, {type_.nbits}, {value} )"
+    return f"{type_names[ type_ ]}( {value}, trunc_int=True )"
+
+  strs = []
+  lo = 0
+  for name, type_ in reversed( list( fields.items() ) ):
+    strs.append( f"ret.{name} = {_gen_from_uint_str( type_, lo )}" )
+    lo += _field_nbits( type_ )
+
+  _globals = { y: x for x, y in type_names.items() }
+  _globals['_object_new']  = _object_new
+  _globals['_new_bits_of'] = PythonBits._new_bits_of
+
+  return classmethod( _create_fn( '_from_uint', [ 'cls', 'v' ],
+                                  [ "ret = _object_new( cls )" ] + strs[::-1] + [ "return ret" ],
+                                  _globals ) )
+
+#-------------------------------------------------------------------------
+# _mk_bytes_fns
+#-------------------------------------------------------------------------
+# Creates to_bytes/pack_into and the from_bytes/unpack_from class
+# methods, plus bulk pack_array_into/unpack_array_from that serialize a
+# list of bitstructs with one struct call or one join. They use the same
+# little-endian layout as Bits: a bitstruct takes ceil(nbits/8) bytes of
+# its to_bits() value. _to_uint and _from_uint convert from and to ints,
+# _from_uint expects a value that fits.
+
+def _mk_bytes_fns( nbits ):
+  nbytes = (nbits + 7) >> 3
+
+  def to_bytes( self ):
+    return self._to_uint().to_bytes( nbytes, 'little' )
+
+  def pack_into( self, buffer, offset=0 ):
+    _check_buffer( buffer, offset, nbytes )
+    buffer[offset:offset+nbytes] = self._to_uint().to_bytes( nbytes, 'little' )
+    return offset + nbytes
+
+  def _check_uint( cls, v ):
+    if v >> nbits:
+      raise ValueError( f"Value {hex(v)} is too wide for {cls.__name__} of {nbits} bits" )
+    return v
+
+  def from_bytes( cls, data ):
+    if len(data) != nbytes:
+      raise ValueError( f"{cls.__name__} takes {nbytes} bytes, not {len(data)}" )
+    return cls._from_uint( _check_uint( cls, int.from_bytes( data, 'little' ) ) )
+
+  def unpack_from( cls, buffer, offset=0 ):
+    _check_buffer( buffer, offset, nbytes )
+    v = int.from_bytes( memoryview( buffer )[offset:offset+nbytes], 'little' )
+    return cls._from_uint( _check_uint( cls, v ) )
+
+  def pack_array_into( cls, buffer, values, offset=0 ):
+    for x in values:
+      if x.__class__ is not cls:
+        raise TypeError( f"Cannot pack a {x.__class__.__name__} object as {cls.__name__}" )
+    return _pack_uints( buffer, offset, [ x._to_uint() for x in values ], nbytes )
+
+  def unpack_array_from( cls, buffer, count=None, offset=0 ):
+    uints = _unpack_uints( buffer, offset, count, nbytes )
+    if uints:
+      _check_uint( cls, max( uints ) )
+    from_uint = cls._from_uint
+    return [ from_uint( v ) for v in uints ]
+
+  return to_bytes, pack_into, classmethod(from_bytes), classmethod(unpack_from), \
+         classmethod(pack_array_into), classmethod(unpack_array_from)
+
+#-------------------------------------------------------------------------
+# Packed bitstructs
+#-------------------------------------------------------------------------
+# A packed bitstruct keeps its whole value in a single Bits object
+# self._bits instead of one Bits object per field, so __init__ allocates
+# one object, and to_bits() and from_bits() copy it.
+# The class-level __bitstruct_packed__ table maps each field to a tuple
+# of the offset of its least significant bit and its width. The layout is
+# the same as to_bits() of an unpacked bitstruct: the first field sits at
+# the most significant bits and x[0] of a list field is the least
+# significant element.
+#
+# Reading a field returns a view, i.e., a copy of the field whose @=, <<=
+# and item assignment also write the field back into the bitstruct, so
+# that update blocks can keep assigning to s.out.x. A list field returns
+# a list of such views that also writes back assigned elements. Assigning a field
+# packs the new value with shift and mask. Only Bits and lists of Bits
+# are supported as fields of a packed bitstruct.
+
+_PACKED = '__bitstruct_packed__'
+
+_object_new = object.__new__
+
+def _get_leaf_type( type_ ):
+  while isinstance( type_, list ):
+    type_ = type_[0]
+  return type_
+
+def _field_nbits( type_ ):
+  if isinstance( type_, list ):
+    return len(type_) * _field_nbits( type_[0] )
+  return type_.nbits
+
+def _check_packed_field( cls, name, type_ ):
+  if not issubclass( _get_leaf_type( type_ ), Bits ):
+    raise TypeError( "A packed bitstruct only supports BitsN or list of BitsN as field:\n"
+                    f"- Field '{name}' of BitStruct {cls.__name__} is annotated as {type_}." )
+
+def _mk_packed_layout( fields ):
+  layout = {}
+  lo = 0
+  for name, type_ in reversed( list( fields.items() ) ):
+    nbits = _field_nbits( type_ )
+    layout[ name ] = ( lo, nbits )
+    lo += nbits
+  return lo, { name: layout[ name ] for name in fields }
+
+# Return the packed value of v as an unsigned integer. A list field
+# accepts None (all zeros) like the default argument of __init__.
+
+def _packed_uint( type_, v ):
+  if isinstance( type_, list ):
+    if v is None:
+      return 0
+    if len(v) != len(type_):
+      raise ValueError( f"Expecting a list of {len(type_)} elements, not {len(v)}" )
+    elem_type  = type_[0]
+    elem_nbits = _field_nbits( elem_type )
+    ret = 0
+    for i, x in enumerate( v ):
+      ret |= _packed_uint( elem_type, x ) << (i * elem_nbits)
+    return ret
+  return int( type_(v) )
+
+# Views of pure-Python Bits fields read and write _uint directly instead
+# of going through the constructor and __setitem__.
+
+def _mk_packed_view_type( type_, lo ):
+  nbits = type_.nbits
+  hi    = lo + nbits
+  clear = ~(((1 << nbits) - 1) << lo)
+  is_py = issubclass( type_, PythonBits.Bits )
+
+  def __ilshift__( self, v ):
+    type_.__ilshift__( self, v )
+    bits  = self._owner._bits
+    next_ = getattr( bits, '_next', None )
+    if next_ is None:
+      next_ = int(bits)
+    bits <<= (next_ & clear) | (int(self._next) << lo)
+    return self
+
+  def __imatmul__( self, v ):
+    type_.__imatmul__( self, v )
+    if is_py:
+      bits = self._owner._bits
+      bits._uint = (bits._uint & clear) | (self._uint << lo)
+    else:
+      self._owner._bits[lo:hi] = self
+    return self
+
+  def __setitem__( self, idx, v ):
+    type_.__setitem__( self, idx, v )
+    if is_py:
+      bits = self._owner._bits
+      bits._uint = (bits._uint & clear) | (self._uint << lo)
+    else:
+      self._owner._bits[lo:hi] = self
+
+  return type( type_.__name__, (type_,), {
+    '__slots__'   : ( '_owner', ),
+    '__ilshift__' : __ilshift__,
+    '__imatmul__' : __imatmul__,
+    '__setitem__' : __setitem__,
+  })
+
+# A list field reads as a _PackedList, a list of the views of its
+# elements that also writes an assigned element back, so that both
+# s.out.x[0] @= y and s.out.x[0] = y update the bitstruct. Its length
+# and order are fixed by the layout.
+
+class _PackedList( list ):
+  __slots__ = ( '_owner', '_accessors' )
+
+  def __setitem__( self, idx, v ):
+    if isinstance( idx, slice ):
+      raise TypeError( "Cannot assign to a slice of a list field of a packed bitstruct" )
+    getter, setter = self._accessors[ idx ]
+    setter( self._owner, v )
+    list.__setitem__( self, idx, getter( self._owner ) )
+
+  def _resize( self, *args ):
+    raise TypeError( "Cannot resize or reorder a list field of a packed bitstruct" )
+
+  append = extend = insert = pop = remove = clear = sort = reverse = _resize
+  __delitem__ = __iadd__ = __imul__ = _resize
+
+# Return the getter and the setter of the field of type type_ whose least
+# significant bit is at lo.
+
+def _mk_packed_accessors( type_, lo, bits_type ):
+  hi = lo + _field_nbits( type_ )
+
+  if isinstance( type_, list ):
+    elem_nbits = _field_nbits( type_[0] )
+    accessors  = [ _mk_packed_accessors( type_[0], lo + i * elem_nbits, bits_type )
+                   for i in range(len(type_)) ]
+    def getter( self ):
+      ret = _PackedList([ get( self ) for get, _ in accessors ])
+      ret._owner     = self
+      ret._accessors = accessors
+      return ret
+    View = None
+
+  else:
+    View  = _mk_packed_view_type( type_, lo )
+    nbits = type_.nbits
+    mask  = (1 << nbits) - 1
+
+    if issubclass( type_, PythonBits.Bits ):
+      def getter( self ):
+        ret = _object_new( View )
+        ret._nbits = nbits
+        ret._uint  = (self._bits._uint >> lo) & mask
+        ret._owner = self
+        return ret
+    else:
+      def getter( self ):
+        ret = View( (int(self._bits) >> lo) & mask )
+        ret._owner = self
+        return ret
+
+  def setter( self, v ):
+    # s.x @= y calls the setter with the view of s.x that already wrote
+    # itself back
+    if v.__class__ is View and v._owner is self:
+      return
+    try:
+      bits = self._bits
+    except AttributeError:
+      # A user-defined __init__ assigns the fields one by one
+      bits = self._bits = bits_type()
+    bits[lo:hi] = _packed_uint( type_, v )
+
+  return getter, setter
+
+def _mk_packed_property( type_, lo, bits_type ):
+  return property( *_mk_packed_accessors( type_, lo, bits_type ) )
+
+#-------------------------------------------------------------------------
+# _mk_packed_init_fn
+#-------------------------------------------------------------------------
+# Creates the __init__ function of a packed bitstruct. For example, if
+# fields contains two fields x (Bits4) and y (Bits8), it will return a
+# function that looks like the following:
+#
+# def __init__( s, x = 0, y = 0 ):
+#   s._bits = _bits_type( ((x if x.__class__ is int and 0 <= x <= 15 else int(_type_x(x))) << 8) |
+#                         ((y if y.__class__ is int and 0 <= y <= 255 else int(_type_y(y))) << 0) )
+
+def _mk_packed_init_fn( self_name, fields, layout, bits_type ):
+  _globals = { '_bits_type': bits_type, '_packed_uint': _packed_uint }
+  terms = []
+  for name, type_ in fields.items():
+    _globals[ f"_type_{name}" ] = type_
+    lo = layout[ name ][0]
+    if isinstance( type_, list ):
+      terms.append( f"(_packed_uint(_type_{name}, {name}) << {lo})" )
+    else:
+      terms.append( f"(({name} if {name}.__class__ is int and 0 <= {name} <= {(1 << type_.nbits) - 1} "
+                    f"else int(_type_{name}({name}))) << {lo})" )
+
+  return _create_fn(
+    '__init__',
+    [ self_name ] + [ _mk_init_arg( *field ) for field in fields.items() ],
+    [ f"{self_name}._bits = _bits_type( {' | '.join( terms )} )" ],
+    _globals = _globals,
+  )
+
+#-------------------------------------------------------------------------
+# _mk_packed_fns
+#-------------------------------------------------------------------------
+# Creates the other methods of a packed bitstruct that work on self._bits
+# as a whole.
+
+def _mk_packed_fns( bits_type ):
+
+  def __eq__( self, other ):
+    return other.__class__ is self.__class__ and int(self._bits) == int(other._bits)
+
+  def __hash__( self ):
+    return hash( int(self._bits) )
+
+  def __ilshift__( self, other ):
+    self._bits <<= other._bits if other.__class__ is self.__class__ else other.to_bits()
+    return self
+
+  def _flip( self ):
+    self._bits._flip()
+
+  def __imatmul__( self, other ):
+    self._bits @= other._bits if other.__class__ is self.__class__ else other.to_bits()
+    return self
+
+  def clone( self ):
+    ret = _object_new( self.__class__ )
+    ret._bits = bits_type( self._bits )
+    return ret
+
+  def __deepcopy__( self, memo ):
+    return clone( self )
+
+  # Like to_bits() of an unpacked bitstruct, the result is a new object
+  # that doesn't change with the bitstruct
+
+  def to_bits( self ):
+    return self._bits.clone()
+
+  def from_bits( cls, other ):
+    assert cls.nbits == other.nbits, f'LHS bitstruct {cls.nbits}-bit <> RHS other {other.nbits}-bit'
+    ret = _object_new( cls )
+    ret._bits = bits_type( other._bits if other.__class__ is cls else other.to_bits() )
+    return ret
+
+  def _to_uint( self ):
+    return int(self._bits)
+
+  if issubclass( bits_type, PythonBits.Bits ):
+    nbits = bits_type.nbits
+    def _from_uint( cls, v ):
+      ret = _object_new( cls )
+      ret._bits = PythonBits._new_bits_of( bits_type, nbits, v )
+      return ret
+  else:
+    def _from_uint( cls, v ):
+      ret = _object_new( cls )
+      ret._bits = bits_type( v )
+      return ret
+
+  return __eq__, __hash__, __ilshift__, _flip, __imatmul__, clone, __deepcopy__, \
+         to_bits, classmethod(from_bits), _to_uint, classmethod(_from_uint)
+
 #-------------------------------------------------------------------------
 # _check_valid_array
 #-------------------------------------------------------------------------
@@ -590,7 +1002,7 @@ def _get_self_name( fields ):
 _bitstruct_hash_cache = {}
 
 def _process_class( cls, add_init=True, add_str=True, add_repr=True,
-                    add_hash=True ):
+                    add_hash=True, packed=False ):
 
   # Get annotations of the class
   cls_annotations = cls.__dict__.get('__annotations__', {})
@@ -618,11 +1030,14 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
     assert a_name not in reserved_fields, f"Currently a bitstruct cannot have {reserved_fields}, but "\
                                           f"{a_name} is annotated as {a_type}"
     _check_field_annotation( cls, a_name, a_type )
+    if packed:
+      assert a_name != '_bits', "A packed bitstruct cannot have a field named _bits"
+      _check_packed_field( cls, a_name, a_type )
     fields[ a_name ] = a_type
     hashable_fields[ a_name ] = _convert_list_to_tuple( a_type )
 
   cls._hash = _hash = hash( (cls.__name__, *tuple(hashable_fields.items()),
-                             add_init, add_str, add_repr, add_hash) )
+                             add_init, add_str, add_repr, add_hash, packed) )
 
   if _hash in _bitstruct_hash_cache:
     return _bitstruct_hash_cache[ _hash ]
@@ -633,6 +1048,15 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
   # as bit struct.
   setattr( cls, _FIELDS, fields )
 
+  # A packed bitstruct stores its value in a Bits object and accesses
+  # the fields through properties
+  if packed:
+    nbits, layout = _mk_packed_layout( fields )
+    bits_type = mk_bits( nbits )
+    setattr( cls, _PACKED, layout )
+    for name, type_ in fields.items():
+      setattr( cls, name, _mk_packed_property( type_, layout[ name ][0], bits_type ) )
+
   # Add methods to the class
 
   # Create __init__. Here I follow the dataclass convention that we only
@@ -640,7 +1064,10 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
   # did not define their own init.
   if add_init:
     if not '__init__' in cls.__dict__:
-      cls.__init__ = _mk_init_fn( _get_self_name(fields), fields )
+      if packed:
+        cls.__init__ = _mk_packed_init_fn( _get_self_name(fields), fields, layout, bits_type )
+      else:
+        cls.__init__ = _mk_init_fn( _get_self_name(fields), fields )
 
   # Create __str__
   if add_str:
@@ -658,8 +1085,12 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
   # the translated verilog as in the verilog world two bit structs are
   # equal only if all the fields are equal. We always try to add __eq__
 
+  if packed:
+    __eq__, __hash__, __ilshift__, _flip, __imatmul__, clone, __deepcopy__, \
+      to_bits, from_bits, _to_uint, _from_uint = _mk_packed_fns( bits_type )
+
   if not '__eq__' in cls.__dict__:
-    cls.__eq__ = _mk_eq_fn( fields )
+    cls.__eq__ = __eq__ if packed else _mk_eq_fn( fields )
   else:
     w_msg = ( f'Overwriting {cls.__qualname__}\'s __eq__ may cause the '
               'translated verilog behaves differently from PyMTL '
@@ -669,29 +1100,52 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
   # Create __hash__.
   if add_hash:
     if not '__hash__' in cls.__dict__:
-      cls.__hash__ = _mk_hash_fn( fields )
+      cls.__hash__ = __hash__ if packed else _mk_hash_fn( fields )
 
   # Shunning: add __ilshift__ and _flip for update_ff
   assert not '__ilshift__' in cls.__dict__ and not '_flip' in cls.__dict__
 
-  cls.__ilshift__, cls._flip = _mk_ff_fn( fields )
+  if packed:
+    cls.__ilshift__, cls._flip = __ilshift__, _flip
+  else:
+    cls.__ilshift__, cls._flip = _mk_ff_fn( fields )
 
   # Shunning: add clone
   assert not 'clone' in cls.__dict__ and not '__deepcopy__' in cls.__dict__
 
-  cls.clone = _mk_clone_fn( fields )
+  if packed:
+    cls.clone, cls.__deepcopy__ = clone, __deepcopy__
+  else:
+    cls.clone = _mk_clone_fn( fields )
 
-  cls.__deepcopy__ = _mk_deepcopy_fn( fields )
+    cls.__deepcopy__ = _mk_deepcopy_fn( fields )
 
   # Shunning: add imatmul for assignment, as well as nbits/to_bits/from_bits
   assert '__imatmul__' not in cls.__dict__ and 'to_bits' not in cls.__dict__ and \
          'nbits' not in cls.__dict__ and 'from_bits' not in cls.__dict__
 
-  cls.__imatmul__ = _mk_imatmul_fn( fields )
-  cls.nbits, cls.to_bits = _mk_nbits_to_bits_fn( fields )
+  if packed:
+    cls.__imatmul__ = __imatmul__
+    cls.nbits, cls.to_bits = nbits, to_bits
+    cls.from_bits = from_bits
+  else:
+    cls.__imatmul__ = _mk_imatmul_fn( fields )
+    cls.nbits, cls.to_bits = _mk_nbits_to_bits_fn( fields )
+
+    from_bits = _mk_from_bits_fns( fields, cls.nbits )
+    cls.from_bits = classmethod(from_bits)
+
+  # Add serialization to bytes unless the user defined their own
+  if packed:
+    cls._to_uint, cls._from_uint = _to_uint, _from_uint
+  else:
+    cls._to_uint, cls._from_uint = _mk_to_uint_fn( fields ), _mk_from_uint_fn( fields )
 
-  from_bits = _mk_from_bits_fns( fields, cls.nbits )
-  cls.from_bits = classmethod(from_bits)
+  names = [ 'to_bytes', 'pack_into', 'from_bytes', 'unpack_from',
+            'pack_array_into', 'unpack_array_from' ]
+  for name, fn in zip( names, _mk_bytes_fns( cls.nbits ) ):
+    if not name in cls.__dict__:
+      setattr( cls, name, fn )
 
   assert not 'get_field_type' in cls.__dict__
 
@@ -712,10 +1166,11 @@ def _process_class( cls, add_init=True, add_str=True, add_repr=True,
 # The actual class decorator. We add a * in the argument list so that the
 # following argument can only be used as keyword arguments.
 
-def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True, add_hash=True ):
+def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True, add_hash=True,
+               packed=False ):
 
   def wrap( cls ):
-    return _process_class( cls, add_init, add_str, add_repr )
+    return _process_class( cls, add_init, add_str, add_repr, packed=packed )
 
   # Called as @bitstruct(...)
   if _cls is None:
@@ -731,7 +1186,7 @@ def bitstruct( _cls=None, *, add_init=True, add_str=True, add_repr=True, add_has
 # TODO: should we add base parameters to support inheritence?
 
 def mk_bitstruct( cls_name, fields, *, namespace=None, add_init=True,
-                   add_str=True, add_repr=True, add_hash=True ):
+                   add_str=True, add_repr=True, add_hash=True, packed=False ):
 
   # copy namespace since  will mutate it
   namespace = {} if namespace is None else namespace.copy()
@@ -750,4 +1205,4 @@ def mk_bitstruct( cls_name, fields, *, namespace=None, add_init=True,
   namespace['__annotations__'] = annos
   cls = types.new_class( cls_name, (), {}, lambda ns: ns.update( namespace ) )
   return bitstruct( cls, add_init=add_init, add_str=add_str,
-                    add_repr=add_repr, add_hash=add_hash )
+                    add_repr=add_repr, add_hash=add_hash, packed=packed )
@@ -9,49 +9,158 @@ Author : Shunning Jiang
 Date   : Nov 3, 2017
 """
 import math
+from operator import attrgetter
 
-from .bits_import import *
+from pymtl3.extra.pypy import custom_exec
+
+from . import PythonBits
+from .bits_import import Bits, b1
+
+#-------------------------------------------------------------------------
+# Specialized concat/trunc/zext/sext
+#-------------------------------------------------------------------------
+# Each helper looks up a function specialized for the bitwidths of its
+# arguments and the target width, and generates it on the first call
+# with that signature. The generated function is a single expression
+# with all shifts and masks precomputed. With the pure-Python Bits it
+# reads _uint and fills in the result without going through __init__.
+
+_pure = issubclass( Bits, PythonBits.Bits )
+
+if _pure:
+  _uint_str = "{}._uint"
+else:
+  _uint_str = "{}.uint()"
+
+# Return the body that creates a type_ of nbits bits from expr
+
+def _new_body( type_, nbits, expr ):
+  if _pure:
+    return [ f"ret = _object_new( {'Bits' if type_ is Bits else 'T'} )",
+             f"ret._nbits = {nbits}",
+             f"ret._uint  = {expr}",
+              "return ret" ]
+  if type_ is Bits:
+    return [ f"return Bits( {nbits}, {expr} )" ]
+  return [ f"return T( {expr} )" ]
+
+def _check_nbits( nbits ):
+  if nbits < 1 or nbits >= 1024:
+    raise ValueError(f"Only support 1 <= nbits < 1024, not {nbits}")
+
+def _mk_fn( name, args, body, T=None ):
+  src = f"def {name}( {', '.join(args)} ):\n" + "".join([ f"  {x}\n" for x in body ])
+  _globals = { 'Bits': Bits, 'T': T, '_object_new': object.__new__ }
+  custom_exec( compile( src, filename=name, mode="exec" ), _globals, _globals )
+  return _globals[ name ]
+
+# new_width is either an int, which gives a Bits of that bitwidth, or a
+# BitsN type. Return the result type and its bitwidth.
+
+def _get_target( new_width ):
+  if isinstance( new_width, int ):
+    _check_nbits( new_width )
+    return Bits, new_width
+  assert issubclass( new_width, Bits )
+  return new_width, new_width.nbits
 
 try:
   from mamba import concat
 except:
+  _concat_fns = {}
+  _get_nbits  = attrgetter( 'nbits' )
+
+  def _mk_concat_fn( widths ):
+    nbits = sum( widths )
+    _check_nbits( nbits )
+
+    args  = [ f"x{i}" for i in range(len(widths)) ]
+    terms = []
+    shamt = nbits
+    for x, w in zip( args, widths ):
+      shamt -= w
+      term = _uint_str.format( x )
+      terms.append( f"({term} << {shamt})" if shamt else term )
+
+    return _mk_fn( f"concat_{'_'.join(map(str, widths))}", args,
+                   _new_body( Bits, nbits, " | ".join( terms ) ) )
+
   def concat( *args ):
-    value = nbits = 0
+    key = tuple( map( _get_nbits, args ) )
+    try:
+      fn = _concat_fns[ key ]
+    except KeyError:
+      fn = _concat_fns[ key ] = _mk_concat_fn( key )
+    return fn( *args )
 
-    for x in args:
-      xnb = x.nbits
-      nbits += xnb
-      value = (value << xnb) | x.uint()
+_trunc_fns = {}
+_zext_fns  = {}
+_sext_fns  = {}
 
-    return Bits( nbits, value )
+def _mk_trunc_fn( nbits, new_width ):
+  type_, new_nbits = _get_target( new_width )
+  if type_ is Bits:
+    assert new_nbits <= nbits
+
+  expr = _uint_str.format( "x" )
+  if new_nbits < nbits:
+    expr = f"{expr} & {hex(PythonBits._upper[new_nbits])}"
+
+  return _mk_fn( f"trunc_{nbits}_{new_nbits}", [ "x" ], _new_body( type_, new_nbits, expr ), type_ )
+
+def _mk_zext_fn( nbits, new_width ):
+  type_, new_nbits = _get_target( new_width )
+  if type_ is Bits:
+    assert new_nbits >= nbits
+
+  # A narrower BitsN type only fails if the value does not fit, so it
+  # keeps going through the constructor
+  if new_nbits < nbits:
+    return _mk_fn( f"zext_{nbits}_{new_nbits}", [ "x" ], [ "return T( x.uint() )" ], type_ )
+
+  return _mk_fn( f"zext_{nbits}_{new_nbits}", [ "x" ],
+                 _new_body( type_, new_nbits, _uint_str.format( "x" ) ), type_ )
+
+def _mk_sext_fn( nbits, new_width ):
+  type_, new_nbits = _get_target( new_width )
+  if type_ is Bits:
+    assert new_nbits >= nbits
+
+  if new_nbits < nbits:
+    return _mk_fn( f"sext_{nbits}_{new_nbits}", [ "x" ], [ "return T( x.int() )" ], type_ )
+
+  # Flipping the sign bit and subtracting it sign-extends the value
+  sign = hex( 1 << (nbits - 1) )
+  expr = f"(({_uint_str.format('x')} ^ {sign}) - {sign}) & {hex(PythonBits._upper[new_nbits])}"
+  return _mk_fn( f"sext_{nbits}_{new_nbits}", [ "x" ], _new_body( type_, new_nbits, expr ), type_ )
 
 def trunc( value, new_width ):
-  if isinstance( new_width, int ):
-    assert new_width <= value.nbits
-    return Bits( new_width, value.uint(), trunc_int=True )
-  else:
-    assert issubclass( new_width, Bits )
-    return new_width( value.uint(), trunc_int=True )
+  key = ( value.nbits, new_width )
+  try:
+    fn = _trunc_fns[ key ]
+  except KeyError:
+    fn = _trunc_fns[ key ] = _mk_trunc_fn( *key )
+  return fn( value )
 
 def zext( value, new_width ):
-  if isinstance( new_width, int ):
-    assert new_width >= value.nbits
-    return Bits( new_width, value.uint() )
-  else:
-    assert issubclass( new_width, Bits )
-    return new_width( value.uint() )
+  key = ( value.nbits, new_width )
+  try:
+    fn = _zext_fns[ key ]
+  except KeyError:
+    fn = _zext_fns[ key ] = _mk_zext_fn( *key )
+  return fn( value )
 
 def clog2( N ):
   assert N > 0
   return int( math.ceil( math.log( N, 2 ) ) )
 
 def sext( value, new_width ):
-  if isinstance( new_width, int ):
-    assert new_width >= value.nbits
-    return Bits( new_width, value.int() )
-  else:
-    assert issubclass( new_width, Bits )
-    return new_width( value.int() )
+  key = ( value.nbits, new_width )
+  try:
+    fn = _sext_fns[ key ]
+  except KeyError:
+    fn = _sext_fns[ key ] = _mk_sext_fn( *key )
+  return fn( value )
 
 def reduce_and( value ):
   try:
@@ -0,0 +1,303 @@
+"""
+========================================================================
+numpy_helpers.py
+========================================================================
+Bulk conversion between NumPy arrays and lists of Bits or bitstruct
+instances.
+
+- Bits up to 64 bits map to the smallest unsigned integer dtype that
+  holds them, and are converted and range-checked with vectorized NumPy
+  operations.
+- Wider Bits map to little-endian uint64 lanes, i.e., an array of shape
+  (N, ceil(nbits/64)) whose [:, 0] holds the least significant 64 bits.
+  They can also be converted to an object array of Python ints.
+- A bitstruct maps to a structured dtype with one field per bitstruct
+  field (see bitstruct_dtype). List fields map to sub-arrays and nested
+  bitstructs map to nested structured dtypes.
+
+NumPy is an optional dependency, so pymtl3.datatypes only imports this
+module when one of the helpers is first used.
+"""
+from operator import attrgetter
+
+import numpy as np
+
+from . import PythonBits
+from .bits_import import mk_bits
+from .bitstructs import _FIELDS, _PACKED, is_bitstruct_class
+
+_object_new = object.__new__
+
+#-------------------------------------------------------------------------
+# Layout helpers
+#-------------------------------------------------------------------------
+
+def _nbits( type_ ):
+  if isinstance( type_, list ):
+    return len(type_) * _nbits( type_[0] )
+  return type_.nbits
+
+def _nlanes( nbits ):
+  return ( nbits + 63 ) // 64
+
+def _uint_dtype( nbits ):
+  if nbits <= 8:  return np.dtype( np.uint8  )
+  if nbits <= 16: return np.dtype( np.uint16 )
+  if nbits <= 32: return np.dtype( np.uint32 )
+  if nbits <= 64: return np.dtype( np.uint64 )
+  return np.dtype( ( '<u8', (_nlanes( nbits ),) ) )
+
+# Yield ( steps, lo, nbits ) for each Bits field in type_, where steps
+# are the field names and list indices from the top-level type. The
+# first field of a bitstruct sits at the most significant bits and x[0]
+# of a list is the least significant element, same as to_bits().
+
+def _leaves( type_, steps=(), lo=0 ):
+  if isinstance( type_, list ):
+    elem_nbits = _nbits( type_[0] )
+    for i in range(len(type_)):
+      yield from _leaves( type_[0], steps + (i,), lo + i * elem_nbits )
+  elif is_bitstruct_class( type_ ):
+    for name, t in reversed( list( getattr( type_, _FIELDS ).items() ) ):
+      yield from _leaves( t, steps + (name,), lo )
+      lo += _nbits( t )
+  else:
+    yield steps, lo, type_.nbits
+
+def _get_column( array, steps ):
+  for x in steps:
+    # An index step picks an element of the list field we just selected
+    array = array[x] if isinstance( x, str ) else array[:, x]
+  return array
+
+def bitstruct_dtype( Type ):
+  """Return the structured dtype of bitstruct Type."""
+  if isinstance( Type, list ):
+    elem = bitstruct_dtype( Type[0] )
+    # Merge the shapes of nested lists and wide Bits lanes
+    if elem.subdtype is not None:
+      base, shape = elem.subdtype
+      return np.dtype( ( base, (len(Type),) + shape ) )
+    return np.dtype( ( elem, (len(Type),) ) )
+  if is_bitstruct_class( Type ):
+    return np.dtype([ ( name, bitstruct_dtype( t ) )
+                      for name, t in getattr( Type, _FIELDS ).items() ])
+  return _uint_dtype( Type.nbits )
+
+#-------------------------------------------------------------------------
+# Integer conversion
+#-------------------------------------------------------------------------
+
+# Return an array of n unsigned ints of nbits bits from an iterable.
+
+def _ints_to_array( ints, n, nbits, wide ):
+  if nbits <= 64:
+    ret = np.fromiter( ints, _uint_dtype( nbits ), count=n )
+    if nbits < 64 and n and int( ret.max() ) >> nbits:
+      raise ValueError( f"Some values are wider than Bits{nbits}" )
+    return ret
+
+  if wide == 'object':
+    ret = np.empty( n, dtype=object )
+    ret[:] = list( ints )
+    return ret
+
+  if wide != 'lanes':
+    raise ValueError( f"wide should be 'lanes' or 'object', not {wide!r}" )
+
+  nlanes = _nlanes( nbits )
+  data   = bytearray( b''.join([ v.to_bytes( nlanes * 8, 'little' ) for v in ints ]) )
+  return np.frombuffer( data, '<u8' ).reshape( n, nlanes )
+
+# Return the values in column as unsigned ints of nbits bits: a uint64
+# array if nbits <= 64, otherwise a list of Python ints. Like BitsN(v),
+# negative values down to -2**(nbits-1) are converted to two's
+# complement and out-of-range values raise ValueError.
+
+def _array_to_uints( column, nbits ):
+  column = np.asarray( column )
+  up = ( 1 << nbits ) - 1
+  lo = -( 1 << (nbits - 1) )
+
+  if column.dtype == object:
+    ret = [ int(v) for v in column ]
+    for v in ret:
+      if v < lo or v > up:
+        raise ValueError( f"Value {hex(v)} is too wide for Bits{nbits}!" )
+    ret = [ v & up for v in ret ]
+    return np.array( ret, dtype=np.uint64 ) if nbits <= 64 else ret
+
+  if column.dtype.kind not in 'iu':
+    raise TypeError( f"Expecting an integer or object array, not {column.dtype}" )
+
+  # uint64 lanes of a wide value
+  if column.ndim == 2:
+    nlanes = _nlanes( nbits )
+    if nbits <= 64 or column.shape[1] != nlanes:
+      raise ValueError( f"Expecting an array of shape (N, {nlanes}) for Bits{nbits}, "
+                        f"not {column.shape}" )
+    data = np.ascontiguousarray( column, dtype='<u8' ).tobytes()
+    ret  = [ int.from_bytes( data[i:i+nlanes*8], 'little' )
+             for i in range( 0, len(data), nlanes*8 ) ]
+    for v in ret:
+      if v > up:
+        raise ValueError( f"Value {hex(v)} is too wide for Bits{nbits}!" )
+    return ret
+
+  if column.ndim != 1:
+    raise ValueError( f"Expecting a 1-D array, not an array of shape {column.shape}" )
+
+  if column.size:
+    vmin, vmax = int( column.min() ), int( column.max() )
+    if vmin < lo or vmax > up:
+      v = vmin if vmin < lo else vmax
+      raise ValueError( f"Value {hex(v)} is too wide for Bits{nbits}!\n"
+                        f"(Bits{nbits} only accepts {hex(lo)} <= value <= {hex(up)})" )
+
+  if nbits <= 64:
+    # astype wraps negative values to two's complement
+    return column.astype( np.uint64 ) & np.uint64( up )
+  return [ v & up for v in column.tolist() ]
+
+def _mk_bits_list( Type, ints ):
+  # Pure-Python BitsN objects are filled in directly since the values
+  # are already in range
+  if issubclass( Type, PythonBits.Bits ):
+    nbits = Type.nbits
+    ret = []
+    for v in ints:
+      x = _object_new( Type )
+      x._nbits = nbits
+      x._uint  = v
+      ret.append( x )
+    return ret
+  return [ Type( v ) for v in ints ]
+
+#-------------------------------------------------------------------------
+# to_numpy
+#-------------------------------------------------------------------------
+# We convert one field of all values at a time. A packed bitstruct is
+# converted from its to_bits() values, since reading a field creates a
+# view.
+
+def _fill( column, type_, values ):
+  n = len(values)
+
+  if isinstance( type_, list ):
+    for i in range(len(type_)):
+      _fill( column[:, i], type_[0], [ x[i] for x in values ] )
+
+  elif hasattr( type_, _PACKED ):
+    ints  = [ int( x.to_bits() ) for x in values ]
+    total = type_.nbits
+
+    # Extract all fields from one uint64 array if the bitstruct fits
+    if total <= 64:
+      packed = np.fromiter( ints, np.uint64, count=n )
+
+    for steps, lo, nbits in _leaves( type_ ):
+      mask = ( 1 << nbits ) - 1
+      if total <= 64:
+        _get_column( column, steps )[...] = ( packed >> np.uint64( lo ) ) & np.uint64( mask )
+      else:
+        _get_column( column, steps )[...] = \
+          _ints_to_array( [ (v >> lo) & mask for v in ints ], n, nbits, 'lanes' )
+
+  elif is_bitstruct_class( type_ ):
+    for name, t in getattr( type_, _FIELDS ).items():
+      _fill( column[ name ], t, list( map( attrgetter( name ), values ) ) )
+
+  else:
+    column[...] = _ints_to_array( map( int, values ), n, type_.nbits, 'lanes' )
+
+def to_numpy( values, Type=None, *, wide='lanes' ):
+  """Convert a list of Bits or bitstruct instances to a NumPy array.
+
+  Type defaults to the type of values[0]. Bits wider than 64 bits are
+  converted to uint64 lanes if wide is 'lanes' or to Python ints in an
+  object array if wide is 'object'."""
+
+  if Type is None:
+    if not values:
+      raise ValueError( "Cannot infer the type of an empty list, please provide Type" )
+    Type = values[0].__class__
+    if not is_bitstruct_class( Type ):
+      Type = mk_bits( values[0].nbits )
+
+  if not is_bitstruct_class( Type ):
+    return _ints_to_array( map( int, values ), len(values), Type.nbits, wide )
+
+  ret = np.zeros( len(values), dtype=bitstruct_dtype( Type ) )
+  _fill( ret, Type, values )
+  return ret
+
+#-------------------------------------------------------------------------
+# from_numpy
+#-------------------------------------------------------------------------
+# We build the values of one field of all elements at a time. Unpacked
+# bitstructs are created without calling __init__ and get their fields
+# directly, packed bitstructs are created by from_bits().
+
+def _build( column, type_ ):
+  n = len(column)
+
+  if isinstance( type_, list ):
+    elems = [ _build( column[:, i], type_[0] ) for i in range(len(type_)) ]
+    return [ list(x) for x in zip( *elems ) ]
+
+  if hasattr( type_, _PACKED ):
+    total = type_.nbits
+
+    # Combine all fields into one uint64 array if the bitstruct fits
+    if total <= 64:
+      packed = np.zeros( n, dtype=np.uint64 )
+    else:
+      packed = [ 0 ] * n
+
+    for steps, lo, nbits in _leaves( type_ ):
+      uints = _array_to_uints( _get_column( column, steps ), nbits )
+      if total <= 64:
+        packed |= uints << np.uint64( lo )
+      else:
+        if nbits <= 64:
+          uints = uints.tolist()
+        packed = [ x | (y << lo) for x, y in zip( packed, uints ) ]
+
+    if total <= 64:
+      packed = packed.tolist()
+    return [ type_.from_bits( x ) for x in _mk_bits_list( mk_bits( total ), packed ) ]
+
+  if is_bitstruct_class( type_ ):
+    fields = getattr( type_, _FIELDS )
+    names  = list( fields )
+    cols   = [ _build( column[ name ], t ) for name, t in fields.items() ]
+    ret = []
+    for row in zip( *cols ):
+      x = _object_new( type_ )
+      x.__dict__.update( zip( names, row ) )
+      ret.append( x )
+    return ret
+
+  uints = _array_to_uints( column, type_.nbits )
+  if type_.nbits <= 64:
+    uints = uints.tolist()
+  return _mk_bits_list( type_, uints )
+
+def from_numpy( array, Type ):
+  """Convert a NumPy array to a list of Type instances.
+
+  Type is a BitsN or bitstruct class. A BitsN array is a 1-D integer or
+  object array, or uint64 lanes for BitsN wider than 64 bits. A bitstruct
+  array is a structured array with the fields of bitstruct_dtype( Type ),
+  whose field dtypes can be any integer type."""
+
+  array = np.asarray( array )
+
+  if is_bitstruct_class( Type ):
+    if array.dtype.names is None:
+      raise TypeError( f"Expecting a structured array for bitstruct {Type.__name__}, "
+                       f"not {array.dtype}" )
+    if array.ndim != 1:
+      raise ValueError( f"Expecting a 1-D array, not an array of shape {array.shape}" )
+
+  return _build( array, Type )
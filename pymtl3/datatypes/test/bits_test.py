@@ -4,6 +4,8 @@
 # Tests for the Bits class.
 # Shunning: grabbed from PyMTL2. Thanks Derek Lockhart
 
+import subprocess
+import sys
 from copy import deepcopy
 
 import pytest
@@ -120,6 +122,25 @@ def test_get_slice():
   with pytest.raises( IndexError ):
     x[1:3:1]
 
+def test_int_field_access():
+
+  x = Bits( 40, 0xab_cdef_1234 )
+  assert x.uint_slice( 0, 40 ) == 0xab_cdef_1234
+  assert x.uint_slice( 8, 24 ) == 0xef12
+  assert x.uint_slice( 8, 24 ).__class__ is int
+  assert x.bit( 39 ) == 1
+  assert x.bit( 0 ) == 0
+  assert x.bit( 0 ).__class__ is int
+  assert x.bit( Bits( 6, 2 ) ) == 1
+
+  for lo, hi in [ (0, 41), (-1, 2), (2, 2), (3, 1) ]:
+    with pytest.raises( IndexError ):
+      x.uint_slice( lo, hi )
+  with pytest.raises( IndexError ):
+    x.bit( 40 )
+  with pytest.raises( IndexError ):
+    x.bit( -1 )
+
 def test_set_slice():
 
   x = Bits( 4, 0b1100 )
@@ -747,6 +768,19 @@ def test_imatmul():
   with pytest.raises( ValueError ):
     a @= Bits(9,1)
 
+def test_results_of_operations_are_mutable():
+  a = Bits(32,5) & Bits(32,1)
+  a[3] = 1
+  assert a == 9
+  b = Bits(32,5) & Bits(32,1)
+  b[0:4] = 6
+  assert b == 6
+  assert Bits(32,5) & Bits(32,1) == 1
+  c = Bits(8,12)[0:4]
+  c[0] = 1
+  assert c == 13
+  assert Bits(8,12)[0:4] == 12
+
 def test_hash():
   a = Bits(4,12)
   assert hash(a) == hash( (4,12) )
@@ -760,3 +794,73 @@ def test_bin_oct_hex():
   assert Bits(15,35).bin() == "0b000000000100011"
   assert Bits(15,35).oct() == "0o00043"
   assert Bits(15,35).hex() == "0x0023"
+
+def test_lazy_bits_types():
+  # BitsN types are only created on first use, but still importable
+  # through pymtl3 and pymtl3.datatypes
+  src = "\n".join([
+    "import pymtl3",
+    "from pymtl3.datatypes import bits_import",
+    "assert 100 not in bits_import._bits_types",
+    "from pymtl3.datatypes import Bits100",
+    "assert pymtl3.Bits100 is pymtl3.datatypes.b100 is Bits100",
+    "assert Bits100(3).nbits == 100",
+    "assert not hasattr( pymtl3, 'Bits1000' )",
+    "from pymtl3 import *",
+    "assert Bits255 is bits_import.mk_bits(255) and b512 is Bits512",
+  ])
+  subprocess.run( [ sys.executable, "-c", src ], check=True )
+
+  src = "\n".join([
+    "from pymtl3.datatypes.bits_import import *",
+    "assert Bits8(3).nbits == 8 and b512 is mk_bits(512)",
+  ])
+  subprocess.run( [ sys.executable, "-c", src ], check=True )
+
+def test_bytes():
+  from ..bits_import import mk_bits
+  Bits12, Bits32, Bits72 = mk_bits(12), mk_bits(32), mk_bits(72)
+
+  assert Bits12(0xabc).to_bytes() == b'\xbc\x0a'
+  assert Bits12.from_bytes( b'\xbc\x0a' ) == Bits12(0xabc)
+  with pytest.raises( ValueError ):
+    Bits12.from_bytes( b'\xbc\xfa' )
+  with pytest.raises( ValueError ):
+    Bits12.from_bytes( b'\xbc' )
+  with pytest.raises( TypeError ):
+    Bits.from_bytes( b'\xbc' )
+
+  buf = bytearray(8)
+  assert Bits32(0xdeadbeef).pack_into( buf, 2 ) == 6
+  assert buf == bytearray( b'\x00\x00\xef\xbe\xad\xde\x00\x00' )
+  assert Bits32.unpack_from( memoryview(buf), 2 ) == Bits32(0xdeadbeef)
+  with pytest.raises( ValueError ):
+    Bits32(0).pack_into( buf, 6 )
+  with pytest.raises( ValueError ):
+    Bits32.unpack_from( buf, 6 )
+
+def test_bytes_array():
+  from ..bits_import import mk_bits
+
+  # 4 and 9 bytes take the struct and the join code paths
+  for nbits in ( 32, 72 ):
+    BitsN = mk_bits( nbits )
+    xs = [ BitsN(0), BitsN(1), BitsN(-1) ]
+    nbytes = (nbits + 7) // 8
+
+    buf = bytearray( 1 + 3 * nbytes )
+    assert BitsN.pack_array_into( buf, xs, 1 ) == len(buf)
+    assert buf[1:] == b''.join( x.to_bytes() for x in xs )
+
+    ys = BitsN.unpack_array_from( memoryview(buf), offset=1 )
+    assert ys == xs and all( y.__class__ is BitsN for y in ys )
+    assert BitsN.unpack_array_from( buf, 1, 1 + nbytes ) == xs[1:2]
+
+    with pytest.raises( Exception ):
+      BitsN.pack_array_into( buf, xs, 2 )
+
+  Bits12 = mk_bits(12)
+  with pytest.raises( ValueError ):
+    Bits12.pack_array_into( bytearray(4), [ Bits(16, 0x1000) ] )
+  with pytest.raises( ValueError ):
+    Bits12.unpack_array_from( b'\x00\x10' )
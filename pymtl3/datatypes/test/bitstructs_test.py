@@ -10,7 +10,7 @@ Author : Yanghui Ou
 
 import pytest
 
-from pymtl3.dsl import Component, InPort, OutPort, update
+from pymtl3.dsl import Component, InPort, OutPort, update, update_ff
 from pymtl3.dsl.test.sim_utils import simple_sim_pass
 
 from ..bits_import import *
@@ -604,3 +604,206 @@ def test_imatmul_ilshift():
   assert c == B(0x1234567890abcd0f,[A(2),A(3),A(4)], A(5) )
   c._flip()
   assert c.to_bits() == Bits164(0xf0dcba09876543210005000400030002)
+
+#-------------------------------------------------------------------------
+# Packed bitstructs
+#-------------------------------------------------------------------------
+
+@bitstruct
+class UnpackedMsg:
+  type_ : Bits4
+  data  : [ Bits2, Bits2 ]
+  addr  : Bits8
+
+PackedMsg = mk_bitstruct( "PackedMsg", {
+  'type_' : Bits4,
+  'data'  : [ Bits2, Bits2 ],
+  'addr'  : Bits8,
+}, packed=True )
+
+def test_packed_layout():
+  assert PackedMsg.nbits == UnpackedMsg.nbits == 16
+  assert PackedMsg.__bitstruct_packed__ == { 'type_': (12, 4), 'data': (8, 4), 'addr': (0, 8) }
+
+  p = PackedMsg( 3, [1, 2], 0xab )
+  u = UnpackedMsg( 3, [b2(1), b2(2)], 0xab )
+  assert p.to_bits() == u.to_bits() == Bits16(0x39ab)
+  assert str(p) == str(u)
+  assert p.type_ == 3 and p.data[1] == 2 and p.addr == 0xab
+
+  q = PackedMsg.from_bits( u.to_bits() )
+  assert q == p and hash(q) == hash(p)
+  assert PackedMsg() != p
+  assert UnpackedMsg.from_bits( q.to_bits() ) == u
+
+  # The repr can be evaluated
+  assert eval( repr(p) ) == p
+
+def test_packed_field_assign():
+  p = PackedMsg()
+  p.addr @= 0x12
+  p.data[1] @= 3
+  p.type_[3] = 1
+  assert p.to_bits() == Bits16(0x8c12)
+
+  p.data = [ 1, b2(0) ]
+  p.addr = b8(5)
+  assert p.to_bits() == Bits16(0x8105)
+
+  # A field read is a copy that only writes back through assignments
+  x = p.addr
+  x = x + 1
+  assert p.addr == 5
+
+  with pytest.raises( ValueError ):
+    p.addr = b4(1)
+  with pytest.raises( ValueError ):
+    p.data = [ 1, 2, 3 ]
+
+def test_packed_list_field_assign():
+  P = mk_bitstruct( "P", {
+    'x': [ Bits4 ] * 2,
+    'y': [ [ Bits2 ] * 2 ] * 2,
+  }, packed=True )
+
+  p = P()
+  p.x[0] = b4(9)
+  p.x[1] @= 3
+  p.y[1][0] = 2
+  p.y[0] = [ 1, 3 ]
+  assert p == P( [ b4(9), b4(3) ], [ [ b2(1), b2(3) ], [ b2(2), b2(0) ] ] )
+  assert p.x == [ 9, 3 ] and len( p.y ) == 2
+
+  # The list read from a field sees its own assignments
+  x = p.x
+  x[1] = 5
+  assert x[1] == 5 and p.x[1] == 5
+
+  with pytest.raises( ValueError ):
+    p.x[0] = b8(1)
+  with pytest.raises( TypeError ):
+    p.x[0:1] = [ 1 ]
+  with pytest.raises( TypeError ):
+    p.x.append( 1 )
+
+def test_packed_to_bits_is_a_copy():
+  p = PackedMsg( 3, [1, 2], 0xab )
+  b = p.to_bits()
+  b[0:8] = 0
+  assert p.addr == 0xab
+  p.addr @= 1
+  assert b == Bits16(0x3900)
+  assert p.to_bits() == Bits16(0x3901)
+
+def test_packed_clone_ilshift():
+  p = PackedMsg( 3, [1, 2], 0xab )
+  r = p.clone()
+  r.addr @= 0
+  assert p.addr == 0xab and r.addr == 0
+
+  p <<= r
+  assert p.addr == 0xab
+  p._flip()
+  assert p == r
+
+  # <<= on a field keeps the next value of the other fields
+  p <<= PackedMsg( 1, [0, 0], 1 )
+  p.addr <<= 7
+  p._flip()
+  assert p == PackedMsg( 1, [0, 0], 7 )
+
+  p @= Bits16(0xffff)
+  assert p == PackedMsg( 0xf, [3, 3], 0xff )
+
+def test_packed_cache_and_field_check():
+  # packed is part of the type
+  assert mk_bitstruct( "PackedMsg", PackedMsg.__bitstruct_fields__, packed=True ) is PackedMsg
+  assert mk_bitstruct( "PackedMsg", PackedMsg.__bitstruct_fields__ ) is not PackedMsg
+
+  with pytest.raises( TypeError ):
+    mk_bitstruct( "Nested", { 'x': UnpackedMsg }, packed=True )
+  with pytest.raises( TypeError ):
+    mk_bitstruct( "Nested", { 'x': [ PackedMsg ] * 2 }, packed=True )
+
+  assert get_bitstruct_inst_all_classes( PackedMsg() ) == { PackedMsg, Bits2, Bits4, Bits8 }
+
+@pytest.mark.parametrize( "opts", [ {}, { 'dirty_flip': True }, { 'flat_storage': True } ] )
+def test_packed_component( opts ):
+  from pymtl3.passes import DefaultPassGroup
+
+  class A( Component ):
+    def construct( s ):
+      s.in_ = InPort( PackedMsg )
+      s.out = OutPort( PackedMsg )
+      s.reg = OutPort( PackedMsg )
+
+      @update
+      def up_comb():
+        s.out @= s.reg
+        s.out.addr @= s.reg.addr + 1
+        s.out.data[0] @= s.in_.type_[0:2]
+
+      @update_ff
+      def up_ff():
+        s.reg <<= s.in_
+
+  dut = A()
+  dut.elaborate()
+  dut.apply( DefaultPassGroup( **opts ) )
+  dut.sim_reset()
+
+  dut.in_ @= PackedMsg( 5, [0, 2], 0x10 )
+  dut.sim_tick()
+  assert dut.reg == PackedMsg( 5, [0, 2], 0x10 )
+  dut.in_ @= PackedMsg( 6, [0, 0], 0x20 )
+  dut.sim_eval_combinational()
+  assert dut.out == PackedMsg( 5, [2, 2], 0x11 )
+
+def test_from_bits_list_fields_are_mutable():
+  B = mk_bitstruct( "B", {
+    'x': [ Bits4 ] * 2,
+    'y': [ [ Bits2 ] * 2 ] * 2,
+  })
+  b = B.from_bits( Bits16(0x21e4) )
+  assert b == B( [ b4(1), b4(2) ], [ [ b2(0), b2(1) ], [ b2(2), b2(3) ] ] )
+  b.x[0][1] = 1
+  b.y[1][0][0] = 1
+  assert b == B( [ b4(3), b4(2) ], [ [ b2(0), b2(1) ], [ b2(3), b2(3) ] ] )
+
+@pytest.mark.parametrize( "packed", [ False, True ] )
+def test_bytes( packed ):
+  B = mk_bitstruct( "B", { 'x': Bits12, 'y': [ Bits4 ] * 2, 'z': Bits8 }, packed=packed )
+  b = B( 0xabc, [ b4(1), b4(2) ], 0x5a )
+
+  assert b.to_bytes() == b'\x5a\x21\xbc\x0a'
+  assert B.from_bytes( b.to_bytes() ) == b
+  with pytest.raises( ValueError ):
+    B.from_bytes( b'\x00' )
+
+  buf = bytearray(10)
+  assert b.pack_into( buf, 1 ) == 5
+  assert B.unpack_from( memoryview(buf), 1 ) == b
+
+  assert B.pack_array_into( buf, [ B(), b ], 2 ) == 10
+  assert buf[2:] == B().to_bytes() + b.to_bytes()
+  assert B.unpack_array_from( buf, offset=2 ) == [ B(), b ]
+  with pytest.raises( TypeError ):
+    B.pack_array_into( buf, [ b.to_bits() ] )
+
+def test_bytes_nested():
+  @bitstruct
+  class A:
+    x: Bits16
+
+  C = mk_bitstruct( "C", {
+    'x': Bits100,
+    'y': [ A ] * 3,
+    'z': A,
+  })
+  c = C( 0x1234567890abcd0f, [ A(2), A(3), A(4) ], A(5) )
+  assert c.to_bytes() == int( c.to_bits() ).to_bytes( 21, 'little' )
+  assert C.from_bytes( c.to_bytes() ) == c
+
+  buf = bytearray( 3 * 21 )
+  C.pack_array_into( buf, [ c ] * 3 )
+  assert C.unpack_array_from( buf ) == [ c ] * 3
@@ -8,7 +8,10 @@ Author : Shunning Jiang
   Date : Nov 30, 2019
 """
 
+import pytest
+
 from pymtl3.datatypes import *
+from pymtl3.datatypes import helpers
 
 
 def test_concat():
@@ -23,6 +26,44 @@ def test_zext():
 def test_sext():
   assert zext( Bits8(0xe), 24 ) == Bits24(0xe)
 
+def test_specialized_helpers():
+  x = Bits8(0xa5)
+
+  assert concat( x, b1(1), Bits3(2) ) == Bits12(0xa5a)
+  assert concat( x, b1(1), Bits3(2) ).nbits == 12
+  assert concat( b1(1) ) == b1(1)
+
+  assert trunc( x, 4 ) == Bits4(5)
+  assert trunc( x, Bits4 ).__class__ is Bits4
+  assert trunc( x, Bits12 ) == Bits12(0xa5)
+  assert zext( x, 12 ) == Bits12(0xa5)
+  assert zext( x, Bits12 ).__class__ is Bits12
+  assert zext( Bits8(5), Bits4 ) == Bits4(5)
+  assert sext( x, 12 ) == Bits12(0xfa5)
+  assert sext( x, Bits12 ) == Bits12(0xfa5)
+  assert sext( Bits8(0x25), 12 ) == Bits12(0x25)
+  assert sext( Bits8(0xfd), Bits4 ) == Bits4(0xd)
+  assert sext( b1(1), 3 ) == Bits3(7)
+
+  # Results can be assigned to
+  y = zext( b1(1), 2 )
+  y @= 3
+  assert y == 3
+  assert zext( b1(1), 2 ) == 1
+
+  # The second call with the same signature hits the cache
+  assert sext( Bits8(0x7f), 12 ) == Bits12(0x7f)
+  assert ( 8, 12 ) in helpers._sext_fns
+
+  with pytest.raises( AssertionError ):
+    zext( x, 4 )
+  with pytest.raises( AssertionError ):
+    trunc( x, 12 )
+  with pytest.raises( ValueError ):
+    zext( x, Bits4 )
+  with pytest.raises( ValueError ):
+    concat()
+
 def test_clog2():
   assert clog2(7) == 3
   assert clog2(8) == 3
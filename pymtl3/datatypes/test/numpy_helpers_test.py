@@ -0,0 +1,111 @@
+"""
+==========================================================================
+numpy_helpers_test.py
+==========================================================================
+Test cases for the NumPy conversion helpers.
+"""
+import pytest
+
+np = pytest.importorskip( "numpy" )
+
+from .. import bitstruct_dtype, from_numpy, to_numpy
+from ..bits_import import *
+from ..bitstructs import bitstruct, mk_bitstruct
+
+def test_bits_roundtrip():
+  xs = [ Bits12(x) for x in ( 0, 1, 0x800, 0xfff ) ]
+  arr = to_numpy( xs )
+  assert arr.dtype == np.uint16
+  assert arr.tolist() == [ 0, 1, 0x800, 0xfff ]
+
+  ys = from_numpy( arr, Bits12 )
+  assert ys == xs
+  assert all( y.__class__ is Bits12 for y in ys )
+
+  assert to_numpy( [ Bits64(-1) ] ).dtype == np.uint64
+  assert from_numpy( to_numpy( [ Bits64(-1) ] ), Bits64 ) == [ Bits64(-1) ]
+
+def test_bits_signed_and_range():
+  assert from_numpy( np.array( [ -8, -1, 7 ], dtype=np.int16 ), Bits4 ) == \
+         [ Bits4(8), Bits4(0xf), Bits4(7) ]
+
+  with pytest.raises( ValueError ):
+    from_numpy( np.array( [ 16 ], dtype=np.uint8 ), Bits4 )
+  with pytest.raises( ValueError ):
+    from_numpy( np.array( [ -9 ] ), Bits4 )
+  with pytest.raises( TypeError ):
+    from_numpy( np.array( [ 1.0 ] ), Bits4 )
+  with pytest.raises( ValueError ):
+    to_numpy( [ Bits8(0xff) ], Bits4 )
+
+def test_wide_bits():
+  xs = [ Bits100( (1 << 99) | x ) for x in range(3) ]
+
+  arr = to_numpy( xs )
+  assert arr.shape == (3, 2) and arr.dtype == np.uint64
+  assert arr[1].tolist() == [ 1, 1 << 35 ]
+  assert from_numpy( arr, Bits100 ) == xs
+
+  arr = to_numpy( xs, wide='object' )
+  assert arr.dtype == object and arr[2] == (1 << 99) | 2
+  assert from_numpy( arr, Bits100 ) == xs
+
+  with pytest.raises( ValueError ):
+    from_numpy( np.ones( (3, 3), dtype=np.uint64 ), Bits100 )
+
+@bitstruct
+class Inner:
+  x : Bits16
+
+Outer = mk_bitstruct( "Outer", {
+  'a' : Bits100,
+  'b' : [ Inner ] * 3,
+  'c' : Inner,
+  'd' : [ [ Bits3 ] * 2 ] * 2,
+})
+
+def test_bitstruct_dtype():
+  assert bitstruct_dtype( Inner ) == np.dtype([ ('x', np.uint16) ])
+  assert bitstruct_dtype( Outer ) == np.dtype([
+    ('a', np.uint64, (2,)),
+    ('b', [ ('x', np.uint16) ], (3,)),
+    ('c', [ ('x', np.uint16) ]),
+    ('d', np.uint8, (2, 2)),
+  ])
+
+def test_bitstruct_roundtrip():
+  xs = [ Outer( (1 << 70) | i, [ Inner(i), Inner(2), Inner(3) ], Inner(4),
+                [ [ b3(1), b3(2) ], [ b3(3), b3(i) ] ] ) for i in range(4) ]
+  arr = to_numpy( xs )
+  assert arr['b']['x'][:, 0].tolist() == [ 0, 1, 2, 3 ]
+  assert arr['d'][3].tolist() == [ [ 1, 2 ], [ 3, 3 ] ]
+
+  ys = from_numpy( arr, Outer )
+  assert ys == xs
+  assert ys[1].b[0].x.__class__ is Bits16
+
+@pytest.mark.parametrize( "packed", [ False, True ] )
+def test_mem_msg( packed ):
+  MemReqMsg = mk_bitstruct( "MemReqMsg", {
+    'type_'  : Bits4,
+    'opaque' : Bits8,
+    'addr'   : Bits32,
+    'len'    : Bits2,
+    'data'   : [ Bits16 ] * 2,
+  }, packed=packed )
+
+  xs = [ MemReqMsg( i & 0xf, i, i << 8, 3, [ i, 0xffff ] ) for i in range(10) ]
+  arr = to_numpy( xs )
+  assert arr.dtype == bitstruct_dtype( MemReqMsg )
+  assert arr['addr'].tolist() == [ i << 8 for i in range(10) ]
+  assert arr['data'][9].tolist() == [ 9, 0xffff ]
+  assert from_numpy( arr, MemReqMsg ) == xs
+
+  # Field dtypes of the input array can be any integer type
+  arr2 = np.zeros( 1, dtype=[ ('type_', np.int64), ('opaque', np.int64), ('addr', np.int64),
+                              ('len', np.int64), ('data', np.int64, (2,)) ] )
+  arr2[0] = ( 1, 2, 3, -1, ( 5, 6 ) )
+  assert from_numpy( arr2, MemReqMsg ) == [ MemReqMsg( 1, 2, 3, 3, [ 5, 6 ] ) ]
+
+  with pytest.raises( TypeError ):
+    from_numpy( np.zeros( 3 ), MemReqMsg )
@@ -11,6 +11,9 @@ Date   : Jan 17, 2018
 import ast
 import sys
 
+# Bits methods that read a field as an int, e.g. s.x.bit(i)
+bits_int_methods = { 'bit', 'uint_slice' }
+
 
 class DetectVarNames( ast.NodeVisitor ):
 
@@ -274,6 +277,13 @@ class DetectReadsWritesCalls( DetectVarNames ):
     self.visit( node.slice )
 
   def visit_Call( self, node ):
+    # s.x.bit(i) and s.x.uint_slice(lo, hi) read s.x
+    if isinstance( node.func, ast.Attribute ) and node.func.attr in bits_int_methods:
+      self.visit( node.func.value )
+      for x in node.args:
+        self.visit( x )
+      return
+
     obj_name, nodelist = self._get_full_name( node.func )
     if not obj_name:  return
 
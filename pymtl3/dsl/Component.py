@@ -31,6 +31,68 @@ from .NamedObject import NamedObject
 from .Placeholder import Placeholder
 
 
+class EditLog:
+  """ Structural edits of an elaborated model since a pass started to
+  track them, so that the pass can update its metadata in place. Nets
+  are keyed by id since a resolved net is a (writer, set) tuple. A
+  patched net is stored as [ net, removed members, added members ]. """
+
+  def __init__( s ):
+    s.rebuild = False # set when the edits cannot be tracked
+
+    s.added_components = set()
+    s.added_upblks     = set()
+    s.removed_upblks   = set()
+    s.touched_upblks   = set()
+    s.added_nets       = {}
+    s.removed_nets     = {}
+    s.patched_nets     = {}
+
+  def is_empty( s ):
+    return not ( s.rebuild or s.added_components or s.added_upblks or
+                 s.removed_upblks or s.touched_upblks or
+                 s.added_nets or s.removed_nets or s.patched_nets )
+
+  def add_components( s, parent, components ):
+    s.added_components |= components
+    for c in components:
+      s.added_upblks |= c._dsl.upblks
+    # Update blocks of the parent may access the added ports
+    s.touched_upblks |= parent._dsl.upblks
+
+  def remove_components( s, parent, components ):
+    s.added_components -= components
+    for c in components:
+      for blk in c._dsl.upblks:
+        if blk in s.added_upblks:
+          s.added_upblks.remove( blk )
+        else:
+          s.removed_upblks.add( blk )
+        s.touched_upblks.discard( blk )
+    s.touched_upblks |= parent._dsl.upblks
+
+  def replace_nets( s, removed, added ):
+    for net in removed:
+      s.patched_nets.pop( id(net), None )
+      if s.added_nets.pop( id(net), None ) is None:
+        s.removed_nets[ id(net) ] = net
+    for net in added:
+      s.added_nets[ id(net) ] = net
+
+  def patch_net( s, net, removed=(), added=() ):
+    # A new net is processed as a whole anyway
+    if id(net) in s.added_nets:
+      return
+    if id(net) not in s.patched_nets:
+      s.patched_nets[ id(net) ] = [ net, set(), set() ]
+    _, old, new = s.patched_nets[ id(net) ]
+    for x in removed:
+      if x in new:
+        new.remove( x )
+      else:
+        old.add( x )
+    new.update( added )
+
 class Component( ComponentLevel7 ):
 
   #-----------------------------------------------------------------------
@@ -107,9 +169,43 @@ class Component( ComponentLevel7 ):
       return list(ret)
 
   def _flush_pending_value_connections( s ):
-    if s._dsl._has_pending_value_connections:
-      s._dsl.all_value_nets = s._resolve_value_connections()
+    """ Resolve the nets again if any connection has changed. Only the
+    nets around the dirty and new signals are updated if there are any.
+    Return the ( writer, signals ) pairs that cover the new connections,
+    or None if all nets are new. """
+    if not s._dsl._has_pending_value_connections:
+      return []
+
+    log   = s._dsl.edit_log
+    dirty = s._dsl._dirty_value_signals
+    new   = s._dsl._new_value_signals
+
+    if dirty or new:
+      try:
+        removed, added, patched, checks = \
+          s._resolve_value_connections_incremental( dirty, new )
+      except Exception:
+        # The nets are half updated, so start over next time
+        s._dsl.all_value_nets = s._resolve_value_connections()
+        s._dsl._value_net_of = None
+        raise
+      finally:
+        s._dsl._dirty_value_signals = set()
+        s._dsl._new_value_signals   = set()
+
       s._dsl._has_pending_value_connections = False
+      if log is not None:
+        log.replace_nets( removed, added )
+        for net, members in patched:
+          log.patch_net( net, added=members )
+      return checks
+
+    s._dsl.all_value_nets = s._resolve_value_connections()
+    s._dsl._value_net_of = None
+    s._dsl._has_pending_value_connections = False
+    if log is not None:
+      log.rebuild = True
+    return None
 
   def _flush_pending_method_connections( s ):
     if s._dsl._has_pending_method_connections:
@@ -215,6 +311,13 @@ class Component( ComponentLevel7 ):
     for c in added_components:
       top._collect_vars( c )
 
+    if added_signals:
+      top._dsl._new_value_signals |= added_signals
+      top._dsl._has_pending_value_connections = True
+
+    if top._dsl.edit_log is not None:
+      top._dsl.edit_log.add_components( parent, added_components )
+
     # Lazy -- to avoid resolve_connection call which takes non-trivial
     # time upon adding any connect, I just mark pending here. Whenever you
     # call the right API which is get_all_value_nets()/get_method_nets(),
@@ -225,13 +328,18 @@ class Component( ComponentLevel7 ):
     for (x, y) in provided_connections:
       connection_pairs.append( x )
       connection_pairs.append( eval(y) )
-      if not top._dsl._has_pending_value_connections and isinstance( x, Signal ):
+      if isinstance( x, Signal ):
         top._dsl._has_pending_value_connections = True
       if not top._dsl._has_pending_method_connections and isinstance( x, MethodPort ):
         top._dsl._has_pending_method_connections = True
 
-    # WE NEED TO ADD CONNECTIONS AT PARENT INSTEAD OF TOP
-    parent.add_connections( *connection_pairs )
+    # The cached results of the old design don't apply anymore
+    top._dsl.design_key = None
+
+    # WE NEED TO ADD CONNECTIONS AT PARENT INSTEAD OF TOP. The outside
+    # ends of these connections are not marked dirty because the new
+    # signals are attached to the existing nets when they are flushed.
+    parent._add_connections( top, connection_pairs )
 
     # Now we put back the provided upblk metadata to parent and top
     for blk, obj_name in provided_upblk_reads:
@@ -303,6 +411,9 @@ class Component( ComponentLevel7 ):
 
       top._dsl.all_named_objects -= removed_components
 
+      if top._dsl.edit_log is not None:
+        top._dsl.edit_log.remove_components( parent, removed_components )
+
       removed_connectables = removed_signals | removed_method_ports
       top._dsl.all_named_objects -= removed_connectables
 
@@ -382,6 +493,7 @@ class Component( ComponentLevel7 ):
         parent._dsl.func_calls[func] -= to_save
 
       saved_connections = []
+      cut_signals       = []
 
       for x in removed_connectables:
         # Clean up all_adjancency at top
@@ -391,6 +503,7 @@ class Component( ComponentLevel7 ):
             # If other will be removed, we don't need to remove it here ..
             if other not in removed_connectables and other not in removed_consts:
               top._dsl.all_adjacency[other].remove( x )
+              cut_signals.append( other )
               if isinstance( other, Const ):
                 other = other._dsl.const
               saved_connections.append( (other, "top"+repr(x)[1:]) ) # other is from outside
@@ -413,11 +526,23 @@ class Component( ComponentLevel7 ):
         x._dsl.full_name = "<deleted>"+x._dsl.full_name
       for y in removed_consts:
         del y._dsl.parent_obj
+        top._dsl.all_adjacency.pop( y, None )
+
+      # Take the removed signals out of the nets that were just flushed
+      dropped, patched = top._detach_value_signals( removed_signals | removed_consts,
+                                                    cut_signals )
+      if top._dsl.edit_log is not None:
+        top._dsl.edit_log.replace_nets( dropped, [] )
+        for net, members in patched:
+          top._dsl.edit_log.patch_net( net, removed=members )
 
       # We don't break nets anymore. Instead, we set the flags to true so
-      # that the next get_xxx_net will immediately recollect nets.
-      top._dsl._has_pending_value_connections = True
+      # that the next get_xxx_net will immediately recollect nets. The
+      # value nets that were not patched above are marked dirty.
+      if top._dsl._dirty_value_signals:
+        top._dsl._has_pending_value_connections = True
       top._dsl._has_pending_method_connections = True
+      top._dsl.design_key = None
 
       # We clean up the connect_order list. If we want to preserve the
       # original connect order, we can play some other tricks here such as
@@ -447,6 +572,9 @@ class Component( ComponentLevel7 ):
 
     super().elaborate()
 
+    # Passes that update their metadata in place set up the log
+    s._dsl.edit_log = None
+
     # try:
       # import pypyjit
       # pypyjit.set_param("default")
@@ -696,10 +824,10 @@ class Component( ComponentLevel7 ):
                         saved_upblk_reads, saved_upblk_writes, saved_upblk_calls,
                         saved_func_reads, saved_func_writes, saved_func_calls)
 
-    top._flush_pending_value_connections()
+    new_nets = top._flush_pending_value_connections()
     top._flush_pending_method_connections()
     if check:
-      top.check()
+      top._check_added_component( new_obj, new_nets )
 
   def replace_component_with_obj( top, foo, new_obj, check=True ):
     top._check_called_at_elaborate_top( "replace_component" )
@@ -718,10 +846,23 @@ class Component( ComponentLevel7 ):
                         saved_upblk_reads, saved_upblk_writes, saved_upblk_calls,
                         saved_func_reads, saved_func_writes, saved_func_calls)
 
-    top._flush_pending_value_connections()
+    new_nets = top._flush_pending_value_connections()
     top._flush_pending_method_connections()
     if check:
-      top.check()
+      top._check_added_component( new_obj, new_nets )
+
+  def _check_added_component( top, obj, nets ):
+    """ Check the update blocks of obj's subtree and of its parent, which
+    are the only ones that can access the ports of obj, and the nets that
+    were resolved again after obj was added. """
+    blks = set( obj.get_parent_object()._dsl.upblks )
+    for c in obj._collect_all_single( lambda x: isinstance( x, Component ) ):
+      blks |= c._dsl.upblks
+
+    top._check_upblk_writes( blks )
+    top._check_port_in_upblk( blks )
+    top._check_port_in_nets( nets )
+    top._check_upblk_calls( blks )
 
   def add_value_port( top, parent, name, o ):
     top._check_called_at_elaborate_top( "add_port" )
@@ -738,6 +879,7 @@ class Component( ComponentLevel7 ):
 
     top._dsl.all_signals.add( o )
     top._dsl.all_named_objects.add( o )
+    top._dsl.design_key = None
 
   def add_connection( top, o1, o2 ):
 
@@ -829,14 +971,12 @@ class Component( ComponentLevel7 ):
 
       top._dsl.all_adjacency[o1].add(o2)
       top._dsl.all_adjacency[o2].add(o1)
+      top._dsl._dirty_value_signals.add( o1 )
+      top._dsl._dirty_value_signals.add( o2 )
       top._dsl._has_pending_value_connections = True
+      top._dsl.design_key = None
 
-  def add_connections( s, *args ):
-    try:
-      top = s._dsl.elaborate_top
-    except AttributeError:
-      raise NotElaboratedError()
-
+  def _add_connections( s, top, args ):
     if len(args) & 1 != 0:
        raise InvalidConnectionError( "Odd number ({}) of objects provided.".format( len(args) ) )
 
@@ -850,6 +990,19 @@ class Component( ComponentLevel7 ):
     for x, adjs in s._dsl.adjacency.items():
       top._dsl.all_adjacency[x].update( adjs )
 
+  def add_connections( s, *args ):
+    try:
+      top = s._dsl.elaborate_top
+    except AttributeError:
+      raise NotElaboratedError()
+
+    s._add_connections( top, args )
+
+    for x in args:
+      if isinstance( x, Signal ):
+        top._dsl._dirty_value_signals.add( x )
+        top._dsl._has_pending_value_connections = True
+
   # TODO implement everything below and test them
 
   # Override
@@ -16,6 +16,7 @@ import ast
 import gc
 import inspect
 import re
+import sys
 from collections import defaultdict
 
 from pymtl3.datatypes import Bits, is_bitstruct_class
@@ -24,6 +25,7 @@ from . import AstHelper
 from .ComponentLevel1 import ComponentLevel1
 from .Connectable import Connectable, Const, InPort, Interface, OutPort, Signal, Wire
 from .ConstraintTypes import RD, WR, U, ValueConstraint
+from .ElaborationCache import file_digest, get_elaboration_cache, make_key
 from .errors import (
     InvalidConstraintError,
     InvalidFuncCallError,
@@ -45,6 +47,8 @@ from .Placeholder import Placeholder
 
 compiled_re = re.compile('( *(@|def))')
 
+_ast_versions = ( sys.version, file_digest( AstHelper.__file__ ), file_digest( __file__ ) )
+
 def update_ff( blk ):
   NamedObject._elaborate_stack[-1]._update_ff( blk )
   return blk
@@ -101,14 +105,30 @@ class ComponentLevel2( ComponentLevel1 ):
 
     elif name not in name_info:
       _src, _line = inspect.getsourcelines( func )
-      _src = "".join( _src )
-      _ast = ast.parse( compiled_re.sub( r'\2', _src ) )
-
-      name_info[ name ] = (False, _src, _line, inspect.getsourcefile( func ), _ast )
-      name_rd[ name ]   = _rd   = []
-      name_wr[ name ]   = _wr   = []
-      name_fc[ name ]   = _fc   = []
-      AstHelper.extract_reads_writes_calls( s, func, _ast, _rd, _wr, _fc )
+      _src  = "".join( _src )
+      _file = inspect.getsourcefile( func )
+
+      # The analysis only depends on the source, so we can also reuse it
+      # across processes through the on-disk cache
+      cache  = get_elaboration_cache()
+      cached = None
+      if cache is not None:
+        key    = make_key( _ast_versions, _file, _line, _src )
+        cached = cache.load( 'ast', key )
+
+      if cached is not None:
+        _ast, _rd, _wr, _fc = cached
+      else:
+        _ast = ast.parse( compiled_re.sub( r'\2', _src ) )
+        _rd, _wr, _fc = [], [], []
+        AstHelper.extract_reads_writes_calls( s, func, _ast, _rd, _wr, _fc )
+        if cache is not None:
+          cache.store( 'ast', key, (_ast, _rd, _wr, _fc) )
+
+      name_info[ name ] = (False, _src, _line, _file, _ast )
+      name_rd[ name ]   = _rd
+      name_wr[ name ]   = _wr
+      name_fc[ name ]   = _fc
 
   def _elaborate_read_write_func( s ):
 
@@ -383,10 +403,17 @@ class ComponentLevel2( ComponentLevel1 ):
         del s._dsl.all_upblk_writes[k]
         del s._dsl.all_upblk_calls[k]
 
-  def _check_upblk_writes( s ):
+  # The checks below take an optional subset of update blocks so that
+  # an edit after elaboration only checks the blocks it affects
+
+  def _check_upblk_writes( s, blks=None ):
+
+    upblk_writes = s._dsl.all_upblk_writes
+    if blks is not None:
+      upblk_writes = { blk: upblk_writes[ blk ] for blk in blks }
 
     write_upblks = defaultdict(set)
-    for blk, writes in s._dsl.all_upblk_writes.items():
+    for blk, writes in upblk_writes.items():
       for wr in writes:
         write_upblks[ wr ].add( blk )
 
@@ -425,10 +452,16 @@ class ComponentLevel2( ComponentLevel1 ):
               repr(x), wrx_blks[0].__name__,
               repr(obj), wr_blks[0].__name__ ) )
 
-  def _check_port_in_upblk( s ):
+  def _check_port_in_upblk( s, blks=None ):
+
+    upblk_reads  = s._dsl.all_upblk_reads
+    upblk_writes = s._dsl.all_upblk_writes
+    if blks is not None:
+      upblk_reads  = { blk: upblk_reads [ blk ] for blk in blks }
+      upblk_writes = { blk: upblk_writes[ blk ] for blk in blks }
 
     # Check read first
-    for blk, reads in s._dsl.all_upblk_reads.items():
+    for blk, reads in upblk_reads.items():
 
       blk_hostobj = s._dsl.all_upblk_hostobj[ blk ]
 
@@ -451,7 +484,7 @@ class ComponentLevel2( ComponentLevel1 ):
                     blk.__name__, repr(blk_hostobj), type(blk_hostobj).__name__ ) )
 
     # Then check write
-    for blk, writes in s._dsl.all_upblk_writes.items():
+    for blk, writes in upblk_writes.items():
 
       blk_hostobj = s._dsl.all_upblk_hostobj[ blk ]
 
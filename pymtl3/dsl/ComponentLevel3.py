@@ -32,6 +32,11 @@ from .Connectable import (
     Wire,
     _connect_check,
 )
+from .ElaborationCache import (
+    get_design_key,
+    get_elaboration_cache,
+    get_name_map,
+)
 from .errors import (
     InvalidConnectionError,
     InvalidPlaceholderError,
@@ -49,6 +54,10 @@ def connect( o1, o2 ):
   host, o1_connectable, o2_connectable = _connect_check( o1, o2, internal=False )
   host._connect_dispatch( o1, o2, o1_connectable, o2_connectable )
 
+def _is_live_signal( x, all_signals ):
+  # Slices can be created after elaboration and are not in all_signals
+  return isinstance( x, Signal ) and x.get_top_level_signal() in all_signals
+
 class ComponentLevel3( ComponentLevel2 ):
 
   #-----------------------------------------------------------------------
@@ -396,13 +405,258 @@ class ComponentLevel3( ComponentLevel2 ):
 
     # First of all, bfs the "forest" to find out all nets
 
-    nets = s._floodfill_nets( s._dsl.all_signals, s._dsl.all_adjacency )
+    # A constant may drive a slice that is created after elaboration and
+    # thus is not in all_signals, so constants are floodfilled as well
+
+    sources = list( s._dsl.all_signals )
+    sources.extend( x for x in s._dsl.all_adjacency if isinstance( x, Const ) )
+    nets = s._floodfill_nets( sources, s._dsl.all_adjacency )
+
+    return s._resolve_writers( nets, s._dsl.all_upblk_writes.values(), {} )
+
+  #-----------------------------------------------------------------------
+  # Incremental net resolution
+  #-----------------------------------------------------------------------
+  # After elaboration, the nets are kept in s._dsl.all_value_nets and
+  # s._dsl._value_net_of maps every member to the index of its net. Edits
+  # either patch a net in place or mark signals dirty, in which case the
+  # nets around them are resolved again from scratch. Since a net is a
+  # tree, it can be patched in place when it only loses or gains a subtree
+  # that is connected to the rest of the net by a single edge.
+
+  def _get_value_net_index( s ):
+    net_of = s._dsl._value_net_of
+    if net_of is None:
+      net_of = s._dsl._value_net_of = { x: i for i, (_, net) in enumerate( s._dsl.all_value_nets )
+                                             for x in net }
+    return net_of
+
+  def _pop_value_net( s, i ):
+    # The last net fills the hole
+    nets, net_of = s._dsl.all_value_nets, s._dsl._value_net_of
+    net  = nets[i]
+    last = nets.pop()
+    if last is not net:
+      nets[i] = last
+      for y in last[1]:
+        net_of[y] = i
+    for y in net[1]:
+      del net_of[y]
+    return net
+
+  def _push_value_net( s, net ):
+    nets, net_of = s._dsl.all_value_nets, s._dsl._value_net_of
+    i = len(nets)
+    nets.append( net )
+    for y in net[1]:
+      net_of[y] = i
+
+  def _detach_value_signals( s, removed, cut ):
+    """ Take the removed signals out of their nets. cut holds the
+    remaining end of every connection of a removed signal. A net that is
+    cut at a single edge and keeps its writer is patched in place. The
+    other nets are dropped and their remaining signals are marked dirty.
+    Return the dropped nets and a list of ( net, removed members ). """
+
+    nets   = s._dsl.all_value_nets
+    net_of = s._get_value_net_index()
+
+    detached = defaultdict(set)
+    for x in removed:
+      if x in net_of:
+        detached[ net_of[x] ].add( x )
+
+    ncuts = defaultdict(int)
+    for y in cut:
+      if y in net_of:
+        ncuts[ net_of[y] ] += 1
+
+    groups = [ ( nets[i], members, ncuts[i] ) for i, members in detached.items() ]
+
+    dropped = []
+    patched = []
+    for net, members, ncut in groups:
+      writer, signals = net
+      if ncut == 1 and writer not in members and len(signals) - len(members) > 1:
+        signals -= members
+        for x in members:
+          del net_of[x]
+        patched.append( (net, members) )
+      else:
+        dropped.append( s._pop_value_net( net_of[ next(iter(members)) ] ) )
+        s._dsl._dirty_value_signals |= { x for x in signals
+                                         if _is_live_signal( x, s._dsl.all_signals ) }
+
+    return dropped, patched
+
+  def _resolve_value_connections_incremental( s, dirty, new ):
+    """ Resolve the nets around the dirty signals again and add the new
+    signals to the nets, updating s._dsl.all_value_nets in place.
+
+    Since the writer of a net is inferred from the nested fields and
+    slices of its members, a net is resolved again if it contains a dirty
+    signal or shares a top-level signal with another such net. A group of
+    connected new signals is patched into an existing net if it is
+    connected to it by a single edge, otherwise it is resolved from
+    scratch as well.
+
+    Return the removed nets, the added nets, a list of ( net, added
+    members ) of the patched nets, and the ( writer, signals ) pairs that
+    cover all new connections for _check_port_in_nets. """
+
+    nets   = s._dsl.all_value_nets
+    net_of = s._get_value_net_index()
+
+    all_signals = s._dsl.all_signals
+    adjacency   = s._dsl.all_adjacency
+
+    removed = []
+    added   = {} # id -> net
+
+    while True:
+
+      if dirty:
+        affected = set()
+        roots    = set()
+        stack    = list(dirty)
+
+        while stack:
+          x = stack.pop()
+
+          if x in net_of:
+            net = s._pop_value_net( net_of[x] )
+            if added.pop( id(net), None ) is None:
+              removed.append( net )
+            stack.extend( net[1] )
+
+          # Deleted signals and constants are not floodfill sources
+          if x in affected or not _is_live_signal( x, all_signals ):
+            continue
+
+          affected.add( x )
+          if x in adjacency:
+            stack.extend( adjacency[x] )
+
+          root = x.get_top_level_signal()
+          if root not in roots:
+            roots.add( root )
+            stack.extend( root._collect_all_single( lambda y: isinstance( y, Signal ) ) )
+
+        for net in s._resolve_net_writers( s._floodfill_nets( affected, adjacency ) ):
+          s._push_value_net( net )
+          added[ id(net) ] = net
+
+        new   = { x for x in new if x.get_top_level_signal() not in roots }
+        dirty = set()
+
+      # Group the remaining new signals by connectivity. A group can't be
+      # patched if it reaches an old signal that is not in any net, is
+      # connected to existing nets by more than one edge, or has a loop.
+      # Slices created after the component was added are new as well.
 
-    # Then figure out writers: all writes in upblks and their nest objects
+      groups  = []
+      visited = set()
+      for x in new:
+        if x in visited:
+          continue
+        visited.add( x )
+
+        members = set()
+        attach  = []
+        nedges  = 0
+        Q = [ x ]
+        while Q:
+          u = Q.pop()
+          members.add( u )
+          for v in adjacency[u] if u in adjacency else ():
+            if v in net_of:
+              attach.append( v )
+            else:
+              nedges += 1
+              if v not in visited:
+                visited.add( v )
+                if isinstance( v, Signal ) and v.get_top_level_signal() not in new:
+                  dirty.add( v )
+                else:
+                  Q.append( v )
+
+        if len(attach) > 1 or nedges != 2 * (len(members) - 1) or \
+           ( attach and nets[ net_of[ attach[0] ] ][0] is None ):
+          dirty |= members
+
+        elif attach or len(members) > 1:
+          groups.append( (members, attach) )
+
+      if not dirty:
+        break
+
+    # Resolve the writers of all groups at once since the groups may
+    # share top-level signals. A group that is attached to an existing
+    # net is resolved together with the writer of that net.
 
     writer_prop = {}
+    pnets = []
+    for members, attach in groups:
+      if attach:
+        writer = nets[ net_of[ attach[0] ] ][0]
+        writer_prop[ writer ] = True
+        pnets.append( members | { writer } )
+      else:
+        pnets.append( members )
+
+    writers = { id(net): writer for writer, net in s._resolve_net_writers( pnets, writer_prop ) }
+
+    patched = []
+    checks  = list( added.values() )
+
+    for (members, attach), pnet in zip( groups, pnets ):
+      if attach:
+        x = attach[0]
+        i = net_of[x]
+        nets[i][1].update( members )
+        for y in members:
+          net_of[y] = i
+        patched.append( (nets[i], members) )
+        checks.append( (x, members | { x }) )
+      else:
+        net = ( writers[ id(pnet) ], pnet )
+        s._push_value_net( net )
+        added[ id(net) ] = net
+        checks.append( net )
 
-    for blk, writes in s._dsl.all_upblk_writes.items():
+    return removed, list( added.values() ), patched, checks
+
+  def _resolve_net_writers( s, nets, writer_prop=None ):
+    """ Figure out the writer of each net. Only update blocks of the host
+    components of the net members and their ancestors can write to the
+    members. writer_prop may hold known writers. Return a list of
+    ( writer, net ) tuples. """
+
+    if writer_prop is None:
+      writer_prop = {}
+
+    hosts = set()
+    for net in nets:
+      for x in net:
+        if isinstance( x, Signal ):
+          c = x.get_host_component()
+          while c is not None and c not in hosts:
+            hosts.add( c )
+            c = c.get_parent_object()
+
+    all_upblk_writes = s._dsl.all_upblk_writes
+
+    return s._resolve_writers( nets, [ all_upblk_writes[blk] for c in hosts
+                                                            for blk in c._dsl.upblks ],
+                               writer_prop )
+
+  def _resolve_writers( s, nets, all_writes, writer_prop ):
+    """ Figure out the writer of each net given the sets of objects
+    written by update blocks. Return a list of ( writer, net ) tuples. """
+
+    # Figure out writers: all writes in upblks and their nest objects
+
+    for writes in all_writes:
       for obj in writes:
         writer_prop[ obj ] = True # propagatable
 
@@ -518,8 +772,49 @@ class ComponentLevel3( ComponentLevel2 ):
 
     return headed + [ (None, x) for x in headless ]
 
-  def _check_port_in_nets( s ):
-    nets = s._dsl.all_value_nets
+  def _resolve_value_connections_cached( s ):
+    """ Look up the resolved nets in the elaboration cache before falling
+    back to _resolve_value_connections. A constant is not a named
+    object, so a net written by a constant is stored without it and the
+    Const object is found again among the neighbors of the net. """
+
+    cache = get_elaboration_cache()
+    if cache is None:
+      return s._resolve_value_connections()
+
+    # The design key covers the source of ComponentLevel3 itself
+    key    = get_design_key( s )
+    cached = cache.load( 'nets', key )
+
+    if cached is not None:
+      names     = get_name_map( s )
+      adjacency = s._dsl.all_adjacency
+      nets      = []
+      try:
+        for wname, rnames in cached:
+          net = { names[x] for x in rnames }
+          if wname is None:
+            writer, = { y for x in net for y in adjacency[x] if isinstance( y, Const ) }
+          else:
+            writer = names[ wname ]
+          net.add( writer )
+          nets.append( (writer, net) )
+        return nets
+      except (KeyError, ValueError): # stale entry
+        pass
+
+    nets = s._resolve_value_connections()
+
+    # Don't cache a broken design, elaboration will fail anyway
+    if all( writer is not None for writer, _ in nets ):
+      cache.store( 'nets', key, [ ( None if isinstance( writer, Const ) else repr(writer),
+                                    [ repr(x) for x in net if x is not writer ] )
+                                  for writer, net in nets ] )
+    return nets
+
+  def _check_port_in_nets( s, nets=None ):
+    if nets is None:
+      nets = s._dsl.all_value_nets
 
     # The case of connection is very tricky because we put a single upblk
     # in the lowest common ancestor node and the "output port" chain is
@@ -533,10 +828,12 @@ class ComponentLevel3( ComponentLevel2 ):
     if headless:
       raise NoWriterError( headless )
 
-    for writer, _ in nets:
+    for writer, signals in nets:
 
       # We need to do DFS to check all connected port types
-      # Each node is a writer when we expand it to other nodes
+      # Each node is a writer when we expand it to other nodes. Only the
+      # given signals are visited, so that a part of a net can be checked
+      # on its own starting from its driver.
 
       S = [ writer ]
       visited = { writer }
@@ -546,7 +843,7 @@ class ComponentLevel3( ComponentLevel2 ):
         whost = u.get_host_component()
 
         for v in s._dsl.all_adjacency[u]: # v is the reader
-          if v not in visited:
+          if v not in visited and v in signals:
             visited.add( v )
             S.append( v )
             rhost = v.get_host_component()
@@ -673,6 +970,7 @@ class ComponentLevel3( ComponentLevel2 ):
   def _disconnect_signal_int( s, o1, o2 ):
 
     nets = s.get_all_value_nets()
+    s._dsl._value_net_of = None
 
     for i, net in enumerate( nets ):
       writer, signals = net
@@ -698,6 +996,7 @@ class ComponentLevel3( ComponentLevel2 ):
   def _disconnect_signal_signal( s, o1, o2 ):
 
     nets = s.get_all_value_nets()
+    s._dsl._value_net_of = None
 
     assert o1 in s._dsl.all_adjacency[o2] and o2 in s._dsl.all_adjacency[o1]
     # I don't remove it from m._adjacency since they are not used later
@@ -776,10 +1075,17 @@ class ComponentLevel3( ComponentLevel2 ):
     super()._elaborate_declare_vars()
     s._dsl.all_adjacency = defaultdict(set)
 
+    # Signals whose nets have to be resolved again after elaboration, the
+    # signals of added components, and the lazily built index of the net
+    # that each signal belongs to
+    s._dsl._dirty_value_signals = set()
+    s._dsl._new_value_signals   = set()
+    s._dsl._value_net_of = None
+
   # Override
   def _elaborate_collect_all_vars( s ):
     super()._elaborate_collect_all_vars()
-    s._dsl.all_value_nets = s._resolve_value_connections()
+    s._dsl.all_value_nets = s._resolve_value_connections_cached()
     s._dsl._has_pending_value_connections = False
 
     s._check_valid_dsl_code()
@@ -61,10 +61,14 @@ class ComponentLevel4( ComponentLevel3 ):
       s._dsl.all_update_once   |= m._dsl.update_once
       s._dsl.all_M_constraints |= m._dsl.M_constraints
 
-  def _check_upblk_calls( s ):
+  def _check_upblk_calls( s, blks=None ):
     all_update_once = s._dsl.all_update_once
 
-    for blk, calls in s._dsl.all_upblk_calls.items():
+    upblk_calls = s._dsl.all_upblk_calls
+    if blks is not None:
+      upblk_calls = { blk: upblk_calls[ blk ] for blk in blks }
+
+    for blk, calls in upblk_calls.items():
       # if there is method call in normal update block we throw an error
       if blk not in all_update_once:
         method_calls = [ x for x in calls \
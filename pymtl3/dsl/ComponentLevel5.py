@@ -153,7 +153,7 @@ class ComponentLevel5( ComponentLevel4 ):
       elif isinstance( c, MethodPort ):
         s._dsl.all_method_ports.add( c )
 
-    s._dsl.all_value_nets  = s._resolve_value_connections()
+    s._dsl.all_value_nets  = s._resolve_value_connections_cached()
     # Added here
     s._dsl.all_method_nets = s._resolve_method_connections()
     s._dsl._has_pending_value_connections = False
@@ -198,7 +198,7 @@ class Signal( NamedObject, Connectable ):
         u, indices, parent, parent_is_list = Q.popleft()
         cls = u.__class__
 
-        if cls is list:
+        if isinstance( u, list ):
           x = []
           for i, v in enumerate( u ):
             Q.append( ( v, indices+[i], x, True ) )
@@ -0,0 +1,156 @@
+"""
+========================================================================
+ElaborationCache.py
+========================================================================
+A persistent on-disk cache for the results of elaboration and
+scheduling that only depend on the Python source of a design and the
+parameters it is constructed with. Enable it by setting the
+PYMTL_ELAB_CACHE environment variable to a directory or by calling
+set_elaboration_cache( path ) before elaborating a model.
+
+Entries are pickled to <path>/<kind>-<key>.pkl. Components, signals
+and update blocks are never pickled. They are stored by name and looked
+up again in the freshly constructed model, so a stale or unusable entry
+simply becomes a miss.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+
+_cache = None
+_configured = False
+
+def set_elaboration_cache( path ):
+  """ Use the cache at the given directory from now on. None disables the
+  cache and overrides the PYMTL_ELAB_CACHE environment variable. """
+  global _cache, _configured
+  _cache = None if path is None else ElaborationCache( path )
+  _configured = True
+
+def get_elaboration_cache():
+  global _cache, _configured
+  if not _configured:
+    path = os.environ.get( 'PYMTL_ELAB_CACHE' )
+    _cache = ElaborationCache( path ) if path else None
+    _configured = True
+  return _cache
+
+class ElaborationCache:
+
+  def __init__( s, path ):
+    s.path = str(path)
+    os.makedirs( s.path, exist_ok=True )
+
+  def load( s, kind, key ):
+    try:
+      with open( os.path.join( s.path, f"{kind}-{key}.pkl" ), 'rb' ) as f:
+        return pickle.load( f )
+    # A missing or corrupted entry is just a miss
+    except Exception:
+      return None
+
+  def store( s, kind, key, value ):
+    # Write to a temporary file first so that concurrent test processes
+    # never see a partially written entry
+    import tempfile
+    fd, tmp = tempfile.mkstemp( dir=s.path, suffix='.tmp' )
+    try:
+      with os.fdopen( fd, 'wb' ) as f:
+        pickle.dump( value, f, protocol=pickle.HIGHEST_PROTOCOL )
+      os.replace( tmp, os.path.join( s.path, f"{kind}-{key}.pkl" ) )
+    except Exception:
+      os.remove( tmp )
+
+#-------------------------------------------------------------------------
+# Keys
+#-------------------------------------------------------------------------
+
+_file_digests = {}
+
+def file_digest( path ):
+  """ Return the sha1 digest of a file, memoized on its mtime and size. """
+  try:
+    st = os.stat( path )
+  except (OSError, TypeError):
+    return None
+
+  stamp = (st.st_mtime_ns, st.st_size)
+  try:
+    old_stamp, digest = _file_digests[ path ]
+    if old_stamp == stamp:
+      return digest
+  except KeyError:
+    pass
+
+  with open( path, 'rb' ) as f:
+    digest = hashlib.sha1( f.read() ).hexdigest()
+  _file_digests[ path ] = (stamp, digest)
+  return digest
+
+def make_key( *parts ):
+  return hashlib.sha1( repr(parts).encode() ).hexdigest()
+
+def _param_repr( x ):
+  # Functions and classes are identified by name rather than by their
+  # default repr, which contains the memory address
+  if isinstance( x, (list, tuple) ):
+    return type(x).__name__, tuple( _param_repr(y) for y in x )
+  if isinstance( x, dict ):
+    return tuple( sorted( (repr(k), _param_repr(v)) for k, v in x.items() ) )
+  if inspect.isclass( x ) or inspect.isroutine( x ):
+    return getattr( x, '__module__', None ), getattr( x, '__qualname__', repr(x) )
+  return repr(x)
+
+# A class object never changes after its module is executed, so we only
+# have to hash its source files once
+_class_digests_cache = {}
+
+def _class_digests( cls ):
+  try:
+    return _class_digests_cache[ cls ]
+  except KeyError:
+    pass
+
+  ret = []
+  for c in cls.__mro__:
+    if c is object:
+      continue
+    try:
+      path = inspect.getsourcefile( c )
+    except TypeError:
+      path = None
+    ret.append( (c.__module__, c.__qualname__, file_digest( path )) )
+
+  _class_digests_cache[ cls ] = ret = tuple(ret)
+  return ret
+
+_versions = ( sys.version, file_digest( __file__ ) )
+
+def get_design_key( top ):
+  """ Compute a key of the elaborated structure of top from the source
+  of every component class, the constructor parameters of every
+  component, the names of all named objects, and all connections. The
+  key is kept in top._dsl until the next structural change after
+  elaboration. """
+  key = getattr( top._dsl, 'design_key', None )
+  if key is not None:
+    return key
+
+  components = []
+  for c in sorted( top._dsl.all_components, key=repr ):
+    components.append( ( repr(c), _class_digests( c.__class__ ),
+                         _param_repr( c._dsl.args ), _param_repr( c._dsl.kwargs ) ) )
+
+  names = sorted( repr(x) for x in top._dsl.all_named_objects )
+
+  connections = sorted( f"{u!r}={sorted( repr(v) for v in vs )}"
+                        for u, vs in top._dsl.all_adjacency.items() if vs )
+
+  top._dsl.design_key = key = make_key( _versions, components, names, connections )
+  return key
+
+def get_name_map( top ):
+  """ Return a dict that maps names back to the named objects of top. """
+  return { repr(x): x for x in top._dsl.all_named_objects }
@@ -814,3 +814,31 @@ def test_write_interface_update_ff():
     print("{} is thrown\n{}".format( e.__class__.__name__, e ))
     return
   raise Exception("Should've thrown WriteNonSignalError.")
+
+def test_bits_int_methods_read_signal():
+
+  class Top(ComponentLevel2):
+    def construct( s ):
+      s.A   = Wire( Bits32 )
+      s.sel = Wire( Bits16 )
+
+      @update
+      def up_rd_A():
+        assert s.A.uint_slice( 4, 16 ) == 0xab
+        assert s.A.bit( s.sel ) == 1
+
+      @update
+      def up_wr_A():
+        s.A   @= Bits32( 0xab0 )
+        s.sel @= Bits16( 5 )
+
+    def done( s ):
+      return True
+
+  x = Top()
+  x.elaborate()
+  up_rd_A = x._dsl.name_upblk[ 'up_rd_A' ]
+  assert x._dsl.upblk_reads[ up_rd_A ] == { x.A, x.sel }
+  assert not x._dsl.upblk_calls[ up_rd_A ]
+
+  _test_model( Top )
@@ -1,10 +1,15 @@
 from .autotick.OpenLoopCLPass import OpenLoopCLPass
 from .BasePass import BasePass
+from .errors import InvalidPassOptionValue
+from .sim.ActivityDrivenSchedulePass import ActivityDrivenSchedulePass
 from .sim.DynamicSchedulePass import DynamicSchedulePass
+from .sim.FusedTickPass import FusedTickPass
 from .sim.GenDAGPass import GenDAGPass
 from .sim.PrepareSimPass import PrepareSimPass
 from .sim.SimpleSchedulePass import SimpleSchedulePass
 from .sim.SimpleTickPass import SimpleTickPass
+from .sim.SimProfilingPass import SimProfilingPass
+from .sim.WrapGeneratorPass import WrapGeneratorPass
 from .sim.WrapGreenletPass import WrapGreenletPass
 from .tracing.CLLineTracePass import CLLineTracePass
 from .tracing.LineTraceParamPass import LineTraceParamPass
@@ -27,12 +32,51 @@ class SimpleSimPass( BasePass ):
 
 class DefaultPassGroup( BasePass ):
   def __init__( s, *, vcdwave=None, textwave=False,
-                      linetrace=False, reset_active_high=True ):
+                      linetrace=False, reset_active_high=True,
+                      activity_driven=False, fused_tick=False,
+                      collapse_nets=False, partitioned=False, profile=None,
+                      dirty_flip=False, skip_clean_ff=False, coroutine='greenlet',
+                      flat_storage=False ):
+
+    if coroutine not in ( 'greenlet', 'generator' ):
+      raise InvalidPassOptionValue( "coroutine", coroutine, "DefaultPassGroup",
+              "it must be either 'greenlet' or 'generator'" )
+
+    if profile == 'deterministic' and partitioned:
+      raise InvalidPassOptionValue( "profile", profile, "DefaultPassGroup",
+              "it wraps the blocks that PartitionedSimPass distributes to "
+              "worker processes; please use 'sampling' instead" )
+
+    if fused_tick and partitioned:
+      raise InvalidPassOptionValue( "fused_tick", fused_tick, "DefaultPassGroup",
+              "PartitionedSimPass generates its own tick functions for the "
+              "partitions; please choose one of fused_tick and partitioned" )
+
+    if dirty_flip and partitioned:
+      raise InvalidPassOptionValue( "dirty_flip", dirty_flip, "DefaultPassGroup",
+              "PartitionedSimPass flips the registers in worker processes" )
+
+    if flat_storage and partitioned:
+      raise InvalidPassOptionValue( "flat_storage", flat_storage, "DefaultPassGroup",
+              "PartitionedSimPass flips the registers in worker processes" )
+
+    if skip_clean_ff and not activity_driven:
+      raise InvalidPassOptionValue( "skip_clean_ff", skip_clean_ff, "DefaultPassGroup",
+              "it is part of activity-driven scheduling; please also set activity_driven=True" )
 
     s.vcdwave = vcdwave
     s.textwave = textwave
     s.linetrace = linetrace
     s.reset_active_high = reset_active_high
+    s.activity_driven = activity_driven
+    s.fused_tick = fused_tick
+    s.collapse_nets = collapse_nets
+    s.partitioned = partitioned
+    s.profile = profile
+    s.dirty_flip = dirty_flip
+    s.skip_clean_ff = skip_clean_ff
+    s.coroutine = coroutine
+    s.flat_storage = flat_storage
 
   def __call__( s, top ):
 
@@ -43,15 +87,34 @@ class DefaultPassGroup( BasePass ):
       top.set_metadata( PrintTextWavePass.enable, True )
 
     LineTraceParamPass()( top )
-    GenDAGPass()( top )
-    WrapGreenletPass()( top )
+    GenDAGPass( s.collapse_nets )( top )
+    if s.coroutine == 'generator':
+      WrapGeneratorPass()( top )
+    else:
+      WrapGreenletPass()( top )
     CLLineTracePass()( top )
-    DynamicSchedulePass()( top )
+    if s.activity_driven:
+      ActivityDrivenSchedulePass( dirty_flip=s.dirty_flip,
+                                  skip_clean_ff=s.skip_clean_ff )( top )
+    else:
+      DynamicSchedulePass( s.dirty_flip )( top )
     VcdGenerationPass()( top )
     PrintTextWavePass()( top )
 
-    PrepareSimPass(print_line_trace=s.linetrace,
-                   reset_active_high=s.reset_active_high)( top )
+    if s.profile:
+      SimProfilingPass( s.profile )( top )
+
+    if s.partitioned:
+      # PartitionedSimPass loads multiprocessing, which most simulations
+      # don't need
+      from .sim.PartitionedSimPass import PartitionedSimPass
+      PartitionedSimPass(print_line_trace=s.linetrace,
+                         reset_active_high=s.reset_active_high)( top )
+    else:
+      prepare_sim = FusedTickPass if s.fused_tick else PrepareSimPass
+      prepare_sim(print_line_trace=s.linetrace,
+                  reset_active_high=s.reset_active_high,
+                  flat_storage=s.flat_storage)( top )
 
 class AutoTickSimPass( BasePass ):
   def __init__( s, print_line_trace=True ):
@@ -1 +1,9 @@
 from .PassGroups import *
+
+# Passes with expensive dependencies are only imported on first use
+
+def __getattr__( name ):
+  if name == "PartitionedSimPass":
+    from .sim.PartitionedSimPass import PartitionedSimPass
+    return PartitionedSimPass
+  raise AttributeError( f"module {__name__!r} has no attribute {name!r}" )
@@ -11,15 +11,15 @@
 import os
 import random
 from collections import deque
-
-import py
+from itertools import repeat
 
 from pymtl3.datatypes import Bits1
 from pymtl3.dsl import CalleeIfcCL, CalleePort
-from pymtl3.dsl.errors import UpblkCyclicError
+from pymtl3.extra.pypy import custom_exec
 
 from ..BasePass import BasePass, PassMetadata
-from ..errors import PassOrderError
+from ..errors import MethodNotReadyError, PassOrderError
+from ..sim.DynamicSchedulePass import gen_scc_block
 from ..sim.PrepareSimPass import PrepareSimPass
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, dump_dag
 from ..sim.SimpleTickPass import SimpleTickPass
@@ -278,66 +278,12 @@ class OpenLoopCLPass( BasePass ):
               visited.add( v )
 
         scc_id += 1
-        variables = set()
-        for (u, v) in E:
-          # Collect all variables that triggers other blocks in the SCC
-          if u in scc and v in scc:
-            variables.update( constraint_objs[ (u, v) ] )
-
-        # generate a loop for scc
-        # Shunning: we just simply loop over the whole SCC block
-        # TODO performance optimizations using Mamba techniques within a SCC block
-
-        def gen_wrapped_SCCblk( s, scc, src ):
-          from pymtl3.dsl.errors import UpblkCyclicError
-
-          namespace = {}
-          namespace.update( locals() )
-          # print src
-          exec(py.code.Source( src ).compile(), namespace)
-
-          return namespace['generated_block']
-
-        # FIXME when there is nothing in {2} ..
-        template = """
-          from copy import deepcopy
-          def wrapped_SCC_{0}():
-            num_iters = 0
-            while True:
-              num_iters += 1
-              {1}
-              for blk in scc: # TODO Mamba
-                blk()
-              if {2}:
-                break
-              if num_iters > 100:
-                raise UpblkCyclicError("Combinational loop detected at runtime in {{{3}}}!")
-            # print "SCC block{0} is executed", num_iters, "times"
-          generated_block = wrapped_SCC_{0}
-        """
-
-        copy_srcs  = []
-        check_srcs = []
-        # print_srcs = []
-
-        for j, var in enumerate(variables):
-          if issubclass( var._dsl.Type, Bits ):
-            copy_srcs.append( f"t{j} = {var}.value" )
-          elif is_bitstruct_class( var._dsl.Type ):
-            copy_srcs.append( f"t{j} = {var}.clone()" )
-          else:
-            copy_srcs.append( f"t{j} = deepcopy({var})" )
-
-          check_srcs.append( f"{var} == t{j}" )
-          # print_srcs.append( f"print '{var}', {var}, _____tmp_{j}" )
-
-        scc_block_src = template.format( scc_id,
-                                         "; ".join( copy_srcs ),
-                                         " and ".join( check_srcs ),
-                                         ", ".join( [ x.__name__ for x in scc] ) )
-                                         # "; ".join( print_srcs ) )
-
-        update_schedule.append( gen_wrapped_SCCblk( top, tmp_schedule, scc_block_src ) )
+
+        # Collect all variables that triggers other blocks in the SCC
+        edges = { (u, v): constraint_objs.get( (u, v), () )
+                  for (u, v) in E if u in scc and v in scc }
+
+        update_schedule.append( gen_scc_block( top, scc_id, tmp_schedule, edges ) )
 
     # Shunning: we call line trace related pass here.
     CLLineTracePass()( top )
@@ -432,6 +378,8 @@ class OpenLoopCLPass( BasePass ):
 
       return actual_method
 
+    positions = {}
+
     for i, x in enumerate( schedule ):
       if isinstance( x, CalleePort ):
         x.original_method = x.method
@@ -447,12 +395,24 @@ class OpenLoopCLPass( BasePass ):
         # Get the index of the block in the schedule without method
         # This always exists because we append a line trace at the end
         map_next_func = mapping[ schedule[next_func] ]
+        positions[ x ] = (map_next_func, i)
 
         x.method = wrap_method( top, x.method,
                                 map_next_func,
                                 schedule_no_method,
                                 i )
 
+    # Bulk versions of top level methods that stream many calls through
+    # the schedule in one loop
+
+    for x in top_level_callee_ports:
+      if not x.in_non_blocking_interface():
+        gen_bulk_methods( top, x, schedule_no_method, positions[x] )
+
+    for x in top_level_nb_ifcs:
+      gen_bulk_methods( top, x, schedule_no_method, positions[x.method],
+                        positions[x.rdy] )
+
     top._sim.simulated_cycles = 0
 
     ff = SimpleTickPass.gen_tick_function( ffs_no_method )
@@ -481,3 +441,85 @@ class OpenLoopCLPass( BasePass ):
 
     PrepareSimPass.create_lock_unlock_simulation( top )
     PrepareSimPass.create_sim_cycle_count( top )
+
+#-------------------------------------------------------------------------
+# gen_bulk_methods
+#-------------------------------------------------------------------------
+# Every top level method call advances the schedule to the position of
+# the method. A loop of calls from the test bench pays for the wrapper
+# and the schedule indices in every call, so we generate one loop per
+# method that keeps the indices in local variables. For a non-blocking
+# interface the loop also keeps calling rdy, which ticks the design,
+# until the method is ready, just like a test bench does. We attach
+#
+# - push_many( msgs ): call the method once for each message in the
+#   iterable and return the number of calls
+# - pull_many( n ): call the method n times and return the list of
+#   return values. We clone Bits and bitstructs because a method often
+#   returns a signal that the design overwrites in the next cycle.
+#
+# Both raise MethodNotReadyError if rdy stays low for max_stall_cycles
+# consecutive cycles, since otherwise asking for more messages than the
+# design ever produces would tick forever. None disables the check.
+
+def _gen_advance( lines, indent, pos ):
+  idx_new, idx_orig = pos
+  lines += [ f"{indent}if j > {idx_orig}:",
+             f"{indent}  while i < n_sched:",
+             f"{indent}    schedule[i]()",
+             f"{indent}    i += 1",
+             f"{indent}  i = j = 0",
+             f"{indent}  sim.simulated_cycles += 1",
+             f"{indent}while i < {idx_new}:",
+             f"{indent}  schedule[i]()",
+             f"{indent}  i += 1",
+             f"{indent}j = {idx_orig + 1}" ]
+
+def gen_bulk_methods( top, x, schedule, pos, rdy_pos=None ):
+  if rdy_pos is None:
+    port = x
+    _globals = { 'method': x.original_method }
+  else:
+    port = x.method
+    _globals = { 'method': x.method.original_method,
+                 'rdy'   : x.rdy.original_method }
+  _globals.update( sched=top._sched, sim=top._sim, schedule=schedule,
+                   n_sched=len(schedule), port=port,
+                   MethodNotReadyError=MethodNotReadyError )
+
+  lines = [ "def bulk_call( args_iter, max_stall_cycles ):",
+            "  i = sched.new_schedule_index",
+            "  j = sched.orig_schedule_index",
+            "  ret = []",
+            "  try:",
+            "    for args in args_iter:" ]
+  if rdy_pos is not None:
+    lines += [ "      stalls = 0",
+               "      while True:" ]
+    _gen_advance( lines, "        ", rdy_pos )
+    lines += [ "        if rdy(): break",
+               "        if stalls == max_stall_cycles:",
+               "          raise MethodNotReadyError( port, stalls )",
+               "        stalls += 1" ]
+  _gen_advance( lines, "      ", pos )
+  lines += [ "      r = method( *args )",
+             "      if hasattr( r, 'clone' ): r = r.clone()",
+             "      ret.append( r )",
+             "  finally:",
+             "    sched.new_schedule_index  = i",
+             "    sched.orig_schedule_index = j",
+             "  return ret" ]
+
+  _locals = {}
+  custom_exec( compile( "\n".join( lines ), filename=f"bulk_{port!r}", mode="exec" ),
+               _globals, _locals )
+  bulk_call = _locals['bulk_call']
+
+  def push_many( msgs, max_stall_cycles=10000 ):
+    return len( bulk_call( ( (msg,) for msg in msgs ), max_stall_cycles ) )
+
+  def pull_many( n, max_stall_cycles=10000 ):
+    return bulk_call( repeat( (), n ), max_stall_cycles )
+
+  x.push_many = push_many
+  x.pull_many = pull_many
@@ -6,9 +6,12 @@
 # Author : Shunning Jiang
 # Date   : Apr 19, 2019
 """
+import pytest
+
 from pymtl3.datatypes import Bits32
 from pymtl3.dsl import *
 from pymtl3.dsl.errors import UpblkCyclicError
+from pymtl3.passes.errors import MethodNotReadyError
 from pymtl3.passes.sim.GenDAGPass import GenDAGPass
 from pymtl3.passes.tracing.PrintTextWavePass import PrintTextWavePass
 
@@ -312,3 +315,123 @@ def test_deep_pass_through_equal_m_constraint():
 
   num_cycles = _test_TestModuleNonBlockingIfc( Top )
   assert num_cycles == 3 + 10 # regression
+
+def test_false_cyclic_dependency_with_method():
+
+  class Top(Component):
+
+    def construct( s ):
+      s.count = Wire(Bits32)
+      s.x     = Wire(Bits32)
+      s.y     = Wire(Bits32)
+
+      @update_ff
+      def up_incr():
+        s.count <<= s.count + 1
+
+      # up_x and up_y form an SCC
+      @update
+      def up_x():
+        if s.y[31]: s.x @= s.count
+        else:       s.x @= s.count + 1
+
+      @update
+      def up_y():
+        s.y @= s.x >> 1
+
+      s.add_constraints(
+        U( up_y ) < M( s.pull ),
+      )
+
+    @method_port
+    def pull( s ):
+      return s.y
+
+    def line_trace( s ):
+      return "x {} | y {}".format( s.x, s.y )
+
+    def done( s ):
+      return True
+
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( OpenLoopCLPass( print_line_trace=False ) )
+
+  scc_blk, = A._sched.scc_blocks
+  for i in range(5):
+    assert A.pull() == (i + 1) >> 1
+
+  stats = A._sched.scc_stats[ scc_blk ]
+  assert stats.calls == 5
+  assert stats.max_iterations <= 2
+
+def test_bulk_methods():
+
+  def make():
+    A = TestModuleNonBlockingIfc()
+    A.elaborate()
+    A.apply( GenDAGPass() )
+    A.apply( OpenLoopCLPass( print_line_trace=False ) )
+    A.sim_reset()
+    return A
+
+  msgs = [ Bits32(i) for i in range(1, 20) ]
+
+  A = make()
+  ret = []
+  for msg in msgs:
+    while not A.push.rdy():
+      pass
+    A.push( msg )
+    while not A.pull.rdy():
+      pass
+    ret.append( A.pull().clone() )
+
+  B = make()
+  for msg in msgs:
+    assert B.push.push_many( [ msg ] ) == 1
+    assert B.pull.pull_many( 1 ) == [ ret.pop(0) ]
+  assert B.sim_cycle_count() == A.sim_cycle_count()
+
+  # Back-to-back pushes wait for rdy in between
+
+  C = make()
+  assert C.push.push_many( iter(msgs) ) == len(msgs)
+  D = make()
+  for msg in msgs:
+    while not D.push.rdy():
+      pass
+    D.push( msg )
+  assert C.sim_cycle_count() == D.sim_cycle_count()
+  assert C.pull() == D.pull()
+
+  # No more messages will come out of the design
+
+  with pytest.raises( MethodNotReadyError ):
+    C.pull.pull_many( 1, max_stall_cycles=20 )
+
+def test_bulk_method_port():
+
+  class Top( Component ):
+    def construct( s ):
+      s.count = Wire( Bits32 )
+
+      @update_ff
+      def up_incr():
+        s.count <<= s.count + 1
+
+    @method_port
+    def pull( s ):
+      return s.count
+
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( OpenLoopCLPass( print_line_trace=False ) )
+
+  # Every pull ticks the design once
+  assert A.pull.pull_many( 10 ) == list( range(10) )
+  assert A.pull() == 10
+  assert A.pull.pull_many( 0 ) == []
+  assert A.sim_cycle_count() == 10
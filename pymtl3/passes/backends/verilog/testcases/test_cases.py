@@ -32,6 +32,7 @@ from pymtl3.passes.testcases import (
     CaseBits32x2ConcatFreeVarComp,
     CaseBits32x2ConcatMixedComp,
     CaseBits32x2ConcatUnpackedSignalComp,
+    CaseBits64IntFieldUpblkComp,
     CaseBits64PartSelUpblkComp,
     CaseBits64SextInComp,
     CaseBits64TruncInComp,
@@ -626,6 +627,34 @@ CaseBits32BitSelUpblkComp = set_attributes( CaseBits32BitSelUpblkComp,
     '''
 )
 
+CaseBits64IntFieldUpblkComp = set_attributes( CaseBits64IntFieldUpblkComp,
+    'REF_UPBLK',
+    '''\
+        always_comb begin : upblk
+          out0 = in_[6'd35:6'd4];
+          out1 = in_[6'd63];
+        end
+    ''',
+    'REF_SRC',
+    '''\
+        module DUT_noparam
+        (
+          input logic [0:0] clk,
+          input logic [63:0] in_,
+          output logic [31:0] out0,
+          output logic [0:0] out1,
+          input logic [0:0] reset
+        );
+
+          always_comb begin : upblk
+            out0 = in_[6'd35:6'd4];
+            out1 = in_[6'd63];
+          end
+
+        endmodule
+    '''
+)
+
 CaseBits64PartSelUpblkComp = set_attributes( CaseBits64PartSelUpblkComp,
     'REF_UPBLK',
     '''\
@@ -19,6 +19,7 @@ from ....testcases import (
     CaseBits32x2ConcatFreeVarComp,
     CaseBits32x2ConcatMixedComp,
     CaseBits32x2ConcatUnpackedSignalComp,
+    CaseBits64IntFieldUpblkComp,
     CaseBits64PartSelUpblkComp,
     CaseBits64SextInComp,
     CaseBits64TruncInComp,
@@ -61,6 +62,7 @@ def run_test( case, m ):
       CaseBits32x2ConcatUnpackedSignalComp,
       CaseBits32BitSelUpblkComp,
       CaseBits64PartSelUpblkComp,
+      CaseBits64IntFieldUpblkComp,
       CasePythonClassAttr,
       CaseDefaultBitsComp,
     ]
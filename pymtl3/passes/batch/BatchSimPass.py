@@ -0,0 +1,868 @@
+"""
+========================================================================
+BatchSimPass.py
+========================================================================
+Lockstep simulation of many independent instances of the same RTL
+design. The design is elaborated once and every top-level signal is
+stored as a NumPy array with one lane per instance. The behavioral
+RTLIR of each update block is translated into vectorized NumPy
+operations, where if-statements are turned into per-lane predicates and
+for-loops are unrolled at translation time.
+
+Only designs that consist of translatable update blocks (the same subset
+accepted by the Verilog translator) with signals no wider than 64 bits
+are supported.
+
+  top = MyDesign()
+  top.elaborate()
+  top.apply( BatchSimPass( nlanes=256 ) )
+  top.sim_reset()
+  top.batch_poke( top.in_, numpy.arange(256) )
+  top.sim_tick()
+  out = top.batch_peek( top.out )          # numpy array of 256 lanes
+  out7 = top.batch_peek( top.out, lane=7 ) # Bits/bitstruct of lane 7
+"""
+import linecache
+import operator
+
+import numpy as np
+
+from pymtl3.datatypes import Bits, is_bitstruct_class, mk_bits
+from pymtl3.datatypes.bitstructs import _FIELDS
+from pymtl3.dsl import Const, MethodPort, Signal
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.extra.pypy import custom_exec
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+from pymtl3.passes.errors import TranslationError, UnsupportedDesignError
+from pymtl3.passes.rtlir import BehavioralRTLIR as bir
+from pymtl3.passes.rtlir import RTLIRDataType as rdt
+from pymtl3.passes.rtlir import RTLIRType as rt
+from pymtl3.passes.rtlir.behavioral.BehavioralRTLIRGenL5Pass import (
+    BehavioralRTLIRGenL5Pass,
+)
+from pymtl3.passes.rtlir.behavioral.BehavioralRTLIRTypeCheckL5Pass import (
+    BehavioralRTLIRTypeCheckL5Pass,
+)
+from pymtl3.passes.sim.DynamicSchedulePass import kosaraju_scc
+from pymtl3.passes.sim.GenDAGPass import GenDAGPass
+
+_u64 = np.uint64
+
+def _mask( nbits ):
+  return (1 << nbits) - 1
+
+#-------------------------------------------------------------------------
+# Helpers used by the generated code
+#-------------------------------------------------------------------------
+
+def _shl( x, y, nbits ):
+  y = np.asarray( y, dtype=_u64 )
+  return np.where( y < nbits, (x << np.minimum( y, _u64(63) )) & _u64(_mask(nbits)), _u64(0) )
+
+def _shr( x, y ):
+  y = np.asarray( y, dtype=_u64 )
+  return np.where( y < 64, x >> np.minimum( y, _u64(63) ), _u64(0) )
+
+def _div( x, y ):
+  x, y = np.broadcast_arrays( np.asarray( x, dtype=_u64 ), np.asarray( y, dtype=_u64 ) )
+  return np.floor_divide( x, y, out=np.zeros( x.shape, dtype=_u64 ), where=(y != 0) )
+
+def _mod( x, y ):
+  x, y = np.broadcast_arrays( np.asarray( x, dtype=_u64 ), np.asarray( y, dtype=_u64 ) )
+  return np.remainder( x, y, out=np.zeros( x.shape, dtype=_u64 ), where=(y != 0) )
+
+def _sel( idx, *values ):
+  idx = np.asarray( idx )
+  if idx.ndim == 0:
+    return values[ min( int(idx), len(values)-1 ) ]
+  arrs = np.broadcast_arrays( *[ np.asarray( v, dtype=_u64 ) for v in values ], idx )
+  return np.stack( arrs[:-1] )[ np.minimum( idx, len(values)-1 ), np.arange( idx.shape[0] ) ]
+
+if hasattr( np, 'bitwise_count' ):
+  def _parity( x ):
+    return np.bitwise_count( np.asarray( x, dtype=_u64 ) ).astype( _u64 ) & _u64(1)
+else:
+  def _parity( x ):
+    x = np.asarray( x, dtype=_u64 ).copy()
+    for sh in ( 32, 16, 8, 4, 2, 1 ):
+      x ^= x >> _u64(sh)
+    return x & _u64(1)
+
+#-------------------------------------------------------------------------
+# Objects used during translation
+#-------------------------------------------------------------------------
+# _Loc is a bit range of the storage of a top-level signal. lo is either
+# a Python int or a piece of code that evaluates to a lane array.
+# _DynList is a list of objects selected by a lane-dependent index.
+
+class _Loc:
+  __slots__ = ( 'var', 'lo', 'nbits', 'Type' )
+  def __init__( s, var, lo, nbits, Type ):
+    s.var   = var
+    s.lo    = lo
+    s.nbits = nbits
+    s.Type  = Type
+
+class _DynList:
+  __slots__ = ( 'idx', 'elems' )
+  def __init__( s, idx, elems ):
+    s.idx   = idx
+    s.elems = elems
+
+def _struct_fields( Type, var, lo ):
+  """ Return a dict that maps field names of bitstruct Type, whose bits
+  start at lo in storage var, to _Locs (or nested lists of _Locs). The
+  first field sits at the most significant bits. """
+  ret = {}
+  for name, ftype in reversed( list( getattr( Type, _FIELDS ).items() ) ):
+    ret[ name ], lo = _layout( ftype, var, lo )
+  return ret
+
+def _layout( ftype, var, lo ):
+  if isinstance( ftype, list ):
+    elems = []
+    for i in range( len(ftype) ):
+      elem, lo = _layout( ftype[0], var, lo )
+      elems.append( elem )
+    return elems, lo
+  return _Loc( var, lo, ftype.nbits, ftype ), lo + ftype.nbits
+
+def _add( lo, x ):
+  if isinstance( lo, int ) and isinstance( x, int ):
+    return lo + x
+  return f"({lo} + {x})"
+
+#-------------------------------------------------------------------------
+# BatchSimPass
+#-------------------------------------------------------------------------
+
+class BatchSimPass( BasePass ):
+
+  def __init__( self, nlanes, reset_active_high=True ):
+    self.nlanes = nlanes
+    self.reset_active_high = reset_active_high
+
+  def __call__( self, top ):
+    for x in sorted( top.get_all_object_filter( lambda x: isinstance( x, MethodPort ) ), key=repr ):
+      raise UnsupportedDesignError( x, self.__class__.__name__,
+                                    "batch simulation only supports pure RTL designs" )
+
+    for blk in sorted( top.get_all_update_once(), key=lambda x: x.__name__ ):
+      host = top.get_update_block_host_component( blk )
+      raise UnsupportedDesignError( f"{host!r}.{blk.__name__}", self.__class__.__name__,
+                                    "batch simulation only supports pure RTL designs" )
+
+    top.apply( GenDAGPass( collapse_nets=True ) )
+    top._sched = PassMetadata()
+    self.schedule_intra_cycle( top )
+
+    top._batch = PassMetadata()
+    top._batch.nlanes = self.nlanes
+
+    self.allocate_storage( top )
+
+    for m in sorted( top.get_all_components(), key=repr ):
+      m.apply( BehavioralRTLIRGenL5Pass( top ) )
+      m.apply( BehavioralRTLIRTypeCheckL5Pass( top ) )
+
+    self.compile_batch_functions( top )
+    self.create_sim_functions( top )
+
+  #-----------------------------------------------------------------------
+  # schedule_intra_cycle
+  #-----------------------------------------------------------------------
+  # Topologically sort the strongly connected components of update blocks
+  # like DynamicSchedulePass. A cycle between blocks that are not
+  # combinationally connected at the bit level (e.g. blocks that access
+  # different elements of an array) converges after every block of the
+  # cycle has been evaluated as many times as there are blocks in it, so
+  # the blocks of each cycle are simply repeated that many times.
+
+  def schedule_intra_cycle( self, top ):
+    V   = top._dag.final_upblks - top.get_all_update_ff()
+    G   = { v: [] for v in sorted( V, key=lambda x: x.__name__ ) }
+    G_T = { v: [] for v in G }
+
+    for (u, v) in top._dag.all_constraints: # u -> v
+      if u in V and v in V:
+        G  [u].append( v )
+        G_T[v].append( u )
+
+    SCCs, G_new = kosaraju_scc( G, G_T )
+
+    InD = { i: 0 for i in range(len(SCCs)) }
+    for u, vs in G_new.items():
+      for v in vs:
+        InD[ v ] += 1
+
+    top._sched.update_schedule = schedule = []
+
+    Q = [ i for i in range(len(SCCs)) if not InD[i] ]
+    while Q:
+      u = Q.pop()
+      blks = sorted( SCCs[u], key=lambda x: x.__name__ )
+      schedule.extend( blks * len(blks) )
+      for v in G_new[u]:
+        InD[v] -= 1
+        if not InD[v]:
+          Q.append( v )
+
+  #-----------------------------------------------------------------------
+  # allocate_storage
+  #-----------------------------------------------------------------------
+  # Same as lock_in_simulation, all top-level signals in the same net
+  # share the same storage.
+
+  def allocate_storage( self, top ):
+    nlanes = self.nlanes
+
+    storage = top._batch.storage = {} # top-level signal -> variable name
+    arrays  = top._batch.arrays  = {} # variable name -> numpy array
+    widths  = top._batch.widths  = {} # variable name -> nbits
+
+    def new_storage( x, init ):
+      nbits = x._dsl.Type.nbits
+      if nbits > 64:
+        raise UnsupportedDesignError( x, self.__class__.__name__,
+                                      f"batch simulation only supports signals "
+                                      f"up to 64 bits, not {nbits} bits" )
+      var = f"_v{len(arrays)}"
+      arrays[ var ] = np.full( nlanes, init & _mask( nbits ), dtype=_u64 )
+      widths[ var ] = nbits
+      return var
+
+    def default( Type ):
+      if is_bitstruct_class( Type ):
+        return int( Type().to_bits() )
+      return 0
+
+    for writer, signals in top.get_all_value_nets():
+      members = sorted( [ x for x in signals if isinstance( x, Signal ) and x.is_top_level_signal() ], key=repr )
+      if not members:
+        continue # whole net is slice
+
+      if isinstance( writer, Const ):
+        const = writer._dsl.const
+        init  = int( const.to_bits() ) if is_bitstruct_class( const.__class__ ) else int( const )
+      else:
+        init  = default( members[0]._dsl.Type )
+
+      var = new_storage( members[0], init )
+      for x in members:
+        storage[ x ] = var
+
+    for x in sorted( top._dsl.all_signals, key=repr ):
+      if x.is_top_level_signal() and x not in storage:
+        storage[ x ] = new_storage( x, default( x._dsl.Type ) )
+
+  #-----------------------------------------------------------------------
+  # compile_batch_functions
+  #-----------------------------------------------------------------------
+
+  def compile_batch_functions( self, top ):
+    storage = top._batch.storage
+    tr = _BatchTranslator( top, storage, top._batch.widths )
+
+    comb_src = []
+    for blk in top._sched.update_schedule:
+      if blk in top._dag.genblks:
+        comb_src.extend( tr.translate_genblk( blk ) )
+      else:
+        comb_src.extend( tr.translate_upblk( blk, False ) )
+
+    ff_src = []
+    for blk in sorted( top.get_all_update_ff(), key=lambda x: x.__name__ ):
+      ff_src.extend( tr.translate_upblk( blk, True ) )
+
+    # Writes of update_ff go to the next-state arrays, which are
+    # initialized with the current state so that lanes/bits that are not
+    # written keep their values.
+
+    nexts = sorted( tr.next_vars.items() )
+    ff_src = [ f"{n}[:] = {v}" for v, n in nexts ] + ff_src + \
+             [ f"{v}[:] = {n}" for v, n in nexts ]
+
+    lines = [ "def batch_comb():" ] + \
+            [ f"  {x}" for x in comb_src ] + [ "  pass", "" ] + \
+            [ "def batch_ff():" ] + \
+            [ f"  {x}" for x in ff_src ] + [ "  pass" ]
+
+    _globals = { 'np': np, '_u64': _u64, '_shl': _shl, '_shr': _shr,
+                 '_div': _div, '_mod': _mod, '_parity': _parity, '_sel': _sel,
+                 '_zeros': np.zeros( self.nlanes, dtype=_u64 ) }
+    _globals.update( top._batch.arrays )
+    for v, n in nexts:
+      _globals[ n ] = top._batch.arrays[ v ].copy()
+
+    filename = f"batch_sim_{id(top)}"
+    custom_exec( compile( '\n'.join(lines), filename=filename, mode='exec' ), _globals )
+    linecache.cache[ filename ] = (1, None, lines, filename)
+
+    top._batch.src  = '\n'.join( lines )
+    top._batch.comb = _globals['batch_comb']
+    top._batch.ff   = _globals['batch_ff']
+
+  #-----------------------------------------------------------------------
+  # create_sim_functions
+  #-----------------------------------------------------------------------
+
+  def create_sim_functions( self, top ):
+    comb = top._batch.comb
+    ff   = top._batch.ff
+
+    top._batch.simulated_cycles = 0
+
+    def batch_poke( signal, value, lane=None ):
+      loc = _locate( top, signal )
+      arr = top._batch.arrays[ loc.var ]
+      if is_bitstruct_class( value.__class__ ):
+        value = int( value.to_bits() )
+      if isinstance( value, (int, Bits) ):
+        value = _u64( int(value) & _mask( loc.nbits ) )
+      else:
+        value = np.asarray( value, dtype=_u64 ) & _u64( _mask( loc.nbits ) )
+
+      idx = slice(None) if lane is None else lane
+      clear = _u64( _mask(64) ^ (_mask( loc.nbits ) << loc.lo) )
+      arr[ idx ] = ( arr[ idx ] & clear ) | ( value << _u64( loc.lo ) )
+
+    def batch_peek( signal, lane=None ):
+      loc = _locate( top, signal )
+      arr = top._batch.arrays[ loc.var ]
+      values = ( arr >> _u64(loc.lo) ) & _u64( _mask( loc.nbits ) )
+      if lane is None:
+        return values
+      bits = mk_bits( loc.nbits )( int( values[ lane ] ) )
+      Type = signal._dsl.Type
+      return Type.from_bits( bits ) if is_bitstruct_class( Type ) else bits
+
+    def sim_eval_combinational():
+      comb()
+
+    def sim_tick():
+      comb()
+      ff()
+      top._batch.simulated_cycles += 1
+      comb()
+
+    def sim_cycle_count():
+      return top._batch.simulated_cycles
+
+    active_high = self.reset_active_high
+
+    def sim_reset():
+      batch_poke( top.reset, int(active_high) )
+      comb()
+      ff()
+      comb()
+      ff()
+      comb()
+      ff()
+      batch_poke( top.reset, int(not active_high) )
+      comb()
+
+    top.batch_poke = batch_poke
+    top.batch_peek = batch_peek
+    top.sim_eval_combinational = sim_eval_combinational
+    top.sim_tick = sim_tick
+    top.sim_reset = sim_reset
+    top.sim_cycle_count = sim_cycle_count
+
+#-------------------------------------------------------------------------
+# _locate
+#-------------------------------------------------------------------------
+# Return the _Loc of any signal, including sliced signals and struct
+# fields.
+
+def _locate( top, signal ):
+  if signal.is_top_level_signal():
+    var = top._batch.storage[ signal ]
+    return _Loc( var, 0, signal._dsl.Type.nbits, signal._dsl.Type )
+
+  parent = signal.get_parent_object()
+  ploc = _locate( top, parent )
+
+  if signal.is_sliced_signal():
+    sl = signal._dsl.slice
+    return _Loc( ploc.var, ploc.lo + sl.start, sl.stop - sl.start, signal._dsl.Type )
+
+  obj = _struct_fields( ploc.Type, ploc.var, ploc.lo )[ signal._dsl._my_name ]
+  for i in signal._dsl._my_indices:
+    obj = obj[i]
+  return obj
+
+#-------------------------------------------------------------------------
+# _BatchTranslator
+#-------------------------------------------------------------------------
+# Translate behavioral RTLIR of update blocks into vectorized code. Each
+# expression is translated into ( value, nbits ) where value is either a
+# Python int (known at translation time) or a piece of code that
+# evaluates to a lane array of dtype uint64.
+
+class _BatchTranslator( bir.BehavioralRTLIRNodeVisitor ):
+
+  def __init__( s, top, storage, widths ):
+    s.top       = top
+    s.storage   = storage
+    s.widths    = widths
+    s.next_vars = {} # storage variable -> next-state variable
+    s.counter   = 0
+
+  def new_var( s, prefix ):
+    s.counter += 1
+    return f"{prefix}{s.counter}"
+
+  def emit( s, line ):
+    s.src.append( "  " * s.indent + line )
+
+  #-----------------------------------------------------------------------
+  # Entry points
+  #-----------------------------------------------------------------------
+
+  def translate_upblk( s, blk, is_ff ):
+    host  = s.top.get_update_block_host_component( blk )
+    upblk = host.get_metadata( BehavioralRTLIRGenL5Pass.rtlir_upblks )[ blk ]
+
+    s.blk      = blk
+    s.is_ff    = is_ff
+    s.src      = [ f"# {blk.__name__} @ {host!r}" ]
+    s.indent   = 0
+    s.pred     = None
+    s.loopvars = {}
+    s.tmpvars  = set()
+
+    for stmt in upblk.body:
+      s.visit( stmt )
+
+    # Temporary variables are always defined before the first use
+    return s.src[:1] + [ f"_t_{x} = _zeros" for x in sorted( s.tmpvars ) ] + s.src[1:]
+
+  def translate_genblk( s, blk ):
+    top    = s.top
+    writer = top._dag.genblk_writer[ blk ]
+    s.src    = [ f"# {blk.__name__}" ]
+    s.indent = 0
+    s.pred   = None
+
+    if isinstance( writer, Const ):
+      const = writer._dsl.const
+      value = int( const.to_bits() ) if is_bitstruct_class( const.__class__ ) else int( const )
+    else:
+      value = s.read( _locate( top, writer ) )
+
+    if not isinstance( value, int ):
+      x = s.new_var( "_x" )
+      s.emit( f"{x} = {value}" )
+      value = x
+
+    for reader in top._dag.genblk_writes[ blk ]:
+      s.write( _locate( top, reader ), value, True )
+    return s.src
+
+  #-----------------------------------------------------------------------
+  # Reads and writes
+  #-----------------------------------------------------------------------
+
+  def read( s, obj ):
+    if isinstance( obj, int ):
+      return obj
+    if isinstance( obj, Bits ):
+      return int( obj )
+    if isinstance( obj, _Loc ):
+      full = s.widths[ obj.var ]
+      if obj.lo == 0 and obj.nbits == full:
+        return obj.var
+      if obj.lo == 0:
+        return f"({obj.var} & {_mask(obj.nbits)})"
+      if isinstance( obj.lo, int ) and obj.lo + obj.nbits == full:
+        return f"({obj.var} >> {obj.lo})"
+      return f"(({obj.var} >> {obj.lo}) & {_mask(obj.nbits)})"
+    if isinstance( obj, _DynList ):
+      values = ", ".join( [ str( s.read( x ) ) for x in obj.elems ] )
+      return f"_sel({obj.idx}, {values})"
+    raise TranslationError( s.blk, f"cannot read {obj} in batch simulation" )
+
+  def write( s, obj, value, blocking, pred=None ):
+    if pred is None:
+      pred = s.pred
+
+    if isinstance( obj, _DynList ):
+      for i, elem in enumerate( obj.elems ):
+        p = f"({obj.idx} == {i})" if pred is None else f"({pred} & ({obj.idx} == {i}))"
+        s.write( elem, value, blocking, p )
+      return
+
+    if not isinstance( obj, _Loc ):
+      raise TranslationError( s.blk, f"cannot write to {obj} in batch simulation" )
+
+    var = obj.var
+    if not blocking:
+      if var not in s.next_vars:
+        s.next_vars[ var ] = f"_n{var[2:]}"
+      var = s.next_vars[ var ]
+
+    m = _mask( obj.nbits )
+    if isinstance( value, int ):
+      value &= m
+
+    if obj.lo == 0 and obj.nbits == s.widths[ obj.var ]:
+      if pred is None: s.emit( f"{var}[:] = {value}" )
+      else:            s.emit( f"np.copyto({var}, {value}, where={pred})" )
+      return
+
+    if isinstance( obj.lo, int ):
+      clear = _mask(64) ^ (m << obj.lo)
+      new = f"{value << obj.lo}" if isinstance( value, int ) else f"({value} << {obj.lo})"
+    else:
+      clear = f"~_u64({m} << {obj.lo})"
+      new = f"(_u64({value}) << {obj.lo})"
+
+    if pred is None:
+      s.emit( f"{var}[:] = ({var} & {clear}) | {new}" )
+    else:
+      s.emit( f"np.copyto({var}, ({var} & {clear}) | {new}, where={pred})" )
+
+  #-----------------------------------------------------------------------
+  # Statements
+  #-----------------------------------------------------------------------
+
+  def visit_Assign( s, node ):
+    value, nbits = s.expr( node.value )
+
+    if not isinstance( value, int ) and len( node.targets ) > 1:
+      x = s.new_var( "_x" )
+      s.emit( f"{x} = {value}" )
+      value = x
+
+    for target in node.targets:
+      if isinstance( target, bir.TmpVar ):
+        name = f"_t_{target.name}"
+        s.tmpvars.add( target.name )
+        if isinstance( value, str ) and value in s.widths:
+          value = f"{value}.copy()"
+        if s.pred is None:
+          s.emit( f"{name} = {value}" )
+        else:
+          s.emit( f"{name} = np.where({s.pred}, {value}, {name})" )
+      else:
+        obj = s.obj( target )
+        # Evaluate the RHS before clearing bits of the target
+        if not isinstance( value, int ) and not ( isinstance( obj, _Loc ) and obj.lo == 0 and \
+           obj.nbits == s.widths[ obj.var ] ):
+          x = s.new_var( "_x" )
+          s.emit( f"{x} = {value}" )
+          value = x
+        s.write( obj, value, node.blocking or not s.is_ff )
+
+  def visit_If( s, node ):
+    cond, _ = s.expr( node.cond )
+
+    if isinstance( cond, int ):
+      for stmt in ( node.body if cond else node.orelse ):
+        s.visit( stmt )
+      return
+
+    c = s.new_var( "_c" )
+    s.emit( f"{c} = ({cond}) != 0" )
+    saved = s.pred
+
+    for body, p in ( ( node.body, c ), ( node.orelse, f"~{c}" ) ):
+      if not body:
+        continue
+      pred = s.new_var( "_p" )
+      s.emit( f"{pred} = {p}" if saved is None else f"{pred} = {saved} & {p}" )
+      s.emit( f"if {pred}.any():" )
+      s.indent += 1
+      s.pred = pred
+      for stmt in body:
+        s.visit( stmt )
+      s.emit( "pass" )
+      s.indent -= 1
+
+    s.pred = saved
+
+  def visit_For( s, node ):
+    start = s.static( node.start )
+    end   = s.static( node.end )
+    step  = s.static( node.step )
+    name  = node.var.name
+
+    for i in range( start, end, step ):
+      s.loopvars[ name ] = i
+      for stmt in node.body:
+        s.visit( stmt )
+    s.loopvars.pop( name, None )
+
+  #-----------------------------------------------------------------------
+  # Objects
+  #-----------------------------------------------------------------------
+
+  def static( s, node ):
+    # Slice bounds and loop bounds are not truncated to their type
+    if hasattr( node, '_value' ) and isinstance( node._value, (int, Bits) ):
+      return int( node._value )
+    # Arithmetic on loop indices, e.g. s.in_[i*8:i*8+8], is folded with
+    # Python ints instead of the (possibly narrower) inferred bitwidth
+    if isinstance( node, bir.BinOp ) and node.op.__class__ in s._constops:
+      l, r = s.static( node.left ), s.static( node.right )
+      if isinstance( node.op, ( bir.Div, bir.Mod ) ) and r == 0:
+        return 0
+      return s._constops[ node.op.__class__ ]( l, r )
+    value, _ = s.expr( node )
+    if not isinstance( value, int ):
+      raise TranslationError( s.blk, "loop bounds must be known at elaboration time" )
+    return value
+
+  def to_obj( s, x ):
+    if isinstance( x, Signal ):
+      var = s.storage[ x ]
+      return _Loc( var, 0, x._dsl.Type.nbits, x._dsl.Type )
+    if isinstance( x, Bits ):
+      return int( x )
+    return x
+
+  def obj( s, node ):
+    if isinstance( node, bir.Base ):
+      return node.base
+
+    if isinstance( node, bir.LoopVar ):
+      return s.loopvars[ node.name ]
+
+    if isinstance( node, bir.FreeVar ):
+      return s.to_obj( node.obj )
+
+    if isinstance( node, bir.Attribute ):
+      return s.attribute( s.obj( node.value ), node.attr )
+
+    if isinstance( node, bir.Index ):
+      base = s.obj( node.value )
+      idx, _ = s.expr( node.idx )
+      return s.index( base, idx )
+
+    if isinstance( node, bir.Slice ):
+      base = s.obj( node.value )
+      if node.base is not None and node.size is not None:
+        if isinstance( node.base.Type, rt.Const ):
+          lo = s.static( node.base )
+        else:
+          lo, _ = s.expr( node.base )
+        nbits = int( node.size )
+      else:
+        lo    = s.static( node.lower )
+        nbits = s.static( node.upper ) - lo
+      return s.slice( base, lo, nbits )
+
+    # Fall back to evaluating the node as an expression
+    value, _ = s.expr( node )
+    return value
+
+  def attribute( s, base, attr ):
+    if isinstance( base, _DynList ):
+      return _DynList( base.idx, [ s.attribute( x, attr ) for x in base.elems ] )
+    if isinstance( base, _Loc ):
+      return _struct_fields( base.Type, base.var, base.lo )[ attr ]
+    if isinstance( base, NamedObject ):
+      return s.to_obj( getattr( base, attr ) )
+    raise TranslationError( s.blk, f"cannot access attribute {attr} of {base}" )
+
+  def index( s, base, idx ):
+    if isinstance( base, _DynList ):
+      return _DynList( base.idx, [ s.index( x, idx ) for x in base.elems ] )
+    if isinstance( base, list ):
+      if isinstance( idx, int ):
+        return s.to_obj( base[ idx ] )
+      return _DynList( idx, [ s.to_obj( x ) for x in base ] )
+    if isinstance( base, _Loc ):
+      return _Loc( base.var, _add( base.lo, idx ), 1, mk_bits(1) )
+    raise TranslationError( s.blk, f"cannot index {base}" )
+
+  def slice( s, base, lo, nbits ):
+    if isinstance( base, _DynList ):
+      return _DynList( base.idx, [ s.slice( x, lo, nbits ) for x in base.elems ] )
+    if isinstance( base, _Loc ):
+      return _Loc( base.var, _add( base.lo, lo ), nbits, mk_bits( nbits ) )
+    raise TranslationError( s.blk, f"cannot slice {base}" )
+
+  #-----------------------------------------------------------------------
+  # Expressions
+  #-----------------------------------------------------------------------
+
+  def expr( s, node ):
+    nbits = s.nbits( node )
+
+    if hasattr( node, '_value' ) and isinstance( node._value, (int, Bits) ):
+      return int( node._value ) & _mask( nbits ), nbits
+
+    method = getattr( s, f"expr_{node.__class__.__name__}", None )
+    if method is not None:
+      return method( node, nbits )
+
+    if isinstance( node, ( bir.Base, bir.Attribute, bir.Index, bir.Slice,
+                           bir.LoopVar, bir.FreeVar ) ):
+      return s.read( s.obj( node ) ), nbits
+
+    raise TranslationError( s.blk, f"{node.__class__.__name__} is not supported in batch simulation" )
+
+  def nbits( s, node ):
+    try:
+      dtype = node.Type.get_dtype()
+    except AttributeError:
+      return 64
+    if isinstance( dtype, rdt.Bool ):
+      return 1
+    return dtype.get_length()
+
+  def expr_Number( s, node, nbits ):
+    return node.value & _mask( nbits ), nbits
+
+  def expr_TmpVar( s, node, nbits ):
+    s.tmpvars.add( node.name )
+    return f"_t_{node.name}", nbits
+
+  def expr_Concat( s, node, nbits ):
+    terms = []
+    lo = nbits
+    for x in node.values:
+      v, n = s.expr( x )
+      lo -= n
+      terms.append( (v, lo) )
+
+    if all( isinstance( v, int ) for v, _ in terms ):
+      ret = 0
+      for v, lo in terms:
+        ret |= v << lo
+      return ret, nbits
+
+    return "(" + " | ".join( [ f"_u64({v} << {lo})" if isinstance( v, int ) else
+                               f"({v} << {lo})" if lo else f"{v}"
+                               for v, lo in terms ] ) + ")", nbits
+
+  def expr_ZeroExt( s, node, nbits ):
+    v, _ = s.expr( node.value )
+    return v, nbits
+
+  def expr_SignExt( s, node, nbits ):
+    v, n = s.expr( node.value )
+    ext = _mask( nbits ) ^ _mask( n )
+    if isinstance( v, int ):
+      return ( v | ext if v >> (n-1) else v ), nbits
+    return f"np.where(({v} >> {n-1}) & 1, {v} | _u64({ext}), {v})", nbits
+
+  def expr_Truncate( s, node, nbits ):
+    v, _ = s.expr( node.value )
+    if isinstance( v, int ):
+      return v & _mask( nbits ), nbits
+    return f"({v} & {_mask(nbits)})", nbits
+
+  expr_SizeCast = expr_Truncate
+
+  def expr_Reduce( s, node, nbits ):
+    v, n = s.expr( node.value )
+    op = node.op
+    if   isinstance( op, bir.BitAnd ): return f"_u64({v} == {_mask(n)})", 1
+    elif isinstance( op, bir.BitOr  ): return f"_u64({v} != 0)", 1
+    elif isinstance( op, bir.BitXor ): return f"_parity({v})", 1
+    raise TranslationError( s.blk, f"unrecognized operator {op} for reduce method" )
+
+  def expr_StructInst( s, node, nbits ):
+    fields = list( getattr( node.struct, _FIELDS ).values() )
+    terms = []
+    lo = nbits
+    for ftype, x in zip( fields, node.values ):
+      if isinstance( ftype, list ):
+        raise TranslationError( s.blk, "list fields in struct instantiation are not supported" )
+      v, _ = s.expr( x )
+      lo -= ftype.nbits
+      terms.append( f"_u64({v} << {lo})" if isinstance( v, int ) else f"({v} << {lo})" )
+    return "(" + " | ".join( terms ) + ")", nbits
+
+  def expr_IfExp( s, node, nbits ):
+    c, _ = s.expr( node.cond )
+    # Only the taken branch of a constant condition is translated, since
+    # the other one may index out of range in an unrolled loop
+    if isinstance( c, int ):
+      return s.expr( node.body if c else node.orelse )[0], nbits
+    b, _ = s.expr( node.body )
+    o, _ = s.expr( node.orelse )
+    return f"np.where(({c}) != 0, _u64({b}), _u64({o}))", nbits
+
+  def expr_UnaryOp( s, node, nbits ):
+    v, _ = s.expr( node.operand )
+    m = _mask( nbits )
+    op = node.op
+    if isinstance( op, bir.UAdd ):
+      return v, nbits
+    if isinstance( op, bir.Invert ):
+      return f"(~_u64({v}) & {m})", nbits
+    if isinstance( op, bir.USub ):
+      return f"((_u64(0) - {v}) & {m})", nbits
+    raise TranslationError( s.blk, f"unrecognized unary operator {op}" )
+
+  _binops = {
+    bir.Add: '+', bir.Sub: '-', bir.Mult: '*',
+    bir.BitAnd: '&', bir.BitOr: '|', bir.BitXor: '^',
+  }
+
+  _cmpops = {
+    bir.Eq: '==', bir.NotEq: '!=', bir.Lt: '<', bir.LtE: '<=',
+    bir.Gt: '>', bir.GtE: '>=',
+  }
+
+  # Operations on two constants (e.g. arithmetic on an unrolled loop
+  # index) are folded so that the result stays a Python int
+
+  _constops = {
+    bir.Add: operator.add, bir.Sub: operator.sub, bir.Mult: operator.mul,
+    bir.BitAnd: operator.and_, bir.BitOr: operator.or_, bir.BitXor: operator.xor,
+    bir.ShiftLeft: operator.lshift, bir.ShiftRightLogic: operator.rshift,
+    bir.Div: operator.floordiv, bir.Mod: operator.mod,
+    bir.Eq: operator.eq, bir.NotEq: operator.ne, bir.Lt: operator.lt,
+    bir.LtE: operator.le, bir.Gt: operator.gt, bir.GtE: operator.ge,
+  }
+
+  def expr_BinOp( s, node, nbits ):
+    l, _ = s.expr( node.left )
+    r, _ = s.expr( node.right )
+    m = _mask( nbits )
+    op = node.op.__class__
+
+    if isinstance( l, int ) and isinstance( r, int ) and op in s._constops:
+      if op in ( bir.Div, bir.Mod ) and r == 0:
+        return 0, nbits
+      return s._constops[ op ]( l, r ) & m, nbits
+
+    if op in s._binops:
+      sym = s._binops[ op ]
+      # Make sure at least one operand is an array of uint64
+      if isinstance( l, int ): l = f"_u64({l})"
+      ret = f"({l} {sym} {r})"
+      if op in ( bir.Add, bir.Sub, bir.Mult ):
+        ret = f"({ret} & {m})"
+      return ret, nbits
+
+    if op is bir.ShiftLeft:
+      if isinstance( r, int ):
+        if r >= nbits:
+          return 0, nbits
+        return f"((_u64({l}) << {r}) & {m})", nbits
+      return f"_shl(_u64({l}), {r}, {nbits})", nbits
+
+    if op is bir.ShiftRightLogic:
+      if isinstance( r, int ):
+        if r >= 64:
+          return 0, nbits
+        return f"(_u64({l}) >> {r})", nbits
+      return f"_shr(_u64({l}), {r})", nbits
+
+    if op is bir.Div: return f"_div({l}, {r})", nbits
+    if op is bir.Mod: return f"_mod({l}, {r})", nbits
+
+    raise TranslationError( s.blk, f"{op.__name__} is not supported in batch simulation" )
+
+  def expr_Compare( s, node, nbits ):
+    l, _ = s.expr( node.left )
+    r, _ = s.expr( node.right )
+    if isinstance( l, int ) and isinstance( r, int ):
+      return int( s._constops[ node.op.__class__ ]( l, r ) ), 1
+    if isinstance( l, int ): l = f"_u64({l})"
+    return f"_u64({l} {s._cmpops[ node.op.__class__ ]} {r})", 1
@@ -0,0 +1 @@
+from .BatchSimPass import BatchSimPass
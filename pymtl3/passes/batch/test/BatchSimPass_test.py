@@ -0,0 +1,309 @@
+#=========================================================================
+# BatchSimPass_test.py
+#=========================================================================
+
+import random
+
+import pytest
+
+from pymtl3 import *
+from pymtl3.datatypes import is_bitstruct_class
+from pymtl3.passes.errors import UnsupportedDesignError
+from pymtl3.passes.testcases import test_cases
+
+np = pytest.importorskip("numpy")
+
+from ..BatchSimPass import BatchSimPass
+
+#-------------------------------------------------------------------------
+# Test harness
+#-------------------------------------------------------------------------
+# Simulate nlanes instances with BatchSimPass and compare every output
+# port against nlanes normal simulations driven with the same inputs.
+
+def run_lockstep( cls, args, nlanes, ncycles, seed=0xbeef ):
+  rng = random.Random( seed )
+
+  A = cls( *args )
+  A.elaborate()
+  A.apply( BatchSimPass( nlanes ) )
+  A.sim_reset()
+
+  refs = []
+  for i in range( nlanes ):
+    R = cls( *args )
+    R.elaborate()
+    R.apply( DefaultPassGroup() )
+    R.sim_reset()
+    refs.append( R )
+
+  def top_ports( cls ):
+    return sorted( A.get_all_object_filter( lambda x: isinstance( x, cls ) and
+                   x.is_top_level_signal() and x.get_host_component() is A ), key=repr )
+
+  def get_ref( R, port ):
+    return eval( repr(port), { 's': R } )
+
+  inports  = [ x for x in top_ports( InPort ) if repr(x) not in ('s.clk', 's.reset') ]
+  outports = top_ports( OutPort )
+
+  for cycle in range( ncycles ):
+    for port in inports:
+      Type   = port._dsl.Type
+      values = [ rng.getrandbits( Type.nbits ) for _ in range( nlanes ) ]
+      A.batch_poke( port, values )
+      for i, R in enumerate( refs ):
+        value = mk_bits( Type.nbits )( values[i] )
+        ref   = get_ref( R, port )
+        ref  @= Type.from_bits( value ) if is_bitstruct_class( Type ) else value
+
+    A.sim_eval_combinational()
+    for R in refs:
+      R.sim_eval_combinational()
+
+    for port in outports:
+      values = A.batch_peek( port )
+      for i, R in enumerate( refs ):
+        ref = get_ref( R, port )
+        ref = ref if isinstance( ref, Bits ) else ref.to_bits()
+        assert int( values[i] ) == int( ref ), f"lane {i} {port} cycle {cycle}"
+      assert A.batch_peek( port, lane=nlanes-1 ) == get_ref( refs[-1], port )
+
+    A.sim_tick()
+    for R in refs:
+      R.sim_tick()
+
+#-------------------------------------------------------------------------
+# Test components
+#-------------------------------------------------------------------------
+
+class Accumulator( Component ):
+  def construct( s, nbits=16 ):
+    s.in_ = InPort( nbits )
+    s.en  = InPort()
+    s.out = OutPort( nbits )
+    s.acc = Wire( nbits )
+
+    @update_ff
+    def up_acc():
+      if s.reset:
+        s.acc <<= 0
+      elif s.en:
+        s.acc <<= s.acc + s.in_
+
+    @update
+    def up_out():
+      s.out @= s.acc
+
+class Alu( Component ):
+  def construct( s ):
+    s.a   = InPort( 8 )
+    s.b   = InPort( 8 )
+    s.op  = InPort( 3 )
+    s.out = OutPort( 8 )
+    s.cmp = OutPort( 1 )
+    s.ext = OutPort( 16 )
+    s.cat = OutPort( 16 )
+    s.red = OutPort( 3 )
+
+    @update
+    def up_alu():
+      if   s.op == 0: s.out @= s.a + s.b
+      elif s.op == 1: s.out @= s.a - s.b
+      elif s.op == 2: s.out @= s.a & s.b
+      elif s.op == 3: s.out @= s.a | ~s.b
+      elif s.op == 4: s.out @= s.a << zext( s.b[0:3], 8 )
+      elif s.op == 5: s.out @= s.a >> zext( s.b[0:3], 8 )
+      elif s.op == 6: s.out @= s.a * s.b
+      else:           s.out @= s.a ^ s.b
+      s.cmp @= s.a < s.b
+      s.ext @= sext( s.a, 16 ) if s.op[0] else zext( s.b, 16 )
+      s.cat @= concat( s.b[4:8], s.a, s.op, s.a[7] )
+      s.red @= concat( reduce_and( s.a ), reduce_or( s.b ), reduce_xor( s.a ) )
+
+class RegFile( Component ):
+  def construct( s, nregs=8 ):
+    s.wen   = InPort()
+    s.waddr = InPort( clog2(nregs) )
+    s.wdata = InPort( 32 )
+    s.raddr = InPort( clog2(nregs) )
+    s.bidx  = InPort( 5 )
+    s.rdata = OutPort( 32 )
+    s.bit   = OutPort()
+    s.regs  = [ Wire( 32 ) for _ in range(nregs) ]
+
+    @update_ff
+    def up_write():
+      if s.wen:
+        s.regs[ s.waddr ] <<= s.wdata
+
+    @update
+    def up_read():
+      s.rdata @= s.regs[ s.raddr ]
+      s.bit   @= s.wdata[ s.bidx ]
+
+@bitstruct
+class Pair:
+  x: Bits8
+  y: Bits8
+
+@bitstruct
+class Point:
+  x: Bits8
+  y: Bits8
+  z: [ Bits4, Bits4 ]
+
+class PointUnit( Component ):
+  def construct( s ):
+    s.in_  = InPort( Point )
+    s.sel  = InPort()
+    s.out  = OutPort( Point )
+    s.pair = OutPort( Pair )
+    s.zdyn = OutPort( 4 )
+
+    @update
+    def up_point():
+      s.out.x    @= s.in_.y
+      s.out.y    @= s.in_.x
+      s.out.z[0] @= s.in_.z[1]
+      s.out.z[1] @= s.in_.z[0]
+      s.pair     @= Pair( s.in_.y, s.in_.x + 1 )
+      s.zdyn     @= s.in_.z[ s.sel ]
+
+class StructTop( Component ):
+  def construct( s ):
+    s.in_    = InPort( Point )
+    s.sel    = InPort()
+    s.out    = OutPort( Point )
+    s.pair   = OutPort( Pair )
+    s.zdyn   = OutPort( 4 )
+    s.x      = OutPort( 8 )
+    s.lo     = OutPort( 4 )
+    s.const  = OutPort( 8 )
+    s.mixed  = OutPort( 8 )
+
+    s.unit = PointUnit()
+    s.unit.in_ //= s.in_
+    s.unit.sel //= s.sel
+    s.out      //= s.unit.out
+    s.pair     //= s.unit.pair
+    s.zdyn     //= s.unit.zdyn
+
+    # Nets with struct fields, slices and constants
+    s.x          //= s.unit.out.x
+    s.lo         //= s.unit.out.y[0:4]
+    s.const      //= 0x5a
+    s.mixed[0:4] //= 3
+    s.mixed[4:8] //= s.in_.y[4:8]
+
+class Chain( Component ):
+  def construct( s, N=4 ):
+    s.in_ = InPort( 16 )
+    s.en  = InPort()
+    s.out = OutPort( 16 )
+    s.accs = [ Accumulator( 16 ) for _ in range(N) ]
+    for i in range(N):
+      s.accs[i].en //= s.en
+    s.accs[0].in_ //= s.in_
+    for i in range(N-1):
+      s.accs[i+1].in_ //= s.accs[i].out
+    s.out //= s.accs[-1].out
+
+class ByteInc( Component ):
+  def construct( s ):
+    s.in_ = InPort( 32 )
+    s.out = OutPort( 32 )
+
+    # i*8 is inferred as a narrow constant but must not wrap
+    @update
+    def up_inc():
+      for i in range( 4 ):
+        s.out[i*8:i*8+8] @= s.in_[i*8:i*8+8] + 1
+
+#-------------------------------------------------------------------------
+# Tests
+#-------------------------------------------------------------------------
+
+def test_accumulator():
+  run_lockstep( Accumulator, (16,), 8, 20 )
+
+def test_alu():
+  run_lockstep( Alu, (), 16, 20 )
+
+def test_regfile_dynamic_index():
+  run_lockstep( RegFile, (8,), 8, 40 )
+
+def test_structs_slices_and_const_nets():
+  run_lockstep( StructTop, (), 8, 10 )
+
+def test_hierarchy():
+  run_lockstep( Chain, (4,), 8, 20 )
+
+def test_loop_index_slice_bounds():
+  run_lockstep( ByteInc, (), 8, 10 )
+
+# Every shared test case with test vectors. Cases that the normal
+# simulator cannot run (translation-only designs, designs that take
+# arguments) have no reference and are skipped.
+
+_shared_cases = [ getattr( test_cases, x ) for x in dir( test_cases )
+                  if x.startswith( 'Case' ) and hasattr( getattr( test_cases, x ), 'TV_IN' ) ]
+
+@pytest.mark.parametrize( 'case', _shared_cases, ids=lambda x: x.__name__ )
+def test_shared_cases( case ):
+  try:
+    R = case.DUT()
+    R.elaborate()
+    R.apply( DefaultPassGroup() )
+    R.sim_reset()
+  except Exception as e:
+    pytest.skip( f"cannot simulate {case.__name__}: {e}" )
+
+  try:
+    run_lockstep( case.DUT, (), 4, 8 )
+  except UnsupportedDesignError as e:
+    pytest.skip( str(e) )
+
+def test_per_lane_poke_peek():
+  A = Accumulator( 8 )
+  A.elaborate()
+  A.apply( BatchSimPass( 4 ) )
+  A.sim_reset()
+
+  A.batch_poke( A.en, 1 )
+  A.batch_poke( A.in_, 0 )
+  A.batch_poke( A.in_, 5, lane=2 )
+  A.sim_tick()
+  A.sim_tick()
+
+  assert list( A.batch_peek( A.out ) ) == [ 0, 0, 10, 0 ]
+  assert A.batch_peek( A.out, lane=2 ) == Bits8(10)
+  assert A.sim_cycle_count() == 2
+
+def test_wide_signal_is_rejected():
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_ = InPort( 128 )
+      s.out = OutPort( 128 )
+      s.out //= s.in_
+
+  A = Top()
+  A.elaborate()
+  with pytest.raises( UnsupportedDesignError, match="s.in_" ):
+    A.apply( BatchSimPass( 4 ) )
+
+def test_method_port_is_rejected():
+
+  class Top( Component ):
+    def construct( s ):
+      s.out = OutPort( 8 )
+
+    @method_port
+    def recv( s, msg ):
+      pass
+
+  A = Top()
+  A.elaborate()
+  with pytest.raises( UnsupportedDesignError, match="s.recv" ):
+    A.apply( BatchSimPass( 4 ) )
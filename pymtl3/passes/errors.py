@@ -33,7 +33,18 @@ class InvalidPassOptionValue( Exception ):
     return super().__init__(f"\n{val} is not a valid value for option {opt}"
                             f" of pass {pas} because {msg}.")
 
+class UnsupportedDesignError( Exception ):
+  """ Raised when a pass cannot handle some object of the design. """
+  def __init__( self, obj, pas, msg ):
+    return super().__init__(f"\n{obj} is not supported by pass {pas}"
+                            f" because {msg}.")
+
 class PlaceholderConfigError( Exception ):
   """ Raised when a placeholder is incorrectly configured. """
   def __init__( self, obj, msg ):
     return super().__init__(f"Error while configuring {obj}:\n - {msg}")
+
+class MethodNotReadyError( Exception ):
+  """ Raised when a top level method stays not ready for too long. """
+  def __init__( self, port, ncycles ):
+    return super().__init__(f"{port} is still not ready after {ncycles} cycles")
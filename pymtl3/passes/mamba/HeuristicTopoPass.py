@@ -32,6 +32,11 @@ class CountBranchesLoops( ast.NodeVisitor ):
     self.visit( node )
     return self.num_br, self.only_loop_at_top
 
+  # Every branch counts as one unless we know how it behaves at runtime
+  # (see ScheduleProfile.ProfiledBranchesLoops)
+  def branch_weight( self, node ):
+    return 1
+
   def visit_FunctionDef( self, node ):
     for stmt in node.body:
       self.only_loop_at_top |= isinstance( stmt, (ast.For, ast.While) )
@@ -53,7 +58,7 @@ class CountBranchesLoops( ast.NodeVisitor ):
        node.test.value.id == 's':
       pass
     else:
-      self.num_br += 1
+      self.num_br += self.branch_weight( node )
     self.visit( node.test )
 
     for stmt in node.body:
@@ -72,7 +77,7 @@ class CountBranchesLoops( ast.NodeVisitor ):
        node.test.value.id == 's':
       pass
     else:
-      self.num_br += 1
+      self.num_br += self.branch_weight( node )
 
     self.visit( node.test )
     self.visit( node.body )
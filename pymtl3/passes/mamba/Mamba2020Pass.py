@@ -9,6 +9,7 @@
 # Date   : Feb 14, 2020
 
 import os
+import sys
 from collections import defaultdict, deque
 
 import py
@@ -23,6 +24,7 @@ from pymtl3.passes.errors import PassOrderError
 from ..sim.DynamicSchedulePass import kosaraju_scc
 from ..sim.SimpleSchedulePass import SimpleSchedulePass, dump_dag
 from .HeuristicTopoPass import CountBranchesLoops
+from .ScheduleProfile import ScheduleProfileRecorder, load_schedule_profile
 from .UnrollSimPass import UnrollSimPass
 
 # _DEBUG = True
@@ -30,6 +32,17 @@ _DEBUG = False
 
 class Mamba2020Pass( UnrollSimPass ):
 
+  # pgo is the path of a schedule profile (see ScheduleProfile). If the
+  # file exists, meta blocks are formed using the measured branchiness of
+  # the blocks. Otherwise, the first pgo_cycles ticks are traced to
+  # record the profile, which is then saved to the file.
+
+  def __init__( self, print_line_trace=True, reset_active_high=True, profile=None,
+                pgo=None, pgo_cycles=1000 ):
+    super().__init__( print_line_trace, reset_active_high, profile )
+    self.pgo        = pgo
+    self.pgo_cycles = pgo_cycles
+
   def __call__( self, top ):
     if not hasattr( top._dag, "all_constraints" ):
       raise PassOrderError( "all_constraints" )
@@ -63,6 +76,17 @@ class Mamba2020Pass( UnrollSimPass ):
       else:
         self.branchiness[ blk ], self.only_loop_at_top[ blk ] = v.enter( hostobj.get_update_block_info( blk )[-1] )
 
+    # Measured branchiness from a previous run overrides the static one.
+    # When training, the blocks have to be called one by one so that we
+    # can trace them.
+    recorder = None
+    if self.pgo is not None:
+      if os.path.exists( self.pgo ):
+        self.apply_schedule_profile( top, load_schedule_profile( self.pgo ) )
+      else:
+        recorder = ScheduleProfileRecorder( top )
+        self.profile = "pypy"
+
     self.schedule_ff( top )
 
     # Reuse simple's flip schedule
@@ -81,16 +105,66 @@ class Mamba2020Pass( UnrollSimPass ):
     self.create_sim_tick( top )
     self.create_sim_reset( top )
 
+    if recorder is not None:
+      self.create_pgo_training( top, recorder )
+
+  #-----------------------------------------------------------------------
+  # Profile-guided scheduling
+  #-----------------------------------------------------------------------
+
+  def apply_schedule_profile( self, top, profile ):
+    blocks = profile[ 'blocks' ]
+    for blk in top.get_all_update_blocks():
+      if blk in top._dag.blk_greenlet_mapping:
+        continue
+      host = top.get_update_block_host_component( blk )
+      data = blocks.get( f"top{repr(host)[1:]}.{blk.__name__}" )
+      if data is not None:
+        self.branchiness[ blk ] = data[ 'branchiness' ]
+
+  # Trace the first pgo_cycles ticks and save the profile. The profile
+  # can also be saved earlier with top.sim_save_schedule_profile().
+
+  def create_pgo_training( self, top, recorder ):
+    path    = self.pgo
+    ncycles = self.pgo_cycles
+    tick    = top.sim_tick
+    tracer  = recorder.gen_tracer()
+
+    def sim_save_schedule_profile():
+      top.sim_tick = tick
+      recorder.dump( path )
+
+    def sim_tick():
+      prev = sys.gettrace()
+      sys.settrace( tracer )
+      try:
+        tick()
+      finally:
+        sys.settrace( prev )
+
+      recorder.cycles += 1
+      if recorder.cycles >= ncycles:
+        sim_save_schedule_profile()
+
+    top.sim_tick = sim_tick
+    top.sim_save_schedule_profile = sim_save_schedule_profile
+
   #-----------------------------------------------------------------------
   # compile_meta_block
   #-----------------------------------------------------------------------
-  # Util function to compile and trace-break a list of update blocks
+  # Util function to compile and trace-break a list of update blocks.
+  # For CPython there are no traces to break, so we inline the blocks
+  # into a single specialized function instead.
 
-  def compile_meta_block( self, blocks ):
+  def compile_meta_block( self, top, blocks ):
 
     meta_id = self.meta_block_id
     self.meta_block_id += 1
 
+    if self.profile == "cpython":
+      return self.gen_schedule_function( top, blocks, f"meta_block{meta_id}" )
+
     # Create custom global dict for all blocks inside the meta block
     _globals = { f"blk{i}": b for i, b in enumerate( blocks ) }
 
@@ -163,12 +237,12 @@ class Mamba2020Pass( UnrollSimPass ):
         cur_count += 1
 
         if cur_br >= branchiness_factor or cur_count >= branchy_block_factor:
-          schedule.append( self.compile_meta_block( cur_meta ) )
+          schedule.append( self.compile_meta_block( top, cur_meta ) )
           cur_br = cur_count = 0
           cur_meta = []
 
     if cur_meta:
-      schedule.append( self.compile_meta_block( cur_meta ) )
+      schedule.append( self.compile_meta_block( top, cur_meta ) )
 
   #-----------------------------------------------------------------------
   # schedule_intra_cycle
@@ -359,8 +433,15 @@ generated_block = wrapped_SCC_{0}
       _globals = { 's': top, 'UpblkCyclicError': UpblkCyclicError }
       blk_srcs = []
 
+      # CPython doesn't trace, so we simply inline the whole SCC into the
+      # loop body
+      if self.profile == "cpython":
+        b = self.compile_meta_block( top, tmp_schedule )
+        blk_srcs = [ f"{b.__name__}()" ]
+        _globals[ b.__name__ ] = b
+
       # If there is only 10 blocks, we directly unroll it
-      if len(tmp_schedule) < 10:
+      elif len(tmp_schedule) < 10:
         blk_srcs = []
         for i, b in enumerate(tmp_schedule):
           blk_srcs.append( f"blk{i}() # [br {self.branchiness[b]}, loop {int(self.only_loop_at_top[b])}] {b.__name__}" )
@@ -421,7 +502,7 @@ generated_block = wrapped_SCC_{0}
             # _globals[ f"blk_of_last_meta{i}" ] = b
 
           for i, meta in enumerate( scc_schedule ):
-            b = self.compile_meta_block( meta )
+            b = self.compile_meta_block( top, meta )
             blk_srcs.append( f"{b.__name__}()" )
             _globals[ b.__name__ ] = b
 
@@ -577,4 +658,4 @@ generated_block = wrapped_SCC_{0}
         if _DEBUG: print( f"blk{i}() # [br {self.branchiness[b]}, loop {int(self.only_loop_at_top[b])}] {b.__name__}" )
     else:
       for i, meta in enumerate( schedule ):
-        top._sched.update_schedule.append( self.compile_meta_block( meta ) )
+        top._sched.update_schedule.append( self.compile_meta_block( top, meta ) )
@@ -11,10 +11,11 @@ from .UnrollSimPass import UnrollSimPass
 
 
 class UnrollSim( BasePass ):
-  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True ):
+  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True, profile=None ):
     s.waveform = waveform
     s.print_line_trace = print_line_trace
     s.reset_active_high = reset_active_high
+    s.profile = profile
 
   def __call__( s, top ):
     top.elaborate()
@@ -22,26 +23,33 @@ class UnrollSim( BasePass ):
     WrapGreenletPass()( top )
     SimpleSchedulePass()( top )
     UnrollSimPass(print_line_trace=s.print_line_trace,
-                  reset_active_high=s.reset_active_high)( top )
+                  reset_active_high=s.reset_active_high,
+                  profile=s.profile)( top )
 
 class HeuTopoUnrollSim( BasePass ):
-  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True ):
+  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True, profile=None ):
     s.waveform = waveform
     s.print_line_trace = print_line_trace
     s.reset_active_high = reset_active_high
+    s.profile = profile
 
   def __call__( s, top ):
     top.elaborate()
     GenDAGPass()( top )
     WrapGreenletPass()( top )
     HeuristicTopoPass(print_line_trace=s.print_line_trace,
-                      reset_active_high=s.reset_active_high)( top )
+                      reset_active_high=s.reset_active_high,
+                      profile=s.profile)( top )
 
 class Mamba2020( BasePass ):
-  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True ):
+  def __init__( s, *, waveform=None, print_line_trace=True, reset_active_high=True, profile=None,
+                pgo=None, pgo_cycles=1000 ):
     s.waveform = waveform
     s.print_line_trace = print_line_trace
     s.reset_active_high = reset_active_high
+    s.profile = profile
+    s.pgo = pgo
+    s.pgo_cycles = pgo_cycles
 
   def __call__( s, top ):
     top.elaborate()
@@ -51,4 +59,7 @@ class Mamba2020( BasePass ):
       CLLineTracePass()( top )
       LineTraceParamPass()( top )
     Mamba2020Pass(print_line_trace=s.print_line_trace,
-                  reset_active_high=s.reset_active_high)( top )
+                  reset_active_high=s.reset_active_high,
+                  profile=s.profile,
+                  pgo=s.pgo,
+                  pgo_cycles=s.pgo_cycles)( top )
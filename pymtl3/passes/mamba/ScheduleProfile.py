@@ -0,0 +1,183 @@
+"""
+========================================================================
+ScheduleProfile.py
+========================================================================
+Record how update blocks behave at runtime so that Mamba2020Pass can
+group them into meta blocks by measured rather than static branchiness.
+
+During a short training run we trace every update block with
+sys.settrace to count its calls, measure its time and count how many
+times each line is executed. From the line counts we know how often
+every if statement is reached and how often its body is entered. A
+branch that almost always goes the same way doesn't break a trace, so
+its weight is 2*min(p, 1-p) where p is the fraction of executions that
+enter the body, scaled by how many times per call the branch is reached.
+A branch that is never reached has zero weight. An if expression or an
+if statement whose body is on the same line as the test can't be told
+apart by line counts and weighs one per call in which it is reached.
+
+The profile is a JSON file keyed by the full name of each block (e.g.,
+top.inners[0].up) so that later runs of the same design can reuse it.
+Blocks that are not in the profile keep their static branchiness.
+"""
+import ast
+import json
+import sys
+import time
+from collections import defaultdict
+
+from pymtl3.dsl.NamedObject import NamedObject
+
+from .HeuristicTopoPass import CountBranchesLoops
+
+
+class ProfiledBranchesLoops( CountBranchesLoops ):
+
+  def __init__( self, lines, offset, calls ):
+    self.lines  = lines
+    self.offset = offset
+    self.calls  = calls
+
+  def branch_weight( self, node ):
+    if not self.calls:
+      return 0
+
+    lines = self.lines
+    test  = node.lineno + self.offset
+    reach = lines.get( test, 0 )
+    if not reach:
+      return 0
+
+    if isinstance( node, ast.If ):
+      body = node.body[0].lineno + self.offset
+      if body != test:
+        # A loop at the beginning of the body executes its first line more
+        # than once
+        taken = min( lines.get( body, 0 ), reach )
+        return 2.0 * min( taken, reach - taken ) / self.calls
+
+    return min( reach, self.calls ) / self.calls
+
+class ScheduleProfileEntry:
+  __slots__ = ( 'name', 'blk', 'calls', 'time' )
+
+  def __init__( s, name, blk ):
+    s.name  = name
+    s.blk   = blk
+    s.calls = 0
+    s.time  = 0.0
+
+#-------------------------------------------------------------------------
+# ScheduleProfileRecorder
+#-------------------------------------------------------------------------
+# Blocks of different instances of the same component class share the
+# same code object. We tell them apart by the host object that the frame
+# refers to through its closure variable (usually "s"), and aggregate the
+# line counts per code object.
+
+class ScheduleProfileRecorder:
+
+  def __init__( s, top ):
+    s.top     = top
+    s.entries = []
+    s.cycles  = 0
+    s.lines   = defaultdict( lambda: defaultdict(int) )
+
+    code_insts = defaultdict(dict)
+    code_names = {}
+
+    greenlet_blks = getattr( top._dag, 'blk_greenlet_mapping', {} )
+
+    for blk in sorted( top.get_all_update_blocks(), key=lambda x: x.__name__ ):
+      if blk in greenlet_blks:
+        continue
+
+      host  = top.get_update_block_host_component( blk )
+      entry = ScheduleProfileEntry( f"top{repr(host)[1:]}.{blk.__name__}", blk )
+      s.entries.append( entry )
+
+      code = blk.__code__
+      inst = None
+      for name, cell in zip( code.co_freevars, blk.__closure__ or () ):
+        try:
+          value = cell.cell_contents
+        except ValueError: # empty cell
+          continue
+        if isinstance( value, NamedObject ):
+          code_names[ code ] = name
+          inst = value
+          break
+      code_insts[ code ][ id(inst) ] = entry
+
+    # Map each code object to its entry, or to the name of the closure
+    # variable and the entries of all instances
+    s.code_entries = {}
+    for code, insts in code_insts.items():
+      if len(insts) == 1 or code not in code_names:
+        s.code_entries[ code ] = next( iter( insts.values() ) )
+      else:
+        s.code_entries[ code ] = ( code_names[ code ], insts )
+
+  def gen_tracer( s ):
+    code_entries = s.code_entries
+    all_lines    = s.lines
+    perf_counter = time.perf_counter
+
+    def tracer( frame, event, arg ):
+      entry = code_entries.get( frame.f_code )
+      if entry is None:
+        return None
+
+      if entry.__class__ is tuple:
+        name, insts = entry
+        entry = insts.get( id( frame.f_locals.get( name ) ) )
+        if entry is None:
+          return None
+
+      entry.calls += 1
+      lines = all_lines[ frame.f_code ]
+      t0    = perf_counter()
+
+      def local_tracer( frame, event, arg ):
+        if event == 'line':
+          lines[ frame.f_lineno ] += 1
+        elif event == 'return':
+          entry.time += perf_counter() - t0
+        return local_tracer
+
+      return local_tracer
+
+    return tracer
+
+  def gen_profile( s ):
+    top = s.top
+
+    code_calls = defaultdict(int)
+    for entry in s.entries:
+      code_calls[ entry.blk.__code__ ] += entry.calls
+
+    blocks = {}
+    for entry in s.entries:
+      blk  = entry.blk
+      host = top.get_update_block_host_component( blk )
+      info = host.get_update_block_info( blk )
+      code = blk.__code__
+
+      v = ProfiledBranchesLoops( s.lines.get( code, {} ), info[2] - 1, code_calls[ code ] )
+      branchiness, _ = v.enter( info[-1] )
+
+      blocks[ entry.name ] = {
+        'calls'      : entry.calls,
+        'time'       : entry.time,
+        'branchiness': round( branchiness, 3 ),
+      }
+
+    return { 'cycles': s.cycles, 'blocks': blocks }
+
+  def dump( s, path ):
+    with open( path, 'w' ) as f:
+      json.dump( s.gen_profile(), f, indent=2, sort_keys=True )
+
+def load_schedule_profile( path ):
+  with open( path ) as f:
+    return json.load( f )
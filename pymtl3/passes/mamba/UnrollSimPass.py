@@ -4,21 +4,48 @@ UnrollTickPass.py
 ========================================================================
 Generate an unrolled tick function
 
+The generated code can be tuned for either PyPy or CPython:
+- "pypy" calls every block from the unrolled function and relies on the
+  tracing JIT to inline them, breaking the traces at meta blocks.
+- "cpython" inlines the bodies of the blocks into straight-line
+  functions (see FusedTickPass) and resolves the attribute chains that
+  lead to components at compile time, since CPython pays for every call
+  and attribute lookup.
+By default the profile matches the running interpreter.
+
 Author : Shunning Jiang
 Date   : Dec 26, 2018
 """
+import sys
 
 import py
 
 from pymtl3.dsl.Connectable import MethodPort
 from pymtl3.passes.BasePass import BasePass
-from pymtl3.passes.errors import PassOrderError
+from pymtl3.passes.errors import InvalidPassOptionValue, PassOrderError
 
+from ..sim.FusedTickPass import FusedTickPass
 from ..sim.PrepareSimPass import PrepareSimPass
 
 
 class UnrollSimPass( PrepareSimPass ):
 
+  def __init__( self, print_line_trace=True, reset_active_high=True, profile=None ):
+    super().__init__( print_line_trace, reset_active_high )
+
+    if profile is None:
+      profile = "pypy" if sys.implementation.name == "pypy" else "cpython"
+    if profile not in ( "pypy", "cpython" ):
+      raise InvalidPassOptionValue( "profile", profile, self.__class__.__name__,
+                                    "it must be 'pypy' or 'cpython'" )
+    self.profile = profile
+
+  def gen_schedule_function( self, top, schedule, name ):
+    if self.profile == "cpython":
+      fused = FusedTickPass( self.print_line_trace, self.reset_active_high )
+      return fused.gen_fused_function( top, schedule, name, fold_chains=True )
+    return self.gen_tick_function( schedule )
+
   @staticmethod
   def gen_tick_function( funclist ):
 
@@ -47,7 +74,7 @@ def compile_unroll( schedule ):
     method_ports = top.get_all_object_filter( lambda x: isinstance( x, MethodPort ) )
 
     if len(method_ports) == 0: # Pure RTL design, add eval_combinational
-      sim_eval_combinational = self.gen_tick_function( top._sched.update_schedule )
+      sim_eval_combinational = self.gen_schedule_function( top, top._sched.update_schedule, 'unrolled_eval_comb' )
     else:
       def sim_eval_combinational():
         raise NotImplementedError(f"top is not a pure RTL design. {'top'+repr(list(method_ports)[0])[1:]} is a method port.")
@@ -66,4 +93,4 @@ def compile_unroll( schedule ):
     final_schedule += self.collect_ff_funcs( top )
     final_schedule += top._sched.update_schedule
     final_schedule.append( top._sim.check_top_level_inports )
-    top.sim_tick = self.gen_tick_function( final_schedule )
+    top.sim_tick = self.gen_schedule_function( top, final_schedule, 'unrolled_tick' )
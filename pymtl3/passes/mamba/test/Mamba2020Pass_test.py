@@ -1,7 +1,15 @@
-from pymtl3.datatypes import Bits32
+import json
+
+import pytest
+
+from pymtl3.datatypes import Bits8, Bits32
 from pymtl3.dsl import *
 from pymtl3.dsl.errors import UpblkCyclicError
+from pymtl3.passes.errors import InvalidPassOptionValue
+from pymtl3.passes.sim.GenDAGPass import GenDAGPass
+from pymtl3.passes.sim.WrapGreenletPass import WrapGreenletPass
 
+from ..Mamba2020Pass import Mamba2020Pass
 from ..PassGroups import Mamba2020
 
 
@@ -143,3 +151,129 @@ def test_update_once():
     return
 
   raise Exception("Should've thrown UpblkCyclicError")
+
+def test_profiles():
+
+  class Inner(Component):
+    def construct( s ):
+      s.in_ = InPort(Bits8)
+      s.out = OutPort(Bits8)
+      s.a   = Wire(Bits8)
+      s.b   = OutPort(Bits8)
+
+      # A combinational loop that converges
+      @update
+      def up_a():
+        s.a @= s.in_ | ( s.b & 1 )
+
+      @update
+      def up_b():
+        s.b @= s.a >> 1
+
+      @update_ff
+      def up_reg():
+        s.out <<= s.a + s.b
+
+  class Top(Component):
+    def construct( s ):
+      s.in_    = InPort(Bits8)
+      s.inners = [ Inner() for _ in range(4) ]
+      s.out    = OutPort(Bits8)
+
+      s.inners[0].in_ //= s.in_
+      for i in range(3):
+        s.inners[i].out //= s.inners[i+1].in_
+
+      @update
+      def up_out():
+        s.out @= s.inners[3].out + s.inners[0].b
+
+  def run( profile ):
+    A = Top()
+    A.apply( Mamba2020( print_line_trace=False, profile=profile ) )
+    A.sim_reset()
+    trace = []
+    for i in range(20):
+      A.in_ @= i * 13
+      A.sim_tick()
+      trace.append( A.out.clone() )
+    return A, trace
+
+  A, trace_a = run( 'pypy' )
+  B, trace_b = run( 'cpython' )
+  assert trace_a == trace_b
+
+  # The blocks are inlined and s.inners[0] is resolved at compile time
+  src = B.sim_tick.src
+  assert "# up_out @ s" in src
+  assert "inners[" not in src
+
+def test_invalid_profile():
+  with pytest.raises( InvalidPassOptionValue ):
+    Mamba2020Pass( profile='jython' )
+
+def test_profile_guided( tmp_path ):
+
+  class Top(Component):
+    def construct( s ):
+      s.in_ = InPort(Bits8)
+      s.out = OutPort(Bits8)
+      s.a   = Wire(Bits8)
+      s.b   = Wire(Bits8)
+
+      # Never taken
+      @update
+      def up_biased():
+        s.a @= s.in_
+        if s.in_ == 0xff:
+          s.a @= 0
+        if s.in_ == 0xfe:
+          s.a @= 1
+
+      # Taken every other cycle
+      @update
+      def up_random():
+        if s.in_[0]:
+          s.b @= s.a + 1
+        else:
+          s.b @= s.a - 1
+
+      @update_ff
+      def up_reg():
+        s.out <<= s.b
+
+  def run( pgo ):
+    A = Top()
+    A.elaborate()
+    A.apply( GenDAGPass() )
+    A.apply( WrapGreenletPass() )
+    mamba = Mamba2020Pass( print_line_trace=False, pgo=pgo, pgo_cycles=20 )
+    A.apply( mamba )
+    A.sim_reset()
+    trace = []
+    for i in range(30):
+      A.in_ @= i
+      A.sim_tick()
+      trace.append( A.out.clone() )
+    blks = { x.__name__: x for x in A.get_all_update_blocks() }
+    return blks, mamba, trace
+
+  path = str( tmp_path / "schedule.json" )
+
+  # The first run traces 20 ticks and saves the profile
+  blks, mamba_a, trace_a = run( path )
+  assert mamba_a.branchiness[ blks['up_biased'] ] == 2
+
+  with open( path ) as f:
+    profile = json.load( f )
+  assert profile['cycles'] == 20
+  # Update blocks of a pure RTL design are executed twice per tick
+  assert profile['blocks']['top.up_biased']['calls'] == 40
+  assert profile['blocks']['top.up_biased']['branchiness'] == 0
+  assert profile['blocks']['top.up_random']['branchiness'] == 1
+
+  # The second run schedules with the measured branchiness
+  blks, mamba_b, trace_b = run( path )
+  assert mamba_b.branchiness[ blks['up_biased'] ] == 0
+  assert mamba_b.branchiness[ blks['up_random'] ] == 1
+  assert trace_a == trace_b
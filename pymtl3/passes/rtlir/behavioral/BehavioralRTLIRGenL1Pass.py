@@ -21,6 +21,7 @@ from pymtl3.datatypes import (
     trunc,
     zext,
 )
+from pymtl3.dsl.AstHelper import bits_int_methods
 from pymtl3.passes.rtlir.errors import PyMTLSyntaxError
 from pymtl3.passes.rtlir.RTLIRPass import RTLIRPass
 from pymtl3.passes.rtlir.rtype.RTLIRType import RTLIRGetter
@@ -105,10 +106,36 @@ class BehavioralRTLIRGeneratorL1( ast.NodeVisitor ):
         pass
 
     s.const_extractor = ConstantExtractor( s.blk, s.globals, s.closure )
+    s.int_call_ok = s.find_int_call_operands( ast )
     ret = s.visit( ast )
     ret.component = s.component
     return ret
 
+  # x.bit(i) and x.uint_slice(lo, hi) return an int in simulation but
+  # translate to Bits, so they are only accepted where the two behave the
+  # same: as an operand of a comparison, as an index or slice bound, as
+  # the condition of an if, or as the whole right-hand side of an
+  # assignment. Return the ids of these operand nodes.
+
+  def find_int_call_operands( s, tree ):
+    ret = set()
+    for node in ast.walk( tree ):
+      if isinstance( node, ast.Compare ):
+        operands = [ node.left ] + node.comparators
+      elif isinstance( node, ast.Subscript ):
+        sl = node.slice
+        if isinstance( sl, ast.Index ):
+          sl = sl.value
+        operands = [ sl.lower, sl.upper ] if isinstance( sl, ast.Slice ) else [ sl ]
+      elif isinstance( node, ( ast.If, ast.IfExp ) ):
+        operands = [ node.test ]
+      elif isinstance( node, ( ast.Assign, ast.AugAssign ) ):
+        operands = [ node.value ]
+      else:
+        continue
+      ret.update( id(x) for x in operands )
+    return ret
+
   def handle_constant( s, node, obj ):
     if isinstance( obj, int ):
       return bir.Number( obj )
@@ -126,6 +153,10 @@ class BehavioralRTLIRGeneratorL1( ast.NodeVisitor ):
     if node.keywords:
       raise PyMTLSyntaxError( s.blk, node, 'keyword argument is not supported!')
 
+    # x.bit(i) and x.uint_slice(lo, hi) become Bits.bit and Bits.uint_slice
+    if isinstance( node.func, ast.Attribute ) and node.func.attr in bits_int_methods:
+      return getattr( Bits, node.func.attr )
+
     obj = s.const_extractor.enter( node.func )
     if obj is not None:
       return obj
@@ -224,7 +255,8 @@ class BehavioralRTLIRGeneratorL1( ast.NodeVisitor ):
     # 3. zext(), sext()
     # TODO: support the following
     # 4. reduce_and(), reduce_or(), reduce_xor()
-    # 5. Real function call: not supported yet
+    # 5. x.bit(i) and x.uint_slice(lo, hi), which are x[i] and x[lo:hi]
+    # 6. Real function call: not supported yet
 
     # Deal with Bits type cast
     if isinstance(obj, type) and issubclass( obj, Bits ):
@@ -304,6 +336,26 @@ class BehavioralRTLIRGeneratorL1( ast.NodeVisitor ):
 
       ret = bir.Reduce( op, s.visit( node.args[0] ) )
 
+    # Bits methods that return an int field
+    elif obj in ( Bits.bit, Bits.uint_slice ) and id(node) not in s.int_call_ok:
+      raise PyMTLSyntaxError( s.blk, node,
+        f'{obj.__name__}() returns an int in simulation but Bits in translation, so it can '
+        f'only be used as a comparison operand, an index, an if condition or the right-hand '
+        f'side of an assignment!' )
+
+    elif obj is Bits.bit:
+      if num_args != 1:
+        raise PyMTLSyntaxError( s.blk, node,
+          'exactly one argument should be given to bit!' )
+      ret = bir.Index( s.visit( node.func.value ), s.visit( node.args[0] ) )
+
+    elif obj is Bits.uint_slice:
+      if num_args != 2:
+        raise PyMTLSyntaxError( s.blk, node,
+          'exactly two arguments should be given to uint_slice!' )
+      lower, upper = [ s.visit( x ) for x in node.args ]
+      ret = bir.Slice( s.visit( node.func.value ), lower, upper )
+
     else:
       # Only Bits class instantiation is supported at L1
       raise PyMTLSyntaxError( s.blk, node, f'Unrecognized method call {obj.__name__}!' )
@@ -86,6 +86,7 @@ from pymtl3.passes.testcases import (
     CaseTryExceptComp,
     CaseTryFinallyComp,
     CaseTupleComp,
+    CaseUintSliceOneArgComp,
     CaseUnrecognizedFuncComp,
     CaseUntypedTmpComp,
     CaseUpblkArgComp,
@@ -333,6 +334,10 @@ def test_L1_call_sext_num_args( do_test ):
   with expected_failure( PyMTLSyntaxError, "exactly two arguments" ):
     do_test( CaseSextTwoArgsComp )
 
+def test_L1_call_uint_slice_num_args( do_test ):
+  with expected_failure( PyMTLSyntaxError, "exactly two arguments" ):
+    do_test( CaseUintSliceOneArgComp )
+
 def test_L1_call_unrecognized( do_test ):
   with expected_failure( PyMTLSyntaxError, "function is not found" ):
     do_test( CaseUnrecognizedFuncComp )
@@ -24,6 +24,8 @@ from pymtl3.passes.testcases import (
     CaseAddComponentComp,
     CaseAddStructBits1Comp,
     CaseAndStructComp,
+    CaseBitInvertComp,
+    CaseBitsIntFieldOperandsComp,
     CaseComponentEndRangeComp,
     CaseComponentIfCondComp,
     CaseComponentIfExpBodyComp,
@@ -35,6 +37,7 @@ from pymtl3.passes.testcases import (
     CaseExplicitBoolComp,
     CaseForLoopElseComp,
     CaseFuncCallAfterInComp,
+    CaseInvComponentComp,
     CaseInvalidBreakComp,
     CaseInvalidContinueComp,
     CaseInvalidDivComp,
@@ -42,7 +45,6 @@ from pymtl3.passes.testcases import (
     CaseInvalidIsComp,
     CaseInvalidIsNotComp,
     CaseInvalidNotInComp,
-    CaseInvComponentComp,
     CaseLambdaConnectComp,
     CaseLambdaConnectWithListComp,
     CaseMultiOpComparisonComp,
@@ -55,6 +57,7 @@ from pymtl3.passes.testcases import (
     CaseStructIfExpCondComp,
     CaseTmpVarUsedBeforeAssignmentComp,
     CaseTooManyArgsToRangeComp,
+    CaseUintSliceArithComp,
     CaseVariableStepRangeComp,
     CaseZeroStepRangeComp,
 )
@@ -96,6 +99,9 @@ def test_L2_lambda_connect_with_list( do_test ):
         ) ] ) }
   do_test( a )
 
+def test_L2_bits_int_field_operands( do_test ):
+  do_test( CaseBitsIntFieldOperandsComp )
+
 #-------------------------------------------------------------------------
 # PyMTL type errors
 #-------------------------------------------------------------------------
@@ -232,6 +238,14 @@ def test_L2_compare_terms( do_test ):
   with expected_failure( PyMTLSyntaxError, "Comparison can only have 2 operands" ):
     do_test( CaseMultiOpComparisonComp )
 
+def test_L2_bit_as_unary_operand( do_test ):
+  with expected_failure( PyMTLSyntaxError, "bit() returns an int in simulation" ):
+    do_test( CaseBitInvertComp )
+
+def test_L2_uint_slice_as_binop_operand( do_test ):
+  with expected_failure( PyMTLSyntaxError, "uint_slice() returns an int in simulation" ):
+    do_test( CaseUintSliceArithComp )
+
 #-------------------------------------------------------------------------
 # PyMTL syntax errors for unsupported Python syntax
 #-------------------------------------------------------------------------
@@ -0,0 +1,439 @@
+"""
+========================================================================
+ActivityDrivenSchedulePass.py
+========================================================================
+An activity-driven (change-sensitive) alternative to the static
+schedule produced by DynamicSchedulePass. We still compute the same
+topological order of update blocks, but instead of calling every block
+in every cycle, a block is only re-executed when at least one of the
+signals it reads has changed since the last time it ran.
+"""
+import linecache
+from collections import defaultdict
+from copy import deepcopy
+
+from pymtl3.datatypes import Bits, is_bitstruct_inst
+from pymtl3.dsl import MethodPort
+from pymtl3.dsl.Connectable import Const, Signal
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.extra.pypy import custom_exec
+
+from .DynamicSchedulePass import DynamicSchedulePass
+from .PrepareSimPass import _may_write_python_state, _rebound_free_vars
+
+# Python objects that an update block may read from "s." without
+# carrying any simulation state. Everything else, e.g. a plain Python
+# list/dict kept in the component, may change behind the scheduler's
+# back and the block has to be executed every cycle.
+
+_STATELESS_TYPES = ( int, bool, float, str, bytes, tuple, frozenset, type, type(None), Bits )
+
+class ActivityDrivenSchedulePass( DynamicSchedulePass ):
+
+  def __init__( self, static_fallback=False, dirty_flip=False, skip_clean_ff=False ):
+    super().__init__( dirty_flip )
+    self.static_fallback = static_fallback
+    self.skip_clean_ff   = skip_clean_ff
+
+  def __call__( self, top ):
+    super().__call__( top )
+
+    if self.skip_clean_ff and top._sched.activity_driven:
+      ff_blks = set( top.get_all_update_ff() )
+      schedule_ff = top._sched.schedule_ff
+      top._sched.schedule_ff = [ x for x in schedule_ff if x not in ff_blks ] + \
+                               [ self.gen_ff_gate( top, [ x for x in schedule_ff if x in ff_blks ] ) ]
+
+  def schedule_intra_cycle( self, top ):
+    super().schedule_intra_cycle( top )
+
+    top._sched.static_update_schedule = top._sched.update_schedule
+    top._sched.activity_driven = False
+
+    if self.static_fallback:
+      return
+
+    # Method calls and update_once blocks can change Python-level state
+    # that we cannot observe, so we only enable change-sensitive
+    # scheduling for pure RTL designs.
+    if top.get_all_object_filter( lambda x: isinstance( x, MethodPort ) ) or \
+       top.get_all_update_once():
+      return
+
+    top._sched.activity_driven = True
+    top._sched.update_schedule = [ self.gen_activity_tick( top, top._sched.update_schedule ) ]
+
+  #-----------------------------------------------------------------------
+  # collect_blk_rw
+  #-----------------------------------------------------------------------
+  # Return ( tracked, reads, writes ) for each block in the static
+  # schedule. Reads/writes are top-level signals. An untracked block is
+  # executed every cycle, but we still propagate its writes.
+
+  @staticmethod
+  def collect_blk_rw( top, schedule ):
+    upblk_reads, upblk_writes, upblk_calls = top.get_all_upblk_metadata()
+    genblk_reads, genblk_writes = top._dag.genblk_reads, top._dag.genblk_writes
+    scc_blocks = getattr( top._sched, "scc_blocks", {} )
+    rebound_cells, _ = _rebound_free_vars( top )
+
+    def to_top_level( objs ):
+      ret = set()
+      for x in objs:
+        if not isinstance( x, Signal ):
+          return None
+        ret.add( x.get_top_level_signal() )
+      return ret
+
+    def blk_rw( blk ):
+      if blk in top._dag.genblks:
+        return True, to_top_level( genblk_reads.get( blk, [] ) ), \
+                     to_top_level( genblk_writes[ blk ] )
+
+      writes = to_top_level( upblk_writes[ blk ] )
+      if upblk_calls[ blk ]:
+        return False, None, writes
+
+      reads = to_top_level( upblk_reads[ blk ] )
+      if reads is None or not _reads_only_signals( top, blk ) or \
+         not _closure_is_stateless( blk, rebound_cells ):
+        return False, None, writes
+      return True, reads, writes
+
+    ret = []
+    for blk in schedule:
+      if blk in scc_blocks:
+        # An SCC block iterates internally until its values converge, so
+        # we always execute it and only track what its members write.
+        writes = set()
+        for x in scc_blocks[ blk ]:
+          _, _, w = blk_rw( x )
+          if w is None:
+            writes = None
+            break
+          writes |= w
+        ret.append( (False, None, writes) )
+      else:
+        ret.append( blk_rw( blk ) )
+    return ret
+
+  #-----------------------------------------------------------------------
+  # gen_activity_tick
+  #-----------------------------------------------------------------------
+  # We generate a single function that looks like the following:
+  #
+  # def activity_tick():
+  #   nonlocal t0, t1, d0, d1
+  #   if v0._uint != t0: # signal not written by any combinational block
+  #     t0 = v0._uint
+  #     d0 = True
+  #   if d0:
+  #     d0 = False
+  #     blk0()
+  #     if v1._uint != t1:
+  #       t1 = v1._uint
+  #       d1 = True
+  #   if d1:
+  #     d1 = False
+  #     blk1()
+  #
+  # The values of signals are swapped in by lock_in_simulation, which
+  # happens after all scheduling passes, so we compile the function when
+  # it is called for the first time.
+
+  def gen_activity_tick( self, top, schedule ):
+    blk_rw = self.collect_blk_rw( top, schedule )
+
+    def compile_activity_tick():
+      mapping = top._sim.signal_object_mapping
+
+      # Signals in the same net share the same value object, so we
+      # identify every variable with the id of its value object
+
+      value_ids   = {}
+      values      = []
+      signal_vid  = {}
+
+      def get_vid( signal ):
+        if signal in signal_vid:
+          return signal_vid[ signal ]
+        value = mapping[ signal ][-1]
+        vid = value_ids.get( id(value) )
+        if vid is None:
+          vid = value_ids[ id(value) ] = len(values)
+          values.append( value )
+        signal_vid[ signal ] = vid
+        return vid
+
+      readers = defaultdict(list) # vid -> list of block ids
+      written = set()
+
+      for i, (tracked, reads, writes) in enumerate( blk_rw ):
+        read_vids = set()
+        if tracked:
+          for x in reads:
+            vid = get_vid( x )
+            readers[ vid ].append( i )
+            read_vids.add( vid )
+
+        # A write that aliases one of the block's own reads is not
+        # considered as produced by this block. For example, the net
+        # block of a net with only top-level signals "writes" the same
+        # value object that it reads.
+        if writes:
+          for x in writes:
+            vid = get_vid( x )
+            if vid not in read_vids:
+              written.add( vid )
+
+      def gen_check( vid, indent ):
+        value = values[ vid ]
+        if isinstance( value, Bits ):
+          cur = f"v{vid}._uint"
+          return [ f"{indent}if {cur} != t{vid}:",
+                   f"{indent}  t{vid} = {cur}",
+                   f"{indent}  {' = '.join( [ f'd{j}' for j in readers[vid] ] )} = True" ]
+        if is_bitstruct_inst( value ):
+          cur = f"v{vid}.clone()"
+        else:
+          cur = f"deepcopy(v{vid})"
+        return [ f"{indent}if v{vid} != t{vid}:",
+                 f"{indent}  t{vid} = {cur}",
+                 f"{indent}  {' = '.join( [ f'd{j}' for j in readers[vid] ] )} = True" ]
+
+      tracked_vids = sorted( readers.keys() )
+      tracked_blks = [ i for i, (tracked, _, _) in enumerate( blk_rw ) if tracked ]
+
+      # Variables read by tracked blocks but not written by any
+      # combinational block are produced by update_ff, the flips, or the
+      # test harness. We check them at the beginning of the function.
+
+      src = []
+      for vid in tracked_vids:
+        if vid not in written:
+          src.extend( gen_check( vid, "    " ) )
+
+      for i, (tracked, reads, writes) in enumerate( blk_rw ):
+        indent = "    "
+        if tracked:
+          src.append( f"    if d{i}:" )
+          src.append( f"      d{i} = False" )
+          indent = "      "
+
+        src.append( f"{indent}blk{i}() # {schedule[i].__name__}" )
+
+        if writes:
+          for vid in sorted( { signal_vid[x] for x in writes } ):
+            if vid in readers:
+              src.extend( gen_check( vid, indent ) )
+
+      nonlocals = [ f"t{vid}" for vid in tracked_vids ] + [ f"d{i}" for i in tracked_blks ]
+
+      lines = [ "def compile_activity_tick( values, schedule ):" ]
+      lines += [ f"  v{vid} = values[{vid}]" for vid in tracked_vids ]
+      lines += [ f"  blk{i} = schedule[{i}]" for i in range(len(schedule)) ]
+      for vid in tracked_vids:
+        value = values[vid]
+        if   isinstance( value, Bits ):    lines.append( f"  t{vid} = v{vid}._uint" )
+        elif is_bitstruct_inst( value ):   lines.append( f"  t{vid} = v{vid}.clone()" )
+        else:                              lines.append( f"  t{vid} = deepcopy(v{vid})" )
+      lines += [ f"  d{i} = True" for i in tracked_blks ]
+      lines.append( "  def activity_tick():" )
+      if nonlocals:
+        lines.append( f"    nonlocal {', '.join( nonlocals )}" )
+      lines += src
+      lines.append( "    pass" )
+      lines.append( "  return activity_tick" )
+
+      # Same as schedule_posedge_flip, we use exec(compile()) + linecache
+      # to avoid the overhead of py.code.Source for huge designs.
+      _globals = { 'deepcopy': deepcopy }
+      _locals  = {}
+      custom_exec( compile( '\n'.join(lines), filename='activity_tick', mode='exec' ), _globals, _locals )
+      linecache.cache['activity_tick'] = (1, None, lines, 'activity_tick')
+      return _locals['compile_activity_tick']( values, schedule )
+
+    activity_tick = None
+
+    def lazy_activity_tick():
+      nonlocal activity_tick
+      if activity_tick is None:
+        activity_tick = compile_activity_tick()
+      activity_tick()
+
+    lazy_activity_tick.__name__ = "activity_tick"
+    return lazy_activity_tick
+
+  #-----------------------------------------------------------------------
+  # gen_ff_gate
+  #-----------------------------------------------------------------------
+  # An update_ff block that reads the same values as the last time it was
+  # executed would write the same values to its registers, which already
+  # hold these values after the last flip. We generate a single function
+  # that skips such blocks:
+  #
+  # def ff_gate():
+  #   nonlocal t0_0, t0_1
+  #   if v0._uint != t0_0 or v1.to_bits()._uint != t0_1:
+  #     t0_0 = v0._uint
+  #     t0_1 = v1.to_bits()._uint
+  #     blk0()
+  #   blk1() # untracked
+  #
+  # Restoring a checkpoint invalidates the recorded values, so
+  # top._sched.reset_ff_gate() makes us recompile the function.
+
+  def gen_ff_gate( self, top, schedule ):
+    upblk_reads, _, upblk_calls = top.get_all_upblk_metadata()
+    rebound_cells, _ = _rebound_free_vars( top )
+
+    tracked = []
+    for blk in schedule:
+      reads = set()
+      for x in upblk_reads[ blk ]:
+        if not isinstance( x, Signal ):
+          reads = None
+          break
+        reads.add( x.get_top_level_signal() )
+
+      info = top.get_update_block_host_component( blk ).get_update_block_info( blk )
+      if reads is None or upblk_calls[ blk ] or info is None or \
+         _may_write_python_state( info[-1] ) or \
+         not _reads_only_signals( top, blk ) or not _closure_is_stateless( blk, rebound_cells ):
+        reads = None
+      tracked.append( reads )
+
+    def compile_ff_gate():
+      mapping = top._sim.signal_object_mapping
+
+      values    = []
+      src       = []
+      nonlocals = []
+      for i, reads in enumerate( tracked ):
+        checks = []
+        if reads is not None:
+          for x in sorted( reads, key=repr ):
+            value = mapping[ x ][-1]
+            if isinstance( value, Bits ):
+              cur = f"v{len(values)}._uint"
+            elif is_bitstruct_inst( value ):
+              cur = f"v{len(values)}.to_bits()._uint"
+            else:
+              checks = None
+              break
+            checks.append( ( f"t{i}_{len(checks)}", cur ) )
+            values.append( value )
+
+        if not checks:
+          src.append( f"    blk{i}() # {schedule[i].__name__}" )
+        else:
+          nonlocals.extend( [ t for t, _ in checks ] )
+          src.append( f"    if {' or '.join( [ f'{cur} != {t}' for t, cur in checks ] )}:" )
+          src.extend( [ f"      {t} = {cur}" for t, cur in checks ] )
+          src.append( f"      blk{i}() # {schedule[i].__name__}" )
+
+      lines = [ "def compile_ff_gate( values, schedule ):" ]
+      lines += [ f"  v{i} = values[{i}]" for i in range(len(values)) ]
+      lines += [ f"  blk{i} = schedule[{i}]" for i in range(len(schedule)) ]
+      lines += [ f"  {t} = None" for t in nonlocals ]
+      lines.append( "  def ff_gate():" )
+      if nonlocals:
+        lines.append( f"    nonlocal {', '.join( nonlocals )}" )
+      lines += src
+      lines.append( "    pass" )
+      lines.append( "  return ff_gate" )
+
+      _locals = {}
+      custom_exec( compile( '\n'.join(lines), filename='ff_gate', mode='exec' ), {}, _locals )
+      linecache.cache['ff_gate'] = (1, None, lines, 'ff_gate')
+      return _locals['compile_ff_gate']( values, schedule )
+
+    ff_gate = None
+
+    def lazy_ff_gate():
+      nonlocal ff_gate
+      if ff_gate is None:
+        ff_gate = compile_ff_gate()
+      ff_gate()
+
+    def reset_ff_gate():
+      nonlocal ff_gate
+      ff_gate = None
+
+    top._sched.reset_ff_gate = reset_ff_gate
+
+    lazy_ff_gate.__name__ = "ff_gate"
+    return lazy_ff_gate
+
+#-------------------------------------------------------------------------
+# _reads_only_signals
+#-------------------------------------------------------------------------
+# Conservatively check whether an update block reads Python-level state
+# (anything other than signals and constant parameters) from its host
+# component. The metadata only keeps NamedObjects, so we re-resolve the
+# cached names here.
+
+def _reads_only_signals( top, blk ):
+  host = top.get_update_block_host_component( blk )
+  try:
+    names = host.__class__._name_rd[ blk.__name__ ]
+  except (AttributeError, KeyError):
+    return False
+
+  for obj_name, _, _ in names:
+    if obj_name[0][0] != "s":
+      continue
+
+    obj = host
+    for field, _ in obj_name[1:]:
+      if not isinstance( obj, NamedObject ):
+        break
+      try:
+        obj = getattr( obj, field )
+      except AttributeError:
+        break
+      if isinstance( obj, list ):
+        while isinstance( obj, list ) and obj:
+          obj = obj[0]
+        # A list of Python objects is mutable state
+        if not isinstance( obj, NamedObject ):
+          return False
+
+    if isinstance( obj, (NamedObject, Const) ) or callable( obj ):
+      continue
+    if isinstance( obj, _STATELESS_TYPES ) or is_bitstruct_inst( obj ):
+      continue
+    return False
+
+  return True
+
+#-------------------------------------------------------------------------
+# _closure_is_stateless
+#-------------------------------------------------------------------------
+# Same as _reads_only_signals but for the free variables of the block.
+# A variable that some function rebinds with nonlocal (see
+# _rebound_free_vars) is state whatever it holds.
+
+def _closure_is_stateless( blk, rebound_cells=() ):
+  for cell in blk.__closure__ or ():
+    if id(cell) in rebound_cells:
+      return False
+    try:
+      obj = cell.cell_contents
+    except ValueError: # empty cell
+      continue
+
+    if isinstance( obj, list ):
+      while isinstance( obj, list ) and obj:
+        obj = obj[0]
+      # A list of Python objects is mutable state
+      if not isinstance( obj, NamedObject ):
+        return False
+
+    if isinstance( obj, (NamedObject, Const) ) or callable( obj ):
+      continue
+    if isinstance( obj, _STATELESS_TYPES ) or is_bitstruct_inst( obj ):
+      continue
+    return False
+
+  return True
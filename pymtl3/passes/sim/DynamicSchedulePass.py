@@ -8,20 +8,29 @@
 import os
 from collections import defaultdict, deque
 from copy import deepcopy
-
-import py
+from linecache import cache as line_cache
 
 from pymtl3.datatypes import Bits, is_bitstruct_class
+from pymtl3.dsl import Signal
+from pymtl3.dsl.ElaborationCache import (
+    file_digest,
+    get_elaboration_cache,
+    get_name_map,
+    make_key,
+)
 from pymtl3.dsl.errors import UpblkCyclicError
 from pymtl3.extra.pypy import custom_exec
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 
 from .SimpleSchedulePass import SimpleSchedulePass, dump_dag
-from .SimpleTickPass import SimpleTickPass
 
+_versions = ( file_digest( __file__ ), )
 
 class DynamicSchedulePass( BasePass ):
+  def __init__( self, dirty_flip=False ):
+    self.dirty_flip = dirty_flip
+
   def __call__( self, top ):
     if not hasattr( top._dag, "all_constraints" ):
       raise PassOrderError( "all_constraints" )
@@ -34,12 +43,23 @@ class DynamicSchedulePass( BasePass ):
     self.schedule_intra_cycle( top )
 
     # Reuse simple's ff and flip schedule
-    simple = SimpleSchedulePass()
+    simple = SimpleSchedulePass( self.dirty_flip )
     simple.schedule_ff( top )
     simple.schedule_posedge_flip( top )
 
   def schedule_intra_cycle( self, top ):
 
+    # GenDAGPass leaves a cache key if the constraints come from a design
+    # that can be cached. We can then also reuse the schedule.
+
+    cache = get_elaboration_cache()
+    key   = getattr( top._dag, "cache_key", None )
+
+    if cache is not None and key is not None:
+      key = make_key( _versions, key )
+      if self.load_schedule( top, cache.load( 'sched', key ) ):
+        return
+
     # Construct the intra-cycle graph based on normal update blocks
 
     V   = top._dag.final_upblks - top.get_all_update_ff()
@@ -96,6 +116,12 @@ class DynamicSchedulePass( BasePass ):
     # Put the graph schedule to _sched
     top._sched.update_schedule = schedule = []
 
+    # Record the member blocks of each generated SCC block so that later
+    # passes can still reason about what an SCC block reads and writes
+    top._sched.scc_blocks = {}
+    top._sched.scc_stats  = {}
+    scc_edges = {}
+
     scc_id = 0
     for i in scc_schedule:
       scc = SCCs[i]
@@ -154,105 +180,222 @@ class DynamicSchedulePass( BasePass ):
               visited.add( v )
 
         scc_id += 1
-        variables = set()
-        for (u, v) in E:
-          # Collect all variables that triggers other blocks in the SCC
-          if u in scc and v in scc:
-            variables.update( constraint_objs[ (u, v) ] )
 
-        if len(variables) == 0:
+        # Collect all variables that triggers other blocks in the SCC
+        edges = { (u, v): constraint_objs.get( (u, v), () )
+                  for (u, v) in E if u in scc and v in scc }
+
+        if not any( edges.values() ):
           raise UpblkCyclicError("There is a cyclic dependency without involving variables."
                           "Probably a loop that involves blocks that should be update_once:\n{}"\
                           .format(", ".join( [ x.__name__ for x in scc] )))
 
-        # generate a loop for scc
-        # Shunning: we just simply loop over the whole SCC block
-        # TODO performance optimizations using Mamba techniques within a SCC block
-
-        def gen_wrapped_SCCblk( s, scc, src ):
-
-          # TODO mamba?
-          scc_tick_func = SimpleTickPass.gen_tick_function( scc )
-          _globals = { 's': s, 'scc_tick_func': scc_tick_func, 'deepcopy': deepcopy,
-                       'UpblkCyclicError': UpblkCyclicError }
-          _locals  = {}
-
-          custom_exec(py.code.Source( src ).compile(), _globals, _locals)
-          return _locals[ 'generated_block' ]
-
-        template = """
-def wrapped_SCC_{0}():
-  N = 0
-  while True:
-    N += 1
-    if N > 100:
-      raise UpblkCyclicError("Combinational loop detected at runtime in {{{3}}} after 100 iters!")
-    {1}
-    scc_tick_func()
-    {2}
-    # print( "SCC block{0} is executed", num_iters, "times" )
-    break
-generated_block = wrapped_SCC_{0}
-          """
-
-        copy_srcs  = []
-        check_srcs = []
-        # print_srcs = []
-
-        # clean up non-top variables if top is there. remove slices
-
-        final_variables = set()
-
-        for x in sorted( variables, key=repr ):
-          w = x.get_top_level_signal()
-          if w is x:
-            final_variables.add( x )
-            continue
-
-          # w is not x
-          if issubclass( w._dsl.Type, Bits ):
-            if w not in final_variables:
-              final_variables.add( w )
-          elif is_bitstruct_class( w._dsl.Type ):
-            if w not in final_variables:
-              final_variables.add( x )
-          else:
-            final_variables.add( x )
-
-        # group them by host component so that we create less bytecode
-
-        final_var_host = defaultdict(list)
-        for x in final_variables:
-          final_var_host[ x.get_host_component() ].append( x )
-
-        # create a block of copy/check code for each host component. Need
-        # to allocate global var_id across different host components.
-
-        var_id = 0
-        for host, var_list in final_var_host.items():
-
-          copy_srcs .append( f"host={host!r}" )
-          check_srcs.append( f"host={host!r}" )
-
-          sub_check_srcs = []
-
-          hostlen = len(repr(host))
-          for var in var_list:
-            var_id += 1
-            subname = repr(var)[hostlen+1:]
-            if issubclass( var._dsl.Type, Bits ):     copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-            elif is_bitstruct_class( var._dsl.Type ): copy_srcs.append( f"t{var_id}=host.{subname}.clone()" )
-            else:                                     copy_srcs.append( f"t{var_id}=deepcopy(host.{subname})" )
-
-            sub_check_srcs.append( f"host.{subname} != t{var_id}" )
-
-          check_srcs.append( f"if { ' or '.join(sub_check_srcs)}: continue" )
-
-        scc_block_src = template.format( scc_id, "; ".join( copy_srcs ), "\n    ".join( check_srcs ),
-                                         ", ".join( [ x.__name__ for x in scc] ) )
-
-        # print(scc_block_src)
-        schedule.append( gen_wrapped_SCCblk( top, tmp_schedule, scc_block_src ) )
+        scc_blk = gen_scc_block( top, scc_id, tmp_schedule, edges )
+        scc_edges[ scc_blk ] = edges
+        schedule.append( scc_blk )
+
+    if cache is not None and key is not None:
+      self.store_schedule( top, cache, key, scc_edges )
+
+  #-----------------------------------------------------------------------
+  # load_schedule/store_schedule
+  #-----------------------------------------------------------------------
+  # The schedule is stored as a list of block indices into the block
+  # names from GenDAGPass. An SCC is stored as the ordered list of its
+  # members and its internal edges with the names of the variables that
+  # trigger them, from which we regenerate the SCC block.
+
+  def load_schedule( self, top, cached ):
+    if cached is None:
+      return False
+
+    blk_names, obj_names, entries = cached
+    id_blk = { v: k for k, v in top._dag.block_ids.items() }
+    names  = get_name_map( top )
+    try:
+      blks = [ id_blk[x] for x in blk_names ]
+      objs = [ names[x] for x in obj_names ]
+    except KeyError: # stale entry
+      return False
+
+    top._sched.update_schedule = schedule = []
+    top._sched.scc_blocks = {}
+    top._sched.scc_stats  = {}
+
+    scc_id = 0
+    for entry in entries:
+      if isinstance( entry, int ):
+        schedule.append( blks[ entry ] )
+      else:
+        scc_id += 1
+        members, edges = entry
+        schedule.append( gen_scc_block( top, scc_id, [ blks[x] for x in members ],
+                                        { (blks[u], blks[v]): { objs[x] for x in xs }
+                                          for u, v, xs in edges } ) )
+    return True
+
+  def store_schedule( self, top, cache, key, scc_edges ):
+    blk_ids   = top._dag.block_ids
+    blk_names = []
+    blk_index = {}
+    names     = get_name_map( top )
+    obj_names = []
+    obj_index = {}
+
+    def index( blk ):
+      if blk not in blk_index:
+        blk_index[ blk ] = len(blk_names)
+        blk_names.append( blk_ids[ blk ] )
+      return blk_index[ blk ]
+
+    def obj( x ):
+      if x not in obj_index:
+        obj_index[ x ] = len(obj_names)
+        obj_names.append( repr(x) )
+      return obj_index[ x ]
+
+    entries = []
+    try:
+      for blk in top._sched.update_schedule:
+        if blk not in scc_edges:
+          entries.append( index( blk ) )
+          continue
+
+        edges = []
+        for (u, v), xs in scc_edges[ blk ].items():
+          for x in xs:
+            if names.get( repr(x) ) is not x:
+              return
+          edges.append( ( index(u), index(v), [ obj(x) for x in xs ] ) )
+        entries.append( ( [ index(x) for x in top._sched.scc_blocks[ blk ] ], edges ) )
+    # Some pass in between added a block that GenDAGPass doesn't know
+    except KeyError:
+      return
+
+    cache.store( 'sched', key, (blk_names, obj_names, entries) )
+
+#-------------------------------------------------------------------------
+# gen_scc_block
+#-------------------------------------------------------------------------
+# An SCC block keeps a worklist of the member blocks as a bitmask in the
+# order of the intra-SCC schedule. Each pass over the schedule executes
+# the pending blocks. After a block is executed, we check the variables
+# it may change for the other blocks, and only the blocks that read a
+# changed variable become pending again. Bits are snapshotted as integers
+# and bitstructs are cloned, so we only deepcopy other Python objects.
+
+class SCCStats:
+  """ Runtime statistics of an SCC block. An iteration is a pass over
+  the intra-SCC schedule that executes at least one member block. """
+
+  def __init__( s, blocks ):
+    s.blocks         = blocks
+    s.calls          = 0
+    s.iterations     = 0
+    s.max_iterations = 0
+    s.executions     = 0
+
+  def __repr__( s ):
+    avg_iters = s.iterations / s.calls if s.calls else 0.0
+    avg_execs = s.executions / s.calls if s.calls else 0.0
+    return f"SCC({', '.join( x.__name__ for x in s.blocks )}): {s.calls} calls, " \
+           f"{avg_iters:.2f} iterations (max {s.max_iterations}) and " \
+           f"{avg_execs:.2f} block executions per call"
+
+def gen_scc_block( top, scc_id, scc, edges ):
+  """ Generate a block that executes the blocks of an SCC in the given
+  order until none of the variables that trigger blocks in the SCC
+  change anymore. edges maps each constraint (u, v) between two blocks
+  of the SCC to the variables through which u triggers v. The block is
+  recorded in top._sched.scc_blocks and its statistics are kept in
+  top._sched.scc_stats. """
+
+  index = { blk: i for i, blk in enumerate( scc ) }
+
+  # For each block, the variables to check after executing it, and for
+  # each variable, the blocks to execute again if it changes. We check
+  # the top-level signal of a slice or a field, since comparing it is
+  # about as cheap as comparing the slice or field itself.
+
+  var_checks  = defaultdict(set)
+  var_readers = defaultdict(int)
+  for (u, v), objs in edges.items():
+    for x in objs:
+      if not isinstance( x, Signal ): # e.g. method ports
+        continue
+      y = x.get_top_level_signal()
+      var_checks[ u ].add( y )
+      var_readers[ y ] |= 1 << index[ v ]
+
+  stats = SCCStats( scc )
+  _globals = { 'stats': stats, 'deepcopy': deepcopy,
+               'UpblkCyclicError': UpblkCyclicError }
+
+  hosts = {}
+  def host_name( host ):
+    if host not in hosts:
+      hosts[ host ] = f"h{len(hosts)}"
+      _globals[ hosts[ host ] ] = host
+    return hosts[ host ]
+
+  var_ids   = {}
+  var_names = {}
+  snapshots = {}
+  for x in sorted( var_readers, key=repr ):
+    host = x.get_host_component()
+    var_ids[ x ]   = t = f"t{len(var_ids)}"
+    var_names[ x ] = name = f"{host_name( host )}.{repr(x)[len(repr(host))+1:]}"
+    if issubclass( x._dsl.Type, Bits ):
+      snapshots[ x ] = f"{name}.uint()"
+    elif is_bitstruct_class( x._dsl.Type ):
+      snapshots[ x ] = f"{name}.clone()"
+    else:
+      snapshots[ x ] = f"deepcopy({name})"
+
+  blk_srcs = []
+  for i, blk in enumerate( scc ):
+    _globals[ f"b{i}" ] = blk
+    blk_srcs.append( f"if todo & {1 << i}:" )
+    blk_srcs.append( f"  todo ^= {1 << i}" )
+    blk_srcs.append( f"  b{i}()" )
+    blk_srcs.append( f"  e += 1" )
+    for x in sorted( var_checks[ blk ], key=repr ):
+      t = var_ids[ x ]
+      blk_srcs.append( f"  if {snapshots[ x ]} != {t}:" )
+      blk_srcs.append( f"    {t} = {snapshots[ x ]}" )
+      blk_srcs.append( f"    todo |= {var_readers[ x ]}" )
+
+  blk_names = ", ".join( [ x.__name__ for x in scc ] )
+  indent = "\n    "
+
+  src = f"""
+def wrapped_SCC_{scc_id}():
+  {'; '.join( f'{var_ids[x]} = {snapshots[x]}' for x in var_ids ) or 'pass'}
+  todo = {(1 << len(scc)) - 1}
+  n = e = 0
+  while todo:
+    n += 1
+    if n > 100:
+      raise UpblkCyclicError("Combinational loop detected at runtime in {{{blk_names}}} after 100 iters!")
+    {indent.join( blk_srcs )}
+  stats.calls += 1
+  stats.iterations += n
+  stats.executions += e
+  if n > stats.max_iterations:
+    stats.max_iterations = n
+"""
+
+  _locals = {}
+  custom_exec( compile( src, filename=f"wrapped_SCC_{scc_id}", mode="exec" ), _globals, _locals )
+  line_cache[ f"wrapped_SCC_{scc_id}" ] = (len(src), None, src.splitlines(), f"wrapped_SCC_{scc_id}")
+
+  scc_blk = _locals[ f"wrapped_SCC_{scc_id}" ]
+  if not hasattr( top._sched, "scc_blocks" ):
+    top._sched.scc_blocks = {}
+    top._sched.scc_stats  = {}
+  top._sched.scc_blocks[ scc_blk ] = scc
+  top._sched.scc_stats [ scc_blk ] = stats
+  return scc_blk
 
 def kosaraju_scc( G, G_T ):
 
@@ -0,0 +1,94 @@
+"""
+========================================================================
+FlatStorage.py
+========================================================================
+Keep the values of all top-level signals of a locked model in two flat
+lists, one for the current values and one for the next values written
+by <<=. The Bits objects that lock_in_simulation created for the signals
+stay in place, so every reference to them remains valid, but their
+class is swapped to a subclass of the original BitsN class whose _uint
+and _next are properties that index into the lists. The index is kept
+in the _uint slot that the property shadows.
+
+Double-buffered values get the lowest indices, so flipping all registers
+becomes a single slice assignment and a snapshot of the model is a copy
+of two lists.
+
+Constants in nets are shared between models and are never converted.
+This only works with the pure-Python Bits.
+"""
+from pymtl3.datatypes import Bits, PythonBits
+from pymtl3.dsl import Const
+from pymtl3.passes.BasePass import PassMetadata
+
+from .PrepareSimPass import _collect_bits
+
+
+def _find_slot( cls, name ):
+  for c in cls.__mro__:
+    if name in c.__dict__:
+      return c.__dict__[ name ]
+  raise AttributeError( name )
+
+def _mk_handle_class( cls, uint, next_ ):
+  idx = _find_slot( cls, '_uint' ).__get__
+
+  def get_uint( s ):
+    return uint[ idx(s) ]
+  def set_uint( s, v ):
+    uint[ idx(s) ] = v
+  def get_next( s ):
+    return next_[ idx(s) ]
+  def set_next( s, v ):
+    next_[ idx(s) ] = v
+
+  return type( cls.__name__, ( cls, ), {
+    '__slots__': (),
+    '__module__': cls.__module__,
+    '_uint': property( get_uint, set_uint ),
+    '_next': property( get_next, set_next ),
+  })
+
+def create_flat_storage( top ):
+  if Bits is not PythonBits.Bits:
+    return None
+
+  mapping = top._sim.signal_object_mapping
+
+  consts = { id(writer._dsl.const) for writer, _ in top.get_all_value_nets()
+                                   if isinstance( writer, Const ) }
+
+  regs, others = [], []
+  done = set()
+  # Registers first
+  for x in sorted( mapping, key=lambda x: ( not x._dsl.needs_double_buffer, repr(x) ) ):
+    for y in _collect_bits( mapping[x][-1] ):
+      if id(y) not in done and id(y) not in consts:
+        done.add( id(y) )
+        ( regs if x._dsl.needs_double_buffer else others ).append( y )
+
+  values = regs + others
+  uint   = [ y._uint for y in values ]
+  next_  = [ getattr( y, '_next', None ) for y in values ]
+
+  classes = {}
+  for i, y in enumerate( values ):
+    cls = y.__class__
+    if cls not in classes:
+      classes[ cls ] = _mk_handle_class( cls, uint, next_ )
+    new_cls = classes[ cls ]
+    y.__class__ = new_cls
+    _find_slot( cls, '_uint' ).__set__( y, i )
+
+  nregs = len(regs)
+
+  def flat_flip():
+    uint[:nregs] = next_[:nregs]
+
+  ret = PassMetadata()
+  ret.uint   = uint
+  ret.next   = next_
+  ret.nregs  = nregs
+  ret.values = values
+  ret.flip   = flat_flip
+  return ret
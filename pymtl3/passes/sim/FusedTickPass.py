@@ -0,0 +1,264 @@
+"""
+========================================================================
+FusedTickPass.py
+========================================================================
+A drop-in replacement of PrepareSimPass that generates a single
+straight-line function for each tick. Instead of calling every update
+block and net block as a separate Python function, we inline the body of
+each block into the tick function. The cached AST of each update block is
+rewritten so that "s", closure variables and globals refer to the
+objects of the right host component, and block-local variables are
+renamed to avoid conflicts between blocks.
+
+Blocks that cannot be safely inlined (e.g., blocks with return
+statements, nested functions, or comprehensions) and other callables in
+the schedule (SCC blocks, flips, tracing hooks) are simply called.
+"""
+import ast
+import builtins
+import copy
+import linecache
+
+from pymtl3.dsl import MethodPort
+from pymtl3.dsl.Connectable import Signal
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.extra.pypy import custom_exec
+
+from .PrepareSimPass import PrepareSimPass, _rebound_free_vars
+from .SimpleTickPass import SimpleTickPass
+
+# These nodes either introduce a new scope or change the control flow
+# of the enclosing function, so blocks that contain them are not inlined.
+
+_UNSUPPORTED_NODES = ( ast.Return, ast.Yield, ast.YieldFrom, ast.Await,
+                       ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp,
+                       ast.GeneratorExp, ast.FunctionDef, ast.AsyncFunctionDef,
+                       ast.ClassDef, ast.Global, ast.Nonlocal )
+
+class _InlineRenamer( ast.NodeTransformer ):
+
+  def __init__( self, local_names, prefix, free_names ):
+    self.local_names = local_names
+    self.prefix      = prefix
+    self.free_names  = free_names
+
+  def visit_Name( self, node ):
+    if node.id in self.local_names:
+      node.id = self.prefix + node.id
+    elif node.id in self.free_names:
+      node.id = self.free_names[ node.id ]
+    return node
+
+# Components, interfaces and method ports are never replaced after
+# elaboration, so an attribute chain like _o0.inners[3].out can be
+# resolved to the inner component at compile time, leaving only the last
+# attribute access to the signal value. Signals are excluded because
+# lock_in_simulation replaces them with their values.
+
+class _ComponentChainFolder( ast.NodeTransformer ):
+
+  def __init__( self, env, bind ):
+    self.env  = env
+    self.bind = bind
+
+  def lookup( self, node ):
+    if isinstance( node, ast.Name ):
+      if node.id.startswith('_o') and node.id[2:].isdigit():
+        return self.env[ int(node.id[2:]) ]
+
+    elif isinstance( node, ast.Attribute ):
+      obj = self.lookup( node.value )
+      if isinstance( obj, NamedObject ):
+        return getattr( obj, node.attr, None )
+
+    elif isinstance( node, ast.Subscript ):
+      if isinstance( node.slice, ast.Constant ) and isinstance( node.slice.value, int ):
+        obj = self.lookup( node.value )
+        if isinstance( obj, list ) and -len(obj) <= node.slice.value < len(obj):
+          return obj[ node.slice.value ]
+
+    return None
+
+  def fold( self, node ):
+    if isinstance( node.ctx, ast.Load ):
+      obj = self.lookup( node )
+      if isinstance( obj, NamedObject ) and not isinstance( obj, Signal ):
+        return ast.copy_location( ast.Name( id=self.bind( obj ), ctx=ast.Load() ), node )
+    self.generic_visit( node )
+    return node
+
+  visit_Attribute = visit_Subscript = fold
+
+class FusedTickPass( PrepareSimPass ):
+
+  _fused_id = 0
+
+  # Override
+  def create_sim_eval_comb( self, top ):
+    # Non-pure-RTL designs get an eval_combinational that raises
+    if len( top.get_all_object_filter( lambda x: isinstance( x, MethodPort ) ) ) > 0 or \
+       len( top.get_all_update_once() ) > 0:
+      super().create_sim_eval_comb( top )
+      return
+
+    top.sim_eval_combinational = self.gen_fused_function( top,
+      [ top._sim.check_top_level_inports ] + top._sched.update_schedule, 'fused_eval_comb' )
+
+  # Override
+  def create_sim_tick( self, top ):
+    super().create_sim_tick( top )
+    top.sim_tick = self.gen_fused_function( top, top._sim.final_schedule, 'fused_tick' )
+
+  #-----------------------------------------------------------------------
+  # get_inlined_body
+  #-----------------------------------------------------------------------
+  # Return ( statements, filename, line offset, line number of def ) of
+  # the block whose local names and free names are renamed, or None if
+  # the block cannot be inlined. The line offset maps the line numbers in
+  # the AST back to the lines in the source file. Free names are bound to
+  # their current values, so a block that reads a variable rebound with
+  # nonlocal or global (see _rebound_free_vars) is not inlined.
+
+  @staticmethod
+  def get_inlined_body( top, upblks, blk, prefix, bind, rebound=( (), () ) ):
+
+    if blk in top._dag.genblks:
+      tree     = ast.parse( top._dag.genblk_src[ blk ] )
+      filename = blk.__code__.co_filename
+      offset   = 0
+
+    elif blk in upblks:
+      host = top.get_update_block_host_component( blk )
+      info = host.get_update_block_info( blk )
+      if info is None:
+        return None
+      _, _, lineno, filename, tree = info
+      offset = lineno - 1
+
+    else:
+      return None
+
+    funcdef = None
+    for node in ast.walk( tree ):
+      if isinstance( node, ast.FunctionDef ) and node.name == blk.__name__:
+        funcdef = node
+        break
+
+    if funcdef is None or funcdef.args.args:
+      return None
+
+    body = funcdef.body
+    for stmt in body:
+      for node in ast.walk( stmt ):
+        if isinstance( node, _UNSUPPORTED_NODES ):
+          return None
+
+    code = blk.__code__
+    local_names = set( code.co_varnames )
+
+    free_names = {}
+    closure = { var: cell for var, cell in zip( code.co_freevars, blk.__closure__ or () ) }
+
+    for stmt in body:
+      for node in ast.walk( stmt ):
+        if isinstance( node, ast.Name ) and node.id not in local_names and \
+           node.id not in free_names:
+          name = node.id
+          if name in closure:
+            if id( closure[ name ] ) in rebound[0]:
+              return None
+            try:
+              free_names[ name ] = bind( closure[ name ].cell_contents )
+            except ValueError: # empty cell
+              return None
+          elif name in blk.__globals__:
+            if ( id( blk.__globals__ ), name ) in rebound[1]:
+              return None
+            free_names[ name ] = bind( blk.__globals__[ name ] )
+          elif not hasattr( builtins, name ):
+            return None
+
+    renamer = _InlineRenamer( local_names, prefix, free_names )
+    body = [ renamer.visit( copy.deepcopy( stmt ) ) for stmt in body ]
+    body = [ stmt for stmt in body if not isinstance( stmt, ast.Pass ) ]
+
+    return body, filename, offset, funcdef.lineno
+
+  #-----------------------------------------------------------------------
+  # gen_fused_function
+  #-----------------------------------------------------------------------
+  # Generate a function that looks like the following:
+  #
+  # def compile_fused( _env ):
+  #   _o0 = _env[0]
+  #   _o1 = _env[1]
+  #   def fused_tick():
+  #     # up @ top.inner (/path/to/file.py:10)
+  #     _o0.out @= _o0.in_ + 1 # /path/to/file.py:11
+  #     _o1() # double_buffer
+  #   return fused_tick
+
+  def gen_fused_function( self, top, schedule, name, fold_chains=False ):
+
+    # Python < 3.9 doesn't have ast.unparse, just call every block
+    if not hasattr( ast, 'unparse' ):
+      return SimpleTickPass.gen_tick_function( schedule )
+
+    env = []
+    env_ids = {}
+
+    def bind( obj ):
+      i = env_ids.get( id(obj) )
+      if i is None:
+        i = env_ids[ id(obj) ] = len(env)
+        env.append( obj )
+      return f"_o{i}"
+
+    upblks  = top.get_all_update_blocks()
+    rebound = _rebound_free_vars( top )
+    folder = _ComponentChainFolder( env, bind ) if fold_chains else None
+
+    src = []
+    for i, blk in enumerate( schedule ):
+      ret = self.get_inlined_body( top, upblks, blk, f"_l{i}_", bind, rebound )
+
+      if ret is None:
+        src.append( f"    {bind( blk )}() # {blk.__name__}" )
+        continue
+
+      body, filename, offset, def_lineno = ret
+      if folder is not None:
+        body = [ folder.visit( stmt ) for stmt in body ]
+      if not body:
+        continue
+
+      if blk in top._dag.genblks:
+        src.append( f"    # {blk.__name__} (net block)" )
+      else:
+        host = top.get_update_block_host_component( blk )
+        src.append( f"    # {blk.__name__} @ {host!r} ({filename}:{offset + def_lineno})" )
+
+      for stmt in body:
+        lines = ast.unparse( stmt ).split('\n')
+        lines[0] += f" # {filename}:{offset + stmt.lineno}"
+        src.extend( [ f"    {x}" for x in lines ] )
+
+    FusedTickPass._fused_id += 1
+    filename = f"{name}_{FusedTickPass._fused_id}"
+
+    lines = [ "def compile_fused( _env ):" ] + \
+            [ f"  _o{i} = _env[{i}]" for i in range(len(env)) ] + \
+            [ f"  def {name}():" ] + \
+              src + \
+            [ "    pass",
+             f"  return {name}" ]
+
+    # Keep the generated source in linecache so that the tracebacks show
+    # the inlined statements along with their original locations
+    _locals = {}
+    custom_exec( compile( '\n'.join(lines), filename=filename, mode='exec' ), {}, _locals )
+    linecache.cache[ filename ] = (1, None, lines, filename)
+
+    ret = _locals['compile_fused']( env )
+    ret.src = '\n'.join( lines )
+    return ret
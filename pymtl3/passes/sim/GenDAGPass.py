@@ -8,22 +8,51 @@ a model.
 Author : Shunning Jiang
 Date   : Jan 18, 2018
 """
+import marshal
 from collections import defaultdict, deque
 from linecache import cache as line_cache
 
-from pymtl3.datatypes import *
 from pymtl3.datatypes.bitstructs import get_bitstruct_inst_all_classes
 from pymtl3.dsl import *
+from pymtl3.dsl.Component import EditLog
+from pymtl3.dsl.Connectable import _overlap
+from pymtl3.dsl.ElaborationCache import (
+    file_digest,
+    get_design_key,
+    get_elaboration_cache,
+    get_name_map,
+    make_key,
+)
 from pymtl3.dsl.errors import LeftoverPlaceholderError
 from pymtl3.extra.pypy import custom_exec
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 
+_versions = ( file_digest( __file__ ), )
 
 class GenDAGPass( BasePass ):
 
+  # With collapse_nets=True, top-level signals in the same net are treated
+  # as one variable since they share the same storage after
+  # lock_in_simulation. Net blocks are only generated for nets that have
+  # sliced or nested readers, and we skip the copies to top-level readers.
+
+  def __init__( self, collapse_nets=False ):
+    self.collapse_nets = collapse_nets
+
   def __call__( self, top ):
+
+    # After structural edits of a model that has been through this pass,
+    # only the blocks and constraints around the edits are regenerated
+    log = top._dsl.edit_log
+    if hasattr( top, "_dag" ) and log is not None and not log.is_empty() and \
+       self._can_update_dag( top, log ):
+      self._update_dag( top, log )
+      top._dsl.edit_log = EditLog()
+      return
+
     top.check()
     top._dag = PassMetadata()
+    top._dag.collapse_nets = self.collapse_nets
 
     placeholders = [ x for x in top._dsl.all_named_objects
                      if isinstance( x, Placeholder ) ]
@@ -32,9 +61,11 @@ class GenDAGPass( BasePass ):
       raise LeftoverPlaceholderError( placeholders )
 
     self._generate_net_blocks( top )
-    self._process_value_constraints( top )
+    self._process_value_constraints_cached( top )
     self._process_methods( top )
 
+    top._dsl.edit_log = EditLog()
+
   def _generate_net_blocks( self, top ):
     """ _generate_net_blocks:
     Each net is an update block. Readers are actually "written" here.
@@ -45,7 +76,10 @@ class GenDAGPass( BasePass ):
     top._dag.genblk_hostobj = {}
     top._dag.genblk_reads   = {}
     top._dag.genblk_writes  = {}
-    # top._dag.genblk_src     = {}
+    top._dag.genblk_src     = {}
+    top._dag.genblk_writer  = {}
+    top._dag.net_aliases    = {}
+    top._dag.net_genblk     = {}
 
     # Fall back to compiling one block at a time
     # This is currently because there might be different structs with
@@ -53,177 +87,199 @@ class GenDAGPass( BasePass ):
     # disambiguation to let them co-exist in closure. With block-by-block
     # compilation, we minimize the effect.
 
+    # With the elaboration cache, we reuse the code objects that were
+    # compiled for the same design in a previous run
+    cache = get_elaboration_cache()
+    if cache is None:
+      compile_net_blk = _compile_net_blk
+    else:
+      key = make_key( _versions, get_design_key( top ), self.collapse_nets )
+      cached_codes = cache.load( 'netblk', key ) or {}
+      codes = {}
+
+      def compile_net_blk( src, fname ):
+        cached_src, data = cached_codes.get( fname, (None, None) )
+        if cached_src == src:
+          code = marshal.loads( data )
+        else:
+          code = compile( src, filename=fname, mode="exec" )
+          data = marshal.dumps( code )
+        codes[ fname ] = (src, data)
+        return code
+
+    for writer, signals in top.get_all_value_nets():
+      self._generate_net_block( top, writer, signals, compile_net_blk )
+
+    if cache is not None and codes != cached_codes:
+      cache.store( 'netblk', key, codes )
+
+    # Get the final list of update blocks
+    top._dag.final_upblks = top.get_all_update_blocks() | top._dag.genblks
+
+  def _generate_net_block( self, top, writer, signals, compile_net_blk ):
+    if len(signals) == 1:
+      return
+
     # TODO see if directly compiling AST instead of source can be faster
-    def compile_net_blk( _globals, src, writer ):
+    def exec_net_blk( _globals, src ):
       _locals = {}
       fname = f"Net (writer is {writer!r}"
-      custom_exec( compile( src, filename=fname, mode="exec"), _globals, _locals )
+      custom_exec( compile_net_blk( src, fname ), _globals, _locals )
       line_cache[ fname ] = (len(src), None, src.splitlines(), fname )
-      return list(_locals.values())[0]
+      blk = list(_locals.values())[0]
+      top._dag.net_genblk[ writer ] = blk
+      return blk
 
-    for writer, signals in top.get_all_value_nets():
-      if len(signals) == 1:
-        continue
+    all_readers = [ x for x in signals if x is not writer ]
+    all_fanout  = len( all_readers )
 
-      all_readers = [ x for x in signals if x is not writer ]
-      all_fanout  = len( all_readers )
-
-      # Here we remove every top-level signal from the reader list, but need to keep a shallow
-      # one as the delegate
-      #
-      # - writer: a,  reader: b, c
-      #   nothing
-      # - writer: a,  reader: b[0], c
-      #   # 1 selected_reader
-      #   b[0] @= a
-      # - writer: a,  reader: b[0], c[0]
-      #   x = a[0]
-      #   b[0] @= x
-      #   c[0] @= x
-      # - writer: a[0],  reader: b, c
-      #   # 1 selected_reader
-      #   b @= a[0]
-      # - writer: a[0],  reader: b[0], c
-      #   x = a[0]
-      #   b[0] @= x
-      #   c    @= x
-      # - writer: a[0],  reader: b[0], c[0]
-      #   x = a[0]
-      #   b[0] @= x
-      #   c[0] @= x
-
-      readers = []
-      if isinstance( writer, Const ) or writer.is_top_level_signal():
-        for x in all_readers:
-          if not x.is_top_level_signal():
-            readers.append( x )
-      else:
-        residence = None
-        for x in all_readers:
-          if x.is_top_level_signal():
-            if residence is None:
-              residence = x
-              readers.append( x )
-            # skip other top signals
-          else:
+    # Here we remove every top-level signal from the reader list, but need to keep a shallow
+    # one as the delegate
+    #
+    # - writer: a,  reader: b, c
+    #   nothing
+    # - writer: a,  reader: b[0], c
+    #   # 1 selected_reader
+    #   b[0] @= a
+    # - writer: a,  reader: b[0], c[0]
+    #   x = a[0]
+    #   b[0] @= x
+    #   c[0] @= x
+    # - writer: a[0],  reader: b, c
+    #   # 1 selected_reader
+    #   b @= a[0]
+    # - writer: a[0],  reader: b[0], c
+    #   x = a[0]
+    #   b[0] @= x
+    #   c    @= x
+    # - writer: a[0],  reader: b[0], c[0]
+    #   x = a[0]
+    #   b[0] @= x
+    #   c[0] @= x
+
+    readers = []
+    if isinstance( writer, Const ) or writer.is_top_level_signal():
+      for x in all_readers:
+        if not x.is_top_level_signal():
+          readers.append( x )
+    else:
+      residence = None
+      for x in all_readers:
+        if x.is_top_level_signal():
+          if residence is None:
+            residence = x
             readers.append( x )
+          # skip other top signals
+        else:
+          readers.append( x )
 
-      fanout = len(readers)
-
-      genblk_name = f"{writer!r}__{all_fanout}_{fanout}".replace( " ", "" ) \
-                      .replace( ".", "_" ).replace( ":", "_" ) \
-                      .replace( "[", "_" ).replace( "]", "_" ) \
-                      .replace( "(", "_" ).replace( ")", "_" ) \
-                      .replace( ",", "_" )
+    fanout = len(readers)
 
-      # If all signals are top-level, we still need to generate an empty
-      # to convey the constraints using all_readers
+    if self.collapse_nets:
+      aliases = tuple( x for x in signals if isinstance( x, Signal ) and x.is_top_level_signal() )
+      if len(aliases) > 1:
+        for x in aliases:
+          top._dag.net_aliases[ x ] = aliases
 
+      # All readers share the writer's storage, no block is needed
       if fanout == 0:
-        blk = compile_net_blk( {}, f"""def {genblk_name}(): pass""", writer )
+        return
 
-        top._dag.genblks.add( blk )
-        if writer.is_signal():
-          top._dag.genblk_reads[ blk ] = [ writer ]
-        top._dag.genblk_writes[ blk ] = all_readers
-        continue
-      # readers = all_readers
-      # fanout  = all_fanout
+    genblk_name = _genblk_name( writer, all_fanout, fanout )
 
-      wr_lca  = writer.get_host_component()
-      rd_lcas = [ x.get_host_component() for x in readers ]
+    # If all signals are top-level, we still need to generate an empty
+    # to convey the constraints using all_readers
 
-      # Find common ancestor: iteratively go to parent level and check if
-      # at the same level all objects' ancestors are the same
+    if fanout == 0:
+      gen_src = f"def {genblk_name}(): pass"
+      blk = exec_net_blk( {}, gen_src )
 
-      mindep  = min( wr_lca.get_component_level(),
-                min( [ x.get_component_level() for x in rd_lcas ] ) )
+      top._dag.genblks.add( blk )
+      top._dag.genblk_src[ blk ] = gen_src
+      if writer.is_signal():
+        top._dag.genblk_reads[ blk ] = [ writer ]
+      top._dag.genblk_writes[ blk ] = all_readers
+      return
+    # readers = all_readers
+    # fanout  = all_fanout
 
-      # First navigate all objects to the same level deep
+    wr_lca  = writer.get_host_component()
+    rd_lcas = [ x.get_host_component() for x in readers ]
 
-      for i in range( mindep, wr_lca.get_component_level() ):
-        wr_lca = wr_lca.get_parent_object()
+    # Find common ancestor: iteratively go to parent level and check if
+    # at the same level all objects' ancestors are the same
 
-      for i, x in enumerate( rd_lcas ):
-        for j in range( mindep, x.get_component_level() ):
-          x = x.get_parent_object()
-        rd_lcas[i] = x
+    mindep  = min( wr_lca.get_component_level(),
+              min( [ x.get_component_level() for x in rd_lcas ] ) )
 
-      # Then iteratively check if their ancestor is the same
+    # First navigate all objects to the same level deep
 
-      while wr_lca is not top:
-        succeed = True
-        for x in rd_lcas:
-          if x is not wr_lca:
-            succeed = False
-            break
-        if succeed: break
+    for i in range( mindep, wr_lca.get_component_level() ):
+      wr_lca = wr_lca.get_parent_object()
 
-        # Bring up all objects for another level
-        wr_lca = wr_lca.get_parent_object()
-        for i in range( fanout ):
-          rd_lcas[i] = rd_lcas[i].get_parent_object()
+    for i, x in enumerate( rd_lcas ):
+      for j in range( mindep, x.get_component_level() ):
+        x = x.get_parent_object()
+      rd_lcas[i] = x
 
-      lca_len = len( repr(wr_lca) )
-      _globals = {'s': wr_lca }
+    # Then iteratively check if their ancestor is the same
 
-      if isinstance( writer, Const ) and type(writer._dsl.const) is not int:
-        types = get_bitstruct_inst_all_classes( writer._dsl.const )
+    while wr_lca is not top:
+      succeed = True
+      for x in rd_lcas:
+        if x is not wr_lca:
+          succeed = False
+          break
+      if succeed: break
 
-        for t in types:
-          if t.__name__ in _globals:
-            assert t is _globals[ t.__name__ ], "Cannot handle two subfields with the same struct name but different structs"
-          _globals[ t.__name__ ] = t
-        wstr = repr(writer)
+      # Bring up all objects for another level
+      wr_lca = wr_lca.get_parent_object()
+      for i in range( fanout ):
+        rd_lcas[i] = rd_lcas[i].get_parent_object()
 
-      else:
-        wstr = f"s.{repr(writer)[lca_len+1:]}"
+    lca_len = len( repr(wr_lca) )
+    _globals = {'s': wr_lca }
+
+    if isinstance( writer, Const ) and type(writer._dsl.const) is not int:
+      types = get_bitstruct_inst_all_classes( writer._dsl.const )
+
+      for t in types:
+        if t.__name__ in _globals:
+          assert t is _globals[ t.__name__ ], "Cannot handle two subfields with the same struct name but different structs"
+        _globals[ t.__name__ ] = t
+      wstr = repr(writer)
+
+    else:
+      wstr = f"s.{repr(writer)[lca_len+1:]}"
 
-      rstrs   = [ f"s.{repr(x)[lca_len+1:]}" for x in readers ]
+    rstrs   = [ f"s.{repr(x)[lca_len+1:]}" for x in readers ]
 
-      gen_src = """
+    gen_src = """
 def {}():
   x = {}
   {}""".format( genblk_name, wstr, '\n  '.join([ f"{rstr} @= x" for rstr in rstrs ]) )
 
-      blk = compile_net_blk( _globals, gen_src, writer )
+    blk = exec_net_blk( _globals, gen_src )
 
-      top._dag.genblks.add( blk )
-      if writer.is_signal():
-        top._dag.genblk_reads[ blk ] = [ writer ]
-      top._dag.genblk_writes[ blk ] = all_readers
-
-    # Get the final list of update blocks
-    top._dag.final_upblks = top.get_all_update_blocks() | top._dag.genblks
+    top._dag.genblks.add( blk )
+    top._dag.genblk_hostobj[ blk ] = wr_lca
+    top._dag.genblk_src[ blk ] = gen_src
+    top._dag.genblk_writer[ blk ] = writer
+    if writer.is_signal():
+      top._dag.genblk_reads[ blk ] = [ writer ]
+    top._dag.genblk_writes[ blk ] = readers if self.collapse_nets else all_readers
 
   def _process_value_constraints( self, top ):
 
     # Query update block metadata from top
 
-    update_ff                    = top.get_all_update_ff()
     upblk_reads, upblk_writes, _ = top.get_all_upblk_metadata()
     genblk_reads, genblk_writes  = top._dag.genblk_reads, top._dag.genblk_writes
-    U_U, RD_U, WR_U, U_M         = top.get_all_explicit_constraints()
-
-    #---------------------------------------------------------------------
-    # Explicit constraint
-    #---------------------------------------------------------------------
-    # Schedule U1 before U2 when U1 == WR(x) < RD(x) == U2: combinational
-    #
-    # Explicitly, one should define these to invert the implicit constraint:
-    # - RD(x) < U when U == WR(x) --> RD(x) ( == U') < U == WR(x)
-    # - WR(x) > U when U == RD(x) --> RD(x) == U < WR(x) ( == U')
-    # constraint RD(x) < U1 & U2 reads  x --> U2 == RD(x) <  U1
-    # constraint RD(x) > U1 & U2 reads  x --> U1 <  RD(x) == U2 # impl
-    # constraint WR(x) < U1 & U2 writes x --> U2 == WR(x) <  U1 # impl
-    # constraint WR(x) > U1 & U2 writes x --> U1 <  WR(x) == U2
-    # Doesn't work for nested data struct and slice:
 
     read_upblks = defaultdict(set)
     write_upblks = defaultdict(set)
 
     constraint_objs = defaultdict(set)
-    expl_constraints = set( top._dsl.all_U_U_constraints )
 
     for data in [ upblk_reads, genblk_reads ]:
       for blk, reads in data.items():
@@ -235,6 +291,73 @@ def {}():
         for wr in writes:
           write_upblks[ wr ].add( blk )
 
+    # In collapse_nets mode, group the writes by the set of aliased
+    # top-level signals they belong to
+
+    net_aliases  = top._dag.net_aliases
+    alias_writes = defaultdict(list)
+
+    if net_aliases:
+      for obj in write_upblks:
+        if isinstance( obj, Signal ):
+          top_obj = obj.get_top_level_signal()
+          if top_obj in net_aliases:
+            alias_writes[ net_aliases[ top_obj ] ].append( obj )
+
+    U_U = self._process_explicit_constraints( top, read_upblks, write_upblks,
+                                              constraint_objs )
+
+    #---------------------------------------------------------------------
+    # Implicit constraint
+    #---------------------------------------------------------------------
+    # Synthesize total constraints between two upblks that read/write to
+    # the "same variable" (we also handle the read/write of a recursively
+    # nested field/slice)
+    #
+    # Implicitly, WR(x) < RD(x), so when U1 writes X and U2 reads x
+    # - U1 == WR(x) & U2 == RD(x) --> U1 == WR(x) < RD(x) == U2
+
+    impl_constraints = set()
+
+    for obj in read_upblks:
+      for u, v in self._implicit_read_constraints( top, obj, read_upblks,
+                                                   write_upblks, alias_writes ):
+        impl_constraints.add( (u, v) )
+        constraint_objs[ (u, v) ].add( obj )
+
+    for obj in write_upblks:
+      for u, v in self._implicit_write_constraints( top, obj, read_upblks,
+                                                    write_upblks ):
+        impl_constraints.add( (u, v) )
+        constraint_objs[ (u, v) ].add( obj )
+
+    top._dag.constraint_objs = constraint_objs
+    top._dag.all_constraints = { *U_U }
+    for (x, y) in impl_constraints:
+      if (y, x) not in U_U: # no conflicting expl
+        top._dag.all_constraints.add( (x, y) )
+
+  def _process_explicit_constraints( self, top, read_upblks, write_upblks,
+                                     constraint_objs ):
+    U_U, RD_U, WR_U, U_M = top.get_all_explicit_constraints()
+    U_U = set( U_U )
+
+    #---------------------------------------------------------------------
+    # Explicit constraint
+    #---------------------------------------------------------------------
+    # Schedule U1 before U2 when U1 == WR(x) < RD(x) == U2: combinational
+    #
+    # Explicitly, one should define these to invert the implicit constraint:
+    # - RD(x) < U when U == WR(x) --> RD(x) ( == U') < U == WR(x)
+    # - WR(x) > U when U == RD(x) --> RD(x) == U < WR(x) ( == U')
+    # constraint RD(x) < U1 & U2 reads  x --> U2 == RD(x) <  U1
+    # constraint RD(x) > U1 & U2 reads  x --> U1 <  RD(x) == U2 # impl
+    # constraint WR(x) < U1 & U2 writes x --> U2 == WR(x) <  U1 # impl
+    # constraint WR(x) > U1 & U2 writes x --> U1 <  WR(x) == U2
+    # Doesn't work for nested data struct and slice:
+
+    net_aliases = top._dag.net_aliases
+
     for typ in [ 'rd', 'wr' ]: # deduplicate code
       if typ == 'rd':
         constraints = RD_U
@@ -249,7 +372,16 @@ def {}():
         # enumerate upblks that has a constraint with x
         for (sign, co_blk) in constrained_blks:
 
-          for eq_blk in equal_blks[ obj ]: # blocks that are U == RD(x)
+          eq_blks = equal_blks.get( obj, () )
+
+          # WR(x) of an aliased top-level signal used to be the net block,
+          # which is now the writer of any signal in the alias group
+          if typ == 'wr' and obj in net_aliases:
+            eq_blks = set()
+            for x in net_aliases[ obj ]:
+              eq_blks |= write_upblks.get( x, set() )
+
+          for eq_blk in eq_blks: # blocks that are U == RD(x)
             if co_blk != eq_blk:
               if sign == 1: # RD/WR(x) < U is 1, RD/WR(x) > U is -1
                 # eq_blk == RD/WR(x) < co_blk
@@ -260,48 +392,53 @@ def {}():
                 U_U.add( (co_blk, eq_blk) )
                 constraint_objs[ (co_blk, eq_blk) ].add( obj )
 
-    #---------------------------------------------------------------------
-    # Implicit constraint
-    #---------------------------------------------------------------------
-    # Synthesize total constraints between two upblks that read/write to
-    # the "same variable" (we also handle the read/write of a recursively
-    # nested field/slice)
-    #
-    # Implicitly, WR(x) < RD(x), so when U1 writes X and U2 reads x
-    # - U1 == WR(x) & U2 == RD(x) --> U1 == WR(x) < RD(x) == U2
+    return U_U
 
-    impl_constraints = set()
+  def _implicit_read_constraints( self, top, obj, read_upblks, write_upblks,
+                                  alias_writes ):
+    update_ff   = top._dsl.all_update_ff
+    net_aliases = top._dag.net_aliases
 
     # Collect all objs that write the variable whose id is "read"
     # 1) RD A.b.b     - WR A.b.b, A.b, A
     # 2) RD A.b[1:10] - WR A.b[1:10], A.b, A
     # 3) RD A.b[1:10] - WR A.b[0:5], A.b[6], A.b[8:11]
 
-    for obj, rd_blks in read_upblks.items():
-      writers = []
+    writers = []
+
+    # Check parents. Cover 1) and 2)
+    x = obj
+    while x.is_signal():
+      if x in write_upblks:
+        writers.append( x )
+      x = x.get_parent_object()
 
-      # Check parents. Cover 1) and 2)
-      x = obj
-      while x.is_signal():
-        if x in write_upblks:
+    # Check the sibling slices. Cover 3)
+    if obj.is_signal():
+      for x in obj.get_sibling_slices():
+        if x.slice_overlap( obj ) and x in write_upblks:
           writers.append( x )
-        x = x.get_parent_object()
 
-      # Check the sibling slices. Cover 3)
-      if obj.is_signal():
-        for x in obj.get_sibling_slices():
-          if x.slice_overlap( obj ) and x in write_upblks:
+      # Check the other top-level signals that share the same storage
+      # with obj's top-level signal. Cover 1) 2) and 3) across the net
+      top_obj = obj.get_top_level_signal()
+      if top_obj in net_aliases:
+        for x in alias_writes[ net_aliases[ top_obj ] ]:
+          if x.get_top_level_signal() is not top_obj and _alias_overlap( obj, x ):
             writers.append( x )
 
-      # Add all constraints
-      for writer in writers:
-        for wr_blk in write_upblks[ writer ]:
-          if wr_blk not in update_ff:
-            for rd_blk in rd_blks:
-              if wr_blk != rd_blk:
-                # if rd_blk not in update_ff:
-                impl_constraints.add( (wr_blk, rd_blk) ) # wr < rd default
-                constraint_objs[ (wr_blk, rd_blk) ].add( obj )
+    # Add all constraints
+    rd_blks = read_upblks[ obj ]
+    for writer in writers:
+      for wr_blk in write_upblks[ writer ]:
+        if wr_blk not in update_ff:
+          for rd_blk in rd_blks:
+            if wr_blk != rd_blk:
+              # if rd_blk not in update_ff:
+              yield (wr_blk, rd_blk) # wr < rd default
+
+  def _implicit_write_constraints( self, top, obj, read_upblks, write_upblks ):
+    update_ff = top._dsl.all_update_ff
 
     # Collect all objs that read the variable whose id is "write"
     # 1) WR A.b.b.b, A.b.b, A.b, A (detect 2-writer conflict)
@@ -310,31 +447,289 @@ def {}():
     # 4) WR A.b[1:10], A.b[0:5], A.b[6] (detect 2-writer conflict)
     # "WR A.b[1:10] - RD A.b[0:5], A.b[6], A.b[8:11]" has been discovered
 
-    for obj, wr_blks in write_upblks.items():
-      readers = []
+    readers = []
 
-      # Check parents. Cover 2) and 3). 1) and 4) should be detected in elaboration
-      x = obj
-      while x.is_signal():
-        if x in read_upblks:
-          readers.append( x )
-        x = x.get_parent_object()
+    # Check parents. Cover 2) and 3). 1) and 4) should be detected in elaboration
+    x = obj
+    while x.is_signal():
+      if x in read_upblks:
+        readers.append( x )
+      x = x.get_parent_object()
 
-      # Add all constraints
-      for wr_blk in wr_blks:
-        if wr_blk not in update_ff:
-          for reader in readers:
-              for rd_blk in read_upblks[ reader ]:
-                if wr_blk != rd_blk:
-                  # if rd_blk not in update_ff:
-                  impl_constraints.add( (wr_blk, rd_blk) ) # wr < rd default
-                  constraint_objs[ (wr_blk, rd_blk) ].add( obj )
+    # Add all constraints
+    for wr_blk in write_upblks[ obj ]:
+      if wr_blk not in update_ff:
+        for reader in readers:
+            for rd_blk in read_upblks[ reader ]:
+              if wr_blk != rd_blk:
+                # if rd_blk not in update_ff:
+                yield (wr_blk, rd_blk) # wr < rd default
 
-    top._dag.constraint_objs = constraint_objs
-    top._dag.all_constraints = { *U_U }
+  #-----------------------------------------------------------------------
+  # Update in place after structural edits
+  #-----------------------------------------------------------------------
+  # The blocks of the removed nets and components are dropped together
+  # with their constraints, then the blocks of the new nets and
+  # components are generated and the implicit constraints are recomputed
+  # only for the variables that share a top-level signal with what the
+  # new blocks access. Explicit and method constraints are few, so they
+  # are processed again as a whole.
+
+  def _can_update_dag( self, top, log ):
+    dag = top._dag
+    # Greenlet wrapping replaces blocks in final_upblks, and collapsed
+    # nets may merge or split alias groups
+    return not log.rebuild and not self.collapse_nets and \
+           not getattr( dag, "collapse_nets", True ) and \
+           hasattr( dag, "net_genblk" ) and \
+           not hasattr( dag, "blk_greenlet_mapping" )
+
+  def _update_dag( self, top, log ):
+    dag = top._dag
+
+    placeholders = [ x for x in log.added_components if isinstance( x, Placeholder ) ]
+    if placeholders:
+      raise LeftoverPlaceholderError( placeholders )
+
+    new_nets = list( log.added_nets.values() )
+    blks = log.added_upblks | log.touched_upblks
+
+    # A patched net is checked from where the new members are attached
+    check_nets = list( new_nets )
+    adjacency  = top._dsl.all_adjacency
+    for (_, signals), _, added in log.patched_nets.values():
+      attach = { y for x in added for y in adjacency[x]
+                   if y in signals and y not in added }
+      check_nets.extend( (y, added | { y }) for y in attach )
+
+    top._check_upblk_writes( blks )
+    top._check_port_in_upblk( blks )
+    top._check_port_in_nets( check_nets )
+    top._check_upblk_calls( blks )
+
+    # Remove the net blocks of the removed nets
+
+    removed_blks = set( log.removed_upblks )
+
+    for writer, _ in log.removed_nets.values():
+      blk = dag.net_genblk.pop( writer, None )
+      if blk is not None:
+        dag.genblks.discard( blk )
+        dag.genblk_hostobj.pop( blk, None )
+        dag.genblk_reads.pop( blk, None )
+        dag.genblk_writes.pop( blk, None )
+        dag.genblk_src.pop( blk, None )
+        dag.genblk_writer.pop( blk, None )
+        removed_blks.add( blk )
+
+    # A net block that only tells the readers of a net apart is updated
+    # in place as long as all readers are top-level signals. Any other
+    # patched net gets a new block.
+
+    patched_objs = set()
+    for net, removed, added in log.patched_nets.values():
+      writer, signals = net
+      blk = dag.net_genblk[ writer ]
+      if blk in dag.genblk_hostobj or \
+         not all( x.is_top_level_signal() for x in added ):
+        new_nets.append( net )
+        dag.net_genblk.pop( writer )
+        dag.genblks.discard( blk )
+        dag.genblk_hostobj.pop( blk, None )
+        dag.genblk_reads.pop( blk, None )
+        dag.genblk_writes.pop( blk, None )
+        dag.genblk_src.pop( blk, None )
+        dag.genblk_writer.pop( blk, None )
+        removed_blks.add( blk )
+        continue
+
+      all_readers = [ x for x in dag.genblk_writes[ blk ] if x not in removed ]
+      all_readers.extend( added )
+      dag.genblk_writes[ blk ] = all_readers
+
+      blk.__name__ = _genblk_name( writer, len(all_readers), 0 )
+      dag.genblk_src[ blk ] = f"def {blk.__name__}(): pass"
+
+      if hasattr( dag, "upblk_objs" ):
+        reads, writes = dag.upblk_objs[ blk ]
+        dag.upblk_objs[ blk ] = (reads, tuple( all_readers ))
+        for x in removed:
+          _discard_blk( dag.write_upblks, dag.root_writes, x, blk )
+        for x in added:
+          dag.write_upblks.setdefault( x, set() ).add( blk )
+          dag.root_writes.setdefault( x, set() ).add( x )
+      patched_objs |= added
+
+    # The touched blocks are removed and added back with new metadata
+
+    if not hasattr( dag, "upblk_objs" ):
+      self._index_blocks( top, dag.final_upblks - removed_blks )
+    else:
+      self._unindex_blocks( top, removed_blks | log.touched_upblks )
+
+    dag.final_upblks -= removed_blks
+
+    genblks = dag.genblks
+    dag.genblks = set()
+    for writer, signals in new_nets:
+      self._generate_net_block( top, writer, signals, _compile_net_blk )
+    new_blks = blks | dag.genblks
+    dag.genblks |= genblks
+
+    dag.final_upblks |= new_blks
+    self._index_blocks( top, new_blks )
+
+    # Drop the constraints of the removed and touched blocks
+
+    dead = removed_blks | log.touched_upblks
+    dag.all_constraints = { (x, y) for (x, y) in dag.all_constraints
+                            if x not in dead and y not in dead }
+    constraint_objs = dag.constraint_objs
+    for k in [ k for k in constraint_objs if k[0] in dead or k[1] in dead ]:
+      del constraint_objs[ k ]
+
+    read_upblks, write_upblks = dag.read_upblks, dag.write_upblks
+
+    U_U = self._process_explicit_constraints( top, read_upblks, write_upblks,
+                                              constraint_objs )
+
+    roots = set( patched_objs )
+    for blk in new_blks:
+      reads, writes = dag.upblk_objs[ blk ]
+      roots.update( _root( x ) for x in reads )
+      roots.update( _root( x ) for x in writes )
+
+    impl_constraints = set()
+    for root in roots:
+      for obj in dag.root_reads.get( root, () ):
+        for u, v in self._implicit_read_constraints( top, obj, read_upblks,
+                                                     write_upblks, {} ):
+          impl_constraints.add( (u, v) )
+          constraint_objs[ (u, v) ].add( obj )
+
+      for obj in dag.root_writes.get( root, () ):
+        for u, v in self._implicit_write_constraints( top, obj, read_upblks,
+                                                      write_upblks ):
+          impl_constraints.add( (u, v) )
+          constraint_objs[ (u, v) ].add( obj )
+
+    dag.all_constraints |= U_U
     for (x, y) in impl_constraints:
       if (y, x) not in U_U: # no conflicting expl
-        top._dag.all_constraints.add( (x, y) )
+        dag.all_constraints.add( (x, y) )
+
+    if top._dsl.all_method_ports or top._dsl.all_M_constraints:
+      self._process_methods( top )
+
+    # The schedule of the edited design can't be cached under the old key.
+    # Scheduling is a linear pass over the updated DAG, so we just drop
+    # the stale schedule and let the schedule pass run again
+    dag.cache_key = None
+    dag.block_ids = None
+    if hasattr( top, "_sched" ):
+      del top._sched
+
+  def _index_blocks( self, top, blks ):
+    dag = top._dag
+    if not hasattr( dag, "upblk_objs" ):
+      dag.upblk_objs   = {}
+      dag.read_upblks  = {}
+      dag.write_upblks = {}
+      dag.root_reads   = {}
+      dag.root_writes  = {}
+
+    for blk in blks:
+      if blk in dag.genblks:
+        reads  = tuple( dag.genblk_reads.get( blk, () ) )
+        writes = tuple( dag.genblk_writes[ blk ] )
+      else:
+        reads  = tuple( top._dsl.all_upblk_reads[ blk ] )
+        writes = tuple( top._dsl.all_upblk_writes[ blk ] )
+      dag.upblk_objs[ blk ] = (reads, writes)
+
+      for x in reads:
+        dag.read_upblks.setdefault( x, set() ).add( blk )
+        dag.root_reads.setdefault( _root( x ), set() ).add( x )
+      for x in writes:
+        dag.write_upblks.setdefault( x, set() ).add( blk )
+        dag.root_writes.setdefault( _root( x ), set() ).add( x )
+
+  def _unindex_blocks( self, top, blks ):
+    dag = top._dag
+    for blk in blks:
+      if blk not in dag.upblk_objs: # added after the last update
+        continue
+      reads, writes = dag.upblk_objs.pop( blk )
+      for x in reads:
+        _discard_blk( dag.read_upblks, dag.root_reads, x, blk )
+      for x in writes:
+        _discard_blk( dag.write_upblks, dag.root_writes, x, blk )
+
+  def _process_value_constraints_cached( self, top ):
+    """ Look up the value constraints in the elaboration cache before
+    falling back to _process_value_constraints. Update blocks are stored
+    by their names from get_block_ids and objects by their full names,
+    both as indices into a list to keep the entry compact. """
+
+    cache = get_elaboration_cache()
+    if cache is None:
+      return self._process_value_constraints( top )
+
+    blk_ids = get_block_ids( top )
+    if blk_ids is None:
+      return self._process_value_constraints( top )
+
+    # Later passes extend the key to cache their own results
+    key    = make_key( _versions, get_design_key( top ), self.collapse_nets )
+    cached = cache.load( 'dag', key )
+
+    top._dag.cache_key = key
+    top._dag.block_ids = blk_ids
+
+    if cached is not None:
+      blk_names, obj_names, edges, edge_objs = cached
+      id_blk = { v: k for k, v in blk_ids.items() }
+      names  = get_name_map( top )
+      try:
+        blks = [ id_blk[x] for x in blk_names ]
+        objs = [ names[x] for x in obj_names ]
+      except KeyError: # stale entry
+        pass
+      else:
+        top._dag.all_constraints = { (blks[u], blks[v]) for u, v in edges }
+        top._dag.constraint_objs = constraint_objs = defaultdict(set)
+        for u, v, xs in edge_objs:
+          constraint_objs[ (blks[u], blks[v]) ] = { objs[x] for x in xs }
+        return
+
+    self._process_value_constraints( top )
+
+    order     = sorted( blk_ids, key=blk_ids.get )
+    blk_names = [ blk_ids[x] for x in order ]
+    blk_index = { blk: i for i, blk in enumerate( order ) }
+
+    names     = get_name_map( top )
+    obj_names = []
+    obj_index = {}
+    edge_objs = []
+    try:
+      edges = [ (blk_index[u], blk_index[v]) for u, v in top._dag.all_constraints ]
+      for (u, v), xs in top._dag.constraint_objs.items():
+        indices = []
+        for x in xs:
+          if x not in obj_index:
+            name = repr(x)
+            if names.get( name ) is not x:
+              return
+            obj_index[ x ] = len(obj_names)
+            obj_names.append( name )
+          indices.append( obj_index[ x ] )
+        edge_objs.append( (blk_index[u], blk_index[v], indices) )
+    # A constraint involves a block that isn't in final_upblks
+    except KeyError:
+      return
+
+    cache.store( 'dag', key, (blk_names, obj_names, edges, edge_objs) )
 
   #-----------------------------------------------------------------------
   # Process methods
@@ -590,3 +985,59 @@ def {}():
     for blocking_method in blocking_ifcs:
       for blk in method_blks[ blocking_method.method.method ]:
         top._dag.greenlet_upblks.add( blk )
+
+def _compile_net_blk( src, fname ):
+  return compile( src, filename=fname, mode="exec" )
+
+def _genblk_name( writer, all_fanout, fanout ):
+  return f"{writer!r}__{all_fanout}_{fanout}".replace( " ", "" ) \
+           .replace( ".", "_" ).replace( ":", "_" ) \
+           .replace( "[", "_" ).replace( "]", "_" ) \
+           .replace( "(", "_" ).replace( ")", "_" ) \
+           .replace( ",", "_" )
+
+def _discard_blk( index, roots, x, blk ):
+  xblks = index[ x ]
+  xblks.discard( blk )
+  if not xblks:
+    del index[ x ]
+    r = _root( x )
+    roots[ r ].discard( x )
+    if not roots[ r ]:
+      del roots[ r ]
+
+def _root( x ):
+  return x.get_top_level_signal() if x.is_signal() else x
+
+def get_block_ids( top ):
+  """ Return a dict that maps every block in top._dag.final_upblks to a
+  name that identifies the same block in a different process, or None
+  if two blocks share the same name. An update block is identified by
+  its host component and a net block by its writer and readers. """
+  genblks = top._dag.genblks
+  genblk_writes = top._dag.genblk_writes
+  hostobj = top._dsl.all_upblk_hostobj
+
+  ret = {}
+  for blk in top._dag.final_upblks:
+    if blk in genblks:
+      ret[ blk ] = ( blk.__name__, *sorted( repr(x) for x in genblk_writes[ blk ] ) )
+    else:
+      ret[ blk ] = ( repr( hostobj[ blk ] ), blk.__name__ )
+
+  if len( set( ret.values() ) ) != len( ret ):
+    return None
+  return ret
+
+# Check if two objects whose top-level signals are aliased may overlap.
+# We only compare the slices that are directly taken from the top-level
+# signals and conservatively assume overlap for all other cases.
+
+def _alias_overlap( x, y ):
+  if x.is_top_level_signal() or y.is_top_level_signal():
+    return True
+  if x._dsl.slice and y._dsl.slice and \
+     x.get_parent_object().is_top_level_signal() and \
+     y.get_parent_object().is_top_level_signal():
+    return _overlap( x._dsl.slice, y._dsl.slice )
+  return True
@@ -0,0 +1,544 @@
+"""
+========================================================================
+PartitionedSimPass.py
+========================================================================
+A drop-in replacement of PrepareSimPass that simulates a single design
+in multiple worker processes. The hierarchy is cut into partitions, each
+of which is a subtree rooted at a component marked with
+
+  tile.set_metadata( PartitionedSimPass.partition, True )
+
+or, if no component is marked, every child component of the top whose
+boundary is registered. Every block that is not inside a partition runs
+in the main process, and the partitions are distributed among the
+worker processes forked at the end of this pass.
+
+A partition boundary is legal only if every signal that crosses it is
+either written by update_ff blocks or is a top-level input port. This
+way each process can evaluate its combinational logic independently, and
+the boundary values only need to be exchanged twice per cycle through a
+shared memory buffer:
+
+  main process                      worker process
+  ------------                      --------------
+  export top-level inputs
+  -------------------- barrier --------------------
+  update blocks                     import top-level inputs
+                                    update blocks
+  update_ff blocks, flip            update_ff blocks, flip
+  export registered outputs         export registered outputs
+  -------------------- barrier --------------------
+  import registered outputs         import registered outputs
+  update blocks                     update blocks
+
+The main process only observes the boundary values of the partitions
+and the signals of top. Line traces and waveforms that look into a
+partition are not supported.
+
+Every cycle pays for two barriers and the copies of the boundary values,
+so the speedup depends on how much work each partition does per cycle
+and on the number of free cores. scripts/partitioned-sim-bench measures
+it for a ring of registered tiles.
+"""
+import linecache
+import multiprocessing
+import os
+import threading
+import traceback
+import weakref
+from collections import defaultdict
+from multiprocessing import shared_memory
+
+from pymtl3.datatypes import b1, is_bitstruct_class, mk_bits
+from pymtl3.dsl import MetadataKey
+from pymtl3.dsl.Component import Component
+from pymtl3.dsl.Connectable import MethodPort, Signal
+from pymtl3.extra.pypy import custom_exec
+from pymtl3.passes.errors import UnsupportedDesignError
+from pymtl3.passes.tracing.PrintTextWavePass import PrintTextWavePass
+from pymtl3.passes.tracing.VcdGenerationPass import VcdGenerationPass
+
+from .PrepareSimPass import PrepareSimPass
+from .SimpleTickPass import SimpleTickPass
+
+_CMD_TICK = 0
+_CMD_STOP = 1
+
+class PartitionError( Exception ):
+  """ Raise when a partition boundary is not registered """
+
+def _worker_loop( buf, barrier, begin, end ):
+  try:
+    while True:
+      barrier.wait()
+      if buf[0] == _CMD_STOP:
+        return
+      begin()
+      barrier.wait()
+      end()
+  except threading.BrokenBarrierError:
+    pass
+  except:
+    traceback.print_exc()
+    barrier.abort()
+
+class PartitionedSimPass( PrepareSimPass ):
+
+  # PartitionedSimPass public pass data
+
+  #: Mark a component as the root of a partition
+  #:
+  #: Type: ``bool``; input
+  #:
+  #: Default value: False
+  partition = MetadataKey(bool)
+
+  def __init__( self, nworkers=None, print_line_trace=True, reset_active_high=True ):
+    super().__init__( print_line_trace, reset_active_high )
+    self.nworkers = nworkers
+
+  def __call__( self, top ):
+    name = self.__class__.__name__
+
+    for x in sorted( top.get_all_object_filter( lambda x: isinstance( x, MethodPort ) ), key=repr ):
+      raise UnsupportedDesignError( x, name, "partitioned simulation only supports pure RTL designs" )
+
+    for blk in sorted( top.get_all_update_once(), key=lambda x: x.__name__ ):
+      host = top.get_update_block_host_component( blk )
+      raise UnsupportedDesignError( f"{host!r}.{blk.__name__}", name,
+                                    "partitioned simulation only supports pure RTL designs" )
+
+    if top.has_metadata( VcdGenerationPass.vcd_func ) or \
+       top.has_metadata( PrintTextWavePass.textwave_func ):
+      raise UnsupportedDesignError( top, name, "waveform generation is enabled" )
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+      raise UnsupportedDesignError( top, name, "the 'fork' start method is not available" )
+
+    super().__call__( top )
+
+    self.start_workers( top )
+
+  #-----------------------------------------------------------------------
+  # analyze_partitions
+  #-----------------------------------------------------------------------
+  # Given the root components of the partitions, return the set of
+  # partition ids (0 is the main process) each block runs in, the
+  # partitions that read each value group, the blocks of each partition
+  # that write each value group, and the pairs of partitions that violate
+  # the registered-boundary rule. Signals that share the same value object
+  # after lock_in_simulation belong to the same value group.
+
+  @staticmethod
+  def analyze_partitions( top, roots ):
+    root_ids = { id(x): i+1 for i, x in enumerate(roots) }
+    mapping  = top._sim.signal_object_mapping
+    dag      = top._dag
+
+    part_cache = {}
+    def get_part( m ):
+      try:
+        return part_cache[ m ]
+      except KeyError:
+        x = m
+        while x is not top and id(x) not in root_ids:
+          x = x.get_parent_object()
+        ret = part_cache[ m ] = root_ids.get( id(x), 0 )
+        return ret
+
+    def get_group( x ):
+      return id( mapping[ x.get_top_level_signal() ][-1] )
+
+    def get_reads_writes( blk ):
+      if blk in dag.genblks:
+        # Net blocks driven by a constant have no reads
+        reads, writes = dag.genblk_reads.get( blk, () ), dag.genblk_writes[ blk ]
+      else:
+        reads, writes = top._dsl.all_upblk_reads[ blk ], top._dsl.all_upblk_writes[ blk ]
+      return ( { get_group(x) for x in reads  if isinstance( x, Signal ) },
+               { get_group(x) for x in writes if isinstance( x, Signal ) } )
+
+    update_ff  = top.get_all_update_ff()
+    scc_blocks = getattr( top._sched, 'scc_blocks', {} )
+
+    blocks = []
+    for blk in top._sched.update_schedule + top._sched.schedule_ff:
+      blocks.extend( scc_blocks.get( blk, [ blk ] ) )
+
+    blk_rw = { blk: get_reads_writes( blk ) for blk in blocks }
+
+    # Update blocks run in the partition of their host components
+
+    blk_parts = {}
+    for blk in blocks:
+      if blk not in dag.genblks:
+        blk_parts[ blk ] = { get_part( top.get_update_block_host_component( blk ) ) }
+
+    # Net blocks are replicated in every partition that reads their
+    # output. A net block can feed another one, so we iterate until there
+    # is no change.
+
+    # The main process also reads every signal of top, since the user
+    # can peek a top-level output port that is driven by a partition.
+
+    group_readers = defaultdict(set)
+    for x in mapping:
+      if x.get_host_component() is top:
+        group_readers[ get_group(x) ].add( 0 )
+
+    for blk, parts in blk_parts.items():
+      for g in blk_rw[ blk ][0]:
+        group_readers[ g ] |= parts
+
+    genblks = [ blk for blk in blocks if blk in dag.genblks ]
+    changed = True
+    while changed:
+      changed = False
+      for blk in genblks:
+        parts = set()
+        for g in blk_rw[ blk ][1]:
+          parts |= group_readers[ g ]
+        if parts - blk_parts.get( blk, set() ):
+          blk_parts[ blk ] = parts
+          for g in blk_rw[ blk ][0]:
+            group_readers[ g ] |= parts
+          changed = True
+
+    for blk in genblks:
+      if not blk_parts.get( blk ):
+        blk_parts[ blk ] = { 0 }
+
+    group_writers = defaultdict( lambda: defaultdict(list) )
+    for blk in blocks:
+      if blk not in dag.genblks:
+        part, = blk_parts[ blk ]
+        for g in blk_rw[ blk ][1]:
+          group_writers[ g ][ part ].append( blk )
+
+    # Check the registered-boundary rule
+
+    violations = set()
+    for blk in top._sched.update_schedule:
+      if blk in scc_blocks:
+        parts = set()
+        for x in scc_blocks[ blk ]:
+          parts |= blk_parts[ x ]
+        if len(parts) > 1:
+          violations.add( ( frozenset(parts), scc_blocks[ blk ][0] ) )
+
+    for g, readers in group_readers.items():
+      writers = group_writers.get( g, {} )
+      if len(writers) > 1:
+        violations.add( ( frozenset(writers), next(iter(writers.values()))[0] ) )
+      for part, blks in writers.items():
+        if readers - { part }:
+          for blk in blks:
+            if blk not in update_ff:
+              violations.add( ( frozenset( readers | { part } ), blk ) )
+
+    return blk_parts, group_readers, group_writers, violations
+
+  #-----------------------------------------------------------------------
+  # partition_design
+  #-----------------------------------------------------------------------
+
+  def partition_design( self, top ):
+
+    marked = top.get_all_object_filter( lambda x: isinstance( x, Component ) and
+                                                  x.has_metadata( self.partition ) and
+                                                  x.get_metadata( self.partition ) )
+    if marked:
+      roots = sorted( marked, key=repr )
+      if top in roots:
+        raise PartitionError( "The top component cannot be a partition" )
+      for x in roots:
+        y = x.get_parent_object()
+        while y is not top:
+          if y in marked:
+            raise PartitionError( f"Partition {x!r} is nested in partition {y!r}" )
+          y = y.get_parent_object()
+    else:
+      roots = top.get_child_components( repr )
+
+    # Partitions with illegal boundaries are rejected if they are marked
+    # by the user, otherwise merged back into the main process.
+
+    while True:
+      blk_parts, group_readers, group_writers, violations = \
+        self.analyze_partitions( top, roots )
+      if not violations:
+        break
+
+      if marked:
+        parts, blk = sorted( violations, key=lambda x: x[1].__name__ )[0]
+        name = blk.__name__
+        if blk not in top._dag.genblks:
+          name += f" in {top.get_update_block_host_component(blk)!r}"
+        raise PartitionError( f"{name} is not an update_ff block but its output crosses partitions "
+                              f"{', '.join( repr(roots[i-1]) if i else 'top' for i in sorted(parts) )}" )
+
+      bad = set()
+      for parts, _ in violations:
+        bad |= parts
+      roots = [ x for i, x in enumerate(roots) if i+1 not in bad ]
+
+    top._sim.partitions = roots
+
+    # Assign partitions to workers, largest partition first
+
+    nworkers = self.nworkers or os.cpu_count()
+    nworkers = min( nworkers, len(roots) )
+
+    sizes = [0] * ( len(roots) + 1 )
+    for blk, parts in blk_parts.items():
+      for p in parts:
+        sizes[p] += 1
+
+    proc_of = [ 0 ] * ( len(roots) + 1 )
+    load    = [ 0 ] * ( nworkers + 1 )
+    for p in sorted( range( 1, len(roots)+1 ), key=lambda p: -sizes[p] ):
+      w = min( range( 1, nworkers+1 ), key=lambda w: load[w] )
+      proc_of[p] = w
+      load[w]   += sizes[p]
+
+    top._sim.partition_workers = [ [ roots[p-1] for p in range( 1, len(roots)+1 ) if proc_of[p] == w ]
+                                   for w in range( 1, nworkers+1 ) ]
+
+    self.nprocs = nworkers + 1
+    self.blk_procs = { blk: { proc_of[p] for p in parts } for blk, parts in blk_parts.items() }
+
+    # Allocate a shared memory slot for every value group that is read by
+    # a process other than its writer, or for every top-level input port
+    # that is read by a worker.
+
+    mapping = top._sim.signal_object_mapping
+    reps = {}
+    for x in sorted( mapping, key=repr ):
+      if x.is_top_level_signal():
+        reps.setdefault( id( mapping[x][-1] ), x )
+
+    inport_groups = { id( mapping[x][-1] ) for x in mapping
+                      if x.is_input_value_port() and x.get_host_component() is top }
+
+    offset = 8 # the first byte is the command
+    self.imports1 = [ [] for _ in range(self.nprocs) ]
+    self.exports1 = [ [] for _ in range(self.nprocs) ]
+    self.imports2 = [ [] for _ in range(self.nprocs) ]
+    self.exports2 = [ [] for _ in range(self.nprocs) ]
+
+    for g in sorted( group_readers, key=lambda g: repr(reps[g]) ):
+      readers = { proc_of[p] for p in group_readers[g] }
+      writers = { proc_of[p] for p in group_writers.get( g, {} ) }
+      rep     = reps[g]
+      nbytes  = ( rep._dsl.Type.nbits + 7 ) // 8
+
+      if writers:
+        writer, = writers
+        if readers - writers:
+          slot = ( rep, offset, nbytes )
+          self.exports2[ writer ].append( slot )
+          for r in sorted( readers - writers ):
+            self.imports2[ r ].append( slot )
+          offset += nbytes
+
+      elif g in inport_groups and readers - { 0 }:
+        slot = ( rep, offset, nbytes )
+        self.exports1[0].append( slot )
+        for r in sorted( readers - { 0 } ):
+          self.imports1[ r ].append( slot )
+        offset += nbytes
+
+    self.shm = shared_memory.SharedMemory( create=True, size=offset )
+    self.shm.buf[0] = _CMD_TICK
+
+    # Only flip the registers written by the process itself
+
+    self.flips = [ [] for _ in range(self.nprocs) ]
+    for blk in top._sched.schedule_ff:
+      proc, = self.blk_procs[ blk ]
+      for x in top._dsl.all_upblk_writes[ blk ]:
+        if isinstance( x, Signal ) and x._dsl.needs_double_buffer:
+          self.flips[ proc ].append( x )
+
+  def gen_process_function( self, top, name, slots_in, slots_out, flips ):
+    lines = [ "def compile_partition( s, _buf ):",
+             f"  def {name}():" ]
+
+    _globals = { 'is_bitstruct_class': is_bitstruct_class, '_from': int.from_bytes }
+
+    for x, lo, nbytes in slots_in:
+      if is_bitstruct_class( x._dsl.Type ):
+        _globals[ f"_B{x._dsl.Type.nbits}" ] = mk_bits( x._dsl.Type.nbits )
+        lines.append( f"    {x!r} @= _B{x._dsl.Type.nbits}( _from( _buf[{lo}:{lo+nbytes}], 'little' ) )" )
+      else:
+        lines.append( f"    {x!r} @= _from( _buf[{lo}:{lo+nbytes}], 'little' )" )
+
+    done = set()
+    for x in sorted( flips, key=repr ):
+      if repr(x) not in done:
+        done.add( repr(x) )
+        lines.append( f"    {x!r}._flip()" )
+
+    for x, lo, nbytes in slots_out:
+      if is_bitstruct_class( x._dsl.Type ):
+        lines.append( f"    _buf[{lo}:{lo+nbytes}] = int( {x!r}.to_bits() ).to_bytes( {nbytes}, 'little' )" )
+      else:
+        lines.append( f"    _buf[{lo}:{lo+nbytes}] = int( {x!r} ).to_bytes( {nbytes}, 'little' )" )
+
+    lines += [ "    pass",
+              f"  return {name}" ]
+
+    filename = f"partition_{name}_{id(top)}"
+    _locals = {}
+    custom_exec( compile( '\n'.join(lines), filename=filename, mode='exec' ), _globals, _locals )
+    linecache.cache[ filename ] = (1, None, lines, filename)
+    return _locals['compile_partition']( top, self.shm.buf )
+
+  def process_schedule( self, top, proc ):
+    scc_blocks = getattr( top._sched, 'scc_blocks', {} )
+    ret = []
+    for blk in top._sched.update_schedule:
+      members = scc_blocks.get( blk, [ blk ] )
+      if proc in self.blk_procs[ members[0] ]:
+        ret.append( blk )
+    return ret
+
+  #-----------------------------------------------------------------------
+  # Overridden hooks of PrepareSimPass
+  #-----------------------------------------------------------------------
+
+  # Override
+  def create_sim_eval_comb( self, top ):
+    # This is the first hook after lock_in_simulation
+    self.partition_design( top )
+
+    self.main_comb = self.process_schedule( top, 0 )
+    self.main_flip = self.gen_process_function( top, 'main_flip', [], [], self.flips[0] )
+
+    top.sim_eval_combinational = SimpleTickPass.gen_tick_function(
+      [ top._sim.check_top_level_inports ] + self.main_comb )
+
+  # Override
+  def collect_ff_funcs( self, top ):
+    # Only the update_ff blocks and the flips of the main process
+    ff    = { blk for blk in top._sched.schedule_ff if 0 not in self.blk_procs[ blk ] }
+    flips = set( top._sched.schedule_posedge_flip )
+    return [ self.main_flip if x in flips else x
+             for x in super().collect_ff_funcs( top ) if x not in ff ]
+
+  # Override
+  def create_sim_tick( self, top ):
+    barrier = self.barrier = multiprocessing.get_context('fork').Barrier( self.nprocs )
+
+    def sync():
+      try:
+        barrier.wait()
+      except threading.BrokenBarrierError:
+        raise RuntimeError( "A partition worker has failed, see the traceback above" ) from None
+
+    export1 = self.gen_process_function( top, 'main_export1', [], self.exports1[0], [] )
+    export2 = self.gen_process_function( top, 'main_export2', [], self.exports2[0], [] )
+    import2 = self.gen_process_function( top, 'main_import2', self.imports2[0], [], [] )
+
+    begin = [ export1, sync ] + self.main_comb
+    end   = self.collect_ff_funcs( top ) + [ export2, sync, import2 ] + self.main_comb
+
+    final_schedule = begin[::]
+    if self.print_line_trace and hasattr( top, 'line_trace' ):
+      final_schedule.append( top.print_line_trace )
+    final_schedule += end
+    final_schedule.append( top._sim.check_top_level_inports )
+
+    top._sim.final_schedule = final_schedule
+    top.sim_tick = SimpleTickPass.gen_tick_function( final_schedule )
+
+    self.main_begin = SimpleTickPass.gen_tick_function( begin )
+    self.main_end   = SimpleTickPass.gen_tick_function( end )
+
+  # Override
+  def create_sim_reset( self, top ):
+    begin = self.main_begin
+    end   = self.main_end
+    up    = SimpleTickPass.gen_tick_function( self.main_comb )
+
+    print_line_trace = self.print_line_trace and hasattr( top, 'line_trace' )
+    active_high      = self.reset_active_high
+
+    def sim_reset():
+      if print_line_trace:
+        print()
+      top.reset @= b1( active_high )
+
+      # cycle 0 -> 1 -> 2 -> 3
+      for i in range(3):
+        begin()
+        end()
+        if print_line_trace and i < 2:
+          print( f"{top._sim.simulated_cycles:3}r {top.line_trace()}" )
+
+      top.reset @= b1( not active_high )
+      up()
+
+    top.sim_reset = sim_reset
+
+  # Override
+  def create_sim_checkpoint( self, top ):
+    # The state of the partitions lives in the worker processes
+    def sim_checkpoint( path ):
+      raise NotImplementedError( "PartitionedSimPass doesn't support checkpoints" )
+
+    top.sim_checkpoint = sim_checkpoint
+    top.sim_restore    = sim_checkpoint
+
+  # Override
+  def create_sim_fast_forward( self, top ):
+    # The registers of the partitions live in the worker processes
+    top._sim.fast_forward_blockers = [ "PartitionedSimPass" ]
+    def sim_fast_forward( max_cycles=None ):
+      return 0
+    top.sim_fast_forward = sim_fast_forward
+
+  #-----------------------------------------------------------------------
+  # start_workers
+  #-----------------------------------------------------------------------
+
+  def start_workers( self, top ):
+    ctx = multiprocessing.get_context('fork')
+
+    procs = []
+    for w in range( 1, self.nprocs ):
+      comb  = self.process_schedule( top, w )
+      ff    = [ blk for blk in top._sched.schedule_ff if w in self.blk_procs[ blk ] ]
+
+      import1 = self.gen_process_function( top, f"w{w}_import1", self.imports1[w], [], [] )
+      flip_export2 = self.gen_process_function( top, f"w{w}_flip_export2", [],
+                                                self.exports2[w], self.flips[w] )
+      import2 = self.gen_process_function( top, f"w{w}_import2", self.imports2[w], [], [] )
+
+      begin = SimpleTickPass.gen_tick_function( [ import1 ] + comb + ff + [ flip_export2 ] )
+      end   = SimpleTickPass.gen_tick_function( [ import2 ] + comb )
+
+      p = ctx.Process( target=_worker_loop, args=( self.shm.buf, self.barrier, begin, end ),
+                       daemon=True )
+      p.start()
+      procs.append( p )
+
+    top._sim.partition_procs = procs
+
+    # Note that the finalizer must not hold a reference to top
+
+    def finalize( shm, barrier, procs ):
+      if procs:
+        shm.buf[0] = _CMD_STOP
+        try:
+          barrier.wait( timeout=5 )
+        except threading.BrokenBarrierError:
+          pass
+        for p in procs:
+          p.join( timeout=5 )
+          if p.is_alive():
+            p.terminate()
+      shm.close()
+      shm.unlink()
+
+    top.sim_finalize = weakref.finalize( top, finalize, self.shm, self.barrier, procs )
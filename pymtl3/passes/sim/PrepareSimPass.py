@@ -7,14 +7,22 @@ Author : Shunning Jiang
 Date   : Jan 26, 2020
 """
 
+import ast
+import dis
+import io
+import pickle
+import random
+import sys
+from collections import deque
+
 import py
 
-from pymtl3.datatypes import Bits, b1
+from pymtl3.datatypes import Bits, b1, is_bitstruct_class, is_bitstruct_inst, mk_bits
+from pymtl3.datatypes.bitstructs import _PACKED, _bitstruct_hash_cache
 from pymtl3.dsl.Component import Component
-from pymtl3.dsl.Connectable import Const, Interface, MethodPort, Signal
+from pymtl3.dsl.Connectable import CalleePort, Const, Interface, MethodPort, Signal
 from pymtl3.dsl.NamedObject import NamedObject
 from pymtl3.extra.pypy import custom_exec
-from pymtl3.passes.backends.verilog import VerilogTBGenPass
 from pymtl3.passes.BasePass import BasePass, PassMetadata
 from pymtl3.passes.errors import PassOrderError
 from pymtl3.passes.tracing.CLLineTracePass import CLLineTracePass
@@ -23,14 +31,27 @@ from pymtl3.passes.tracing.PrintTextWavePass import PrintTextWavePass
 from pymtl3.passes.tracing.VcdGenerationPass import VcdGenerationPass
 
 from .SimpleTickPass import SimpleTickPass
+from .SimProfilingPass import SimProfilingPass
+
+# Importing VerilogTBGenPass loads the Verilog backend and RTLIR, which a
+# pure-Python simulation never needs. Testbench hooks can only have been
+# added by code that already imported it.
 
+_vtbgen_module = "pymtl3.passes.backends.verilog.tbgen.VerilogTBGenPass"
+
+def _get_vtbgen_hooks( top ):
+  module = sys.modules.get( _vtbgen_module )
+  if module is not None and top.has_metadata( module.VerilogTBGenPass.vtbgen_hooks ):
+    return top.get_metadata( module.VerilogTBGenPass.vtbgen_hooks )
+  return []
 
 class PrepareSimPass( BasePass ):
-  def __init__( self, print_line_trace=True, reset_active_high=True ):
+  def __init__( self, print_line_trace=True, reset_active_high=True, flat_storage=False ):
     assert reset_active_high in [ True, False ]
 
     self.print_line_trace  = print_line_trace
     self.reset_active_high = reset_active_high
+    self.flat_storage      = flat_storage
 
   def __call__( self, top ):
     if hasattr(top, "sim_reset"):
@@ -53,10 +74,15 @@ class PrepareSimPass( BasePass ):
     self.create_lock_unlock_simulation( top )
 
     top.lock_in_simulation()
+    if self.flat_storage:
+      self.create_flat_storage( top )
 
     self.create_sim_eval_comb( top )
     self.create_sim_tick( top )
     self.create_sim_reset( top )
+    self.create_dirty_tracking_guard( top )
+    self.create_sim_checkpoint( top )
+    self.create_sim_fast_forward( top )
 
 
   def create_sim_eval_comb( self, top ):
@@ -83,6 +109,7 @@ class PrepareSimPass( BasePass ):
     final_schedule += self.collect_ff_funcs( top )
     final_schedule += top._sched.update_schedule
     final_schedule.append( top._sim.check_top_level_inports )
+    top._sim.final_schedule = final_schedule
     top.sim_tick = SimpleTickPass.gen_tick_function( final_schedule )
 
   def collect_ff_funcs( self, top ):
@@ -95,8 +122,10 @@ class PrepareSimPass( BasePass ):
     if top.has_metadata( PrintTextWavePass.textwave_func ):
       ret.append( top.get_metadata( PrintTextWavePass.textwave_func ) )
 
-    if top.has_metadata( VerilogTBGenPass.vtbgen_hooks ):
-      ret.extend( top.get_metadata( VerilogTBGenPass.vtbgen_hooks ) )
+    ret.extend( _get_vtbgen_hooks( top ) )
+
+    if top.has_metadata( SimProfilingPass.tick_hook ):
+      ret.append( top.get_metadata( SimProfilingPass.tick_hook ) )
 
     ret.extend( top._sched.schedule_ff )
     ret.extend( top._sched.schedule_posedge_flip )
@@ -142,6 +171,236 @@ class PrepareSimPass( BasePass ):
 
     top.sim_reset = sim_reset
 
+  # Move the values of all top-level signals into flat lists (see
+  # FlatStorage) and flip all registers with one slice assignment unless
+  # the schedule pass only flips the written ones. Falls back to normal
+  # storage with the RPython Bits from mamba.
+
+  def create_flat_storage( self, top ):
+    from .FlatStorage import create_flat_storage
+
+    top._sim.flat_storage = storage = create_flat_storage( top )
+    if storage is not None and not hasattr( top._sched, "stop_dirty_tracking" ):
+      top._sched.schedule_posedge_flip = [ storage.flip ]
+
+  # With dirty_flip, SimpleSchedulePass swaps Bits.__ilshift__ during the
+  # clock edge. Swap it back if an update_ff block raises so that <<= in
+  # the rest of the process doesn't keep recording into this model.
+
+  def create_dirty_tracking_guard( self, top ):
+    if not hasattr( top._sched, "stop_dirty_tracking" ):
+      return
+
+    stop  = top._sched.stop_dirty_tracking
+    tick  = top.sim_tick
+    reset = top.sim_reset
+
+    def sim_tick():
+      try:
+        tick()
+      except BaseException:
+        stop()
+        raise
+
+    def sim_reset():
+      try:
+        reset()
+      except BaseException:
+        stop()
+        raise
+
+    top.sim_tick  = sim_tick
+    top.sim_reset = sim_reset
+
+  def create_sim_checkpoint( self, top ):
+
+    def sim_checkpoint( path ):
+      for blk in getattr( top._dag, 'blk_greenlet_mapping', {} ).values():
+        if blk.is_suspended():
+          raise NotImplementedError( f"Cannot checkpoint when {blk.__name__} is blocked "
+                                     f"in the middle of a method call" )
+
+      state = {
+        'top'     : f"{top.__class__.__module__}.{top.__class__.__qualname__}",
+        'cycles'  : top._sim.simulated_cycles,
+        'layout'  : { name: _type_key( value.__class__ )
+                      for name, value in _collect_signal_values( top ) },
+        'signals' : { name: _get_value_state( value )
+                      for name, value in _collect_signal_values( top ) },
+        'objects' : { repr(obj): attrs for obj, attrs in _collect_python_state( top ) },
+      }
+
+      try:
+        data = _dumps( state )
+      except Exception as e:
+        # Locate the culprit for a better error message
+        for obj, attrs in state['objects'].items():
+          for name, value in attrs.items():
+            try:
+              _dumps( value )
+            except Exception:
+              raise TypeError( f"Cannot checkpoint top{obj[1:]}.{name} of type "
+                               f"{type(value).__name__}: {e}" ) from None
+        raise
+
+      with open( path, 'wb' ) as f:
+        f.write( data )
+
+    def sim_restore( path ):
+      with open( path, 'rb' ) as f:
+        state = _BitstructUnpickler( f ).load()
+
+      name = f"{top.__class__.__module__}.{top.__class__.__qualname__}"
+      if state['top'] != name:
+        raise ValueError( f"The checkpoint is taken from {state['top']}, not {name}" )
+
+      values = dict( _collect_signal_values( top ) )
+      if { name: _type_key( value.__class__ ) for name, value in values.items() } != state['layout']:
+        raise ValueError( "The checkpoint is taken from a model with different parameters" )
+
+      objs = { repr(obj): obj for obj, _ in _collect_python_state( top ) }
+      for obj_name in state['objects']:
+        if obj_name not in objs:
+          raise ValueError( f"The checkpoint has state of top{obj_name[1:]} "
+                            f"which doesn't exist in this model" )
+
+      for name, value in values.items():
+        _set_value_state( value, state['signals'][ name ] )
+
+      for obj_name, attrs in state['objects'].items():
+        obj = objs[ obj_name ]
+        for name, value in attrs.items():
+          _set_python_state( obj, name, value )
+
+      top._sim.simulated_cycles = state['cycles']
+
+      # The values recorded by change-sensitive update_ff scheduling are
+      # stale now
+      if hasattr( top._sched, 'reset_ff_gate' ):
+        top._sched.reset_ff_gate()
+
+    top.sim_checkpoint = sim_checkpoint
+    top.sim_restore    = sim_restore
+
+  #-----------------------------------------------------------------------
+  # create_sim_fast_forward
+  #-----------------------------------------------------------------------
+  # top.sim_fast_forward() is supposed to be called right after every
+  # sim_tick in a loop that doesn't drive top-level inputs (e.g., run_sim).
+  # A tick is quiet if no register and no top-level input changed and all
+  # stateful components were idle at the end of the previous tick. After
+  # two consecutive quiet ticks, the signals must have reached a fixed
+  # point, so we can skip the cycles in which all stateful components
+  # stay idle by advancing the cycle counter and their internal timers.
+  #
+  # A stateful component is a component that owns update_once blocks,
+  # method ports, or update/update_ff blocks that may modify Python-side
+  # state (see _may_write_python_state). It has to implement
+  # idle_cycles() that returns 0 if it
+  # has work to do in the next cycle, the number of following cycles in
+  # which it does nothing observable, or None if it stays idle until a
+  # method call or a signal wakes it up. It may also implement
+  # skip_cycles( ncycles ) to advance its internal timers. Fast-forward is
+  # disabled if any stateful component doesn't implement idle_cycles.
+
+  def create_sim_fast_forward( self, top ):
+    blockers = []
+
+    if top.has_metadata( VcdGenerationPass.vcd_func ) or \
+       top.has_metadata( PrintTextWavePass.textwave_func ) or \
+       _get_vtbgen_hooks( top ):
+      blockers.append( "waveform/testbench generation needs every cycle" )
+
+    # The internal state of an imported model is invisible to us
+    for x in sorted( top._dsl.all_components, key=repr ):
+      if hasattr( x, '_ffi_m' ):
+        blockers.append( f"top{repr(x)[1:]} is an imported model" )
+
+    hosts = { top.get_update_block_host_component( x ) for x in top.get_all_update_once() }
+    for blk in top.get_all_update_blocks():
+      host = top.get_update_block_host_component( blk )
+      if host not in hosts:
+        info = host.get_update_block_info( blk )
+        if info is None or _may_write_python_state( info[-1] ):
+          hosts.add( host )
+    hosts.update( x.get_host_component() for x in top.get_all_object_filter(
+                  lambda x: isinstance( x, CalleePort ) and x.method is not None ) )
+    stateful = sorted( hosts, key=repr )
+    for x in stateful:
+      if not hasattr( x, 'idle_cycles' ):
+        blockers.append( f"top{repr(x)[1:]} doesn't implement idle_cycles" )
+
+    top._sim.fast_forward_blockers = blockers
+
+    # Registers and top-level input ports determine the signals of the
+    # next cycle
+    leaves = []
+    done   = set()
+    for x, value in top._sim.signal_object_mapping.items():
+      if x._dsl.needs_double_buffer or \
+         ( x.is_input_value_port() and x.is_top_level_signal() and x.get_host_component() is top ):
+        for y in _collect_bits( value[-1] ):
+          if id(y) not in done:
+            done.add( id(y) )
+            leaves.append( y )
+
+    idle_funcs = [ x.idle_cycles for x in stateful if hasattr( x, 'idle_cycles' ) ]
+    skip_funcs = [ x.skip_cycles for x in stateful if hasattr( x, 'skip_cycles' ) ]
+    print_line_trace = self.print_line_trace and hasattr( top, 'line_trace' )
+
+    last_cycle    = None
+    last_snapshot = None
+    last_idle     = 0
+    nquiet        = 0
+
+    def sim_fast_forward( max_cycles=None ):
+      nonlocal last_cycle, last_snapshot, last_idle, nquiet
+      if blockers:
+        return 0
+
+      cycle    = top._sim.simulated_cycles
+      snapshot = [ x._uint for x in leaves ]
+
+      if last_cycle == cycle - 1 and last_idle != 0 and snapshot == last_snapshot:
+        nquiet += 1
+      else:
+        nquiet = 0
+
+      idle = None
+      for f in idle_funcs:
+        n = f()
+        if n is not None and ( idle is None or n < idle ):
+          idle = n
+
+      last_cycle    = cycle
+      last_snapshot = snapshot
+      last_idle     = idle
+
+      if nquiet < 2 or idle == 0:
+        return 0
+
+      # Nothing will ever happen if all components are idle without a
+      # timer, so we can only skip to max_cycles
+      ncycles = idle
+      if max_cycles is not None:
+        ncycles = max_cycles - cycle if ncycles is None else min( ncycles, max_cycles - cycle )
+      if ncycles is None or ncycles <= 0:
+        return 0
+
+      for f in skip_funcs:
+        f( ncycles )
+
+      top._sim.simulated_cycles += ncycles
+      last_cycle = cycle + ncycles
+      if idle is not None:
+        last_idle = idle - ncycles
+
+      if print_line_trace:
+        print( f"{'':3}  ... skipped {ncycles} idle cycles" )
+      return ncycles
+
+    top.sim_fast_forward = sim_fast_forward
+
   def create_print_line_trace( self, top ):
     if self.print_line_trace and hasattr( top, 'line_trace' ):
       def print_line_trace():
@@ -297,3 +556,210 @@ def check_top_level_inports():
 
     top.lock_in_simulation = lock_in_simulation
     top.unlock_simulation  = unlock_simulation
+
+#-------------------------------------------------------------------------
+# Checkpoint helpers
+#-------------------------------------------------------------------------
+# Signals in the same net share the same value object after
+# lock_in_simulation, so we only save each value object once under the
+# name of the first signal.
+
+def _collect_signal_values( top ):
+  mapping = top._sim.signal_object_mapping
+  done = set()
+  ret  = []
+  for x in sorted( mapping, key=repr ):
+    value = mapping[x][-1]
+    if id(value) not in done:
+      done.add( id(value) )
+      ret.append( ( repr(x), value ) )
+  return ret
+
+# Signals are written with @= and <<=, so an update block that assigns to
+# anything other than a local variable in any other way, or calls any
+# method other than the ones of Bits, may modify Python-side state.
+
+_BITS_METHODS = { 'uint', 'int', 'clone', 'to_bits', 'bin', 'hex', 'oct' }
+
+def _may_write_python_state( tree ):
+  for node in ast.walk( tree ):
+    if isinstance( node, (ast.Global, ast.Nonlocal) ):
+      return True
+    if isinstance( node, ast.Assign ):
+      targets = node.targets
+    elif isinstance( node, ast.AugAssign ):
+      if isinstance( node.op, (ast.MatMult, ast.LShift) ):
+        continue
+      targets = [ node.target ]
+    elif isinstance( node, ast.Call ):
+      if isinstance( node.func, ast.Attribute ) and node.func.attr not in _BITS_METHODS:
+        return True
+      continue
+    else:
+      continue
+
+    for target in targets:
+      for x in ast.walk( target ):
+        if isinstance( x, (ast.Attribute, ast.Subscript) ):
+          return True
+  return False
+
+# Return the ids of the closure cells (cells are not hashable) and the
+# ( id(globals), name ) pairs that any update block, helper function or
+# method port of top rebinds with nonlocal or global. Such a free
+# variable is simulation state even if it holds an int.
+
+def _rebound_free_vars( top ):
+  funcs = list( top.get_all_update_blocks() )
+  for x in top._dsl.all_components:
+    funcs.extend( getattr( x._dsl, 'name_func', {} ).values() )
+  funcs.extend( x.method for x in top.get_all_object_filter(
+                lambda x: isinstance( x, CalleePort ) and x.method is not None ) )
+
+  cells, names = set(), set()
+  for f in funcs:
+    f    = getattr( f, '__func__', f )
+    code = getattr( f, '__code__', None )
+    if code is None:
+      continue
+    for x in dis.get_instructions( code ):
+      if x.opname in ( 'STORE_DEREF', 'DELETE_DEREF' ):
+        if x.argval in code.co_freevars:
+          cells.add( id( f.__closure__[ code.co_freevars.index( x.argval ) ] ) )
+      elif x.opname in ( 'STORE_GLOBAL', 'DELETE_GLOBAL' ):
+        names.add( ( id(f.__globals__), x.argval ) )
+  return cells, names
+
+# The fields of a packed bitstruct are views of its Bits object, so we
+# always work on the Bits object itself
+
+def _collect_bits( value ):
+  if isinstance( value, Bits ):
+    return [ value ]
+  if hasattr( value.__class__, _PACKED ):
+    return [ value._bits ]
+  if is_bitstruct_inst( value ):
+    return [ y for name in value.__bitstruct_fields__
+               for y in _collect_bits( getattr( value, name ) ) ]
+  if isinstance( value, list ):
+    return [ y for x in value for y in _collect_bits( x ) ]
+  return []
+
+def _get_value_state( value ):
+  if isinstance( value, Bits ):
+    return ( int(value), getattr( value, '_next', None ) )
+  if hasattr( value.__class__, _PACKED ):
+    return _get_value_state( value._bits )
+  if is_bitstruct_inst( value ):
+    return { name: _get_value_state( getattr( value, name ) )
+             for name in value.__bitstruct_fields__ }
+  if isinstance( value, list ):
+    return [ _get_value_state( x ) for x in value ]
+  raise TypeError( f"Cannot checkpoint signal value of type {type(value).__name__}" )
+
+def _set_value_state( value, state ):
+  if isinstance( value, Bits ):
+    uint, next_ = state
+    if next_ is not None:
+      value <<= next_
+    value @= uint
+  elif hasattr( value.__class__, _PACKED ):
+    _set_value_state( value._bits, state )
+  elif isinstance( value, list ):
+    for x, y in zip( value, state ):
+      _set_value_state( x, y )
+  else:
+    for name, y in state.items():
+      _set_value_state( getattr( value, name ), y )
+
+# Bitstruct classes are often created inside functions (e.g., mk_mem_msg)
+# and cannot be pickled by reference, so we save bitstruct instances as
+# their bits and look up the class among the bitstruct classes created in
+# the restoring process by its name and fields.
+
+def _type_key( t ):
+  if isinstance( t, list ):
+    return tuple( _type_key(x) for x in t )
+  if is_bitstruct_class( t ):
+    return ( t.__module__, t.__qualname__,
+             tuple( (name, _type_key(x)) for name, x in t.__bitstruct_fields__.items() ) )
+  return t.nbits
+
+class _BitstructPickler( pickle.Pickler ):
+  def persistent_id( self, obj ):
+    if is_bitstruct_inst( obj ):
+      return ( _type_key( obj.__class__ ), int( obj.to_bits() ) )
+    return None
+
+class _BitstructUnpickler( pickle.Unpickler ):
+  classes = None
+
+  def persistent_load( self, pid ):
+    if self.classes is None:
+      self.classes = { _type_key( cls ): cls for cls in _bitstruct_hash_cache.values() }
+
+    key, value = pid
+    try:
+      cls = self.classes[ key ]
+    except KeyError:
+      raise pickle.UnpicklingError( f"Cannot find bitstruct {key[1]} in module {key[0]}" )
+    return cls.from_bits( mk_bits( cls.nbits )( value ) )
+
+def _dumps( obj ):
+  f = io.BytesIO()
+  _BitstructPickler( f, protocol=pickle.HIGHEST_PROTOCOL ).dump( obj )
+  return f.getvalue()
+
+# The Python-side state of a component/interface is every attribute that
+# is not a DSL construct, a signal, or a function.
+
+def _collect_python_state( top ):
+  mapping = top._sim.signal_object_mapping
+
+  signal_attrs = set()
+  signal_lists = set()
+  for obj, i, is_list, _ in mapping.values():
+    if is_list: signal_lists.add( id(obj) )
+    else:       signal_attrs.add( (id(obj), i) )
+
+  def is_structural( x ):
+    if isinstance( x, NamedObject ) or callable( x ):
+      return True
+    if isinstance( x, list ):
+      return id(x) in signal_lists or any( is_structural( y ) for y in x )
+    return False
+
+  objs = top.get_all_object_filter( lambda x: isinstance( x, (Component, Interface) ) )
+  ret = []
+  for obj in sorted( objs, key=repr ):
+    attrs = {}
+    for name, value in obj.__dict__.items():
+      if name[0] == '_' or (id(obj), name) in signal_attrs or is_structural( value ):
+        continue
+      attrs[ name ] = value
+    ret.append( ( obj, attrs ) )
+  return ret
+
+# Update mutable containers in place because update blocks and method
+# ports may hold references to them.
+
+def _set_python_state( obj, name, value ):
+  current = obj.__dict__.get( name )
+
+  if type(current) is type(value):
+    if isinstance( value, (list, bytearray) ):
+      current[:] = value
+      return
+    if isinstance( value, deque ):
+      current.clear()
+      current.extend( value )
+      return
+    if isinstance( value, (dict, set) ):
+      current.clear()
+      current.update( value )
+      return
+    if isinstance( value, random.Random ):
+      current.setstate( value.getstate() )
+      return
+
+  setattr( obj, name, value )
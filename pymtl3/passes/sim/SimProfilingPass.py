@@ -0,0 +1,437 @@
+"""
+========================================================================
+SimProfilingPass.py
+========================================================================
+Measure how much every update block, net block, flip function and
+method port costs during simulation. Apply this pass after the
+scheduling pass and before the pass that generates sim_tick (e.g.,
+PrepareSimPass). There are two modes:
+
+- "deterministic" wraps every entry of update_schedule, schedule_ff and
+  schedule_posedge_flip to count calls and measure wall time. The
+  members of an SCC block are wrapped individually. The time of a
+  method port is included in the block that calls it.
+
+- "sampling" wraps nothing. Instead, every `interval` seconds of CPU
+  time we record the innermost block or method port that the main
+  thread is executing. Time spent outside of all blocks (e.g., in the
+  test harness) is recorded as "(outside blocks)". Blocks inlined into
+  the tick function by FusedTickPass are not visible in this mode.
+
+  The profiling timer and the SIGPROF handler are process-wide, so we
+  only keep them installed while the model is being simulated: the
+  first tick arms the timer, and the handler disarms it and restores
+  the previous handler once the model hasn't ticked for one second of
+  CPU time. Only one model samples at a time; arming the timer for
+  another model stops the current one.
+
+top.sim_profile_report() returns a text report aggregated by block,
+component class and hierarchy path, and also dumps the full report as
+JSON if a path is given. top.sim_profile_reset() clears the collected
+data and top.sim_profile_stop() stops sampling for good.
+"""
+import signal
+import time
+from collections import defaultdict
+
+from pymtl3.dsl import CalleePort, MetadataKey
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.passes.BasePass import BasePass, PassMetadata
+from pymtl3.passes.errors import PassOrderError
+
+
+class ProfileEntry:
+  __slots__ = ( 'name', 'kind', 'host', 'calls', 'time', 'samples' )
+
+  def __init__( s, name, kind, host ):
+    s.name    = name
+    s.kind    = kind
+    s.host    = host
+    s.calls   = 0
+    s.time    = 0.0
+    s.samples = 0
+
+  def __repr__( s ):
+    return f"ProfileEntry({s.name}, {s.kind}, calls={s.calls}, time={s.time:.6f}, samples={s.samples})"
+
+class SimProfilingPass( BasePass ):
+
+  # Called once per tick by the sim_tick generated later
+  tick_hook = MetadataKey()
+
+  def __init__( s, mode='deterministic', interval=0.001 ):
+    assert mode in [ 'deterministic', 'sampling' ]
+    assert interval > 0
+
+    s.mode     = mode
+    s.interval = interval
+
+  def __call__( s, top ):
+    if not hasattr( top, "_sched" ):
+      raise PassOrderError( "_sched" )
+    if not hasattr( top._sched, "update_schedule" ):
+      raise PassOrderError( "update_schedule" )
+    if hasattr( top, "sim_tick" ):
+      raise AttributeError( "SimProfilingPass has to be applied before sim_tick is generated" )
+
+    top._prof = PassMetadata()
+    top._prof.mode     = s.mode
+    top._prof.interval = s.interval
+    top._prof.entries  = {}
+    top._prof.outside  = ProfileEntry( "(outside blocks)", "outside", top )
+    top._prof.sampling = False
+
+    if s.mode == 'deterministic':
+      s.wrap_schedules( top )
+    else:
+      s.start_sampling( top )
+
+    s.create_sim_profile_funcs( top )
+
+  #-----------------------------------------------------------------------
+  # get_entry
+  #-----------------------------------------------------------------------
+  # Every block is identified by the original function so that a block
+  # wrapped by WrapGreenletPass shares the same entry with itself.
+
+  @staticmethod
+  def get_entry( top, blk ):
+    entries = top._prof.entries
+    try:
+      return entries[ blk ]
+    except KeyError:
+      pass
+
+    upblks = top.get_all_update_blocks()
+    dag    = top._dag
+
+    if blk in upblks:
+      host = top.get_update_block_host_component( blk )
+      if   blk in top.get_all_update_ff():   kind = 'update_ff'
+      elif blk in top.get_all_update_once(): kind = 'update_once'
+      else:                                  kind = 'update'
+      name = f"top{repr(host)[1:]}.{blk.__name__}"
+
+    elif blk in dag.genblks:
+      host = dag.genblk_hostobj.get( blk, top )
+      kind = 'net'
+      name = f"top{repr(host)[1:]}.{blk.__name__}"
+
+    elif isinstance( blk, CalleePort ):
+      host = blk.get_host_component()
+      kind = 'method'
+      name = f"top{repr(blk)[1:]}"
+
+    else:
+      host = top
+      kind = 'flip' if blk in top._sched.schedule_posedge_flip else \
+             'scc'  if blk in getattr( top._sched, 'scc_blocks', {} ) else 'other'
+      name = getattr( blk, '__name__', repr(blk) )
+
+    entries[ blk ] = ret = ProfileEntry( name, kind, host )
+    return ret
+
+  #-----------------------------------------------------------------------
+  # Deterministic mode
+  #-----------------------------------------------------------------------
+
+  def wrap_schedules( s, top ):
+    unwrapped  = { v: k for k, v in getattr( top._dag, 'blk_greenlet_mapping', {} ).items() }
+    scc_blocks = getattr( top._sched, 'scc_blocks', {} )
+
+    def wrap( blk ):
+      entry = s.get_entry( top, unwrapped.get( blk, blk ) )
+      return s.gen_timed_block( entry, blk )
+
+    # An SCC block calls its members through the globals b0, b1, ... of
+    # the generated function (see gen_scc_block), so we wrap the members
+    # there and keep the SCC block itself.
+    for scc_blk, members in scc_blocks.items():
+      _globals = scc_blk.__globals__
+      for i, blk in enumerate( members ):
+        _globals[ f"b{i}" ] = wrap( blk )
+
+    top._sched.update_schedule = [ x if x in scc_blocks else wrap( x )
+                                   for x in top._sched.update_schedule ]
+    top._sched.schedule_ff = [ wrap( x ) for x in top._sched.schedule_ff ]
+    top._sched.schedule_posedge_flip = [ wrap( x ) for x in top._sched.schedule_posedge_flip ]
+
+  @staticmethod
+  def gen_timed_block( entry, blk ):
+    perf_counter = time.perf_counter
+    def timed():
+      t0 = perf_counter()
+      blk()
+      entry.time  += perf_counter() - t0
+      entry.calls += 1
+    timed.__name__ = blk.__name__
+    return timed
+
+  #-----------------------------------------------------------------------
+  # Sampling mode
+  #-----------------------------------------------------------------------
+  # We look up the code object of each frame from the innermost one, so
+  # a method port is attributed to itself rather than to its caller and
+  # a block in an SCC is attributed to itself rather than to the SCC
+  # block. Blocks of different instances of the same component class
+  # share the same code object, so we tell them apart by the host object
+  # that the frame refers to through "s" (or whatever the closure variable
+  # or the self argument is named).
+
+  def start_sampling( s, top ):
+    if not hasattr( signal, "setitimer" ):
+      raise NotImplementedError( "Sampling mode requires signal.setitimer which is not available "
+                                 "on this platform. Please use the deterministic mode instead." )
+
+    code_insts = defaultdict(dict)
+    code_names = {}
+
+    def add( func, entry ):
+      code = getattr( func, '__code__', None )
+      if code is None:
+        return
+
+      inst = getattr( func, '__self__', None )
+      if inst is not None:
+        code_names[ code ] = code.co_varnames[0]
+      else:
+        for name, cell in zip( code.co_freevars, getattr( func, '__closure__', None ) or () ):
+          try:
+            value = cell.cell_contents
+          except ValueError: # empty cell
+            continue
+          if isinstance( value, NamedObject ):
+            code_names[ code ] = name
+            inst = value
+            break
+      code_insts[ code ].setdefault( id(inst), entry )
+
+    for blk in top.get_all_update_blocks():
+      add( blk, s.get_entry( top, blk ) )
+    for blk in top._dag.genblks:
+      add( blk, s.get_entry( top, blk ) )
+    for port in top.get_all_object_filter( lambda x: isinstance( x, CalleePort ) ):
+      if port.method is not None:
+        add( port.method, s.get_entry( top, port ) )
+    for blk in top._sched.schedule_posedge_flip + top._sched.update_schedule:
+      add( blk, s.get_entry( top, blk ) )
+
+    # Map each code object to its entry, or to the name of the local
+    # variable and the entries of all instances
+    code_entries = {}
+    for code, insts in code_insts.items():
+      if len(insts) == 1 or code not in code_names:
+        code_entries[ code ] = next( iter( insts.values() ) )
+      else:
+        code_entries[ code ] = ( code_names[ code ], insts )
+
+    prof      = top._prof
+    outside   = prof.outside
+    max_idle  = max( 1, int( 1.0 / s.interval ) )
+
+    prof.enabled    = True
+    prof.ticks      = 0
+    prof.last_ticks = 0
+    prof.idle       = 0
+    prof.cpu_start  = 0.0
+    prof.cpu_time   = 0.0
+
+    def sample( signum, frame ):
+      while frame is not None:
+        entry = code_entries.get( frame.f_code )
+        if entry is not None:
+          if entry.__class__ is tuple:
+            name, insts = entry
+            inst  = frame.f_locals.get( name )
+            entry = insts.get( id(inst) ) or next( iter( insts.values() ) )
+          entry.samples += 1
+          prof.idle = 0
+          return
+        frame = frame.f_back
+
+      # The model has stopped ticking
+      if prof.ticks == prof.last_ticks:
+        prof.idle += 1
+        if prof.idle >= max_idle:
+          _disarm( prof )
+          return
+      else:
+        prof.last_ticks = prof.ticks
+        prof.idle = 0
+      outside.samples += 1
+
+    prof.handler = sample
+
+    def tick_hook():
+      prof.ticks += 1
+      if not prof.sampling and prof.enabled:
+        _arm( prof )
+
+    top.set_metadata( SimProfilingPass.tick_hook, tick_hook )
+
+  #-----------------------------------------------------------------------
+  # create_sim_profile_funcs
+  #-----------------------------------------------------------------------
+
+  @staticmethod
+  def create_sim_profile_funcs( top ):
+
+    def sim_profile_stop():
+      top._prof.enabled = False
+      _disarm( top._prof )
+
+    def sim_profile_reset():
+      for entry in list( top._prof.entries.values() ) + [ top._prof.outside ]:
+        entry.calls   = 0
+        entry.time    = 0.0
+        entry.samples = 0
+      top._prof.cpu_start = time.process_time()
+      top._prof.cpu_time  = 0.0
+
+    def sim_profile_report( path=None, limit=20 ):
+      report = gen_profile_report( top )
+      if path is not None:
+        import json
+        with open( path, 'w' ) as f:
+          json.dump( report, f, indent=2 )
+      return format_profile_report( report, limit )
+
+    top.sim_profile_stop   = sim_profile_stop
+    top.sim_profile_reset  = sim_profile_reset
+    top.sim_profile_report = sim_profile_report
+
+#-------------------------------------------------------------------------
+# Sampling timer
+#-------------------------------------------------------------------------
+# The metadata of the model that currently owns the timer
+
+_owner = None
+
+def _arm( prof ):
+  global _owner
+  if _owner is not None:
+    _disarm( _owner )
+  prof.old_handler = signal.signal( signal.SIGPROF, prof.handler )
+  signal.setitimer( signal.ITIMER_PROF, prof.interval, prof.interval )
+  prof.sampling   = True
+  prof.idle       = 0
+  prof.last_ticks = prof.ticks
+  prof.cpu_start  = time.process_time()
+  _owner = prof
+
+def _disarm( prof ):
+  global _owner
+  if not prof.sampling:
+    return
+  signal.setitimer( signal.ITIMER_PROF, 0 )
+  signal.signal( signal.SIGPROF, prof.old_handler )
+  prof.sampling  = False
+  prof.cpu_time += time.process_time() - prof.cpu_start
+  if _owner is prof:
+    _owner = None
+
+#-------------------------------------------------------------------------
+# Reports
+#-------------------------------------------------------------------------
+# The cost of an entry is its measured wall time in deterministic mode.
+# In sampling mode, we split the CPU time during sampling by the number
+# of samples, since the timer may fire less often than requested. The
+# cost of a hierarchy path includes all blocks in its subtree.
+
+def gen_profile_report( top ):
+  prof     = top._prof
+  sampling = prof.mode == 'sampling'
+
+  entries = list( prof.entries.values() )
+  if sampling:
+    entries.append( prof.outside )
+
+  # Only keep entries that are actually called/sampled
+  entries = [ x for x in entries if x.calls or x.samples ]
+
+  if sampling:
+    cpu_time = prof.cpu_time
+    if prof.sampling:
+      cpu_time += time.process_time() - prof.cpu_start
+    nsamples = sum( x.samples for x in entries )
+    def cost( entry ):
+      return cpu_time * entry.samples / nsamples
+  else:
+    def cost( entry ):
+      return entry.time
+
+  total = sum( cost(x) for x in entries )
+
+  def row( calls, cost, samples ):
+    return { 'calls': calls, 'time': cost, 'samples': samples,
+             'percent': 100.0 * cost / total if total else 0.0 }
+
+  blocks = []
+  classes   = defaultdict( lambda: [0, 0.0, 0] )
+  hierarchy = defaultdict( lambda: [0, 0.0, 0] )
+
+  for x in entries:
+    c = cost(x)
+    blocks.append( dict( name=x.name, kind=x.kind, host=f"top{repr(x.host)[1:]}",
+                         **{ 'class': x.host.__class__.__qualname__ },
+                         **row( x.calls, c, x.samples ) ) )
+    if x is prof.outside:
+      continue
+
+    for key, agg in [ ( x.host.__class__.__qualname__, classes ) ] + \
+                    [ ( f"top{repr(h)[1:]}", hierarchy ) for h in _ancestors( x.host ) ]:
+      agg[ key ][0] += x.calls
+      agg[ key ][1] += c
+      agg[ key ][2] += x.samples
+
+  def by_cost( rows ):
+    return sorted( rows, key=lambda r: ( -r['time'], r['name'] ) )
+
+  cycles = getattr( getattr( top, '_sim', None ), 'simulated_cycles', None )
+
+  return {
+    'mode'     : prof.mode,
+    'interval' : prof.interval if sampling else None,
+    'cycles'   : cycles,
+    'total'    : total,
+    'blocks'   : by_cost( blocks ),
+    'classes'  : by_cost([ dict( name=k, **row( *v ) ) for k, v in classes.items() ]),
+    'hierarchy': by_cost([ dict( name=k, **row( *v ) ) for k, v in hierarchy.items() ]),
+  }
+
+def _ancestors( host ):
+  while host is not None:
+    yield host
+    host = host.get_parent_object()
+
+def format_profile_report( report, limit=20 ):
+  sampling = report['mode'] == 'sampling'
+
+  if sampling:
+    header = f"{'samples':>10} {'time(ms)':>10} {'%':>6}  "
+    def fmt( r ):
+      return f"{r['samples']:>10} {r['time']*1e3:>10.3f} {r['percent']:>5.1f}%  "
+  else:
+    header = f"{'calls':>10} {'time(ms)':>10} {'%':>6} {'us/call':>9}  "
+    def fmt( r ):
+      per_call = r['time'] * 1e6 / r['calls'] if r['calls'] else 0.0
+      return f"{r['calls']:>10} {r['time']*1e3:>10.3f} {r['percent']:>5.1f}% {per_call:>9.3f}  "
+
+  title = f"Simulation profile ({report['mode']}"
+  if report['cycles'] is not None:
+    title += f", {report['cycles']} cycles"
+  title += f", {report['total']*1e3:.3f} ms profiled)"
+
+  lines = [ title ]
+  for key, name in [ ('blocks', 'block'), ('classes', 'component class'),
+                     ('hierarchy', 'hierarchy path') ]:
+    rows = report[ key ]
+    lines.append( "" )
+    lines.append( header + name )
+    for r in rows[:limit]:
+      suffix = f" ({r['kind']})" if key == 'blocks' and r['kind'] != 'outside' else ""
+      lines.append( fmt(r) + r['name'] + suffix )
+    if len(rows) > limit:
+      lines.append( f"... {len(rows) - limit} more" )
+
+  return "\n".join( lines )
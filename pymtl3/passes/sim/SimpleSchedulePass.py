@@ -11,6 +11,7 @@ Date   : Dec 26, 2018
 import linecache
 from collections import defaultdict
 
+from pymtl3.datatypes import Bits, PythonBits
 from pymtl3.dsl.errors import UpblkCyclicError
 from pymtl3.extra.pypy import custom_exec
 from pymtl3.passes.BasePass import BasePass, PassMetadata
@@ -18,6 +19,9 @@ from pymtl3.passes.errors import PassOrderError
 
 
 class SimpleSchedulePass( BasePass ):
+  def __init__( self, dirty_flip=False ):
+    self.dirty_flip = dirty_flip
+
   def __call__( self, top ):
     if not hasattr( top._dag, "all_constraints" ):
       raise PassOrderError( "all_constraints" )
@@ -79,6 +83,10 @@ class SimpleSchedulePass( BasePass ):
     if not hasattr( top, "_sched" ):
       raise Exception( "Please create top._sched pass metadata namespace first!" )
 
+    if self.dirty_flip and Bits is PythonBits.Bits:
+      self.schedule_dirty_flip( top )
+      return
+
     # To reduce the time to compile the code and the amount of bytecode, I
     # use a heuristic to group signals that belong to
     #   s.x.y.z._flip()
@@ -146,6 +154,60 @@ class SimpleSchedulePass( BasePass ):
       linecache.cache['ff_flips'] = (1, None, lines, 'ff_flips')
       top._sched.schedule_posedge_flip = [ l['compile_double_buffer']( top ) ]
 
+  def schedule_dirty_flip( self, top ):
+
+    # Most registers of a large design keep their values in a given cycle.
+    # Instead of flipping every double-buffered signal, we only flip the
+    # Bits objects written by <<= while the update_ff blocks execute. To
+    # record them without slowing down <<= everywhere else, we swap in a
+    # recording Bits.__ilshift__ that appends to this model's own list at
+    # the beginning of the clock edge and swap the original back right
+    # before flipping. If an update_ff block raises in between,
+    # PrepareSimPass calls stop_dirty_tracking to swap it back. Note that
+    # <<= outside update_ff blocks, e.g. in the test harness, is not
+    # recorded and therefore never flipped. RPython Bits from mamba cannot
+    # record writes, in which case the caller falls back to flipping every
+    # signal.
+
+    if not any( x._dsl.needs_double_buffer for x in top._dsl.all_signals ):
+      def no_double_buffer():
+        pass
+      top._sched.schedule_posedge_flip = [ no_double_buffer ]
+      return
+
+    PyBits = PythonBits.Bits
+    dirty  = []
+    saved  = []
+
+    def recording_ilshift( self, v ):
+      ilshift( self, v )
+      dirty.append( self )
+      return self
+
+    def start_dirty_tracking():
+      nonlocal ilshift
+      dirty.clear()
+      # Another model may be recording if we are ticked from its update_ff
+      ilshift = PyBits.__ilshift__
+      saved.append( ilshift )
+      PyBits.__ilshift__ = recording_ilshift
+
+    def stop_dirty_tracking():
+      if saved:
+        PyBits.__ilshift__ = saved.pop()
+      dirty.clear()
+
+    def dirty_flip():
+      PyBits.__ilshift__ = saved.pop()
+      for x in dirty:
+        x._flip()
+      dirty.clear()
+
+    ilshift = PyBits.__ilshift__
+    top._sched.schedule_ff = [ start_dirty_tracking ] + top._sched.schedule_ff
+    top._sched.schedule_posedge_flip = [ dirty_flip ]
+    top._sched.stop_dirty_tracking = stop_dirty_tracking
+
 def dump_dag( top, V, E ):
   from graphviz import Digraph
 
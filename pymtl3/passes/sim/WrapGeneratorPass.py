@@ -0,0 +1,377 @@
+"""
+========================================================================
+WrapGeneratorPass.py
+========================================================================
+An alternative to WrapGreenletPass that turns blocking FL code into
+generator-based coroutines. We rewrite the update blocks that call
+blocking methods, and the actual blocking methods, as generators:
+
+- greenlet.getcurrent().parent.switch(...) becomes a bare yield
+- a call to a blocking method port becomes yield from the generator
+  version of the method
+
+A block that is blocked in the middle of a method call then simply
+yields back to the tick function, which resumes the generator in the
+next cycle. Unlike greenlets, this doesn't need a C extension and the
+PyPy JIT can see through the switches.
+
+The original methods stay in place, so blocking methods can still be
+called from outside the simulation. Calls from rewritten blocks bypass
+the method-port wrappers of CLLineTracePass, which don't contribute to
+the line trace of blocking interfaces anyway. Blocks that cannot be
+rewritten, e.g., because they call a blocking method inside a lambda
+or through a helper function, fall back to greenlets.
+"""
+import ast
+import inspect
+import textwrap
+import types
+from copy import deepcopy
+
+from pymtl3.dsl import CalleeIfcFL, CallerIfcFL
+from pymtl3.dsl.NamedObject import NamedObject
+from pymtl3.extra.pypy import custom_exec
+from pymtl3.passes.BasePass import BasePass
+from pymtl3.passes.errors import PassOrderError
+
+
+class WrapGeneratorPass( BasePass ):
+  def __call__( self, top ):
+    if not hasattr( top, "_dag" ):
+      raise PassOrderError( "_dag" )
+
+    self.wrap_generator( top )
+
+  def wrap_generator( self, top ):
+
+    all_upblks      = top._dag.final_upblks
+    all_constraints = top._dag.all_constraints
+    greenlet_upblks = top._dag.greenlet_upblks
+
+    # We reuse the metadata of WrapGreenletPass so that other passes
+    # treat both kinds of wrapped blocks the same way
+    top._dag.blk_greenlet_mapping = blk_greenlet_mapping = {}
+    top._dag.greenlet_fallback    = greenlet_fallback    = []
+
+    if not greenlet_upblks:
+      return
+
+    # Every blocking method port maps to its actual method
+
+    ports = {}
+    for ifc in top.get_all_object_filter( lambda x: isinstance( x, (CalleeIfcFL, CallerIfcFL) ) ):
+      method = ifc.method.method
+      if method is not None:
+        ports[ ifc ] = ports[ ifc.method ] = method
+
+    # A rewritten call site looks up the generator version of the method
+    # through the port object, which stays the same after other passes
+    # wrap the method of the port.
+
+    coros = {}
+
+    def coro_call( port ):
+      try:
+        return coros[ port ]
+      except KeyError:
+        return _gen_plain( port )
+
+    # None means the method cannot be rewritten, and _PLAIN means the
+    # method never blocks. A recursive call to a method that we are still
+    # looking at doesn't make the caller block by itself.
+
+    twins = {}
+
+    # A function called by rewritten code must not block unless it is
+    # called through a port.
+
+    def may_rewrite( targets, helpers ):
+      return all( get_twin( x ) is not None for x in targets ) and \
+             all( get_twin( x ) is _PLAIN for x in helpers )
+
+    def get_twin( method ):
+      if method in twins:
+        twin = twins[ method ]
+        return _PLAIN if twin is _PENDING else twin
+      twins[ method ] = _PENDING
+
+      func = getattr( method, '__func__', method )
+      inst = getattr( method, '__self__', None )
+
+      ret = _rewrite( func, _get_method_ast( func ), inst, ports )
+      if ret is None or not may_rewrite( ret[2], ret[3] ):
+        twins[ method ] = None
+        return None
+
+      funcdef, blocks, _, _ = ret
+      if not blocks:
+        twin = _PLAIN
+      elif func.__name__ == '<lambda>':
+        twins[ method ] = None
+        return None
+      else:
+        twin = _compile_generator( func, funcdef, coro_call )
+        if inst is not None:
+          twin = types.MethodType( twin, inst )
+
+      twins[ method ] = twin
+      return twin
+
+    for port, method in ports.items():
+      twin = get_twin( method )
+      if twin is _PLAIN:
+        coros[ port ] = _gen_plain( port )
+      elif twin is not None:
+        coros[ port ] = twin
+
+    for blk in sorted( greenlet_upblks, key=lambda x: x.__name__ ):
+      host = top.get_update_block_host_component( blk )
+      info = host.get_update_block_info( blk )
+
+      ret = None
+      if info is not None:
+        _, _, lineno, filename, tree = info
+        ret = _rewrite( blk, ( tree, lineno - 1, filename ), None, ports )
+
+      # A block without any call site that we can rewrite calls blocking
+      # methods in a way we don't understand
+      if ret is None or not ret[1] or not may_rewrite( ret[2], ret[3] ):
+        from .WrapGreenletPass import gen_greenlet_ticker
+        blk_greenlet_mapping[ blk ] = gen_greenlet_ticker( blk )
+        greenlet_fallback.append( f"top{repr(host)[1:]}.{blk.__name__}" )
+      else:
+        gen_blk = _compile_generator( blk, ret[0], coro_call )
+        blk_greenlet_mapping[ blk ] = gen_generator_ticker( blk, gen_blk )
+
+    new_upblks = { blk_greenlet_mapping.get( x, x ) for x in all_upblks }
+
+    new_constraints = set()
+    for (x, y) in all_constraints:
+      new_constraints.add( ( blk_greenlet_mapping.get( x, x ),
+                             blk_greenlet_mapping.get( y, y ) ) )
+
+    top._dag.final_upblks    = new_upblks
+    top._dag.all_constraints = new_constraints
+
+    # A wrapped block takes over the name of the original block so that
+    # a cached schedule still applies
+    block_ids = getattr( top._dag, "block_ids", None )
+    if block_ids is not None:
+      for blk, wrapped in blk_greenlet_mapping.items():
+        block_ids[ wrapped ] = block_ids.pop( blk )
+
+#-------------------------------------------------------------------------
+# gen_generator_ticker
+#-------------------------------------------------------------------------
+# The ticker starts a new generator if the previous call of the block has
+# finished, and otherwise resumes the blocked one.
+
+_DONE = object()
+
+def gen_generator_ticker( blk, gen_blk ):
+  gen = None
+
+  def generator_ticker():
+    nonlocal gen
+    if gen is None:
+      gen = gen_blk()
+    if next( gen, _DONE ) is _DONE:
+      gen = None
+
+  generator_ticker.__name__ = blk.__name__
+  generator_ticker.is_suspended = lambda: gen is not None
+
+  return generator_ticker
+
+_PLAIN   = object()
+_PENDING = object()
+
+def _gen_plain( f ):
+  def plain( *args, **kwargs ):
+    return f( *args, **kwargs )
+    yield # pylint: disable=unreachable
+  return plain
+
+#-------------------------------------------------------------------------
+# AST rewriting
+#-------------------------------------------------------------------------
+
+def _get_method_ast( func ):
+  try:
+    src, lineno = inspect.getsourcelines( func )
+    filename    = inspect.getsourcefile( func )
+    return ast.parse( textwrap.dedent( "".join( src ) ) ), lineno - 1, filename
+  except (OSError, TypeError, SyntaxError):
+    return None
+
+def _is_greenlet_switch( node ):
+  # greenlet.getcurrent().parent.switch(...)
+  f = node.func
+  return isinstance( f, ast.Attribute ) and f.attr == 'switch' and \
+         isinstance( f.value, ast.Attribute ) and f.value.attr == 'parent' and \
+         isinstance( f.value.value, ast.Call ) and \
+         isinstance( f.value.value.func, ast.Attribute ) and \
+         f.value.value.func.attr == 'getcurrent'
+
+def _resolve( node, env ):
+  """ Return the objects that an expression like s.x[i].y may refer to. A
+  non-constant index refers to all elements of the list. """
+
+  if isinstance( node, ast.Name ):
+    return [ env[ node.id ] ] if node.id in env else []
+
+  if isinstance( node, ast.Attribute ):
+    ret = []
+    for x in _resolve( node.value, env ):
+      try:
+        ret.append( getattr( x, node.attr ) )
+      except Exception:
+        pass
+    return ret
+
+  if isinstance( node, ast.Subscript ):
+    idx = node.slice
+    if isinstance( idx, ast.Index ): # Python < 3.9
+      idx = idx.value
+
+    ret = []
+    for x in _resolve( node.value, env ):
+      if isinstance( x, list ):
+        if isinstance( idx, ast.Constant ) and isinstance( idx.value, int ):
+          if -len(x) <= idx.value < len(x):
+            ret.append( x[ idx.value ] )
+        else:
+          ret.extend( x )
+    return ret
+
+  return []
+
+class _BlockingCallRewriter( ast.NodeTransformer ):
+
+  def __init__( self, env, ports ):
+    self.env     = env
+    self.ports   = ports
+    self.targets = set()
+    self.helpers = set()
+    self.yields  = False
+    self.ok      = True
+    self.nested  = 0
+
+  def visit_nested( self, node ):
+    self.nested += 1
+    self.generic_visit( node )
+    self.nested -= 1
+    return node
+
+  visit_FunctionDef = visit_AsyncFunctionDef = visit_Lambda = visit_nested
+  visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_nested
+
+  # The function is a generator already
+  def visit_unsupported( self, node ):
+    self.ok = False
+    return node
+
+  visit_Yield = visit_YieldFrom = visit_Await = visit_unsupported
+
+  def visit_Call( self, node ):
+    self.generic_visit( node )
+
+    if _is_greenlet_switch( node ):
+      if self.nested:
+        self.ok = False
+      self.yields = True
+      return ast.copy_location( ast.Yield( value=None ), node )
+
+    methods = set()
+    for x in _resolve( node.func, self.env ):
+      if isinstance( x, NamedObject ) and x in self.ports:
+        methods.add( self.ports[ x ] )
+      elif isinstance( getattr( x, '__func__', x ), types.FunctionType ):
+        self.helpers.add( x )
+
+    if not methods:
+      return node
+
+    if self.nested:
+      self.ok = False
+
+    self.targets |= methods
+    call = ast.Call( func=ast.Call( func=ast.Name( id='_coro_call', ctx=ast.Load() ),
+                                    args=[ node.func ], keywords=[] ),
+                     args=node.args, keywords=node.keywords )
+    return ast.copy_location( ast.YieldFrom( value=call ), node )
+
+def _rewrite( func, src, inst, ports ):
+  """ Return ( rewritten FunctionDef, whether it may block, actual
+  blocking methods called, other Python functions called ) or None if
+  the function cannot be rewritten. """
+
+  if src is None:
+    return None
+
+  tree, offset, filename = src
+
+  funcdef = None
+  if func.__name__ == '<lambda>':
+    # We only need to know if a lambda blocks, so we look at the bodies
+    # of all lambdas on the same lines
+    lambdas = [ x for x in ast.walk( tree ) if isinstance( x, ast.Lambda ) ]
+    if lambdas:
+      funcdef = ast.FunctionDef( name='<lambda>', args=deepcopy( lambdas[0].args ),
+                                 body=[ ast.Expr( value=deepcopy( x.body ) ) for x in lambdas ],
+                                 decorator_list=[], returns=None )
+  else:
+    for node in ast.walk( tree ):
+      if isinstance( node, ast.FunctionDef ) and node.name == func.__name__:
+        funcdef = deepcopy( node )
+        break
+  if funcdef is None:
+    return None
+
+  # Names in the function that refer to components/interfaces/functions
+  env = dict( func.__globals__ )
+  code = func.__code__
+  for var, cell in zip( code.co_freevars, func.__closure__ or () ):
+    try:
+      env[ var ] = cell.cell_contents
+    except ValueError: # empty cell
+      pass
+  if inst is not None and funcdef.args.args:
+    env[ funcdef.args.args[0].arg ] = inst
+
+  funcdef.decorator_list = []
+  rewriter = _BlockingCallRewriter( env, ports )
+  rewriter.generic_visit( funcdef )
+
+  if not rewriter.ok:
+    return None
+
+  # Any other use of greenlet
+  for node in ast.walk( funcdef ):
+    if isinstance( node, ast.Name ) and node.id == 'greenlet' or \
+       isinstance( node, ast.Attribute ) and node.attr == 'getcurrent':
+      return None
+
+  ast.increment_lineno( funcdef, offset )
+  funcdef.filename = filename
+  return funcdef, rewriter.yields or bool( rewriter.targets ), \
+         rewriter.targets, rewriter.helpers
+
+def _compile_generator( func, funcdef, coro_call ):
+  # def _make( _coro_call, <free variables> ):
+  #   def blk(): ...
+  #   return blk
+
+  code     = func.__code__
+  freevars = code.co_freevars
+
+  tree = ast.parse( f"def _make( {', '.join( ('_coro_call',) + freevars )} ):\n  pass" )
+  make = tree.body[0]
+  make.body = [ funcdef, ast.Return( value=ast.Name( id=funcdef.name, ctx=ast.Load() ) ) ]
+  ast.fix_missing_locations( tree )
+
+  _locals = {}
+  custom_exec( compile( tree, funcdef.filename, 'exec' ), func.__globals__, _locals )
+
+  cells = [ x.cell_contents for x in func.__closure__ or () ]
+  return _locals['_make']( coro_call, *cells )
@@ -33,28 +33,11 @@ class WrapGreenletPass( BasePass ):
     if not greenlet_upblks:
       return
 
-    def wrap_greenlet( blk ):
-
-      def greenlet_wrapper():
-        while True:
-          blk()
-          greenlet.getcurrent().parent.switch()
-
-      gl = greenlet( greenlet_wrapper )
-
-      def greenlet_ticker():
-        gl.switch()
-
-      # greenlet_ticker.greenlet = gl
-      greenlet_ticker.__name__ = blk.__name__
-
-      return greenlet_ticker
-
     new_upblks  = set()
 
     for blk in all_upblks:
       if blk in greenlet_upblks:
-        wrapped = wrap_greenlet( blk )
+        wrapped = gen_greenlet_ticker( blk )
         blk_greenlet_mapping[ blk ] = wrapped
         new_upblks.add( wrapped )
       else:
@@ -73,3 +56,38 @@ class WrapGreenletPass( BasePass ):
     top._dag.final_upblks    = new_upblks
     top._dag.all_constraints = new_constraints
     top._dag.blk_greenlet_mapping = blk_greenlet_mapping
+
+    # A wrapped block takes over the name of the original block so that
+    # a cached schedule still applies
+    block_ids = getattr( top._dag, "block_ids", None )
+    if block_ids is not None:
+      for blk, wrapped in blk_greenlet_mapping.items():
+        block_ids[ wrapped ] = block_ids.pop( blk )
+
+#-------------------------------------------------------------------------
+# gen_greenlet_ticker
+#-------------------------------------------------------------------------
+
+def gen_greenlet_ticker( blk ):
+
+  # suspended[0] is True if blk is blocked in the middle of a method
+  # call when the greenlet switches back
+  suspended = [ False ]
+
+  def greenlet_wrapper():
+    while True:
+      suspended[0] = True
+      blk()
+      suspended[0] = False
+      greenlet.getcurrent().parent.switch()
+
+  gl = greenlet( greenlet_wrapper )
+
+  def greenlet_ticker():
+    gl.switch()
+
+  # greenlet_ticker.greenlet = gl
+  greenlet_ticker.__name__ = blk.__name__
+  greenlet_ticker.is_suspended = lambda: suspended[0]
+
+  return greenlet_ticker
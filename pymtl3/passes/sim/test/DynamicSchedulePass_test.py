@@ -5,7 +5,7 @@
 # Author : Shunning Jiang
 # Date   : Apr 19, 2019
 
-from pymtl3.datatypes import Bits8, Bits32, bitstruct
+from pymtl3.datatypes import Bits8, Bits32, bitstruct, zext
 from pymtl3.dsl import *
 from pymtl3.dsl.errors import UpblkCyclicError
 
@@ -315,3 +315,91 @@ def test_update_once():
     print(e)
     return
   raise Exception("Should've thrown UpblkCyclicError")
+
+def test_scc_worklist():
+
+  @bitstruct
+  class Payload:
+    data: [ Bits32, Bits32, Bits32, Bits32 ]
+    tag:  Bits8
+
+  class Top(Component):
+
+    def construct( s ):
+      s.in_ = InPort(32)
+      s.msg = Wire( Payload )
+      s.a   = Wire(32)
+      s.b   = Wire(32)
+      s.c   = Wire(32)
+      s.out = OutPort(32)
+
+      # up_msg, up_a and up_b form an SCC. The false loop through s.b
+      # settles after up_msg is executed again.
+
+      @update
+      def up_msg():
+        if s.b[31]: s.msg @= Payload( [ s.in_, 0, 0, 0 ], 1 )
+        else:       s.msg @= Payload( [ s.in_, s.in_, 0, 0 ], 2 )
+
+      @update
+      def up_a():
+        s.a @= s.msg.data[0] + s.msg.data[1] + zext( s.msg.tag, 32 )
+
+      @update
+      def up_b():
+        s.b @= s.a >> 1
+
+      @update
+      def up_c():
+        s.c @= s.in_ + 1
+
+      @update
+      def up_out():
+        s.out @= s.b + s.c
+
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( PrepareSimPass( print_line_trace=False ) )
+  A.sim_reset()
+
+  scc_blk, = A._sched.scc_blocks
+  assert len( A._sched.scc_blocks[ scc_blk ] ) == 3
+
+  for i in range(10):
+    A.in_ @= i
+    A.sim_tick()
+    assert A.out == ( (i + i + 2) >> 1 ) + i + 1
+
+  # Only the blocks downstream of a changed variable are executed again,
+  # instead of executing the whole SCC until nothing changes
+  stats = A._sched.scc_stats[ scc_blk ]
+  assert stats.calls > 10
+  assert stats.max_iterations == 2
+  assert stats.executions < 2 * 3 * stats.calls
+
+def test_scc_oscillation():
+
+  class Top(Component):
+
+    def construct( s ):
+      s.a = Wire(32)
+      s.b = Wire(32)
+
+      @update
+      def up_a():
+        if s.b[0]: s.a @= 0
+        else:      s.a @= 1
+
+      @update
+      def up_b():
+        s.b @= s.a
+
+  try:
+    _test_model( Top )
+  except UpblkCyclicError as e:
+    print("{} is thrown\n{}".format( e.__class__.__name__, e ))
+    assert "after 100 iters" in str(e)
+    return
+  raise Exception("Should've thrown UpblkCyclicError.")
@@ -0,0 +1,162 @@
+#=========================================================================
+# ElaborationCache_test.py
+#=========================================================================
+
+import os
+
+import pytest
+
+from pymtl3.dsl import *
+from pymtl3.dsl import AstHelper
+from pymtl3.dsl import ElaborationCache as elab_cache
+from pymtl3.dsl.ComponentLevel3 import ComponentLevel3
+
+from .. import DynamicSchedulePass as dynamic_schedule
+from ...PassGroups import DefaultPassGroup
+from ..GenDAGPass import GenDAGPass
+
+
+@pytest.fixture
+def cache_dir( tmp_path, monkeypatch ):
+  # monkeypatch restores the cache configuration after the test
+  monkeypatch.setattr( elab_cache, "_cache", elab_cache._cache )
+  monkeypatch.setattr( elab_cache, "_configured", elab_cache._configured )
+  elab_cache.set_elaboration_cache( tmp_path )
+  return tmp_path
+
+class Inc( Component ):
+  def construct( s, nbits ):
+    s.in_ = InPort( nbits )
+    s.out = OutPort( nbits )
+    s.out //= lambda: s.in_ + 1
+
+class Top( Component ):
+  def construct( s, nbits=16 ):
+    s.in_ = InPort( nbits )
+    s.out = OutPort( nbits )
+    s.lo  = OutPort( 8 )
+
+    s.incs = [ Inc( nbits ) for _ in range(2) ]
+    s.incs[0].in_ //= s.in_
+    s.incs[1].in_[0:8] //= s.incs[0].out[8:16]
+    s.incs[1].in_[8:16] //= 0xab
+
+    s.x = Wire( nbits )
+    s.y = Wire( nbits )
+    s.r = Wire( nbits )
+
+    # A false combinational loop forms an SCC block in the schedule
+    @update
+    def up_x():
+      if s.y[nbits-1]: s.x @= s.incs[1].out
+      else:            s.x @= s.incs[1].out + s.r
+
+    @update
+    def up_y():
+      s.y @= s.x >> 1
+
+    @update_ff
+    def up_r():
+      s.r <<= s.x
+
+    @update
+    def up_out():
+      s.out @= s.x
+      s.lo  @= s.r[0:8]
+
+def _run( A, ncycles=10 ):
+  A.sim_reset()
+  trace = []
+  for i in range( ncycles ):
+    A.in_ @= i * 37
+    A.sim_tick()
+    trace.append( (A.out.clone(), A.lo.clone()) )
+  return trace
+
+def _schedule_names( A ):
+  ret = []
+  for blk in A._sched.update_schedule:
+    members = A._sched.scc_blocks.get( blk, [ blk ] )
+    ret.append( [ A._dag.block_ids[x] for x in members ] )
+  return ret
+
+def _clear_class_caches():
+  for cls in [ Top, Inc ]:
+    for name in [ '_name_info', '_name_rd', '_name_wr', '_name_fc' ]:
+      if name in cls.__dict__:
+        delattr( cls, name )
+
+def test_cache_hit( cache_dir, monkeypatch ):
+  _clear_class_caches()
+
+  A = Top()
+  A.elaborate()
+  A.apply( DefaultPassGroup() )
+  trace_a = _run( A )
+
+  kinds = { x.split('-')[0] for x in os.listdir( cache_dir ) }
+  assert kinds == { 'ast', 'nets', 'dag', 'netblk', 'sched' }
+
+  # Everything that is cached must not be recomputed
+  def fail( *args, **kwargs ):
+    raise AssertionError( "should use the cached result" )
+
+  # Lambda connections are always parsed again
+  extract = AstHelper.extract_reads_writes_calls
+  def extract_lambda( hostobj, f, *args ):
+    if not f.__name__.startswith( '_lambda__' ):
+      fail()
+    extract( hostobj, f, *args )
+
+  _clear_class_caches()
+  monkeypatch.setattr( AstHelper, "extract_reads_writes_calls", extract_lambda )
+  monkeypatch.setattr( ComponentLevel3, "_resolve_value_connections", fail )
+  monkeypatch.setattr( GenDAGPass, "_process_value_constraints", fail )
+  monkeypatch.setattr( dynamic_schedule, "kosaraju_scc", fail )
+
+  B = Top()
+  B.elaborate()
+  B.apply( DefaultPassGroup() )
+
+  assert len( B._sched.scc_blocks ) == 1
+  assert _schedule_names( A ) == _schedule_names( B )
+  assert _run( B ) == trace_a
+
+def test_cache_miss_on_different_design( cache_dir ):
+  A = Top()
+  A.elaborate()
+  A.apply( DefaultPassGroup() )
+  nfiles = len( os.listdir( cache_dir ) )
+
+  # Same design, no new entries
+  B = Top()
+  B.elaborate()
+  B.apply( DefaultPassGroup() )
+  assert len( os.listdir( cache_dir ) ) == nfiles
+
+  # Different parameters
+  C = Top( 32 )
+  C.elaborate()
+  C.apply( DefaultPassGroup() )
+  assert len( os.listdir( cache_dir ) ) > nfiles
+
+  # Same parameters but a connection is added after elaboration
+  D = Top()
+  D.elaborate()
+  D.add_connection( D.lo, D.incs[0].out[0:8] )
+  assert elab_cache.get_design_key( D ) != elab_cache.get_design_key( B )
+
+def test_corrupted_entry( cache_dir ):
+  A = Top()
+  A.elaborate()
+  A.apply( DefaultPassGroup() )
+  trace_a = _run( A )
+
+  for name in os.listdir( cache_dir ):
+    with open( os.path.join( cache_dir, name ), 'wb' ) as f:
+      f.write( b'garbage' )
+
+  B = Top()
+  B.elaborate()
+  B.apply( DefaultPassGroup() )
+  assert _run( B ) == trace_a
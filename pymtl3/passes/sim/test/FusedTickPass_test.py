@@ -0,0 +1,181 @@
+#=========================================================================
+# FusedTickPass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits8, Bits32, bitstruct, concat, zext
+from pymtl3.dsl import *
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..FusedTickPass import FusedTickPass
+from ..GenDAGPass import GenDAGPass
+
+
+def _test_model( cls, *args ):
+  A = cls( *args )
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( FusedTickPass(print_line_trace=False) )
+  A.sim_reset()
+  return A
+
+class Inner( Component ):
+  def construct( s ):
+    s.in_ = InPort(32)
+    s.out = OutPort(32)
+
+    @update
+    def up():
+      tmp = s.in_ + 1
+      s.out @= tmp
+
+class Chain( Component ):
+  def construct( s, N=10 ):
+    s.in_ = InPort(32)
+    s.out = OutPort(32)
+    s.inners = [ Inner() for i in range(N) ]
+    s.inners[0].in_ //= s.in_
+    for i in range(N-1):
+      s.inners[i].out //= s.inners[i+1].in_
+    s.out //= s.inners[-1].out
+
+def test_chain_is_inlined():
+  A = _test_model( Chain, 10 )
+
+  # Each block's local variable is renamed and the bodies are inlined
+  src = A.sim_tick.src
+  assert "# up @ s.inners[0]" in src
+  assert "# up @ s.inners[9]" in src
+  assert "up()" not in src
+
+  for i in range(10):
+    A.in_ @= i * 3
+    A.sim_eval_combinational()
+    assert A.out == i * 3 + 10
+    A.sim_tick()
+    assert A.out == i * 3 + 10
+
+def test_registers_and_closures():
+
+  @bitstruct
+  class Msg:
+    a: Bits8
+    b: Bits32
+
+  class Top( Component ):
+    def construct( s, nbits=8 ):
+      s.in_ = InPort( Msg )
+      s.out = OutPort( Bits32 )
+      s.reg = Wire( Bits32 )
+      s.cat = OutPort( 40 )
+      s.arr = [ Wire( nbits ) for _ in range(4) ]
+
+      N = 4
+
+      @update_ff
+      def up_reg():
+        if s.reset:
+          s.reg <<= 0
+        else:
+          s.reg <<= s.reg + s.in_.b
+
+      @update
+      def up_arr():
+        for i in range(N):
+          s.arr[i] @= s.in_.a + i
+
+      @update
+      def up_out():
+        total = Bits32(0)
+        for i in range(N):
+          total = total + zext( s.arr[i], 32 )
+        s.out @= s.reg + total
+        s.cat @= concat( s.in_.a, s.in_.b )
+
+  A = _test_model( Top )
+  acc = 0
+  for i in range(5):
+    A.in_ @= Msg( i, 100 + i )
+    A.sim_eval_combinational()
+    assert A.out == acc + sum( i + j for j in range(4) )
+    assert A.cat == (i << 32) | (100 + i)
+    A.sim_tick()
+    acc += 100 + i
+
+_count = 0
+
+def test_rebound_free_vars_are_not_inlined():
+
+  class Top( Component ):
+    def construct( s ):
+      s.out0 = OutPort( Bits32 )
+      s.out1 = OutPort( Bits32 )
+      n = 0
+
+      @update_ff
+      def up_count():
+        nonlocal n
+        global _count
+        n += 1
+        _count += 1
+
+      @update
+      def up_out():
+        s.out0 @= n
+        s.out1 @= _count
+
+  A = _test_model( Top )
+  assert "# up_out\n" in A.sim_tick.src
+  for i in range(3):
+    n0, count0 = int(A.out0), int(A.out1)
+    A.sim_tick()
+    assert A.out0 == n0 + 1
+    assert A.out1 == count0 + 1
+
+def test_return_is_not_inlined():
+
+  ncalls = [0]
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_ = InPort(32)
+      s.out = OutPort(32)
+
+      @update
+      def up():
+        ncalls[0] += 1
+        if s.in_ == 0:
+          s.out @= 1
+          return
+        s.out @= s.in_
+
+  A = _test_model( Top )
+  assert "ncalls" not in A.sim_tick.src
+  assert "# up\n" in A.sim_tick.src + "\n"
+
+  A.in_ @= 0
+  A.sim_tick()
+  assert A.out == 1
+  A.in_ @= 5
+  A.sim_tick()
+  assert A.out == 5
+
+def test_method_port_design():
+
+  class Top( Component ):
+    @method_port
+    def recv( s, v ):
+      s.v = v
+
+    def construct( s ):
+      s.v = 0
+      s.out = OutPort(32)
+
+      @update
+      def up():
+        s.out @= s.v
+
+  A = _test_model( Top )
+  A.recv( 3 )
+  A.sim_tick()
+  assert A.out == 3
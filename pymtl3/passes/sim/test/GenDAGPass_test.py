@@ -0,0 +1,285 @@
+#=========================================================================
+# GenDAGPass_test.py
+#=========================================================================
+
+from pymtl3.datatypes import Bits8, Bits16, Bits32, bitstruct
+from pymtl3.dsl import *
+
+from ..GenDAGPass import GenDAGPass
+from ..PrepareSimPass import PrepareSimPass
+from ..SimpleSchedulePass import SimpleSchedulePass
+
+
+def _test_model( cls, collapse_nets ):
+  A = cls()
+  A.elaborate()
+  A.apply( GenDAGPass( collapse_nets ) )
+  A.apply( SimpleSchedulePass() )
+  A.apply( PrepareSimPass(print_line_trace=False) )
+  A.sim_reset()
+  return A
+
+class Inner( Component ):
+  def construct( s ):
+    s.in_ = InPort(32)
+    s.out = OutPort(32)
+
+    @update
+    def up():
+      s.out @= s.in_ + 1
+
+class Chain( Component ):
+  def construct( s ):
+    s.in_ = InPort(32)
+    s.out = OutPort(32)
+    s.inners = [ Inner() for i in range(10) ]
+    s.inners[0].in_ //= s.in_
+    for i in range(9):
+      s.inners[i].out //= s.inners[i+1].in_
+    s.out //= s.inners[-1].out
+
+def test_collapse_chain():
+  A = _test_model( Chain, False )
+  B = _test_model( Chain, True )
+
+  # Every net in Chain consists of top-level signals only
+  assert len( B._dag.genblks ) == 0
+  assert len( B._dag.all_constraints ) < len( A._dag.all_constraints )
+  assert len( set( B._dag.net_aliases.values() ) ) == 11 + 2 # + clk, reset
+
+  for i in range(10):
+    A.in_ @= i
+    B.in_ @= i
+    A.sim_tick()
+    B.sim_tick()
+    assert A.out == B.out == i + 10
+
+def test_collapse_sliced_readers():
+
+  @bitstruct
+  class Msg:
+    a: Bits16
+    b: Bits16
+
+  class Top( Component ):
+    def construct( s ):
+      s.wide   = Wire(32)
+      s.inner  = Inner()
+      s.lo     = OutPort(16)
+      s.hi     = OutPort(16)
+      s.field  = OutPort(16)
+      s.msg    = Wire( Msg )
+      s.msg2   = Wire( Msg )
+      s.res    = Wire(32)
+
+      # s.wide is written by two slices, s.inner.in_ aliases s.wide
+      s.wide //= s.inner.in_
+      s.msg  //= s.msg2
+
+      @update
+      def up_lo():
+        s.wide[0:16] @= 0x1234
+
+      @update
+      def up_hi():
+        s.wide[16:32] @= s.lo + 1
+
+      @update
+      def up_read_alias_slice():
+        s.lo @= s.inner.in_[0:16]
+
+      @update
+      def up_msg():
+        s.msg2.a @= s.inner.out[0:16]
+        s.msg2.b @= 0
+
+      @update
+      def up_read_field():
+        s.field @= s.msg.a
+
+      @update
+      def up_res():
+        s.res @= s.inner.in_
+
+  A = _test_model( Top, True )
+  assert len( A._dag.genblks ) == 0
+  A.sim_tick()
+  assert A.lo == 0x1234
+  assert A.res == 0x12351234
+  assert A.field == 0x1235
+
+def test_collapse_keeps_copies_to_slices():
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_ = InPort(32)
+      s.w   = Wire(32)
+      s.inner = Inner()
+      s.out = OutPort(8)
+
+      # s.in_[0:8] and s.w are copied, s.inner.in_ aliases s.w
+      s.out   //= s.in_[0:8]
+      s.w     //= s.inner.in_
+
+      @update
+      def up():
+        s.w @= s.in_
+
+  A = _test_model( Top, True )
+  assert len( A._dag.genblks ) == 1
+  for i in range(5):
+    A.in_ @= 0x100 + i
+    A.sim_tick()
+    assert A.out == i
+    assert A.inner.out == 0x101 + i
+
+def test_collapse_explicit_write_constraint():
+
+  class Top( Component ):
+    def construct( s ):
+      s.w   = Wire(32)
+      s.x   = Wire(32)
+      s.out = OutPort(32)
+      s.inner = Inner()
+      s.w //= s.inner.in_
+
+      @update
+      def up_wr():
+        s.w @= 5
+
+      @update
+      def up_other():
+        s.out @= s.x
+
+      @update
+      def up_x():
+        s.x @= s.inner.in_
+
+      # WR(inner.in_) used to be the net block
+      s.add_constraints( WR(s.inner.in_) < U(up_x) )
+
+  A = _test_model( Top, True )
+  A.sim_tick()
+  assert A.out == 5
+
+class Inner2( Component ):
+  def construct( s ):
+    s.in_ = InPort(32)
+    s.out = OutPort(32)
+
+    @update
+    def up():
+      s.out @= s.in_ + 2
+
+class Stage( Component ):
+  def construct( s ):
+    s.in_   = InPort(32)
+    s.out   = OutPort(32)
+    s.inner = Inner()
+    s.acc   = Wire(32)
+    s.inner.in_[0:16]  //= s.in_[0:16]
+    s.inner.in_[16:32] //= 0
+
+    @update_ff
+    def up_acc():
+      s.acc <<= s.acc + s.inner.out
+
+    @update
+    def up_out():
+      s.out @= s.acc + s.inner.out
+
+class Pipe( Component ):
+  def construct( s, n=4 ):
+    s.in_  = InPort(32)
+    s.out  = OutPort(32)
+    s.taps = [ OutPort(16) for _ in range(n) ]
+    s.st   = [ Stage() for _ in range(n) ]
+    s.st[0].in_ //= s.in_
+    for i in range(1, n):
+      s.st[i].in_ //= s.st[i-1].out
+    s.out //= s.st[-1].out
+
+def _nets( A ):
+  return sorted( (repr(w), sorted( repr(x) for x in net )) for w, net in A.get_all_value_nets() )
+
+def _dag( A ):
+  dag = A._dag
+  names = {}
+  for blk in dag.final_upblks:
+    if blk in dag.genblks:
+      names[ blk ] = (blk.__name__, sorted( repr(x) for x in dag.genblk_writes[ blk ] ))
+    else:
+      names[ blk ] = (repr( A._dsl.all_upblk_hostobj[ blk ] ), blk.__name__)
+  return ( sorted( names.values() ),
+           sorted( (names[u], names[v]) for u, v in dag.all_constraints ),
+           sorted( (names[u], names[v], sorted( repr(x) for x in xs ))
+                   for (u, v), xs in dag.constraint_objs.items() if xs ) )
+
+def _run( A, ncycles=10 ):
+  A.apply( SimpleSchedulePass() )
+  A.apply( PrepareSimPass(print_line_trace=False) )
+  A.sim_reset()
+  trace = []
+  for i in range( ncycles ):
+    A.in_ @= i
+    A.sim_tick()
+    trace.append( (A.out.clone(), [ x.clone() for x in A.taps ]) )
+  return trace
+
+def test_incremental_edits():
+  A = Pipe()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+
+  updates = []
+  update_dag = GenDAGPass._update_dag
+  def count_update_dag( self, top, log ):
+    updates.append( log )
+    update_dag( self, top, log )
+
+  B = Pipe()
+  B.elaborate()
+
+  for i, edit in enumerate([
+    lambda X: X.replace_component_with_obj( X.st[1].inner, Inner2() ),
+    lambda X: X.replace_component_with_obj( X.st[2], Stage() ),
+    lambda X: X.add_connection( X.taps[0], X.st[0].out[0:16] ),
+    lambda X: X.replace_component_with_obj( X.st[0], Stage() ),
+    lambda X: X.replace_component( X.st[3].inner, Inner2 ),
+    lambda X: X.add_connection( X.taps[3], X.st[3].out[16:32] ),
+  ]):
+    edit( A )
+    edit( B )
+
+    # The nets are patched in place and match a full resolution
+    assert _nets( A ) == sorted( (repr(w), sorted( repr(x) for x in net ))
+                                 for w, net in A._resolve_value_connections() )
+
+    GenDAGPass._update_dag = count_update_dag
+    try:
+      A.apply( GenDAGPass() )
+    finally:
+      GenDAGPass._update_dag = update_dag
+    assert len( updates ) == i + 1
+
+    B._dsl.edit_log = None
+    B.apply( GenDAGPass() )
+    assert _dag( A ) == _dag( B )
+
+  assert _run( A ) == _run( B )
+
+def test_incremental_edit_new_const_slice():
+  A = Pipe()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+
+  # The slice of the new Stage that is driven by a constant is created
+  # after the component is added
+  A.replace_component_with_obj( A.st[0], Stage() )
+  A.apply( GenDAGPass() )
+
+  B = Pipe()
+  B.elaborate()
+  B.apply( GenDAGPass() )
+  assert _dag( A ) == _dag( B )
+  assert _run( A ) == _run( B )
@@ -0,0 +1,213 @@
+#=========================================================================
+# PartitionedSimPass_test.py
+#=========================================================================
+
+import pytest
+
+from pymtl3.datatypes import Bits8, Bits16, bitstruct
+from pymtl3.dsl import *
+from pymtl3.passes.errors import InvalidPassOptionValue, UnsupportedDesignError
+
+from ...PassGroups import DefaultPassGroup
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..PartitionedSimPass import PartitionError, PartitionedSimPass
+
+
+def _test_model( cls, *args, nworkers=2, mark=True ):
+  A = cls( *args )
+  A.elaborate()
+  if mark:
+    for x in A.tiles:
+      x.set_metadata( PartitionedSimPass.partition, True )
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( PartitionedSimPass( nworkers, print_line_trace=False ) )
+  return A
+
+@bitstruct
+class Pair:
+  x: Bits8
+  y: Bits8
+
+class Tile( Component ):
+  def construct( s, i ):
+    s.in_ = InPort( 16 )
+    s.inj = InPort( 16 )
+    s.out = OutPort( 16 )
+    s.st  = OutPort( Pair )
+
+    s.acc = Wire( 16 )
+    s.nxt = Wire( 16 )
+
+    @update
+    def up_nxt():
+      s.nxt @= s.in_ + s.acc + s.inj + i
+
+    @update_ff
+    def up_ff():
+      if s.reset:
+        s.acc <<= 0
+        s.out <<= 0
+        s.st  <<= Pair( 0, 0 )
+      else:
+        s.acc <<= s.nxt
+        s.out <<= s.nxt ^ s.acc
+        s.st  <<= Pair( s.nxt[0:8], s.acc[8:16] )
+
+class Ring( Component ):
+  def construct( s, N=4 ):
+    s.in_ = InPort( 16 )
+    s.out = OutPort( 16 )
+    s.sum = OutPort( 8 )
+
+    s.tiles = [ Tile( i ) for i in range(N) ]
+    for i in range(N):
+      s.tiles[i].inj //= s.in_
+      # Crossed slices between neighboring tiles
+      s.tiles[(i+1) % N].in_[0:8]  //= s.tiles[i].out[8:16]
+      s.tiles[(i+1) % N].in_[8:16] //= s.tiles[i].out[0:8]
+
+    s.total = Wire( 16 )
+
+    @update_ff
+    def up_total():
+      s.total <<= s.tiles[0].out + s.tiles[-1].out
+
+    @update
+    def up_out():
+      s.out @= s.total
+      s.sum @= s.tiles[1].st.x + s.tiles[2].st.y
+
+def _check_against_reference( A, B, ncycles ):
+  A.sim_reset()
+  B.sim_reset()
+  for i in range( ncycles ):
+    A.in_ @= i * 7
+    B.in_ @= i * 7
+    A.sim_tick()
+    B.sim_tick()
+    assert A.out == B.out
+    assert A.sum == B.sum
+  assert A.sim_cycle_count() == B.sim_cycle_count()
+
+def test_marked_partitions():
+  A = _test_model( Ring, 4 )
+  assert len( A._sim.partitions ) == 4
+  assert [ len(x) for x in A._sim.partition_workers ] == [ 2, 2 ]
+
+  B = Ring( 4 )
+  B.apply( DefaultPassGroup() )
+
+  _check_against_reference( A, B, 20 )
+  A.sim_finalize()
+
+def test_top_outputs_driven_by_partitions():
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_  = InPort( 16 )
+      s.out  = OutPort( 16 )
+      s.sum  = OutPort( 8 )
+      s.out0 = OutPort( 16 )
+      s.lo1  = OutPort( 8 )
+      s.st1  = OutPort( Pair )
+
+      s.tiles = [ Tile( i ) for i in range(2) ]
+      for x in s.tiles:
+        x.in_ //= s.in_
+        x.inj //= s.in_
+
+      s.out  //= 0
+      s.sum  //= 0
+      s.out0 //= s.tiles[0].out
+      s.lo1  //= s.tiles[1].out[0:8]
+      s.st1  //= s.tiles[1].st
+
+  A = _test_model( Top )
+  B = Top()
+  B.apply( DefaultPassGroup() )
+  A.sim_reset()
+  B.sim_reset()
+  for i in range( 10 ):
+    A.in_ @= i * 3
+    B.in_ @= i * 3
+    A.sim_tick()
+    B.sim_tick()
+    assert A.out0 == B.out0
+    assert A.lo1  == B.lo1
+    assert A.st1  == B.st1
+  assert A.out0 != 0
+  A.sim_finalize()
+
+class Mixed( Component ):
+  def construct( s ):
+    s.in_ = InPort( 16 )
+    s.out = OutPort( 16 )
+    s.sum = OutPort( 8 )
+
+    s.ring = Ring( 3 )
+    s.t0   = Tile( 0 )
+    s.t1   = Tile( 1 )
+
+    s.ring.in_ //= s.in_
+    s.t0.in_   //= s.in_
+    s.t0.inj   //= s.in_
+    s.t1.in_   //= s.t0.out
+    s.t1.inj   //= s.in_
+
+    @update
+    def up():
+      s.out @= s.ring.out + s.t1.out
+      s.sum @= s.ring.sum + s.t1.st.x
+
+def test_auto_partitions_skip_combinational_boundary():
+  A = _test_model( Mixed, mark=False )
+  # Ring has combinational outputs so it stays in the main process
+  assert A._sim.partitions == [ A.t0, A.t1 ]
+
+  B = Mixed()
+  B.apply( DefaultPassGroup() )
+
+  _check_against_reference( A, B, 20 )
+  A.sim_finalize()
+
+def test_marked_combinational_boundary():
+
+  class Bad( Component ):
+    def construct( s ):
+      s.in_ = InPort( 16 )
+      s.out = OutPort( 16 )
+      s.out //= lambda: s.in_ + 1
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_ = InPort( 16 )
+      s.out = OutPort( 16 )
+      s.tiles = [ Bad(), Bad() ]
+      s.tiles[0].in_ //= s.in_
+      s.tiles[1].in_ //= s.tiles[0].out
+      s.out //= s.tiles[1].out
+
+  with pytest.raises( PartitionError ):
+    _test_model( Top )
+
+def test_unsupported_design():
+
+  class Top( Component ):
+    def construct( s ):
+      s.out = OutPort( 16 )
+
+    @method_port
+    def recv( s, msg ):
+      pass
+
+  A = Top()
+  with pytest.raises( UnsupportedDesignError, match="s.recv" ):
+    A.apply( DefaultPassGroup( partitioned=True ) )
+
+def test_invalid_options():
+  with pytest.raises( InvalidPassOptionValue ):
+    DefaultPassGroup( partitioned=True, fused_tick=True )
+  with pytest.raises( InvalidPassOptionValue ):
+    DefaultPassGroup( partitioned=True, flat_storage=True )
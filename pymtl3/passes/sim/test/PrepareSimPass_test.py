@@ -0,0 +1,252 @@
+#=========================================================================
+# PrepareSimPass_test.py
+#=========================================================================
+
+import random
+import subprocess
+import sys
+from collections import deque
+
+import pytest
+
+from pymtl3.datatypes import Bits, Bits8, Bits16, PythonBits, bitstruct
+from pymtl3.dsl import *
+
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..PrepareSimPass import PrepareSimPass
+
+
+def _test_model( cls, *args, flat_storage=False ):
+  A = cls( *args )
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( PrepareSimPass(print_line_trace=False, flat_storage=flat_storage) )
+  A.sim_reset()
+  return A
+
+def mk_msg():
+  # Bitstruct classes created in a function can't be pickled by reference
+  @bitstruct
+  class Msg:
+    a: Bits8
+    b: [ Bits8, Bits8 ]
+  return Msg
+
+class Top( Component ):
+  def construct( s, seed=0 ):
+    Msg = mk_msg()
+
+    s.in_ = InPort( 16 )
+    s.out = OutPort( 16 )
+    s.msg = OutPort( Msg )
+    s.regs = [ Wire( 16 ) for _ in range(4) ]
+
+    # Python-side state
+    s.queue = deque( maxlen=4 )
+    s.mem   = bytearray( 16 )
+    s.rng   = random.Random( seed )
+    s.count = 0
+    s.last  = None
+
+    @update_ff
+    def up_regs():
+      s.regs[0] <<= s.in_
+      for i in range(1, 4):
+        s.regs[i] <<= s.regs[i-1] + i
+      s.msg <<= Msg( s.in_[0:8], [ s.regs[3][0:8], s.regs[3][8:16] ] )
+
+    @update_once
+    def up_state():
+      s.count += 1
+      s.mem[ s.count % 16 ] = s.count & 255
+      s.queue.append( s.rng.randint( 0, 255 ) )
+      s.last = Msg( s.msg.a + 1, [ s.msg.b[0], s.msg.b[1] ] )
+
+    @update
+    def up_out():
+      s.out @= s.regs[3] + sum( s.queue ) + s.mem[3] + s.count
+
+    # up_out reads Python state that isn't tracked by the scheduler
+    s.add_constraints( U(up_state) < U(up_out) )
+
+def test_checkpoint_restore( tmp_path ):
+  path = str( tmp_path / "ckpt.pkl" )
+
+  A = _test_model( Top, 0 )
+  for i in range(10):
+    A.in_ @= i
+    A.sim_tick()
+  A.sim_checkpoint( path )
+
+  trace_a = []
+  for i in range(10):
+    A.in_ @= i * 3
+    A.sim_tick()
+    trace_a.append( ( A.out.clone(), A.msg.clone(), A.last ) )
+
+  # A different seed shows that the random state is restored as well
+  B = _test_model( Top, 1 )
+  queue = B.queue
+  B.sim_restore( path )
+  assert B.sim_cycle_count() == 10 + 3 # reset takes 3 cycles
+  assert B.queue is queue
+
+  trace_b = []
+  for i in range(10):
+    B.in_ @= i * 3
+    B.sim_tick()
+    trace_b.append( ( B.out.clone(), B.msg.clone(), B.last ) )
+
+  assert trace_a == trace_b
+  assert A.sim_cycle_count() == B.sim_cycle_count()
+
+def test_flat_storage( tmp_path ):
+  path = str( tmp_path / "ckpt.pkl" )
+
+  A = _test_model( Top, 0 )
+  B = _test_model( Top, 0, flat_storage=True )
+
+  trace_a, trace_b = [], []
+  for i in range(10):
+    A.in_ @= i
+    A.sim_tick()
+    trace_a.append( ( A.out.clone(), A.msg.clone(), A.last ) )
+    B.in_ @= i
+    B.sim_tick()
+    trace_b.append( ( B.out.clone(), B.msg.clone(), B.last ) )
+
+  assert trace_a == trace_b
+
+  # RPython Bits keep their own storage
+  if Bits is not PythonBits.Bits:
+    assert B._sim.flat_storage is None
+    return
+
+  storage = B._sim.flat_storage
+  # regs and the three fields of msg are registers
+  assert storage.nregs == 7
+  assert isinstance( B.regs[0], Bits16 )
+  i = [ id(x) for x in storage.values ].index( id(B.regs[3]) )
+  assert B.regs[3].uint() == storage.uint[i]
+  assert B._sched.schedule_posedge_flip == [ storage.flip ]
+
+  # Checkpoints are interchangeable with normal storage
+  B.sim_checkpoint( path )
+  A.sim_restore( path )
+  for i in range(5):
+    A.in_ @= i * 7
+    A.sim_tick()
+    B.in_ @= i * 7
+    B.sim_tick()
+    assert A.out == B.out
+    assert A.msg == B.msg
+
+def test_restore_mismatched_model( tmp_path ):
+  path = str( tmp_path / "ckpt.pkl" )
+
+  class Other( Component ):
+    def construct( s, nbits ):
+      s.out = OutPort( nbits )
+
+  A = _test_model( Other, 8 )
+  A.sim_checkpoint( path )
+
+  B = _test_model( Other, 16 )
+  with pytest.raises( ValueError ):
+    B.sim_restore( path )
+
+  C = _test_model( Top )
+  with pytest.raises( ValueError ):
+    C.sim_restore( path )
+
+class Timer( Component ):
+  def construct( s, period ):
+    s.fire   = OutPort()
+    s.period = period
+    s.count  = period
+
+    @update_once
+    def up_timer():
+      s.count -= 1
+      if s.count == 0:
+        s.count = s.period
+        s.fire @= 1
+      else:
+        s.fire @= 0
+
+  # Ticks before up_timer fires again
+  def idle_cycles( s ):
+    return s.count - 1
+
+  def skip_cycles( s, n ):
+    s.count -= n
+
+class TimerTop( Component ):
+  def construct( s ):
+    s.timer = Timer( 20 )
+    s.nfire = Wire( 8 )
+    s.out   = OutPort( 8 )
+
+    @update_ff
+    def up_nfire():
+      if s.timer.fire:
+        s.nfire <<= s.nfire + 1
+
+    s.out //= s.nfire
+
+def test_fast_forward():
+  def run( ff ):
+    A = _test_model( TimerTop )
+    trace = []
+    ticks = 0
+    while A.sim_cycle_count() < 100:
+      A.sim_tick()
+      ticks += 1
+      trace.append( ( A.sim_cycle_count(), A.out.clone() ) )
+      if ff:
+        A.sim_fast_forward( 100 )
+    assert not A._sim.fast_forward_blockers
+    return trace, A.sim_cycle_count(), A.out.clone(), ticks
+
+  trace_a, ncycles_a, out_a, ticks_a = run( False )
+  trace_b, ncycles_b, out_b, ticks_b = run( True )
+
+  # Every observed cycle matches, and no change of the output is skipped
+  assert set( trace_b ) <= set( trace_a )
+  changes = [ y for x, y in zip( trace_a, trace_a[1:] ) if x[1] != y[1] ]
+  assert len( changes ) == 5 and set( changes ) <= set( trace_b )
+  assert ( ncycles_a, out_a ) == ( ncycles_b, out_b )
+  assert ticks_b < ticks_a // 2
+
+def test_fast_forward_blocked():
+  # Top has an update_once block but no idle_cycles
+  A = _test_model( Top )
+  assert A._sim.fast_forward_blockers == [ "top doesn't implement idle_cycles" ]
+  for i in range(10):
+    A.sim_tick()
+    assert A.sim_fast_forward() == 0
+
+def test_import_loads_no_backend():
+  # Pure-Python simulations never need the translation backends, RTLIR,
+  # numpy or multiprocessing, so importing pymtl3 and simulating must not
+  # load them
+  check = "\n".join([
+    "loaded = [ x for x in sys.modules if x.split('.')[0] in ( 'numpy', 'multiprocessing' ) or",
+    "           x.startswith(( 'pymtl3.passes.backends', 'pymtl3.passes.rtlir' )) ]",
+    "assert not loaded, loaded",
+  ])
+  src = "\n".join([
+    "import sys",
+    "import pymtl3",
+    check,
+    "from pymtl3 import *",
+    "from pymtl3.stdlib.basic_rtl import Reg",
+    "A = Reg( Bits8 )",
+    "A.apply( DefaultPassGroup() )",
+    "A.sim_reset()",
+    "A.sim_tick()",
+    check,
+  ])
+  subprocess.run( [ sys.executable, "-c", src ], check=True )
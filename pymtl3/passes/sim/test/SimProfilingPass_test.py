@@ -0,0 +1,205 @@
+#=========================================================================
+# SimProfilingPass_test.py
+#=========================================================================
+
+import json
+import signal
+import time
+
+import pytest
+
+from pymtl3.datatypes import Bits32
+from pymtl3.dsl import *
+from pymtl3.passes.errors import InvalidPassOptionValue
+
+from ...PassGroups import DefaultPassGroup
+from ..DynamicSchedulePass import DynamicSchedulePass
+from ..GenDAGPass import GenDAGPass
+from ..PrepareSimPass import PrepareSimPass
+from ..SimProfilingPass import SimProfilingPass, gen_profile_report
+
+
+class Slow( Component ):
+  def construct( s ):
+    s.in_ = InPort( 32 )
+    s.out = OutPort( 32 )
+
+    @update
+    def up_slow():
+      x = 0
+      for i in range( 2000 ):
+        x += i
+      s.out @= s.in_ + x
+
+class Fast( Component ):
+  def construct( s ):
+    s.in_ = InPort( 32 )
+    s.out = OutPort( 32 )
+
+    @update
+    def up_fast():
+      s.out @= s.in_ + 1
+
+class Top( Component ):
+  def construct( s ):
+    s.in_  = InPort( 32 )
+    s.out  = OutPort( 32 )
+    s.slow = Slow()
+    s.fast = [ Fast() for _ in range(2) ]
+    s.r    = Wire( 32 )
+    s.x    = Wire( 32 )
+    s.y    = Wire( 32 )
+
+    s.fast[0].in_ //= s.in_
+    s.slow.in_    //= s.fast[0].out
+    s.fast[1].in_ //= s.slow.out
+
+    # A false combinational loop forms an SCC block
+    @update
+    def up_x():
+      if s.y[31]: s.x @= s.fast[1].out
+      else:       s.x @= s.fast[1].out + s.r
+
+    @update
+    def up_y():
+      s.y @= s.x >> 1
+
+    @update_ff
+    def up_r():
+      s.r <<= s.x
+
+    s.out //= s.x
+
+def _run( A, ncycles ):
+  for i in range( ncycles ):
+    A.in_ @= i
+    A.sim_tick()
+  return A.out.clone()
+
+def test_deterministic( tmp_path ):
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( DynamicSchedulePass() )
+  A.apply( SimProfilingPass() )
+  A.apply( PrepareSimPass(print_line_trace=False) )
+  A.sim_reset()
+  A.sim_profile_reset()
+  out = _run( A, 20 )
+
+  B = Top()
+  B.apply( DefaultPassGroup() )
+  B.sim_reset()
+  assert _run( B, 20 ) == out
+
+  path = tmp_path / "prof.json"
+  text = A.sim_profile_report( path )
+  report = json.loads( path.read_text() )
+  assert report['mode'] == 'deterministic'
+  assert report['cycles'] == 23
+
+  blocks = { x['name']: x for x in report['blocks'] }
+
+  # sim_tick of a pure RTL design executes the update blocks twice per
+  # tick, and the members of the SCC block may be executed even more
+  assert blocks['top.slow.up_slow']['calls'] == 40
+  assert blocks['top.fast[0].up_fast']['calls'] == 40
+  assert blocks['top.up_r']['kind'] == 'update_ff'
+  assert blocks['top.up_r']['calls'] == 20
+  assert blocks['top.up_x']['calls'] >= 40
+  assert blocks['top.up_y']['calls'] >= 40
+  assert any( x['kind'] == 'net' for x in report['blocks'] )
+  assert any( x['kind'] == 'flip' for x in report['blocks'] )
+
+  # Rows are sorted by cost
+  for key in [ 'blocks', 'classes', 'hierarchy' ]:
+    times = [ x['time'] for x in report[ key ] ]
+    assert times == sorted( times, reverse=True )
+
+  classes = { x['name']: x for x in report['classes'] }
+  assert classes['Slow']['calls'] == 40
+  assert classes['Fast']['calls'] == 80
+
+  hierarchy = { x['name']: x for x in report['hierarchy'] }
+  assert hierarchy['top']['time'] == pytest.approx( report['total'] )
+  assert hierarchy['top.slow']['time'] >= blocks['top.slow.up_slow']['time']
+
+  assert 'top.slow.up_slow (update)' in text
+  assert 'component class' in text and 'hierarchy path' in text
+
+def test_sampling():
+  if not hasattr( signal, 'setitimer' ):
+    pytest.skip( "signal.setitimer is not available" )
+
+  handler = signal.getsignal( signal.SIGPROF )
+
+  A = Top()
+  A.apply( DefaultPassGroup( profile='sampling' ) )
+
+  # The timer is only armed once the model ticks
+  assert not A._prof.sampling
+  assert signal.getsignal( signal.SIGPROF ) is handler
+
+  try:
+    A.sim_reset()
+    A.sim_profile_reset()
+    assert A._prof.sampling
+    start = time.process_time()
+    while time.process_time() - start < 0.3:
+      _run( A, 10 )
+  finally:
+    A.sim_profile_stop()
+
+  assert not A._prof.sampling
+  assert signal.getsignal( signal.SIGPROF ) is handler
+  assert signal.getitimer( signal.ITIMER_PROF ) == (0.0, 0.0)
+
+  # Stopped for good
+  _run( A, 10 )
+  assert not A._prof.sampling
+
+  text = A.sim_profile_report()
+  assert text.startswith( "Simulation profile (sampling" )
+
+  report = gen_profile_report( A )
+  assert report['mode'] == 'sampling'
+  assert report['blocks'] and all( x['samples'] > 0 for x in report['blocks'] )
+  # The time outside blocks doesn't belong to any component
+  hierarchy = { x['name']: x for x in report['hierarchy'] }
+  assert 0 < hierarchy['top']['time'] <= report['total'] + 1e-9
+
+def test_sampling_stops_when_idle():
+  if not hasattr( signal, 'setitimer' ):
+    pytest.skip( "signal.setitimer is not available" )
+
+  handler = signal.getsignal( signal.SIGPROF )
+
+  A = Top()
+  A.apply( DefaultPassGroup( profile='sampling' ) )
+  A.sim_reset()
+  assert A._prof.sampling
+
+  # Burn CPU time outside the simulation
+  start = time.process_time()
+  while A._prof.sampling and time.process_time() - start < 5:
+    pass
+  assert not A._prof.sampling
+  assert signal.getsignal( signal.SIGPROF ) is handler
+
+  # Ticking again arms the timer again
+  _run( A, 1 )
+  assert A._prof.sampling
+
+  # Only one model samples at a time
+  B = Top()
+  B.apply( DefaultPassGroup( profile='sampling' ) )
+  B.sim_reset()
+  assert B._prof.sampling and not A._prof.sampling
+
+  B.sim_profile_stop()
+  A.sim_profile_stop()
+  assert signal.getsignal( signal.SIGPROF ) is handler
+
+def test_deterministic_partitioned():
+  with pytest.raises( InvalidPassOptionValue ):
+    DefaultPassGroup( profile='deterministic', partitioned=True )
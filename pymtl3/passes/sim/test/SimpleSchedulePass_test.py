@@ -5,7 +5,7 @@
 # Author : Shunning Jiang
 # Date   : Apr 19, 2019
 
-from pymtl3.datatypes import Bits8, Bits32, bitstruct
+from pymtl3.datatypes import Bits, Bits8, Bits32, PythonBits, bitstruct
 from pymtl3.dsl import *
 from pymtl3.dsl.errors import UpblkCyclicError
 
@@ -261,3 +261,101 @@ def test_equal_top_level():
     print(e)
     assert str(e).startswith("Please use @= to assign top level InPort")
     return
+
+def test_dirty_flip():
+
+  @bitstruct
+  class Pair:
+    a: Bits8
+    b: Bits8
+
+  class Reg( Component ):
+    def construct( s ):
+      s.en  = InPort()
+      s.in_ = InPort( Bits8 )
+      s.out = OutPort( Bits8 )
+
+      @update_ff
+      def up_reg():
+        if s.en:
+          s.out <<= s.in_
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_  = InPort( Bits8 )
+      s.sel  = InPort( Bits8 )
+      s.regs = [ Reg() for _ in range(8) ]
+      s.pair = Wire( Pair )
+      s.out  = OutPort( Bits8 )
+
+      # Only one register is written in each cycle
+      @update
+      def up_en():
+        for i in range(8):
+          s.regs[i].en @= s.sel == i
+          s.regs[i].in_ @= s.in_ + i
+
+      @update_ff
+      def up_pair():
+        if s.sel[0]:
+          s.pair <<= Pair( s.in_, s.regs[0].out )
+
+      @update
+      def up_out():
+        s.out @= s.regs[7].out + s.pair.a + s.pair.b
+
+  def run( dirty_flip ):
+    A = Top()
+    A.elaborate()
+    A.apply( GenDAGPass() )
+    A.apply( SimpleSchedulePass( dirty_flip ) )
+    A.apply( PrepareSimPass(print_line_trace=False) )
+    A.sim_reset()
+    trace = []
+    for i in range(40):
+      A.in_ @= i * 5
+      A.sel @= i % 9
+      A.sim_tick()
+      trace.append( ( A.out.clone(), [ x.out.clone() for x in A.regs ], A.pair.clone() ) )
+    return A, trace
+
+  A, trace_a = run( False )
+  B, trace_b = run( True )
+  assert trace_a == trace_b
+  # RPython Bits cannot record writes
+  if Bits is PythonBits.Bits:
+    assert B._sched.schedule_posedge_flip[0].__name__ == 'dirty_flip'
+
+def test_dirty_flip_exception():
+
+  class Top( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits8 )
+      s.out = OutPort( Bits8 )
+
+      @update_ff
+      def up_reg():
+        assert s.in_ != 0xff
+        s.out <<= s.in_
+
+  A = Top()
+  A.elaborate()
+  A.apply( GenDAGPass() )
+  A.apply( SimpleSchedulePass( True ) )
+  A.apply( PrepareSimPass(print_line_trace=False) )
+  A.sim_reset()
+
+  ilshift = Bits8.__ilshift__
+  A.in_ @= 0xff
+  try:
+    A.sim_tick()
+  except AssertionError:
+    pass
+  else:
+    assert False
+  assert Bits8.__ilshift__ is ilshift
+
+  A.in_ @= 3
+  A.sim_tick()
+  assert A.out == 3
+  assert Bits8.__ilshift__ is ilshift
@@ -0,0 +1,88 @@
+#=========================================================================
+# WrapGeneratorPass_test.py
+#=========================================================================
+
+import greenlet
+import pytest
+
+from pymtl3.datatypes import Bits32, b32
+from pymtl3.dsl import *
+from pymtl3.passes.errors import InvalidPassOptionValue
+from pymtl3.stdlib.stream import SinkRTL, SourceRTL, fl
+
+from ...PassGroups import DefaultPassGroup
+
+
+class PassFL( Component ):
+  def construct( s, msgs, RecvAdapter=fl.RecvQueueAdapter ):
+    s.recv = RecvAdapter( Bits32 )
+    s.send = fl.SendQueueAdapter( Bits32 )
+    s.src  = SourceRTL( Bits32, msgs, interval_delay=2 )
+    s.sink = SinkRTL( Bits32, [ x * 3 for x in msgs ], interval_delay=3 )
+
+    s.src.send  //= s.recv.recv
+    s.send.send //= s.sink.recv
+
+    @update_once
+    def up_pass():
+      s.send.enq( s.recv.deq() * 3 )
+
+  def done( s ):
+    return s.src.done() and s.sink.done()
+
+def _run( A, coroutine ):
+  A.apply( DefaultPassGroup( coroutine=coroutine ) )
+  A.sim_reset()
+  while not A.done() and A.sim_cycle_count() < 1000:
+    A.sim_tick()
+  assert A.done()
+  return A.sim_cycle_count()
+
+def test_generator_matches_greenlet():
+  msgs = [ b32(i) for i in range(20) ]
+
+  A = PassFL( msgs )
+  ncycles = _run( A, 'generator' )
+  assert A._dag.greenlet_fallback == []
+
+  B = PassFL( msgs )
+  assert _run( B, 'greenlet' ) == ncycles
+
+def test_suspended():
+  A = PassFL( [ b32(1) ] )
+  A.apply( DefaultPassGroup( coroutine='generator' ) )
+  A.sim_reset()
+
+  blk, = A._dag.blk_greenlet_mapping.values()
+  # up_pass is blocked in deq until the source sends the message
+  assert blk.is_suspended()
+  while not A.done():
+    A.sim_tick()
+  assert blk.is_suspended()
+
+# We don't know how to rewrite other uses of greenlet
+
+class RecvQueueAdapter( fl.RecvQueueAdapter ):
+
+  @blocking
+  def deq( s ):
+    main = greenlet.getcurrent().parent
+    while s.entry is None:
+      main.switch(0)
+    ret = s.entry
+    s.entry = None
+    return ret
+
+def test_greenlet_fallback():
+  msgs = [ b32(i) for i in range(20) ]
+
+  A = PassFL( msgs, RecvQueueAdapter )
+  ncycles = _run( A, 'generator' )
+  assert A._dag.greenlet_fallback == [ 'top.up_pass' ]
+
+  B = PassFL( msgs, RecvQueueAdapter )
+  assert _run( B, 'greenlet' ) == ncycles
+
+def test_invalid_option():
+  with pytest.raises( InvalidPassOptionValue ):
+    DefaultPassGroup( coroutine='thread' )
@@ -1505,6 +1505,62 @@ class CaseBits64PartSelUpblkComp:
       [  -64,   -4 ],
   ]
 
+class CaseBits64IntFieldUpblkComp:
+  class DUT( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits64 )
+      s.out0 = OutPort( Bits32 )
+      s.out1 = OutPort( Bits1 )
+      @update
+      def upblk():
+        s.out0 @= s.in_.uint_slice( 4, 36 )
+        s.out1 @= s.in_.bit( 63 )
+  TV_IN = \
+  _set( 'in_', Bits64, 0 )
+  TV_OUT = \
+  _check( 'out0', Bits32, 1, 'out1', Bits1, 2 )
+  TV =\
+  [
+      [   -1,   -1,  1 ],
+      [   -2,   -1,  1 ],
+      [  -32,   -2,  1 ],
+      [   16,    1,  0 ],
+  ]
+
+class CaseBitsIntFieldOperandsComp:
+  class DUT( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits32 )
+      s.arr = [ Wire( Bits8 ) for _ in range( 4 ) ]
+      s.out0 = OutPort( Bits8 )
+      s.out1 = OutPort( Bits1 )
+      s.out2 = OutPort( Bits1 )
+      @update
+      def upblk_arr():
+        for i in range( 4 ):
+          s.arr[i] @= s.in_[i*8:i*8+8]
+      @update
+      def upblk():
+        s.out0 @= s.arr[ s.in_.uint_slice( 0, 2 ) ]
+        s.out1 @= s.in_.uint_slice( 4, 8 ) == 3
+        if s.in_.bit( 31 ):
+          s.out2 @= s.in_[ s.in_.uint_slice( 8, 13 ) ]
+        else:
+          s.out2 @= 0
+  TV_IN = \
+  _set( 'in_', Bits32, 0 )
+  TV_OUT = \
+  _check( 'out0', Bits8, 1, 'out1', Bits1, 2, 'out2', Bits1, 3 )
+  TV =\
+  [
+      [ 0x00000000, 0x00, 0, 0 ],
+      [ 0x12345631, 0x56, 1, 0 ],
+      [ 0x80000520, 0x20, 0, 1 ],
+      [ 0xff00f9b3, 0xff, 0, 1 ],
+      [ 0x7f00f9b3, 0x7f, 0, 0 ],
+      [ 0x80001e01, 0x1e, 0, 0 ],
+  ]
+
 class CasePassThroughComp:
   class DUT( Component ):
     def construct( s ):
@@ -2955,6 +3011,33 @@ class CaseSextTwoArgsComp:
       def upblk():
         x = sext( s )
 
+class CaseUintSliceOneArgComp:
+  class DUT( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits32 )
+      s.out = OutPort( Bits32 )
+      @update
+      def upblk():
+        s.out @= s.in_.uint_slice( 4 )
+
+class CaseBitInvertComp:
+  class DUT( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits32 )
+      s.out = OutPort( Bits1 )
+      @update
+      def upblk():
+        s.out @= ~s.in_.bit( 0 )
+
+class CaseUintSliceArithComp:
+  class DUT( Component ):
+    def construct( s ):
+      s.in_ = InPort( Bits32 )
+      s.out = OutPort( Bits32 )
+      @update
+      def upblk():
+        s.out @= s.in_.uint_slice( 0, 32 ) + 1
+
 class CaseUnrecognizedFuncComp:
   class DUT( Component ):
     def construct( s ):
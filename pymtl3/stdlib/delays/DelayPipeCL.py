@@ -67,6 +67,21 @@ class DelayPipeDeqCL( Component ):
         U(up_delay) < M(s.enq.rdy),
       )
 
+  # Fast-forward support. A message waits at the end of the pipeline
+  # until it is dequeued, and other messages move forward every cycle.
+
+  def idle_cycles( s ):
+    if s.pipeline[-1] is not None:
+      return None
+    for i in range( len(s.pipeline)-2, -1, -1 ):
+      if s.pipeline[i] is not None:
+        return len(s.pipeline) - 2 - i
+    return None
+
+  def skip_cycles( s, ncycles ):
+    if s.pipeline[-1] is None:
+      s.pipeline.rotate( ncycles )
+
   def line_trace( s ):
     return "[{}]".format( "".join( [ " " if x is None else "*" for x in list(s.pipeline)[:-1] ] ) )
 
@@ -108,6 +123,23 @@ class DelayPipeSendCL( Component ):
         M(s.enq.rdy) > U(up_delay),  # pipe behavior
       )
 
+  # Fast-forward support. The message at the end of the pipeline keeps
+  # trying to send every cycle.
+
+  def idle_cycles( s ):
+    if s.delay == 0:
+      return None
+    if s.pipeline[-1] is not None:
+      return 0
+    for i in range( len(s.pipeline)-2, -1, -1 ):
+      if s.pipeline[i] is not None:
+        return len(s.pipeline) - 1 - i
+    return None
+
+  def skip_cycles( s, ncycles ):
+    if s.delay > 0:
+      s.pipeline.rotate( ncycles )
+
   def line_trace( s ):
     if s.delay > 0:
       return "[{}]".format( "".join( [ " " if x is None else "*" for x in s.pipeline ] ) )
@@ -35,5 +35,11 @@ class StallCL( Component ):
     )
 
 
+  # Fast-forward support. Every call to recv.rdy draws a random number,
+  # so we cannot skip any cycle if the stall is random.
+
+  def idle_cycles( s ):
+    return 0 if s.stall_prob > 0 else None
+
   def line_trace( s ):
     return f"{s.recv}"
@@ -208,6 +208,9 @@ class RecvCL2SendRTL( Component ):
   def recv( s, msg ):
     s.entry = clone_deepcopy( msg )
 
+  def idle_cycles( s ):
+    return None if s.entry is None else 0
+
   def line_trace( s ):
     return "{}(){}".format( s.recv, s.send )
 
@@ -241,6 +244,9 @@ class RecvRTL2SendCL( Component ):
 
     s.add_constraints( U( up_recv_rtl_rdy ) < U( up_send_cl ) )
 
+  def idle_cycles( s ):
+    return 0 if s.recv.en or s.sent_msg is not None else None
+
   def line_trace( s ):
     return "{}(){}".format(
       s.recv.line_trace(),
@@ -141,6 +141,18 @@ class MagicMemoryCL( Component ):
 
           s.resp_qs[i].enq( resp )
 
+  #-----------------------------------------------------------------------
+  # idle_cycles
+  #-----------------------------------------------------------------------
+  # The latency is modeled by the delay pipes, which declare their own
+  # idle cycles. We only have work to do if a request can be served.
+
+  def idle_cycles( s ):
+    for i in range( s.nports ):
+      if s.req_qs[i].deq.rdy() and s.resp_qs[i].enq.rdy():
+        return 0
+    return None
+
   #-----------------------------------------------------------------------
   # line_trace
   #-----------------------------------------------------------------------
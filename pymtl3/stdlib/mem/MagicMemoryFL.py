@@ -61,5 +61,10 @@ class MagicMemoryFL( Component ):
     assert len(s.mem) > (addr + len(data))
     s.mem[ addr : addr + len(data) ] = data
 
+  # Fast-forward support. The trace is cleared in the next cycle.
+
+  def idle_cycles( s ):
+    return 0 if s.trace != "     " else None
+
   def line_trace( s ):
     return s.trace
@@ -38,6 +38,10 @@ class PipeQueueCL( Component ):
   def peek( s ):
     return s.queue[-1]
 
+  # A queue only reacts to method calls
+  def idle_cycles( s ):
+    return None
+
   def line_trace( s ):
     return "{}( ){}".format( s.enq, s.deq )
 
@@ -67,6 +71,10 @@ class BypassQueueCL( Component ):
   def peek( s ):
     return s.queue[-1]
 
+  # A queue only reacts to method calls
+  def idle_cycles( s ):
+    return None
+
   def line_trace( s ):
     return "{}( ){}".format( s.enq, s.deq )
 
@@ -105,5 +113,9 @@ class NormalQueueCL( Component ):
   def peek( s ):
     return s.queue[-1]
 
+  # A queue only reacts to method calls
+  def idle_cycles( s ):
+    return None
+
   def line_trace( s ):
     return "{}( ){}".format( s.enq, s.deq )
@@ -114,6 +114,22 @@ class SinkRTL( Component ):
   def done( s ):
     return s.done_flag
 
+  # Fast-forward support. An error, the done flag and a received message
+  # all take effect in the next cycle, and the interval delay counts down
+  # before recv.rdy is set again.
+
+  def idle_cycles( s ):
+    if s.reset or s.error_msg or ( s.idx >= len(s.msgs) and not s.done_flag ) or \
+       ( s.recv.val & s.recv.rdy ):
+      return 0
+    if s.count > 0:
+      return s.count
+    return 0 if bool( s.recv.rdy ) != ( s.idx < len(s.msgs) ) else None
+
+  def skip_cycles( s, ncycles ):
+    s.count = max( 0, s.count - ncycles )
+    s.cycle_count += ncycles
+
   # Line trace
 
   def line_trace( s ):
@@ -57,6 +57,19 @@ class SourceRTL( Component ):
   def done( s ):
     return s.idx >= len(s.msgs)
 
+  # Fast-forward support. A message waits for send.rdy, and the interval
+  # delay counts down before the next message is valid.
+
+  def idle_cycles( s ):
+    if s.idx >= len(s.msgs):
+      return None
+    if s.reset or ( s.send.val & s.send.rdy ) or ( s.count == 0 and not s.send.val ):
+      return 0
+    return s.count if s.count > 0 else None
+
+  def skip_cycles( s, ncycles ):
+    s.count = max( 0, s.count - ncycles )
+
   # Line trace
 
   def line_trace( s ):
@@ -214,9 +214,13 @@ def run_sim( model, cmdline_opts=None, print_line_trace=True, duts=None ):
                                   'test_verilog'       : False,
                                   'test_yosys_verilog' : False,
                                   'max_cycles'         : None,
+                                  'fast_forward'       : False,
+                                  'coroutine'          : 'greenlet',
                                   'dump_vtb'           : ''}
 
-  max_cycles = cmdline_opts['max_cycles'] or 10000
+  max_cycles   = cmdline_opts['max_cycles'] or 10000
+  fast_forward = cmdline_opts.get( 'fast_forward', False )
+  coroutine    = cmdline_opts.get( 'coroutine', 'greenlet' )
 
   # Setup the model
 
@@ -224,13 +228,15 @@ def run_sim( model, cmdline_opts=None, print_line_trace=True, duts=None ):
 
   try:
     # Create a simulator
-    model.apply( DefaultPassGroup(linetrace=print_line_trace) )
+    model.apply( DefaultPassGroup(linetrace=print_line_trace, coroutine=coroutine) )
     # Reset model
     model.sim_reset()
 
     # Run simulation
     while not model.done() and model.sim_cycle_count() < max_cycles:
       model.sim_tick()
+      if fast_forward:
+        model.sim_fast_forward( max_cycles )
 
     # Force a test failure if we timed out
     assert model.sim_cycle_count() < max_cycles
@@ -113,6 +113,20 @@ class TestSinkCL( Component ):
   def done( s ):
     return s.done_flag
 
+  # Fast-forward support. An error, the done flag, and the interval
+  # delay after a message is received all take effect in the next cycle.
+  # The sink becomes ready again when the delay counts down to zero.
+
+  def idle_cycles( s ):
+    if s.error_msg or s.recv_called or ( s.idx >= len( s.msgs ) and not s.done_flag ):
+      return 0
+    return s.count - 1 if s.count > 0 else None
+
+  def skip_cycles( s, ncycles ):
+    s.count = max( 0, s.count - ncycles )
+    if not s.reset:
+      s.cycle_count += ncycles
+
   # Line trace
   def line_trace( s ):
     return "{}".format( s.recv )
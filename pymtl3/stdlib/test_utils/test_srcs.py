@@ -38,6 +38,14 @@ class TestSrcCL( Component ):
   def done( s ):
     return not s.msgs
 
+  # Fast-forward support
+
+  def idle_cycles( s ):
+    return s.count if s.msgs else None
+
+  def skip_cycles( s, ncycles ):
+    s.count = max( 0, s.count - ncycles )
+
   # Line trace
 
   def line_trace( s ):
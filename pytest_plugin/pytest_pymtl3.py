@@ -39,6 +39,11 @@ def pytest_addoption(parser):
                     default=None, help="dump verilog test bench for each test" )
   group.addoption( "--max-cycles", dest="max_cycles", action="store",
                     default=None, help="max cycles of simulation" )
+  group.addoption( "--fast-forward", dest="fast_forward", action="store_true",
+                    default=None, help="skip idle cycles in run_sim" )
+  group.addoption( "--coroutine", dest="coroutine", action="store",
+                    default='greenlet', choices=['greenlet', 'generator'],
+                    help="coroutine implementation of blocking methods in run_sim" )
 
 @pytest.fixture
 def cmdline_opts( request ):
@@ -87,6 +92,8 @@ def _any_opts_present( config ):
       ( 'dump_vcd',           None ),
       ( 'dump_vtb',           None ),
       ( 'max_cycles',         None ),
+      ( 'fast_forward',       None ),
+      ( 'coroutine',    'greenlet' ),
   ]
   return any([config.getoption(opt) != val for opt, val in opt_default_pairs])
 
@@ -149,4 +156,11 @@ def _parse_opts_from_request( request ):
       raise Exception("command line option `--max-cycles` should have integer value!")
   opts['max_cycles'] = max_cycles
 
+  # fast_forward
+  fast_forward = request.config.getoption("fast_forward")
+  opts['fast_forward'] = bool(fast_forward)
+
+  # coroutine
+  opts['coroutine'] = request.config.getoption("coroutine")
+
   return opts
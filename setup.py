@@ -88,6 +88,10 @@ setup(
     'greenlet',
   ],
 
+  extras_require = {
+    'batch' : [ 'numpy' ],
+  },
+
   entry_points = {
     'pytest11' : [
       'pytest-pymtl3 = pytest_plugin.pytest_pymtl3',